@@ -0,0 +1,76 @@
+"""
+Benchmark: agendamentos por segundo COM e SEM a simulação de carga.
+
+Dispara POST /api/agendar concorrentes contra o app real (in-process, via
+TestClient) usando um diretório de dados temporário.
+
+Uso (na raiz do projeto):
+    python -m benchmarks.bookings [--clientes 16] [--agendamentos 400] [--agendamentos-simulacao 4]
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Os dados do benchmark nunca tocam o data/ real
+os.environ["SO_DATA_DIR"] = tempfile.mkdtemp(prefix="so_bench_")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Mês futuro: os agendamentos caem na camada quente, como os de produção
+DATA_BASE = datetime.datetime(2030, 1, 1, 8, 0)
+
+def horario(i: int) -> str:
+    """i-ésimo horário do benchmark: um por minuto, no formato gravado pela API."""
+    return (DATA_BASE + datetime.timedelta(minutes=i)).strftime("%Y-%m-%dT%H:%M")
+
+def medir(client, medico_id: int, total: int, clientes: int) -> dict:
+    def agendar(i: int) -> int:
+        resposta = client.post('/api/agendar', json={
+            "paciente_nome": f"Paciente {i}",
+            "medico_id": medico_id,
+            "data_hora": horario(i),
+        })
+        return resposta.status_code
+
+    inicio = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()): # Silencia os prints do storage
+        with ThreadPoolExecutor(max_workers=clientes) as pool:
+            status = list(pool.map(agendar, range(total)))
+    duracao = time.perf_counter() - inicio
+    return {
+        "agendamentos": total,
+        "sucesso": status.count(200),
+        "duracao_s": round(duracao, 3),
+        "agendamentos_por_s": round(total / duracao, 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clientes", type=int, default=16)
+    parser.add_argument("--agendamentos", type=int, default=400)
+    parser.add_argument("--agendamentos-simulacao", type=int, default=4,
+                        help="Com a simulação (2 s por escrita) poucos bastam")
+    args = parser.parse_args()
+
+    from fastapi.testclient import TestClient
+    import main as app_main
+    from src.storage import simulacao
+
+    resultado = {}
+    with TestClient(app_main.app) as client:
+        simulacao.configurar(ativo=False)
+        resultado["sem_simulacao"] = medir(client, 1, args.agendamentos, args.clientes)
+        simulacao.configurar(ativo=True)
+        resultado["com_simulacao"] = medir(client, 2, args.agendamentos_simulacao, args.clientes)
+        simulacao.configurar(ativo=False)
+
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
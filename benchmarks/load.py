@@ -0,0 +1,488 @@
+"""
+Teste de carga: cenários de um dia movimentado contra o app real.
+
+Alvo: in-process (TestClient, dados num diretório temporário) ou um servidor
+local já rodando (--url). No modo --url os dados do teste são gravados no
+servidor: suba-o com SO_DATA_DIR apontando para um diretório descartável.
+
+Cenários (--cenarios, separados por vírgula):
+    ws_selecao        N clientes WebSocket disputam `selecionar` nos mesmos horários
+    agendar_cancelar  POST /api/agendar (com colisões) e /api/cancelar concorrentes
+    dashboard         GET /admin/ concorrentes
+    relatorio         POST /admin/relatorios/gerar + acompanhamento dos jobs
+
+Cada cenário mede vazão, latência (p50/p95/p99), taxa de conflito e o atraso
+do event loop (amostrado em /admin/metrics/loop durante o cenário). O
+resultado vai para benchmarks/resultados/carga_<data>.json; --comparar
+mostra a variação em relação a um resultado anterior.
+
+Uso (na raiz do projeto):
+    python -m benchmarks.load [--url http://127.0.0.1:8000] [--clientes 16] [--semente 42]
+                              [--cenarios ws_selecao,agendar_cancelar] [--comparar anterior.json]
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import queue
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+RESULTADOS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resultados")
+CENARIOS = ("ws_selecao", "agendar_cancelar", "dashboard", "relatorio")
+# Data-base dos horários do teste (longe de dados reais)
+DATA_BASE = datetime.datetime(2090, 1, 2, 8, 0)
+
+def _log(mensagem: str):
+    # stdout fica com o JSON final (e, no modo in-process, com os prints do app)
+    print(f"[CARGA] {mensagem}", file=sys.stderr, flush=True)
+
+def percentis(amostras_ms: List[float]) -> Dict[str, float]:
+    if not amostras_ms:
+        return {"n": 0, "media_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+    ordenadas = sorted(amostras_ms)
+
+    def p(q: float) -> float:
+        return round(ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * q))], 3)
+
+    return {"n": len(ordenadas), "media_ms": round(sum(ordenadas) / len(ordenadas), 3),
+            "p50_ms": p(0.50), "p95_ms": p(0.95), "p99_ms": p(0.99), "max_ms": round(ordenadas[-1], 3)}
+
+def horario(i: int) -> str:
+    """i-ésimo horário do teste: 20 por dia, de 30 em 30 minutos."""
+    inicio = DATA_BASE + datetime.timedelta(days=i // 20, minutes=30 * (i % 20))
+    return inicio.strftime("%Y-%m-%dT%H:%M")
+
+
+# --- Alvos ---
+
+class _CanalTeste:
+    """
+    WebSocket do TestClient. A sessão não tem timeout de leitura: uma thread
+    repassa as mensagens para uma fila, e receber() espera nela com timeout.
+    """
+
+    def __init__(self, sessao):
+        self._sessao = sessao
+        self._entrada: "queue.Queue[Any]" = queue.Queue()
+        threading.Thread(target=self._bombear, name="ws-teste", daemon=True).start()
+
+    def _bombear(self):
+        while True:
+            try:
+                self._entrada.put(self._sessao.receive_text())
+            except BaseException as e: # Sessão fechada: repassa o erro e termina
+                self._entrada.put(e)
+                return
+
+    def enviar(self, mensagem: dict):
+        self._sessao.send_text(json.dumps(mensagem))
+
+    def receber(self, timeout: float) -> dict:
+        try:
+            mensagem = self._entrada.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"nenhuma mensagem em {timeout} s") from None
+        if isinstance(mensagem, BaseException):
+            raise mensagem
+        return json.loads(mensagem)
+
+
+class _CanalRemoto:
+    def __init__(self, conexao):
+        self._conexao = conexao
+
+    def enviar(self, mensagem: dict):
+        self._conexao.send(json.dumps(mensagem))
+
+    def receber(self, timeout: float) -> dict:
+        return json.loads(self._conexao.recv(timeout=timeout))
+
+
+class AlvoLocal:
+    """App in-process: TestClient + diretório de dados temporário."""
+
+    def __init__(self):
+        from fastapi.testclient import TestClient
+        import main as app_main
+        self.descricao = "in-process"
+        self.http = TestClient(app_main.app)
+
+    def __enter__(self):
+        self.http.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        self.http.__exit__(*exc)
+
+    @contextlib.contextmanager
+    def websocket(self):
+        with self.http.websocket_connect("/api/ws") as sessao:
+            yield _CanalTeste(sessao)
+
+
+class AlvoRemoto:
+    """Servidor já rodando (uvicorn): httpx + websockets."""
+
+    def __init__(self, url: str, conexoes: int):
+        import httpx
+        self.descricao = url
+        self.url = url.rstrip("/")
+        self.http = httpx.Client(base_url=self.url, timeout=60,
+                                 limits=httpx.Limits(max_connections=conexoes, max_keepalive_connections=conexoes))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.http.close()
+
+    @contextlib.contextmanager
+    def websocket(self):
+        from websockets.sync.client import connect
+        with connect(self.url.replace("http", "ws", 1) + "/api/ws") as conexao:
+            yield _CanalRemoto(conexao)
+
+
+# --- Medição ---
+
+class AmostradorLoop(threading.Thread):
+    """Lê /admin/metrics/loop periodicamente enquanto um cenário roda."""
+
+    def __init__(self, alvo, intervalo_s: float = 0.1):
+        super().__init__(daemon=True)
+        self._alvo = alvo
+        self._intervalo_s = intervalo_s
+        self._parar = threading.Event()
+        self.amostras: List[float] = []
+
+    def run(self):
+        while not self._parar.wait(self._intervalo_s):
+            try:
+                self.amostras.append(self._alvo.http.get("/admin/metrics/loop").json()["atual_ms"])
+            except Exception:
+                pass
+
+    def encerrar(self) -> Dict[str, float]:
+        self._parar.set()
+        self.join()
+        resumo = percentis(self.amostras)
+        return {"amostras": resumo["n"], "p50_ms": resumo["p50_ms"], "p99_ms": resumo["p99_ms"],
+                "max_ms": resumo["max_ms"]}
+
+def executar_cenario(alvo, nome: str, funcao: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+    _log(f"cenário {nome}...")
+    amostrador = AmostradorLoop(alvo)
+    amostrador.start()
+    inicio = time.perf_counter()
+    try:
+        resultado = funcao()
+    finally:
+        atraso = amostrador.encerrar()
+    resultado["duracao_s"] = round(time.perf_counter() - inicio, 3)
+    resultado["atraso_event_loop"] = atraso
+    _log(f"cenário {nome}: {resultado.get('vazao_por_s')} op/s em {resultado['duracao_s']} s")
+    return resultado
+
+def cronometrar(funcao: Callable[[], Any]):
+    inicio = time.perf_counter()
+    retorno = funcao()
+    return retorno, (time.perf_counter() - inicio) * 1000
+
+
+# --- Preparação ---
+
+def criar_medico(alvo, nome: str) -> int:
+    alvo.http.post("/admin/medico/novo", data={"nome": nome, "especialidade": "Carga"}, follow_redirects=False)
+    medicos = alvo.http.get("/api/medicos").json()
+    return max(m["id"] for m in medicos if m["nome"] == nome)
+
+def semear(alvo, medico_id: int, total: int, clientes: int):
+    """Consultas de base (não medidas) para o dashboard e os relatórios terem o que ler."""
+    def agendar(i: int):
+        alvo.http.post("/api/agendar", json={"paciente_nome": f"Base {i}", "medico_id": medico_id,
+                                             "data_hora": horario(i)})
+
+    with ThreadPoolExecutor(max_workers=clientes) as pool:
+        list(pool.map(agendar, range(total)))
+
+
+# --- Cenários ---
+
+def cenario_ws_selecao(alvo, medico_id: int, clientes: int, rodadas: int, horarios: int, semente: int) -> Dict[str, Any]:
+    """
+    A cada rodada todos os clientes pedem, ao mesmo tempo, um horário sorteado
+    de um conjunto pequeno. Só um cliente por horário pode vencer (exclusão
+    mútua); os vencedores liberam a seleção antes da próxima rodada.
+    """
+    largada = threading.Barrier(clientes, timeout=60) # Um cliente com erro não trava os demais
+    latencias: List[float] = []
+    vencedores: Dict[tuple, List[int]] = {}
+    trava = threading.Lock()
+
+    def cliente(indice: int):
+        sorteio = random.Random(semente * 1000 + indice)
+        with alvo.websocket() as ws:
+            for rodada in range(rodadas):
+                recurso = horario(sorteio.randrange(horarios))
+                largada.wait()
+                inicio = time.perf_counter()
+                ws.enviar({"acao": "selecionar", "medico_id": medico_id, "data_hora": recurso})
+                resposta = _esperar(ws, lambda m: m.get("tipo") == "resposta_selecao")
+                ms = (time.perf_counter() - inicio) * 1000
+                with trava:
+                    latencias.append(ms)
+                    if resposta["sucesso"]:
+                        vencedores.setdefault((rodada, recurso), []).append(indice)
+                largada.wait() # Todos responderam: ninguém disputa contra uma liberação atrasada
+                if resposta["sucesso"]:
+                    ws.enviar({"acao": "cancelar_selecao", "medico_id": medico_id, "data_hora": recurso})
+                    chave = resposta["recurso"]
+                    _esperar(ws, lambda m: m.get("tipo") == "desbloqueio_temporario" and m.get("recurso") == chave)
+                largada.wait()
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clientes) as pool:
+        for futuro in [pool.submit(cliente, i) for i in range(clientes)]:
+            futuro.result()
+    duracao = time.perf_counter() - inicio
+
+    pedidos = clientes * rodadas
+    concedidos = sum(len(v) for v in vencedores.values())
+    return {
+        "clientes": clientes,
+        "rodadas": rodadas,
+        "pedidos": pedidos,
+        "vazao_por_s": round(pedidos / duracao, 2),
+        "concedidos": concedidos,
+        "taxa_conflito": round(1 - concedidos / pedidos, 4) if pedidos else 0.0,
+        # Mais de um vencedor para o mesmo horário na mesma rodada = falha de exclusão mútua
+        "violacoes_exclusao": sum(1 for v in vencedores.values() if len(v) > 1),
+        "latencia_selecao": percentis(latencias),
+    }
+
+def _esperar(ws, condicao: Callable[[dict], bool], timeout: float = 30) -> dict:
+    # Broadcasts de outros clientes chegam intercalados com as respostas:
+    # o prazo vale para a espera toda, não para cada mensagem
+    prazo = time.monotonic() + timeout
+    while True:
+        restante = prazo - time.monotonic()
+        if restante <= 0:
+            raise TimeoutError(f"resposta esperada não chegou em {timeout} s")
+        mensagem = ws.receber(restante)
+        if condicao(mensagem):
+            return mensagem
+
+def cenario_agendar_cancelar(alvo, medico_id: int, clientes: int, operacoes: int, horarios: int,
+                             proporcao_cancelar: float, semente: int) -> Dict[str, Any]:
+    """Agendamentos e cancelamentos sorteados sobre poucos horários: colisões são esperadas."""
+    sorteio = random.Random(semente)
+    plano = [("cancelar" if sorteio.random() < proporcao_cancelar else "agendar", sorteio.randrange(horarios))
+             for _ in range(operacoes)]
+
+    def executar(passo):
+        operacao, i = passo
+        if operacao == "agendar":
+            corpo = {"paciente_nome": f"Carga {i}", "medico_id": medico_id, "data_hora": horario(i)}
+        else:
+            corpo = {"medico_id": medico_id, "data_hora": horario(i)}
+        resposta, ms = cronometrar(lambda: alvo.http.post(f"/api/{operacao}", json=corpo))
+        return operacao, resposta.status_code, ms
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clientes) as pool:
+        respostas = list(pool.map(executar, plano))
+    duracao = time.perf_counter() - inicio
+
+    resultado: Dict[str, Any] = {"clientes": clientes, "operacoes": operacoes,
+                                 "vazao_por_s": round(operacoes / duracao, 2)}
+    for operacao, conflito in (("agendar", 409), ("cancelar", 404)):
+        feitas = [r for r in respostas if r[0] == operacao]
+        resultado[operacao] = {
+            "total": len(feitas),
+            "sucesso": sum(1 for r in feitas if r[1] == 200),
+            # 409 = horário já ocupado; 404 = nada para cancelar (perdeu a corrida)
+            "conflitos": sum(1 for r in feitas if r[1] == conflito),
+            "erros": sum(1 for r in feitas if r[1] not in (200, conflito)),
+            "taxa_conflito": round(sum(1 for r in feitas if r[1] == conflito) / len(feitas), 4) if feitas else 0.0,
+            "latencia": percentis([r[2] for r in feitas]),
+        }
+    return resultado
+
+def cenario_dashboard(alvo, clientes: int, requisicoes: int) -> Dict[str, Any]:
+    def carregar(_):
+        resposta, ms = cronometrar(lambda: alvo.http.get("/admin/"))
+        return resposta.status_code, ms
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clientes) as pool:
+        respostas = list(pool.map(carregar, range(requisicoes)))
+    duracao = time.perf_counter() - inicio
+    return {
+        "clientes": clientes,
+        "requisicoes": requisicoes,
+        "vazao_por_s": round(requisicoes / duracao, 2),
+        "erros": sum(1 for status, _ in respostas if status != 200),
+        "latencia": percentis([ms for _, ms in respostas]),
+    }
+
+def cenario_relatorio(alvo, medicos: List[int], jobs: int, timeout_s: float) -> Dict[str, Any]:
+    """
+    Enfileira `jobs` relatórios (alternando entre geral e por médico) e
+    acompanha cada um até concluir. Filtros repetidos sem mudança nos dados
+    saem do cache (reutilizado = true).
+    """
+    filtros = ["todos"] + [str(m) for m in medicos]
+    enviados = []
+    for i in range(jobs):
+        resposta, ms = cronometrar(lambda: alvo.http.post("/admin/relatorios/gerar",
+                                                          data={"medico_id": filtros[i % len(filtros)]},
+                                                          follow_redirects=False))
+        job_id = resposta.headers.get("location", "").partition("job=")[2]
+        enviados.append((job_id, time.perf_counter(), ms))
+
+    duracoes, concluidos, reutilizados, erros = [], 0, 0, 0
+    limite = time.perf_counter() + timeout_s
+    for job_id, enviado_em, _ in enviados:
+        while True:
+            estado = alvo.http.get(f"/admin/relatorios/jobs/{job_id}").json() if job_id else {"status": "erro"}
+            if estado.get("status") in ("concluido", "erro") or time.perf_counter() > limite:
+                break
+            time.sleep(0.05)
+        if estado.get("status") == "concluido":
+            concluidos += 1
+            reutilizados += int(bool(estado.get("reutilizado")))
+            duracoes.append((time.perf_counter() - enviado_em) * 1000)
+        else:
+            erros += 1
+    total_s = max(1e-9, max(duracoes, default=0) / 1000)
+    return {
+        "jobs": jobs,
+        "concluidos": concluidos,
+        "reutilizados": reutilizados,
+        "erros": erros,
+        "vazao_por_s": round(concluidos / total_s, 2),
+        "latencia_envio": percentis([ms for _, _, ms in enviados]),
+        "latencia_ate_concluir": percentis(duracoes),
+    }
+
+
+# --- Execução ---
+
+def ambiente() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(RESULTADOS_DIR), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {"python": platform.python_version(), "sistema": platform.platform(), "cpus": os.cpu_count(),
+            "commit": commit, "storage": os.environ.get("SO_STORAGE_BACKEND", "json")}
+
+def comparar(atual: Dict[str, Any], caminho: str):
+    """Imprime (stderr) a variação das métricas principais em relação a outro resultado."""
+    with open(caminho, "r", encoding="utf-8") as f:
+        anterior = json.load(f)
+
+    def metricas(cenario: Dict[str, Any]) -> Dict[str, float]:
+        saida = {"vazao_por_s": cenario.get("vazao_por_s")}
+        for chave, valor in cenario.items():
+            if isinstance(valor, dict) and "p95_ms" in valor:
+                saida[f"{chave}.p95_ms"] = valor["p95_ms"]
+            elif isinstance(valor, dict) and isinstance(valor.get("latencia"), dict):
+                saida[f"{chave}.p95_ms"] = valor["latencia"]["p95_ms"]
+        return saida
+
+    _log(f"comparação com {caminho}:")
+    for nome, cenario in atual["cenarios"].items():
+        antes = metricas(anterior.get("cenarios", {}).get(nome, {}))
+        for chave, valor in metricas(cenario).items():
+            velho = antes.get(chave)
+            if valor is None or not velho:
+                continue
+            _log(f"  {nome}.{chave}: {velho} -> {valor} ({(valor - velho) / velho * 100:+.1f}%)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Servidor já rodando (padrão: app in-process)")
+    parser.add_argument("--cenarios", default=",".join(CENARIOS))
+    parser.add_argument("--clientes", type=int, default=16)
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--rodadas", type=int, default=20, help="ws_selecao: rodadas de disputa")
+    parser.add_argument("--horarios", type=int, default=4, help="Horários disputados (menos = mais conflito)")
+    parser.add_argument("--operacoes", type=int, default=1000, help="agendar_cancelar: requisições")
+    parser.add_argument("--proporcao-cancelar", type=float, default=0.3)
+    parser.add_argument("--dashboards", type=int, default=200, help="dashboard: requisições")
+    parser.add_argument("--relatorios", type=int, default=4, help="relatorio: jobs enfileirados")
+    parser.add_argument("--consultas-base", type=int, default=2000, help="Consultas semeadas antes dos cenários")
+    parser.add_argument("--timeout-relatorio", type=float, default=300)
+    parser.add_argument("--saida", help="Arquivo JSON (padrão: benchmarks/resultados/carga_<data>.json)")
+    parser.add_argument("--comparar", help="Resultado anterior para comparação")
+    args = parser.parse_args()
+
+    cenarios = [c.strip() for c in args.cenarios.split(",") if c.strip()]
+    desconhecidos = set(cenarios) - set(CENARIOS)
+    if desconhecidos:
+        parser.error(f"cenários desconhecidos: {', '.join(sorted(desconhecidos))}")
+
+    silenciar = contextlib.nullcontext()
+    if args.url:
+        alvo = AlvoRemoto(args.url, args.clientes + 2)
+    else:
+        # Os dados do teste nunca tocam o data/ real (nem um SO_DATA_DIR herdado)
+        os.environ["SO_DATA_DIR"] = tempfile.mkdtemp(prefix="so_carga_")
+        silenciar = contextlib.redirect_stdout(io.StringIO()) # Prints do app/storage
+        alvo = AlvoLocal()
+
+    execucao = uuid.uuid4().hex[:6]
+    resultado: Dict[str, Any] = {
+        "inicio": datetime.datetime.now().isoformat(timespec="seconds"),
+        "alvo": alvo.descricao,
+        "parametros": {k: v for k, v in vars(args).items() if k not in ("saida", "comparar", "url")},
+        "ambiente": ambiente(),
+        "cenarios": {},
+    }
+    with silenciar, alvo:
+        # Médicos próprios desta execução: os horários do teste nunca colidem com outros dados
+        medico_base = criar_medico(alvo, f"Carga base {execucao}")
+        medico_disputa = criar_medico(alvo, f"Carga disputa {execucao}")
+        if args.consultas_base:
+            _log(f"semeando {args.consultas_base} consultas...")
+            semear(alvo, medico_base, args.consultas_base, args.clientes)
+
+        for nome in cenarios:
+            if nome == "ws_selecao":
+                funcao = lambda: cenario_ws_selecao(alvo, medico_disputa, args.clientes, args.rodadas,
+                                                    args.horarios, args.semente)
+            elif nome == "agendar_cancelar":
+                funcao = lambda: cenario_agendar_cancelar(alvo, medico_disputa, args.clientes, args.operacoes,
+                                                          args.horarios, args.proporcao_cancelar, args.semente)
+            elif nome == "dashboard":
+                funcao = lambda: cenario_dashboard(alvo, args.clientes, args.dashboards)
+            else:
+                funcao = lambda: cenario_relatorio(alvo, [medico_base, medico_disputa], args.relatorios,
+                                                   args.timeout_relatorio)
+            resultado["cenarios"][nome] = executar_cenario(alvo, nome, funcao)
+
+    saida = args.saida or os.path.join(RESULTADOS_DIR, f"carga_{datetime.datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(saida)), exist_ok=True)
+    with open(saida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    _log(f"resultado salvo em {saida}")
+    if args.comparar:
+        comparar(resultado, args.comparar)
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
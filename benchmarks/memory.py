@@ -0,0 +1,97 @@
+"""
+Benchmark: bytes por consulta em RAM no JsonStorage, layout colunar x dicts.
+
+Gera N consultas sintéticas em um snapshot temporário, abre o storage duas
+vezes (com as colunas de schema.colunas_para e sem colunas, que guarda um
+dict por registro como o layout anterior) e mede com tracemalloc:
+- tabela: só os registros
+- storage: registros + índices (o que o processo realmente segura)
+Também mede o custo da conversão para dict na saída (read completo).
+
+Uso (na raiz do projeto):
+    python -m benchmarks.memory [--consultas 200000] [--medicos 40]
+"""
+import argparse
+import contextlib
+import datetime
+import gc
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Os dados do benchmark nunca tocam o data/ real
+os.environ.setdefault("SO_DATA_DIR", tempfile.mkdtemp(prefix="so_bench_mem_"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ARQUIVO = os.path.join("consultas", "consultas.json")
+
+def gerar_snapshot(total: int, medicos: int):
+    from src.config.settings import DATA_DIR
+    from src.core.serialization import dumps
+    inicio = datetime.datetime(2024, 1, 1, 8, 0)
+    por_dia = medicos * 10 # 10 horários por médico por dia
+    rows = []
+    for i in range(total):
+        dia, resto = divmod(i, por_dia)
+        instante = inicio + datetime.timedelta(days=dia, minutes=30 * (resto // medicos))
+        rows.append({"paciente": f"Paciente {i}", "medico_id": 1 + resto % medicos,
+                     "data_hora": instante.strftime("%Y-%m-%dT%H:%M"),
+                     "status": "confirmado", "id": i + 1})
+    caminho = os.path.join(DATA_DIR, ARQUIVO)
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    with open(caminho, "wb") as f:
+        f.write(dumps(rows))
+
+def medir(total: int, compacto: bool) -> dict:
+    from src.storage.database import JsonStorage
+    from src.storage.schema import colunas_para, indices_para
+
+    def abrir(indices: bool):
+        with contextlib.redirect_stdout(io.StringIO()): # Silencia os prints do storage
+            return JsonStorage(ARQUIVO, indices=indices_para(ARQUIVO) if indices else (),
+                               colunas=colunas_para(ARQUIVO) if compacto else ())
+
+    resultado = {}
+    for chave, indices in (("tabela", False), ("storage", True)):
+        gc.collect()
+        tracemalloc.start()
+        storage = abrir(indices)
+        gc.collect()
+        usados, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        resultado[f"{chave}_bytes_por_consulta"] = round(usados / total, 1)
+        resultado[f"{chave}_mb"] = round(usados / 2**20, 1)
+        if indices:
+            inicio = time.perf_counter()
+            lidos = len(storage.read())
+            resultado["read_completo_ms"] = round((time.perf_counter() - inicio) * 1000, 1)
+            assert lidos == total
+        with contextlib.redirect_stdout(io.StringIO()):
+            storage.close()
+        del storage
+    return resultado
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--consultas", type=int, default=200000)
+    parser.add_argument("--medicos", type=int, default=40)
+    args = parser.parse_args()
+
+    gerar_snapshot(args.consultas, args.medicos)
+    resultado = {
+        "consultas": args.consultas,
+        "dicts": medir(args.consultas, compacto=False),
+        "colunar": medir(args.consultas, compacto=True),
+    }
+    resultado["reducao_tabela"] = round(resultado["dicts"]["tabela_bytes_por_consulta"]
+                                        / resultado["colunar"]["tabela_bytes_por_consulta"], 2)
+    resultado["reducao_storage"] = round(resultado["dicts"]["storage_bytes_por_consulta"]
+                                         / resultado["colunar"]["storage_bytes_por_consulta"], 2)
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
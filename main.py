@@ -1,15 +1,22 @@
 import uvicorn
+import multiprocessing
 import os
 import sys
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, PlainTextResponse
 
 # Imports internos
-from src.config.settings import init_filesystem, SYSTEM_OS, BASE_DIR
+from src.config.settings import init_filesystem, SYSTEM_OS, BASE_DIR, WORKERS, COORDENACAO
 from src.core.api import api_router
 from src.core.admin import admin_router
+from src.core.loop_monitor import loop_monitor
+from src.core.socket_manager import manager as ws_manager
+from src.concurrent.worker import fila_relatorios
+from src.storage import close_all as fechar_storages
+from src.core.logger import encerrar_logs
+from src.core.metrics import metricas, MetricasHTTP
 
 # --- FUNÇÃO AUXILIAR PARA O PYINSTALLER ---
 def get_resource_path(relative_path):
@@ -23,15 +30,28 @@ def get_resource_path(relative_path):
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # --- STARTUP ---
-    print(f"\n--- [BOOT] INICIANDO SISTEMA NO {SYSTEM_OS.upper()} ---")
+    print(f"\n--- [BOOT] INICIANDO SISTEMA NO {SYSTEM_OS.upper()} (pid {os.getpid()}) ---")
     # Bootstrapper (Cria pastas data/logs/consultas)
     init_filesystem()
+    # Sentinela do escalonador: mede quanto o event loop fica bloqueado
+    loop_monitor.start()
+    # Recebe desde já os broadcasts dos outros workers (locks -> mapa de horários)
+    await ws_manager.iniciar()
+    # Fila de relatórios aberta (de novo, se o app já passou por um shutdown)
+    fila_relatorios.iniciar()
     print("--- [BOOT] Sistema pronto.\n")
     
     yield # O sistema roda aqui
     
     # --- SHUTDOWN ---
     print("\n--- [SHUTDOWN] Encerrando...")
+    await loop_monitor.stop()
+    await ws_manager.close()
+    # Jobs de relatório em andamento são cancelados; os processos filhos encerram
+    await fila_relatorios.encerrar()
+    # [SO - FLUSH] Eventos de log e lotes pendentes do journal vão para o disco
+    encerrar_logs()
+    fechar_storages()
 
 # --- INICIALIZAÇÃO DO APP ---
 app = FastAPI(
@@ -40,6 +60,9 @@ app = FastAPI(
     lifespan=lifespan # Injeta a configuração de startup/shutdown
 )
 
+# [SO - INSTRUMENTAÇÃO] Latência de cada requisição, rotulada pela rota
+app.add_middleware(MetricasHTTP)
+
 # 1. Resolver caminhos
 templates_dir = get_resource_path("templates")
 static_dir = get_resource_path("static")
@@ -56,7 +79,7 @@ app.include_router(api_router)
 app.include_router(admin_router)
 
 @app.get("/client", response_class=HTMLResponse)
-async def client_ui():
+def client_ui():
     client_path = os.path.join(templates_dir, "client.html")
     try:
         with open(client_path, "r", encoding="utf-8") as f:
@@ -64,13 +87,30 @@ async def client_ui():
     except FileNotFoundError:
         return "<h1>Erro crítico: Arquivo de template não encontrado no pacote.</h1>"
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Métricas do processo no formato texto do Prometheus."""
+    return PlainTextResponse(metricas.exportar(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/")
 async def root():
     return RedirectResponse(url="/admin")
 
 # --- EXECUÇÃO ---
 if __name__ == "__main__":
+    # Necessário no executável (PyInstaller): os processos filhos do pool de
+    # relatórios reexecutam este binário
+    multiprocessing.freeze_support()
     print("Acesse: http://localhost:8000/admin")
+
+    if WORKERS > 1:
+        # [SO - MULTIPROCESSAMENTO] N processos worker aceitando no mesmo socket.
+        # Cada worker reimporta "main:app" (por isso a string, e não o objeto);
+        # locks e broadcasts passam pelo backend de coordenação compartilhado.
+        # Disponível ao rodar pelo código-fonte (python main.py), não no executável.
+        print(f"[BOOT] {WORKERS} workers, coordenação: {COORDENACAO}")
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=WORKERS, log_level="info")
+        sys.exit(0)
     
     # CORREÇÃO CRÍTICA AQUI:
     # 1. Passamos o objeto 'app' direto, não a string "main:app"
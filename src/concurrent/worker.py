@@ -0,0 +1,364 @@
+import asyncio
+import multiprocessing
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+from src.config.settings import (
+    RELATORIOS_DIR, RELATORIO_PROCESSOS, RELATORIO_LOTE, RELATORIO_LOTES_EM_TRANSITO, RELATORIO_HISTORICO_JOBS,
+    RELATORIO_JOBS_DB, WORKERS, WORKER_ID
+)
+from src.reports.generator import gerar_relatorio_em_processo, podar_relatorios
+from src.storage import run_io
+from src.core.logger import log_evento
+from src.core.metrics import metricas, relatorio_duracao
+from src.core.serialization import dumps_texto, loads
+
+# Estados de um job
+NA_FILA, EXECUTANDO, CONCLUIDO, ERRO = "na_fila", "executando", "concluido", "erro"
+
+class JobRelatorio:
+    """Bloco de controle (PCB) de um job de relatório: identidade, estado e progresso."""
+
+    def __init__(self, rotulo: str):
+        self.id = uuid.uuid4().hex[:10]
+        self.rotulo = rotulo
+        self.status = NA_FILA
+        self.arquivo = f"relatorio_consultas_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{self.id}.pdf"
+        self.erro: Optional[str] = None
+        self.enviadas = 0 # Consultas já entregues ao processo
+        self.reutilizado = False # Arquivo existente devolvido (cache)
+        self.blocos = {"total": 0, "reutilizados": 0} # Meses desenhados x vindos do cache
+        self.criado_em = time.time()
+        self.iniciado_em: Optional[float] = None
+        self.concluido_em: Optional[float] = None
+        self._estado = None # Dicionário compartilhado com o processo filho
+        self._final: Dict[str, Any] = {"linhas": 0, "paginas": 0}
+
+    def progresso(self) -> Dict[str, Any]:
+        if self._estado is not None and self.status == EXECUTANDO:
+            try:
+                return {"linhas": self._estado.get("linhas", 0), "paginas": self._estado.get("paginas", 0)}
+            except Exception:
+                pass # Gerenciador encerrado (shutdown): usa o último valor conhecido
+        return dict(self._final)
+
+    def fixar_progresso(self):
+        self._final = self.progresso()
+        self._estado = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        fim = self.concluido_em or time.time()
+        return {
+            "id": self.id,
+            "rotulo": self.rotulo,
+            "status": self.status,
+            "arquivo": self.arquivo if self.status == CONCLUIDO else None,
+            "erro": self.erro,
+            "enviadas": self.enviadas,
+            "reutilizado": self.reutilizado,
+            "blocos": dict(self.blocos),
+            **self.progresso(),
+            "criado_em": self.criado_em,
+            "duracao_s": round(fim - self.iniciado_em, 3) if self.iniciado_em else None,
+        }
+
+
+class RegistroJobs:
+    """
+    [SO - ESTADO COMPARTILHADO ENTRE PROCESSOS]
+    Status dos jobs e cache de relatórios em um banco SQLite comum a todos os
+    workers (data/relatorios.db, modo WAL):
+    - Tabela `jobs`: o worker que executa o job grava cada mudança de estado
+      (e o progresso a cada lote); qualquer worker responde /jobs/{id}.
+    - Tabela `cache`: filtro -> versão dos dados + último arquivo gerado.
+      Sobrevive a reinícios: o PDF continua sendo reaproveitado.
+    Chamado fora do event loop (pool de I/O ou rotas síncronas).
+    """
+
+    def __init__(self, db_path: str = RELATORIO_JOBS_DB, historico: int = RELATORIO_HISTORICO_JOBS):
+        self._db_path = db_path
+        self._historico = historico
+        self._lock = threading.Lock()
+        self._conexao: Optional[sqlite3.Connection] = None
+
+    def _abrir(self):
+        # Com o lock adquirido: no primeiro uso e após fechar()
+        if self._conexao is None:
+            os.makedirs(os.path.dirname(self._db_path), exist_ok=True)
+            self._conexao = sqlite3.connect(self._db_path, check_same_thread=False, isolation_level=None, timeout=30)
+            self._conexao.execute("PRAGMA journal_mode=WAL")
+            self._conexao.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY, dono TEXT NOT NULL, status TEXT NOT NULL,
+                    criado_em REAL NOT NULL, dados TEXT NOT NULL);
+                CREATE INDEX IF NOT EXISTS jobs_criado ON jobs (criado_em);
+                CREATE TABLE IF NOT EXISTS cache (
+                    chave TEXT PRIMARY KEY, versao TEXT NOT NULL, dados TEXT NOT NULL);
+            """)
+
+    def _executar(self, sql: str, parametros: tuple = ()) -> List[tuple]:
+        with self._lock:
+            self._abrir()
+            return self._conexao.execute(sql, parametros).fetchall()
+
+    def salvar(self, job: "JobRelatorio"):
+        dados = job.to_dict()
+        self._executar("INSERT OR REPLACE INTO jobs (id, dono, status, criado_em, dados) VALUES (?, ?, ?, ?, ?)",
+                       (job.id, WORKER_ID, job.status, job.criado_em, dumps_texto(dados)))
+        if job.status in (CONCLUIDO, ERRO):
+            # Só os últimos `historico` jobs finalizados continuam na tabela
+            self._executar("DELETE FROM jobs WHERE id IN (SELECT id FROM jobs WHERE status IN (?, ?) "
+                           "ORDER BY criado_em DESC LIMIT -1 OFFSET ?)", (CONCLUIDO, ERRO, self._historico))
+
+    def obter(self, job_id: str) -> Optional[Dict[str, Any]]:
+        linhas = self._executar("SELECT dados FROM jobs WHERE id = ?", (job_id,))
+        return loads(linhas[0][0]) if linhas else None
+
+    def listar(self, limite: int) -> List[Dict[str, Any]]:
+        return [loads(d) for (d,) in self._executar("SELECT dados FROM jobs ORDER BY criado_em DESC LIMIT ?", (limite,))]
+
+    def interromper(self, dono: Optional[str] = None) -> int:
+        """Jobs que ficaram pendentes quando o processo dono morreu viram erro."""
+        condicao, parametros = "status IN (?, ?)", [NA_FILA, EXECUTANDO]
+        if dono is not None:
+            condicao += " AND dono = ?"
+            parametros.append(dono)
+        pendentes = self._executar(f"SELECT id, dados FROM jobs WHERE {condicao}", tuple(parametros))
+        for job_id, dados in pendentes:
+            dados = {**loads(dados), "status": ERRO, "erro": "interrompido (reinício do servidor)"}
+            self._executar("UPDATE jobs SET status = ?, dados = ? WHERE id = ?", (ERRO, dumps_texto(dados), job_id))
+        return len(pendentes)
+
+    def cache(self, chave: str, versao: Any = None) -> Optional[Dict[str, Any]]:
+        """Último relatório do filtro (só se for da `versao` informada, quando houver)."""
+        if versao is None:
+            linhas = self._executar("SELECT dados FROM cache WHERE chave = ?", (chave,))
+        else:
+            linhas = self._executar("SELECT dados FROM cache WHERE chave = ? AND versao = ?", (chave, dumps_texto(versao)))
+        return loads(linhas[0][0]) if linhas else None
+
+    def gravar_cache(self, chave: str, versao: Any, entrada: Dict[str, Any]):
+        self._executar("INSERT OR REPLACE INTO cache (chave, versao, dados) VALUES (?, ?, ?)",
+                       (chave, dumps_texto(versao), dumps_texto(entrada)))
+
+    def filtros_em_cache(self) -> int:
+        return self._executar("SELECT COUNT(*) FROM cache")[0][0]
+
+    def fechar(self):
+        with self._lock:
+            if self._conexao is not None:
+                self._conexao.close()
+                self._conexao = None
+
+
+class FilaRelatorios:
+    """
+    [SO - ESCALONAMENTO DE JOBS EM LOTE]
+    Relatórios viram jobs assíncronos: a requisição só cria o job e retorna.
+    - O desenho do PDF (CPU-bound) roda em um pool de PROCESSOS: não disputa
+      o GIL com as threads das requisições nem trava o event loop.
+    - As consultas são lidas do storage em lotes (keyset) por uma thread
+      produtora e enviadas por uma fila limitada (pipe entre processos):
+      produtor e consumidor andam juntos, com backpressure, e o relatório
+      inteiro nunca fica materializado em memória.
+    - No máximo RELATORIO_PROCESSOS jobs produzem ao mesmo tempo; os demais
+      esperam na fila com status "na_fila".
+
+    [SO - CACHE POR VERSÃO]
+    Cada filtro guarda o último arquivo gerado com a versão dos dados
+    (consultas, médicos) lida ANTES da leitura. Mesma chave e mesma versão:
+    o job conclui na hora com o arquivo existente, sem processo nenhum.
+    Versão diferente: o filho reaproveita os meses que não mudaram e, se o
+    conteúdo final for idêntico, devolve o arquivo anterior.
+
+    Status e cache ficam no RegistroJobs (SQLite): com SO_WORKERS=N o job
+    aparece em todos os workers e o cache vale para todos. Na RAM ficam só
+    os jobs em execução neste processo (progresso ao vivo).
+    """
+
+    def __init__(self, processos: int = RELATORIO_PROCESSOS, registro: Optional[RegistroJobs] = None):
+        self._processos = processos
+        # "spawn": o filho não herda threads/locks do servidor (e funciona no Windows)
+        self._contexto = multiprocessing.get_context("spawn")
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._gerenciador = None
+        self._pool_lock = threading.Lock()
+        self._encerrada = False
+        self._vagas: Optional[asyncio.Semaphore] = None
+        # Jobs na fila/executando NESTE processo; os demais são lidos do registro
+        self._jobs: Dict[str, JobRelatorio] = {}
+        self._tarefas: Set[asyncio.Task] = set()
+        # Filtro -> {"arquivo", "digest", ...} do último relatório gerado, por versão
+        self._registro = registro or RegistroJobs()
+        self.acertos_cache = 0
+
+    async def submeter(self, storage, indice: str, grupo: Any, mapa_medicos: Dict[int, str], rotulo: str,
+                       versao: Any = None, de: Optional[str] = None, ate: Optional[str] = None,
+                       resumo: Optional[Dict[str, Any]] = None) -> JobRelatorio:
+        """Registra o job e agenda sua execução; não espera o relatório."""
+        job = JobRelatorio(rotulo)
+        chave = f"{indice}:{grupo}:{de}:{ate}"
+        entrada = await run_io(self._reaproveitavel, chave, versao)
+        if entrada is not None:
+            # Nada mudou desde o último relatório deste filtro
+            self.acertos_cache += 1
+            job.arquivo, job.reutilizado, job.status = entrada["arquivo"], True, CONCLUIDO
+            job._final = {"linhas": entrada["linhas"], "paginas": entrada["paginas"]}
+            job.iniciado_em = job.concluido_em = time.time()
+            await run_io(self._registro.salvar, job)
+            relatorio_duracao.observar(job.concluido_em - job.criado_em, "cache")
+            log_evento("ADMIN", f"Relatório reaproveitado [{rotulo}]: {job.arquivo}")
+            return job
+        self._jobs[job.id] = job
+        await run_io(self._registro.salvar, job)
+        tarefa = asyncio.get_running_loop().create_task(
+            self._executar(job, storage, (indice, grupo, de, ate), mapa_medicos, chave, versao, resumo))
+        self._tarefas.add(tarefa)
+        tarefa.add_done_callback(self._tarefas.discard)
+        return job
+
+    def iniciar(self):
+        """
+        [SO - STARTUP] Reabre a fila a cada lifespan. O semáforo asyncio se
+        prende ao event loop em que é usado: cada loop ganha o seu. O pool de
+        processos volta a ser criado sob demanda.
+        """
+        with self._pool_lock:
+            self._encerrada = False
+        self._vagas = asyncio.Semaphore(self._processos)
+        # Jobs que ficaram "executando" no registro morreram com o processo dono
+        # (com um único worker, todo job pendente é de um processo anterior)
+        interrompidos = self._registro.interromper(None if WORKERS == 1 else WORKER_ID)
+        if interrompidos:
+            print(f"[SO - JOBS] {interrompidos} job(s) de relatório interrompido(s) no último desligamento")
+
+    def _reaproveitavel(self, chave: str, versao: Any) -> Optional[Dict[str, Any]]:
+        if versao is None:
+            return None
+        entrada = self._registro.cache(chave, versao)
+        if entrada is None or not os.path.exists(os.path.join(RELATORIOS_DIR, entrada["arquivo"])):
+            return None
+        os.utime(os.path.join(RELATORIOS_DIR, entrada["arquivo"])) # Mais recente no LRU
+        return entrada
+
+    def obter(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Status de um job de qualquer worker (progresso ao vivo se ele roda aqui)."""
+        job = self._jobs.get(job_id)
+        return job.to_dict() if job is not None else self._registro.obter(job_id)
+
+    def listar(self, limite: int = RELATORIO_HISTORICO_JOBS) -> List[Dict[str, Any]]:
+        """Jobs de todos os workers, do mais recente ao mais antigo."""
+        return [self._jobs[j["id"]].to_dict() if j["id"] in self._jobs else j for j in self._registro.listar(limite)]
+
+    async def _executar(self, job: JobRelatorio, storage, filtro: tuple, mapa_medicos: Dict[int, str],
+                        chave: str, versao: Any, resumo: Optional[Dict[str, Any]] = None):
+        if self._vagas is None:
+            self._vagas = asyncio.Semaphore(self._processos)
+        try:
+            async with self._vagas:
+                await run_io(self._garantir_pool)
+                fila = self._gerenciador.Queue(maxsize=max(1, RELATORIO_LOTES_EM_TRANSITO))
+                job._estado = self._gerenciador.dict()
+                job.status, job.iniciado_em = EXECUTANDO, time.time()
+                await run_io(self._registro.salvar, job)
+                anterior = await run_io(self._registro.cache, chave)
+                futuro = self._pool.submit(gerar_relatorio_em_processo, fila, job._estado, mapa_medicos, job.arquivo,
+                                           f"Relatório de Consultas ({job.rotulo})", anterior, resumo)
+                await run_io(self._produzir, job, storage, filtro, fila, futuro)
+                resultado = await asyncio.wrap_future(futuro)
+            job.fixar_progresso()
+            job.arquivo, job.reutilizado = resultado["arquivo"], resultado["reutilizado"]
+            job.blocos = {"total": resultado["blocos"], "reutilizados": resultado["reutilizados"]}
+            job.status = CONCLUIDO
+            if versao is not None:
+                await run_io(self._registro.gravar_cache, chave, versao, {
+                    "arquivo": resultado["arquivo"], "digest": resultado["digest"],
+                    "linhas": resultado["linhas"], "paginas": resultado["paginas"]})
+            log_evento("ADMIN", f"Relatório gerado [{job.rotulo}]: {job.arquivo} "
+                                f"({resultado['reutilizados']}/{resultado['blocos']} meses do cache)")
+            # [SO - LRU] Mantém data/relatorios dentro dos limites de tamanho e idade
+            removidos = await run_io(podar_relatorios)
+            if removidos:
+                print(f"[SO - CACHE] {removidos} arquivo(s) antigo(s) de relatório removido(s)")
+        except asyncio.CancelledError:
+            job.status, job.erro = ERRO, "cancelado no desligamento"
+            raise
+        except Exception as e:
+            job.fixar_progresso()
+            job.status, job.erro = ERRO, str(e) or type(e).__name__
+            log_evento("ERRO", f"Falha no relatório {job.id}: {job.erro}")
+        finally:
+            job.concluido_em = time.time()
+            relatorio_duracao.observar(job.concluido_em - job.criado_em, job.status)
+            try:
+                await run_io(self._registro.salvar, job)
+            except Exception as e:
+                print(f"[SO - JOBS] Falha ao gravar o status do job {job.id}: {e}")
+            finally:
+                self._jobs.pop(job.id, None) # Daqui em diante o registro responde por ele
+
+    def _produzir(self, job: JobRelatorio, storage, filtro: tuple, fila, futuro: Future):
+        """[SO - PRODUTOR] Roda no pool de I/O: lê lotes do storage e os envia ao processo."""
+        indice, grupo, de, ate = filtro
+        for lote in storage.iterar(indice, grupo, de, ate, lote=RELATORIO_LOTE):
+            # Só os campos desenhados atravessam o pipe
+            self._enviar(fila, [{"data_hora": c["data_hora"], "medico_id": c.get("medico_id"),
+                                 "paciente": c.get("paciente")} for c in lote], futuro)
+            job.enviadas += len(lote)
+            self._registro.salvar(job) # Progresso visível aos outros workers
+        self._enviar(fila, None, futuro) # Fim do stream
+
+    @staticmethod
+    def _enviar(fila, lote: Optional[list], futuro: Future):
+        while True:
+            try:
+                fila.put(lote, timeout=0.5)
+                return
+            except queue.Full:
+                if futuro.done():
+                    futuro.result() # Propaga a exceção do processo filho
+                    raise RuntimeError("processo do relatório terminou antes do fim dos dados")
+
+    def _garantir_pool(self):
+        with self._pool_lock:
+            if self._encerrada:
+                # Shutdown em curso: não cria processos que ninguém mais vai encerrar
+                raise RuntimeError("fila de relatórios encerrada")
+            if self._pool is None:
+                self._gerenciador = self._contexto.Manager()
+                self._pool = ProcessPoolExecutor(max_workers=self._processos, mp_context=self._contexto)
+                print(f"[SO - POOL DE PROCESSOS] {self._processos} processo(s) para relatórios")
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores deste processo (só RAM: seguro para o gauge de /metrics)."""
+        return {"em_andamento": len(self._jobs), "acertos_cache": self.acertos_cache}
+
+    def stats_registro(self) -> Dict[str, Any]:
+        """stats() + tamanho do cache compartilhado (consulta o banco)."""
+        return {**self.stats(), "filtros_em_cache": self._registro.filtros_em_cache()}
+
+    async def encerrar(self):
+        """[SO - SHUTDOWN] Cancela jobs em andamento e encerra os processos filhos."""
+        for tarefa in list(self._tarefas):
+            tarefa.cancel()
+        await asyncio.gather(*self._tarefas, return_exceptions=True)
+        with self._pool_lock:
+            self._encerrada = True
+            if self._pool is not None:
+                # Fechar o gerenciador primeiro desbloqueia filhos parados em fila.get()
+                self._gerenciador.shutdown()
+                self._pool.shutdown(wait=True, cancel_futures=True)
+                self._pool = self._gerenciador = None
+        self._vagas = None # Preso a este event loop
+        self._registro.fechar() # Reaberto no próximo uso
+
+
+fila_relatorios = FilaRelatorios()
+metricas.medidor("so_report_jobs_pending", "Jobs de relatório na fila ou executando.",
+                 lambda: fila_relatorios.stats()["em_andamento"])
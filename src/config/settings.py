@@ -1,5 +1,7 @@
 import os
+import re
 import sys
+import socket
 import platform
 
 # --- 1. Detecção e Correção do Caminho Base ---
@@ -25,13 +27,112 @@ SYSTEM_OS = platform.system()
 # [SO - PATH RESOLUTION]
 # os.path.join usa o separador correto (\ para Windows, / para Linux)
 # os.path.normpath resolve redundâncias no caminho
-DATA_DIR = os.path.normpath(os.path.join(EXEC_DIR, 'data'))
+# SO_DATA_DIR permite apontar os dados para outro diretório (benchmarks, testes)
+DATA_DIR = os.path.normpath(os.environ.get("SO_DATA_DIR") or os.path.join(EXEC_DIR, 'data'))
 LOGS_DIR = os.path.normpath(os.path.join(DATA_DIR, 'logs'))
 CONSULTAS_DIR = os.path.normpath(os.path.join(DATA_DIR, 'consultas'))
 RELATORIOS_DIR = os.path.normpath(os.path.join(DATA_DIR, 'relatorios'))
 
 TEMPLATES_DIR = os.path.normpath(os.path.join(BASE_DIR, 'templates'))
 
+# --- 2.1 Parâmetros do Motor de Armazenamento ---
+# [SO - JOURNALING]
+# Quantidade de registros no Write-Ahead Log (WAL) antes de disparar a
+# compactação em background (o log vira um novo snapshot do arquivo .json).
+WAL_COMPACTACAO_REGISTROS = int(os.environ.get("SO_WAL_COMPACTACAO", "500"))
+# [SO - GROUP COMMIT] Janela (ms) e tamanho máximo do lote de registros que
+# dividem um mesmo write + fsync no journal.
+GROUP_COMMIT_JANELA_MS = float(os.environ.get("SO_GROUP_COMMIT_JANELA_MS", "5"))
+GROUP_COMMIT_MAX_ITENS = int(os.environ.get("SO_GROUP_COMMIT_MAX_ITENS", "256"))
+
+# [SO - ARMAZENAMENTO EM CAMADAS] Consultas de meses passados saem da tabela
+# em RAM/WAL e viram partições mensais seladas (comprimidas, somente leitura,
+# lidas via mmap). Só o mês atual e os futuros ficam na camada quente.
+ARQUIVO_ATIVO = os.environ.get("SO_ARQUIVO", "1").lower() in ("1", "true", "sim", "on")
+# Registros por bloco comprimido de uma partição (unidade de leitura sob demanda)
+ARQUIVO_LINHAS_POR_BLOCO = int(os.environ.get("SO_ARQUIVO_BLOCO", "512"))
+
+# [SO - MULTIPROCESSAMENTO]
+# Número de processos worker do uvicorn (SO_WORKERS). Cada worker tem sua
+# própria memória: o estado compartilhado (dados, locks, broadcasts) precisa
+# de um meio comum entre processos.
+WORKERS = max(1, int(os.environ.get("SO_WORKERS", "1")))
+# Identidade deste processo (dono dos locks e origem dos eventos publicados)
+WORKER_ID = os.environ.get("SO_WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+
+# [SO - DRIVER DE ARMAZENAMENTO PLUGÁVEL]
+# "json"   -> JsonStorage (arquivos .json + WAL, tabela em RAM)
+# "sqlite" -> SqliteStorage (banco único em modo WAL, leitores concorrentes)
+STORAGE_BACKEND = os.environ.get("SO_STORAGE_BACKEND", "json").lower()
+if WORKERS > 1:
+    # A tabela em RAM do JsonStorage divergiria entre processos
+    STORAGE_BACKEND = "sqlite"
+SQLITE_PATH = os.path.normpath(os.path.join(DATA_DIR, 'sistema.db'))
+SQLITE_POOL_SIZE = int(os.environ.get("SO_SQLITE_POOL", "4"))
+# [SO - CHANGE DATA CAPTURE] Mudanças mantidas para a sincronização incremental
+# (GET /api/changes). Clientes mais atrasados que isso recarregam tudo.
+FEED_RETENCAO = int(os.environ.get("SO_FEED_RETENCAO", "10000"))
+
+# [SO - SIMULAÇÃO DE CARGA] Perfil didático (desligado por padrão).
+# Quando ligado, injeta latência DENTRO da região crítica do storage para
+# tornar visível o bloqueio das threads no Mutex (ex.: SO_SIMULACAO=1).
+SIMULACAO_CARGA = os.environ.get("SO_SIMULACAO", "0").lower() in ("1", "true", "sim", "on")
+SIMULACAO_LATENCIA_ADD_S = float(os.environ.get("SO_SIMULACAO_ADD_S", "2.0"))
+SIMULACAO_LATENCIA_DELETE_S = float(os.environ.get("SO_SIMULACAO_DELETE_S", "0.5"))
+# Variação aleatória extra (0..jitter segundos) somada a cada atraso
+SIMULACAO_JITTER_S = float(os.environ.get("SO_SIMULACAO_JITTER_S", "0.0"))
+
+# [SO - LOG ASSÍNCRONO] Fila limitada + thread escritora + segmentos rotativos
+# Eventos que não cabem na fila cheia são descartados (nunca bloqueiam o chamador)
+LOG_FILA_CAPACIDADE = int(os.environ.get("SO_LOG_FILA", "10000"))
+LOG_RING_TAMANHO = int(os.environ.get("SO_LOG_RING", "500"))
+LOG_SEGMENTO_MAX_BYTES = int(os.environ.get("SO_LOG_SEGMENTO_BYTES", str(4 * 1024 * 1024)))
+LOG_SEGMENTO_MAX_IDADE_S = int(os.environ.get("SO_LOG_SEGMENTO_IDADE_S", "3600"))
+LOG_FSYNC = os.environ.get("SO_LOG_FSYNC", "1").lower() in ("1", "true", "sim", "on")
+# Com vários workers cada processo grava a sua própria cadeia de segmentos
+LOG_ESCRITOR = re.sub(r"\W", "_", WORKER_ID) if WORKERS > 1 else ""
+
+# [SO - FAN-OUT DE WEBSOCKET] Mensagens pendentes por cliente antes de ele ser
+# considerado lento e desconectado (protege os demais clientes).
+WS_FILA_POR_CLIENTE = int(os.environ.get("SO_WS_FILA", "256"))
+# [SO - LEASE] Tempo (s) que uma seleção de horário fica reservada sem renovação.
+WS_LOCK_TTL_S = float(os.environ.get("SO_WS_LOCK_TTL_S", "60"))
+
+# [SO - COORDENAÇÃO ENTRE PROCESSOS] Onde vivem os locks temporários e por
+# onde passam os broadcasts:
+# "local"  -> tabela em RAM do próprio processo (um único worker)
+# "sqlite" -> banco compartilhado data/coordenacao.db (locks + fila de eventos)
+COORDENACAO = os.environ.get("SO_COORDENACAO", "sqlite" if WORKERS > 1 else "local").lower()
+COORDENACAO_DB = os.path.normpath(os.path.join(DATA_DIR, 'coordenacao.db'))
+# Intervalo de polling da fila de eventos (latência máxima entre workers)
+COORDENACAO_POLL_MS = float(os.environ.get("SO_COORDENACAO_POLL_MS", "20"))
+# Por quanto tempo os eventos já entregues ficam na tabela antes da limpeza
+COORDENACAO_RETENCAO_S = float(os.environ.get("SO_COORDENACAO_RETENCAO_S", "60"))
+
+# [SO - THREAD POOL DE I/O]
+# Threads dedicadas às chamadas bloqueantes de disco feitas pelas rotas async.
+# O event loop (uvicorn) apenas aguarda o resultado, sem travar.
+IO_WORKERS = int(os.environ.get("SO_IO_WORKERS", "8"))
+# Intervalo de amostragem e limiar de alerta do monitor de atraso do event loop
+LOOP_LAG_INTERVALO_MS = int(os.environ.get("SO_LOOP_LAG_INTERVALO_MS", "100"))
+LOOP_LAG_ALERTA_MS = int(os.environ.get("SO_LOOP_LAG_ALERTA_MS", "50"))
+
+# [SO - POOL DE PROCESSOS] Relatórios PDF (CPU-bound) rodam em processos
+# separados: não disputam o GIL nem o event loop com as requisições.
+RELATORIO_PROCESSOS = max(1, int(os.environ.get("SO_RELATORIO_PROCESSOS", "2")))
+# Consultas por lote enviado ao processo (e lotes em trânsito, p/ backpressure)
+RELATORIO_LOTE = int(os.environ.get("SO_RELATORIO_LOTE", "500"))
+RELATORIO_LOTES_EM_TRANSITO = int(os.environ.get("SO_RELATORIO_LOTES_EM_TRANSITO", "4"))
+# Jobs concluídos mantidos na tabela de status
+RELATORIO_HISTORICO_JOBS = int(os.environ.get("SO_RELATORIO_HISTORICO", "50"))
+# [SO - ESTADO COMPARTILHADO] Status dos jobs e cache de relatórios por filtro:
+# banco comum a todos os workers, que também sobrevive a reinícios
+RELATORIO_JOBS_DB = os.path.normpath(os.path.join(DATA_DIR, 'relatorios.db'))
+# [SO - CACHE EM DISCO] Limites de data/relatorios (PDFs + blocos em cache):
+# o que passar da idade ou do tamanho total é apagado, do menos usado ao mais usado.
+RELATORIO_CACHE_MAX_BYTES = int(float(os.environ.get("SO_RELATORIO_CACHE_MB", "200")) * 1024 * 1024)
+RELATORIO_CACHE_MAX_IDADE_S = float(os.environ.get("SO_RELATORIO_CACHE_DIAS", "30")) * 86400
+
 # --- 3. Bootstrapper Automático ---
 def init_filesystem():
     """
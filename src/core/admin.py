@@ -1,73 +1,166 @@
-from fastapi import APIRouter, Request, Form, HTTPException
+from fastapi import APIRouter, Request, Form, HTTPException, Query
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse, StreamingResponse, PlainTextResponse
+import datetime
 import os
+from typing import Any, Optional, Tuple
 
-from src.storage import JsonStorage
+from src.storage import get_storage, get_async_storage, run_io, PartitionedStorage
 from src.core.socket_manager import manager
-# [MUDANÇA] Importamos a função get_db_logs, não a variável direta
-from src.core.logger import log_evento, get_db_logs 
-from src.reports.generator import gerar_relatorio_pdf
-from src.config.settings import RELATORIOS_DIR, TEMPLATES_DIR
+from src.core.api import cache_medicos, cache_consultas, feed_mudancas
+# [MUDANÇA] Logs recentes vêm do ring buffer em RAM do pipeline de logs
+from src.core.logger import log_evento, get_log_pipeline
+from src.core.log_store import LogStore, horario_local
+from src.core.loop_monitor import loop_monitor
+from src.core.profiler import profiler
+from src.concurrent.worker import fila_relatorios
+from src.reports.aggregates import AgregadorConsultas
+from src.reports.exports import FORMATOS, exportar
+from src.config.settings import RELATORIOS_DIR, TEMPLATES_DIR, WORKERS
 
 templates = Jinja2Templates(directory=TEMPLATES_DIR)
 
 admin_router = APIRouter(prefix="/admin")
+log_store = LogStore()
 
-db_medicos = JsonStorage('consultas/medicos.json')
-db_consultas = JsonStorage('consultas/consultas.json')
+# [SO - MEMÓRIA COMPARTILHADA] O registry devolve as mesmas instâncias da API:
+# uma tabela em RAM e um único escritor por arquivo.
+db_medicos = get_storage('consultas/medicos.json')
+db_consultas = get_storage('consultas/consultas.json')
+db_cancelamentos = get_storage('consultas/cancelamentos.json')
+# Fachadas assíncronas: rotas async nunca fazem I/O de disco no event loop
+adb_medicos = get_async_storage('consultas/medicos.json')
+adb_consultas = get_async_storage('consultas/consultas.json')
+# [SO - CONTADORES] Estatísticas mantidas a cada mudança (GET /admin/stats e PDF)
+agregador = AgregadorConsultas(feed_mudancas, db_medicos, db_consultas, db_cancelamentos)
 
 @admin_router.get("/", response_class=HTMLResponse)
 def admin_dashboard(request: Request):
     medicos = db_medicos.read()
+    contagens = {l["id"]: l for l in agregador.resumo()["por_medico"]}
     
-    # [MUDANÇA] Usa a função para pegar o storage de forma segura
-    logs_storage = get_db_logs()
-    logs_reais = []
-    if logs_storage:
-        logs_reais = logs_storage.read()
-        logs_reais = sorted(logs_reais, key=lambda x: x['timestamp'], reverse=True)[:50]
+    # [SO - RING BUFFER] Últimos 50 eventos direto da RAM (sem ler/ordenar o histórico).
+    # Com vários workers o ring só vê este processo: lê as cadeias do disco.
+    pipeline = get_log_pipeline()
+    if WORKERS > 1:
+        logs_reais = log_store.ultimos(50)
+    else:
+        logs_reais = pipeline.recentes(50) if pipeline else []
+    # Gravados em UTC; o painel mostra o horário do servidor
+    logs_reais = [{**log, "timestamp": horario_local(log.get("timestamp", ""))} for log in logs_reais]
 
     # Listar relatórios
     arquivos_relatorios = []
     if os.path.exists(RELATORIOS_DIR):
-        arquivos_relatorios = sorted(os.listdir(RELATORIOS_DIR), reverse=True)
+        # Só PDFs prontos (os em geração ainda são .parcial)
+        arquivos_relatorios = sorted((f for f in os.listdir(RELATORIOS_DIR) if f.endswith(".pdf")), reverse=True)
 
     return templates.TemplateResponse("admin.html", {
         "request": request, 
         "medicos": medicos,
+        "contagens": contagens,
         "sistema_os": os.name,
         "logs": logs_reais,
-        "relatorios": arquivos_relatorios
+        "relatorios": arquivos_relatorios,
+        "jobs": fila_relatorios.listar(10)
     })
 
-# ... (As outras rotas continuam iguais, pois usam log_evento que já está corrigido) ...
+# ... (As outras rotas continuam iguais: log_evento só enfileira, não bloqueia) ...
 
 @admin_router.post("/relatorios/gerar")
 async def gerar_relatorio(request: Request):
+    """
+    [SO - JOB EM BACKGROUND]
+    Só enfileira o relatório e retorna: o PDF é desenhado num processo do
+    pool (src/concurrent/worker.py), alimentado em lotes pelo storage.
+    Acompanhe em /admin/relatorios/jobs/{id}. Se nada mudou desde o último
+    relatório do mesmo filtro, o job já nasce concluído com o arquivo existente.
+    """
     form_data = await request.form()
-    filtro_id = form_data.get("filtro_medico_id")
+    filtro_id = form_data.get("medico_id") or form_data.get("filtro_medico_id")
     
-    consultas = db_consultas.read()
-    medicos = db_medicos.read()
+    # Versão lida ANTES dos dados: o cache nunca associa um PDF a dados mais novos que ele
+    versao = (await run_io(db_consultas.version), await run_io(db_medicos.version))
+    medicos = await adb_medicos.read()
+    mapa_medicos = {m['id']: m['nome'] for m in medicos}
     
-    consultas_filtradas = []
+    indice, grupo, de, ate, tipo = _filtro_relatorio(filtro_id, form_data.get("de"), form_data.get("ate"))
+    # Páginas de resumo: contadores já prontos, nada de varrer as consultas de novo
+    resumo = await run_io(agregador.resumo, grupo, de, ate)
+    job = await fila_relatorios.submeter(db_consultas, indice, grupo, mapa_medicos, tipo, versao=versao, de=de, ate=ate,
+                                         resumo=resumo)
+    log_evento("ADMIN", f"Relatório enfileirado [{tipo}]: job {job.id}")
     
-    if filtro_id and filtro_id != "todos":
+    return RedirectResponse(url=f"/admin?job={job.id}", status_code=303)
+
+def _filtro_relatorio(medico_id: Optional[str], de: Optional[str], ate: Optional[str]) -> Tuple[str, Any, Optional[str], Optional[str], str]:
+    """
+    Filtros comuns a PDF e exportações -> (índice, grupo, de, ate, rótulo).
+    Índice por médico: só percorre a agenda dele; sem médico, todas por data.
+    de (inclusivo) / ate (exclusivo) no formato AAAA-MM-DD.
+    """
+    indice, grupo, rotulo = 'por_data', None, "Geral"
+    if medico_id and medico_id != "todos":
         try:
-            medico_id_int = int(filtro_id)
-            consultas_filtradas = [c for c in consultas if c['medico_id'] == medico_id_int]
+            indice, grupo, rotulo = 'por_medico', int(medico_id), f"Filtrado {medico_id}"
         except ValueError:
-            consultas_filtradas = consultas
-    else:
-        consultas_filtradas = consultas
+            pass
+    de, ate = de or None, ate or None
+    try:
+        for data in (de, ate):
+            if data:
+                datetime.date.fromisoformat(data)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Datas devem estar no formato AAAA-MM-DD.")
+    if de or ate:
+        rotulo += f" {de or '...'} a {ate or '...'}"
+    return indice, grupo, de, ate, rotulo
 
-    arquivo = gerar_relatorio_pdf(consultas_filtradas, medicos)
-    
-    tipo = "Geral" if filtro_id == "todos" else f"Filtrado {filtro_id}"
-    log_evento("ADMIN", f"Relatório gerado [{tipo}]: {arquivo}")
-    
-    return RedirectResponse(url="/admin", status_code=303)
+@admin_router.get("/relatorios/exportar")
+async def exportar_consultas(formato: str = "csv", medico_id: Optional[str] = None,
+                             de: Optional[str] = None, ate: Optional[str] = None):
+    """
+    [SO - STREAMING]
+    Consultas em csv, ndjson ou colunar (binário SOCOL2, ver src/reports/exports.py),
+    com os mesmos filtros do PDF. O corpo é gerado lote a lote enquanto é
+    enviado: memória constante, qualquer que seja o número de linhas.
+    """
+    if formato not in FORMATOS:
+        raise HTTPException(status_code=400, detail=f"Formato deve ser um de: {', '.join(FORMATOS)}")
+    indice, grupo, de, ate, rotulo = _filtro_relatorio(medico_id, de, ate)
+    medicos = await adb_medicos.read()
+    mapa_medicos = {m['id']: m['nome'] for m in medicos}
+
+    media_type, extensao = FORMATOS[formato]
+    nome = f"consultas_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.{extensao}"
+    log_evento("ADMIN", f"Exportação {formato} [{rotulo}]")
+    # Gerador síncrono: o Starlette o consome no threadpool, fora do event loop
+    return StreamingResponse(exportar(formato, db_consultas, indice, grupo, de, ate, mapa_medicos),
+                             media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{nome}"'})
+
+@admin_router.get("/stats")
+async def estatisticas(medico_id: Optional[str] = None, de: Optional[str] = None, ate: Optional[str] = None):
+    """
+    [SO - CONTADORES INCREMENTAIS]
+    Agendadas e canceladas por médico, especialidade, dia e hora, lidas dos
+    contadores do AgregadorConsultas (mesmos filtros do relatório).
+    """
+    _, grupo, de, ate, _ = _filtro_relatorio(medico_id, de, ate)
+    return await run_io(agregador.resumo, grupo, de, ate)
+
+@admin_router.get("/relatorios/jobs")
+def listar_jobs_relatorio():
+    """Jobs de relatório, do mais recente ao mais antigo."""
+    return fila_relatorios.listar()
+
+@admin_router.get("/relatorios/jobs/{job_id}")
+def status_job_relatorio(job_id: str):
+    """Status e progresso (linhas/páginas) de um job; `arquivo` aparece ao concluir."""
+    job = fila_relatorios.obter(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return job
 
 @admin_router.get("/relatorios/download/{filename}")
 def download_relatorio(filename: str):
@@ -80,17 +173,18 @@ def download_relatorio(filename: str):
 @admin_router.post("/medico/novo")
 async def adicionar_medico(request: Request, nome: str = Form(...), especialidade: str = Form(...)):
     novo_medico = { "nome": nome, "especialidade": especialidade, "ativo": True, "disponibilidade": {"dias": [], "horas": []} }
-    medico_salvo = db_medicos.add(novo_medico)
+    medico_salvo = await adb_medicos.add(novo_medico)
     log_evento("ADMIN", f"Novo médico: {nome}")
-    await manager.broadcast({"tipo": "novo_medico", "dados": medico_salvo})
+    await manager.broadcast({"tipo": "novo_medico", "dados": medico_salvo,
+                             "seq": await adb_medicos.seq_de(medico_salvo["id"])})
     return RedirectResponse(url="/admin", status_code=303)
 
 @admin_router.post("/medico/delete")
 async def deletar_medico(medico_id: int = Form(...)):
-    sucesso = db_medicos.delete(medico_id)
+    sucesso = await adb_medicos.delete(medico_id)
     if sucesso:
         log_evento("ADMIN", f"Médico {medico_id} deletado.")
-        await manager.force_release_resource(str(medico_id))
+        await manager.force_release_resource(str(medico_id), seq=await adb_medicos.seq_de(medico_id))
     return RedirectResponse(url="/admin", status_code=303)
 
 @admin_router.post("/medico/horarios")
@@ -106,12 +200,94 @@ async def configurar_horarios(request: Request):
         hs = form_data.getlist(f"horas_{d}")
         if hs: nova_disp[d] = hs
 
-    db_medicos.update(medico_id, {"disponibilidade": nova_disp})
+    await adb_medicos.update(medico_id, {"disponibilidade": nova_disp})
     log_evento("ADMIN", f"Agenda atualizada médico {medico_id}")
     
-    medicos = db_medicos.read()
-    medico_att = next((m for m in medicos if m["id"] == medico_id), None)
+    medico_att = await adb_medicos.get(medico_id)
     if medico_att:
-        await manager.broadcast({"tipo": "atualizacao_medico", "dados": medico_att})
+        await manager.broadcast({"tipo": "atualizacao_medico", "dados": medico_att,
+                                 "seq": await adb_medicos.seq_de(medico_id)})
     
-    return RedirectResponse(url="/admin", status_code=303)
\ No newline at end of file
+    return RedirectResponse(url="/admin", status_code=303)
+
+@admin_router.get("/metrics/loop")
+def metricas_event_loop():
+    """[SO - MONITORAMENTO] Atraso do event loop (ms) nas últimas amostras."""
+    return loop_monitor.stats()
+
+@admin_router.get("/logs")
+def listar_logs(limite: int = Query(50, ge=1, le=1000), antes: Optional[str] = None,
+                de: Optional[str] = None, ate: Optional[str] = None, tipo: Optional[str] = None):
+    """
+    [SO - PAGINAÇÃO POR CURSOR]
+    Eventos do mais novo ao mais antigo. Para a próxima página, repita a
+    chamada com antes=<proximo> (cursor opaco: timestamp UTC + seq, estável
+    entre eventos do mesmo instante). de/ate filtram um intervalo (ISO 8601;
+    sem fuso = horário do servidor).
+    """
+    eventos, proximo = log_store.consultar(limite=limite, antes=antes, de=de, ate=ate, tipo=tipo)
+    return {"eventos": eventos, "proximo": proximo}
+
+@admin_router.get("/metrics/broadcast")
+def metricas_broadcast():
+    """[SO - MONITORAMENTO] Latência de fan-out/entrega e clientes WebSocket."""
+    return manager.stats()
+
+@admin_router.get("/metrics/cache")
+def metricas_cache():
+    """[SO - MONITORAMENTO] Acertos/reconstruções do cache de respostas da API."""
+    return {"medicos": cache_medicos.stats(), "consultas": cache_consultas.stats(),
+            "relatorios": fila_relatorios.stats_registro(), "agregador": agregador.stats()}
+
+@admin_router.get("/arquivo")
+def status_arquivo():
+    """[SO - TIERING] Limite de selagem e partições mensais arquivadas das consultas."""
+    return _storage_particionado().stats()
+
+@admin_router.post("/arquivo/selar")
+async def selar_arquivo():
+    """Arquiva agora os meses passados (normalmente automático na virada do mês)."""
+    selados = await run_io(_storage_particionado().arquivar)
+    if selados:
+        log_evento("ADMIN", f"Arquivamento manual: {sum(selados.values())} consulta(s) em {', '.join(selados)}")
+    return {"selados": selados, **_storage_particionado().stats()}
+
+def _storage_particionado() -> PartitionedStorage:
+    if not isinstance(db_consultas, PartitionedStorage):
+        # Backend sqlite (ou SO_ARQUIVO=0 sem nada arquivado): tudo numa única tabela
+        raise HTTPException(status_code=404, detail="Arquivamento desativado neste backend")
+    return db_consultas
+
+@admin_router.get("/metrics/logs")
+def metricas_logs():
+    """[SO - MONITORAMENTO] Contadores do pipeline de logs (fila, gravados, descartados)."""
+    pipeline = get_log_pipeline()
+    return pipeline.stats() if pipeline else {}
+
+@admin_router.get("/profiler")
+def status_profiler():
+    """[SO - PROFILING] Estado da captura por amostragem (desligada por padrão)."""
+    return profiler.status()
+
+@admin_router.post("/profiler/iniciar")
+def iniciar_profiler(intervalo_ms: float = Query(10, ge=1, le=1000),
+                     duracao_s: float = Query(60, gt=0, le=600)):
+    """Liga o profiler; ele se desliga sozinho após duracao_s."""
+    if not profiler.iniciar(intervalo_ms, duracao_s):
+        raise HTTPException(status_code=409, detail="Profiler já está em execução")
+    log_evento("ADMIN", f"Profiler iniciado ({intervalo_ms} ms, {duracao_s} s)")
+    return profiler.status()
+
+@admin_router.post("/profiler/parar")
+def parar_profiler():
+    profiler.parar()
+    return profiler.status()
+
+@admin_router.get("/profiler/flamegraph", response_class=PlainTextResponse)
+def flamegraph_profiler():
+    """
+    Pilhas no formato "folded" da última captura:
+        curl .../admin/profiler/flamegraph | flamegraph.pl > perfil.svg
+    (ou abra o arquivo em speedscope.app)
+    """
+    return PlainTextResponse(profiler.folded())
@@ -1,16 +1,41 @@
-from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
 from pydantic import BaseModel
-from typing import List
+from typing import Any, Dict, List, Optional, Tuple
+import base64
+import datetime
 import json
 
-from src.storage import JsonStorage
+from src.storage import (get_storage, get_async_storage, get_change_feed, particao_quente,
+                         ParticaoSeladaError, UniqueConstraintError)
 from src.core.socket_manager import manager
-from src.core.logger import log_evento 
+from src.core.logger import log_evento
+from src.core.http_cache import CacheRespostas, responder
+from src.core.serialization import RespostaJSON
+from src.core.availability import SlotEngine
 
-api_router = APIRouter(prefix="/api")
+# Respostas codificadas por src.core.serialization (orjson quando instalado)
+api_router = APIRouter(prefix="/api", default_response_class=RespostaJSON)
 
-db_medicos = JsonStorage('consultas/medicos.json')
-db_consultas = JsonStorage('consultas/consultas.json')
+# [SO - RECURSO COMPARTILHADO] Instâncias únicas por arquivo (registry)
+db_medicos = get_storage('consultas/medicos.json')
+db_consultas = get_storage('consultas/consultas.json')
+# Fachadas assíncronas: rotas async nunca fazem I/O de disco no event loop
+adb_consultas = get_async_storage('consultas/consultas.json')
+# Um registro por cancelamento: as estatísticas de canceladas vêm daqui
+adb_cancelamentos = get_async_storage('consultas/cancelamentos.json')
+feed_mudancas = get_change_feed()
+# [SO - TIERING] Só o mês atual e os futuros: o histórico arquivado fica fora
+# da listagem completa e do mapa de horários
+consultas_quentes = particao_quente(db_consultas)
+# [SO - CACHE] Listagens pré-serializadas/comprimidas por versão do storage
+cache_medicos = CacheRespostas(db_medicos)
+cache_consultas = CacheRespostas(consultas_quentes)
+# [SO - BITMAP] Horários livres/ocupados/bloqueados mantidos por médico e dia
+motor_slots = SlotEngine(feed_mudancas, db_medicos, consultas_quentes)
+manager.adicionar_ouvinte(motor_slots.observar)
+
+# Maior janela aceita por /slots (dias)
+SLOTS_JANELA_MAX = 62
 
 class AgendamentoRequest(BaseModel):
     paciente_nome: str
@@ -27,9 +52,8 @@ async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
     try:
         while True:
-            data = await websocket.receive_text()
             try:
-                message = json.loads(data)
+                message = await manager.receber(websocket)
                 acao = message.get('acao')
 
                 # Força tudo para string
@@ -41,22 +65,33 @@ async def websocket_endpoint(websocket: WebSocket):
                     if not m_id or not d_hora: continue
                     sucesso = await manager.request_lock(websocket, recurso_id)
                     
-                    await websocket.send_json({
+                    await manager.send_personal(websocket, {
                         "tipo": "resposta_selecao",
                         "sucesso": sucesso,
                         "recurso": recurso_id,
+                        "ttl": manager.ttl_lock,
                         "dados_originais": {
                             "medico_id": m_id,
                             "data_hora": d_hora
                         }
                     })
 
+                elif acao == 'renovar':
+                    if not m_id or not d_hora: continue
+                    await manager.send_personal(websocket, {
+                        "tipo": "resposta_renovacao",
+                        "sucesso": await manager.renew_lock(websocket, recurso_id),
+                        "recurso": recurso_id
+                    })
+
                 elif acao == 'cancelar_selecao':
                     if m_id and d_hora:
-                        await manager.release_lock(recurso_id)
+                        await manager.release_lock(recurso_id, websocket)
 
-            except json.JSONDecodeError:
-                print("[WS ERROR] JSON inválido")
+            except WebSocketDisconnect:
+                raise
+            except ValueError:
+                print("[WS ERROR] Mensagem inválida")
             except Exception as e:
                 print(f"[WS ERROR] Erro: {e}")
                 
@@ -65,25 +100,125 @@ async def websocket_endpoint(websocket: WebSocket):
 
 # --- API REST ---
 @api_router.get("/medicos")
-def listar_medicos():
-    return db_medicos.read()
+def listar_medicos(request: Request):
+    # GET condicional: 304 se o ETag do cliente ainda é o da versão atual
+    return responder(request, cache_medicos.obter())
+
+@api_router.get("/medicos/{medico_id}/slots")
+def listar_slots_medico(medico_id: int, de: Optional[str] = Query(None, alias="from"),
+                        ate: Optional[str] = Query(None, alias="to")):
+    """
+    [SO - MAPA DE BITS] Horários de um médico, dia a dia, em [from, to)
+    (padrão: 7 dias a partir de hoje), já separados em livres, ocupados
+    (consultas) e bloqueados (seleções em andamento).
+    """
+    inicio, fim = _janela_slots(de, ate)
+    dias = motor_slots.slots(medico_id, inicio, fim)
+    if dias is None:
+        raise HTTPException(status_code=404, detail="Médico não encontrado.")
+    # Resposta pronta: dicionários já serializáveis dispensam o jsonable_encoder
+    return RespostaJSON({"medico_id": medico_id, "de": inicio.isoformat(), "ate": fim.isoformat(), "dias": dias})
+
+@api_router.get("/slots")
+def listar_slots(de: Optional[str] = Query(None, alias="from"), ate: Optional[str] = Query(None, alias="to")):
+    """Mesmo formato de /medicos/{id}/slots para todos os médicos (usado pelo cliente)."""
+    inicio, fim = _janela_slots(de, ate)
+    medicos = {}
+    for medico_id in motor_slots.medicos():
+        dias = motor_slots.slots(medico_id, inicio, fim)
+        if dias is not None: # Pode ter sido removido entre as duas chamadas
+            medicos[medico_id] = dias
+    return RespostaJSON({"de": inicio.isoformat(), "ate": fim.isoformat(), "medicos": medicos})
+
+def _janela_slots(de: Optional[str], ate: Optional[str]) -> Tuple[datetime.date, datetime.date]:
+    try:
+        inicio = datetime.date.fromisoformat(de) if de else datetime.date.today()
+        fim = datetime.date.fromisoformat(ate) if ate else inicio + datetime.timedelta(days=7)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Datas devem estar no formato AAAA-MM-DD.")
+    if fim <= inicio or (fim - inicio).days > SLOTS_JANELA_MAX:
+        raise HTTPException(status_code=400, detail=f"Intervalo inválido (máximo de {SLOTS_JANELA_MAX} dias).")
+    # [SO - TIERING] Os bitmaps só cobrem a camada quente: meses selados (já
+    # passados, onde nada mais pode ser agendado) ficam fora da janela
+    limite = getattr(db_consultas, "limite", "")
+    if limite:
+        inicio = min(max(inicio, datetime.date.fromisoformat(f"{limite}-01")), fim)
+    return inicio, fim
 
 @api_router.get("/consultas")
-def listar_consultas():
-    return db_consultas.read()
+def listar_consultas(request: Request, medico_id: Optional[int] = None,
+                     de: Optional[str] = None, ate: Optional[str] = None, status: Optional[str] = None,
+                     limite: Optional[int] = Query(None, ge=1, le=1000), cursor: Optional[str] = None,
+                     campos: Optional[str] = None):
+    """
+    Sem parâmetros: as consultas do mês atual em diante (camada quente,
+    resposta em cache, com ETag).
+    Com filtros: consultas em ordem de data_hora, servidas pelos índices
+    ordenados do storage ('por_medico' se houver medico_id, senão 'por_data'),
+    incluindo os meses arquivados que o intervalo cobrir.
+    - de/ate: intervalo de data_hora (de inclusivo, ate exclusivo),
+      ex.: de=2025-01-06&ate=2025-01-13 para uma semana.
+    - status: filtro residual aplicado só dentro do intervalo indexado.
+    - limite/cursor: paginação; o cursor da próxima página vem no header
+      X-Proximo-Cursor (ausente na última página).
+    - campos: projeção, ex.: campos=id,medico_id,data_hora.
+    """
+    filtros = (medico_id, de, ate, status, limite, cursor, campos)
+    if all(f is None for f in filtros):
+        return responder(request, cache_consultas.obter())
+
+    limite = limite or 100
+    apos = _ler_cursor(cursor) if cursor else None
+    indice, grupo = ('por_medico', medico_id) if medico_id is not None else ('por_data', None)
+
+    pagina: List[Dict[str, Any]] = []
+    esgotado = False
+    while len(pagina) < limite and not esgotado:
+        lote = db_consultas.range(indice, grupo, de, ate, apos=apos, limite=limite)
+        esgotado = len(lote) < limite
+        for row in lote:
+            apos = (row["data_hora"], row["id"])
+            if status is not None and row.get("status") != status:
+                continue
+            pagina.append(row)
+            if len(pagina) == limite:
+                break
+
+    cabecalhos = {}
+    if len(pagina) == limite:
+        ultimo = pagina[-1]
+        cabecalhos["X-Proximo-Cursor"] = _gerar_cursor(ultimo["data_hora"], ultimo["id"])
+    if campos:
+        projecao = [c.strip() for c in campos.split(",") if c.strip()]
+        pagina = [{c: row[c] for c in projecao if c in row} for row in pagina]
+    return RespostaJSON(pagina, headers=cabecalhos)
+
+def _gerar_cursor(data_hora: str, item_id: int) -> str:
+    # Cursor opaco: posição (data_hora, id) do último item entregue
+    return base64.urlsafe_b64encode(json.dumps([data_hora, item_id]).encode()).decode().rstrip("=")
+
+def _ler_cursor(cursor: str) -> Tuple[str, int]:
+    try:
+        data_hora, item_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return str(data_hora), int(item_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido.")
+
+@api_router.get("/changes")
+def listar_mudancas(since: Optional[int] = None, epoca: Optional[str] = None,
+                    limite: int = Query(1000, ge=1, le=10000)):
+    """
+    [SO - SINCRONIZAÇÃO INCREMENTAL]
+    Mudanças (add/update/delete de médicos e consultas) com seq > since.
+    Sem `since`: só devolve o seq/época atuais (ponto de partida do cliente).
+    `reset: true` = histórico indisponível (outra época ou cliente muito
+    atrasado): o cliente deve recarregar /api/medicos e /api/consultas.
+    `mais: true` = página cheia; peça de novo com since=seq.
+    """
+    return RespostaJSON(feed_mudancas.desde(since, epoca=epoca, limite=limite))
 
 @api_router.post("/agendar")
 async def criar_agendamento(agendamento: AgendamentoRequest):
-    # [SO - LEITURA NÃO BLOQUEANTE]
-    # O servidor lê o estado atual para verificar regras de negócio
-    consultas_existentes = db_consultas.read()
-    
-    # Verifica conflito
-    for consulta in consultas_existentes:
-        if (consulta['medico_id'] == agendamento.medico_id and 
-            consulta['data_hora'] == agendamento.data_hora):
-            raise HTTPException(status_code=409, detail="Horário já ocupado!")
-
     novo_agendamento = {
         "paciente": agendamento.paciente_nome,
         "medico_id": agendamento.medico_id,
@@ -93,43 +228,57 @@ async def criar_agendamento(agendamento: AgendamentoRequest):
     
     # [SO - PERSISTÊNCIA ATÔMICA]
     # Chama o método add() que contem o Mutex (Lock).
-    # Aqui ocorre o bloqueio físico da thread de escrita.
-    db_consultas.add(novo_agendamento)
+    # Aqui ocorre o bloqueio físico da thread de escrita. O conflito de horário
+    # é verificado pelo índice único DENTRO da região crítica (sem corrida).
+    try:
+        consulta = await adb_consultas.add(novo_agendamento)
+    except UniqueConstraintError:
+        raise HTTPException(status_code=409, detail="Horário já ocupado!")
+    except ParticaoSeladaError as e:
+        raise HTTPException(status_code=409, detail=f"{e}.")
     log_evento("INFO", f"Consulta agendada: Medico {agendamento.medico_id} às {agendamento.data_hora}")
     
     # [SO - CONSISTÊNCIA DE ESTADO]
     # Remove o lock da memória (Soft Lock) pois agora o dado está seguro no disco (Hard Lock).
     recurso_id_ws = f"{agendamento.medico_id}|{agendamento.data_hora}"
-    manager.consume_lock(recurso_id_ws)
+    await manager.consume_lock(recurso_id_ws)
     
-    # Broadcast
+    # Broadcast (carimbado com o seq da mudança para a sincronização incremental)
     await manager.broadcast({
         "tipo": "novo_agendamento",
-        "dados": novo_agendamento
+        "dados": consulta,
+        "seq": await adb_consultas.seq_de(consulta["id"])
     })
     
     return {"msg": "Agendado com sucesso"}
 
 @api_router.post("/cancelar")
 async def cancelar_agendamento(req: CancelamentoRequest):
-    consultas = db_consultas.read()
-    
-    # Filtra removendo a consulta alvo
-    nova_lista = [c for c in consultas if not (c['medico_id'] == req.medico_id and c['data_hora'] == req.data_hora)]
+    # Busca O(1) pelo índice único (medico_id, data_hora)
+    consulta = await adb_consultas.find_one('medico_data_hora', req.medico_id, req.data_hora)
     
-    if len(nova_lista) < len(consultas):
-        # Salva lista atualizada
-        with db_consultas._lock:
-            with open(db_consultas.filepath, 'w') as f:
-                json.dump(nova_lista, f, indent=4)
-
+    # Remove pelo ID: a exclusão vira um registro no log (WAL) do storage
+    try:
+        removida = bool(consulta) and await adb_consultas.delete(consulta['id'])
+    except ParticaoSeladaError as e:
+        raise HTTPException(status_code=409, detail=f"{e}.")
+    if removida:
+        # Persistido (e no feed): a contagem de canceladas sobrevive a reinícios
+        await adb_cancelamentos.add({
+            "consulta_id": consulta["id"],
+            "medico_id": consulta["medico_id"],
+            "data_hora": consulta["data_hora"],
+            "cancelada_em": datetime.datetime.now().isoformat(timespec="seconds"),
+        })
         # [NOVO] Log
         log_evento("WARN", f"Consulta desocupada/cancelada: Medico {req.medico_id} às {req.data_hora}")
 
         await manager.broadcast({
             "tipo": "agendamento_cancelado",
+            "id": consulta["id"],
             "medico_id": req.medico_id,
-            "data_hora": req.data_hora
+            "data_hora": req.data_hora,
+            "seq": await adb_consultas.seq_de(consulta["id"])
         })
         return {"msg": "Horário desocupado."}
     
@@ -0,0 +1,191 @@
+import datetime
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+# Chaves de `disponibilidade` usadas pelo admin, indexadas por date.weekday()
+DIAS_SEMANA = ['Seg', 'Ter', 'Qua', 'Qui', 'Sex', 'Sab', 'Dom']
+
+def minuto_do_dia(hora: str) -> Optional[int]:
+    """'08:30' -> 510 (posição do bit no bitmap do dia)."""
+    try:
+        h, m = hora.split(":")[:2]
+        minuto = int(h) * 60 + int(m)
+    except (AttributeError, ValueError):
+        return None
+    return minuto if 0 <= minuto < 24 * 60 else None
+
+def separar_data_hora(data_hora: str) -> Optional[Tuple[str, int]]:
+    """'2025-01-06T08:30' -> ('2025-01-06', 510)."""
+    if not isinstance(data_hora, str) or "T" not in data_hora:
+        return None
+    data, hora = data_hora.split("T", 1)
+    minuto = minuto_do_dia(hora)
+    return (data, minuto) if minuto is not None else None
+
+def _horas(bitmap: int) -> List[str]:
+    """Decodifica os bits ligados em 'HH:MM', em ordem."""
+    horas = []
+    while bitmap:
+        bit = bitmap & -bitmap # Bit menos significativo ligado
+        minuto = bit.bit_length() - 1
+        horas.append(f"{minuto // 60:02d}:{minuto % 60:02d}")
+        bitmap ^= bit
+    return horas
+
+
+class SlotEngine:
+    """
+    [SO - MAPA DE BITS (BITMAP) DE RECURSOS]
+    Assim como o sistema de arquivos marca blocos livres/ocupados em um
+    bitmap, cada (médico, dia) é um inteiro de 1440 bits (um por minuto):
+    - agenda[médico][dia_da_semana]: horários de atendimento configurados
+    - ocupados[(médico, data)]: consultas gravadas
+    - bloqueados[(médico, data)]: seleções temporárias (soft locks)
+    Livres = agenda & ~ocupados & ~bloqueados: poucas operações por dia,
+    independente do tamanho do histórico.
+
+    Atualização incremental:
+    - Médicos e consultas chegam pelo feed de mudanças (seq), aplicado sob
+      demanda antes de cada consulta: correto mesmo com vários workers.
+    - Locks chegam pelos broadcasts (bloqueio/desbloqueio_temporario).
+    - Se o feed não tiver mais o histórico necessário (reset), reconstrói
+      tudo a partir dos storages.
+    """
+
+    def __init__(self, feed, db_medicos, db_consultas):
+        self._feed = feed
+        self._db_medicos = db_medicos
+        self._db_consultas = db_consultas
+        self._lock = threading.Lock()
+        self._agenda: Dict[int, List[int]] = {}                 # médico -> máscara por weekday
+        self._ocupados: Dict[Tuple[int, str], int] = {}
+        self._bloqueados: Dict[Tuple[int, str], int] = {}
+        self._posicao: Dict[int, Tuple[int, str, int]] = {}     # consulta id -> (médico, data, minuto)
+        self._epoca: Optional[str] = None
+        self._seq: Optional[int] = None
+        self.reconstrucoes = 0
+
+    # --- Consulta ---
+
+    def slots(self, medico_id: int, de: datetime.date, ate: datetime.date) -> Optional[List[Dict[str, Any]]]:
+        """Disponibilidade dia a dia em [de, ate). None se o médico não existe."""
+        with self._lock:
+            self._sincronizar()
+            agenda = self._agenda.get(medico_id)
+            if agenda is None:
+                return None
+            dias = []
+            dia = de
+            while dia < ate:
+                data = dia.isoformat()
+                mascara = agenda[dia.weekday()]
+                ocupados = self._ocupados.get((medico_id, data), 0) & mascara
+                bloqueados = self._bloqueados.get((medico_id, data), 0) & mascara & ~ocupados
+                dias.append({
+                    "data": data,
+                    "livres": _horas(mascara & ~ocupados & ~bloqueados),
+                    "ocupados": _horas(ocupados),
+                    "bloqueados": _horas(bloqueados),
+                })
+                dia += datetime.timedelta(days=1)
+            return dias
+
+    def medicos(self) -> List[int]:
+        with self._lock:
+            self._sincronizar()
+            return sorted(self._agenda)
+
+    # --- Locks (broadcasts do ConnectionManager, locais ou de outros workers) ---
+
+    def observar(self, mensagem: Dict[str, Any]):
+        tipo = mensagem.get("tipo")
+        if tipo in ("bloqueio_temporario", "desbloqueio_temporario"):
+            medico, _, data_hora = str(mensagem.get("recurso", "")).partition("|")
+            posicao = separar_data_hora(data_hora)
+            if not medico.isdigit() or posicao is None:
+                return
+            with self._lock:
+                self._marcar(self._bloqueados, (int(medico), posicao[0]), posicao[1], tipo == "bloqueio_temporario")
+        elif tipo == "recurso_removido" and str(mensagem.get("id", "")).isdigit():
+            medico_id = int(mensagem["id"])
+            with self._lock:
+                for chave in [c for c in self._bloqueados if c[0] == medico_id]:
+                    del self._bloqueados[chave]
+
+    # --- Feed de mudanças ---
+
+    def _sincronizar(self):
+        if self._seq is None:
+            self._reconstruir()
+        while True:
+            lote = self._feed.desde(self._seq, epoca=self._epoca)
+            if lote["reset"]:
+                self._reconstruir()
+                continue
+            for mudanca in lote["mudancas"]:
+                self._aplicar(mudanca)
+            self._seq = lote["seq"]
+            if not lote["mais"]:
+                return
+
+    def _reconstruir(self):
+        # O seq é lido ANTES dos dados: mudanças concorrentes são reaplicadas
+        # depois (todas as operações abaixo são idempotentes)
+        inicio = self._feed.desde(None)
+        self._epoca, self._seq = inicio["epoca"], inicio["seq"]
+        self._agenda.clear()
+        self._ocupados.clear()
+        self._posicao.clear()
+        for medico in self._db_medicos.read():
+            self._definir_agenda(medico)
+        for consulta in self._db_consultas.read():
+            self._ocupar(consulta)
+        self.reconstrucoes += 1
+
+    def _aplicar(self, mudanca: Dict[str, Any]):
+        dados = mudanca.get("dados") or {}
+        if mudanca["origem"] == "medicos":
+            if mudanca["op"] == "delete":
+                self._agenda.pop(mudanca["id"], None)
+            else:
+                self._definir_agenda(dados)
+        elif mudanca["origem"] == "consultas":
+            self._desocupar(mudanca["id"])
+            if mudanca["op"] != "delete":
+                self._ocupar(dados)
+
+    def _definir_agenda(self, medico: Dict[str, Any]):
+        mascaras = [0] * 7
+        disponibilidade = medico.get("disponibilidade") or {}
+        for i, dia in enumerate(DIAS_SEMANA):
+            for hora in disponibilidade.get(dia, []) or []:
+                minuto = minuto_do_dia(hora)
+                if minuto is not None:
+                    mascaras[i] |= 1 << minuto
+        self._agenda[medico["id"]] = mascaras
+
+    def _ocupar(self, consulta: Dict[str, Any]):
+        posicao = separar_data_hora(consulta.get("data_hora"))
+        medico_id = consulta.get("medico_id")
+        if posicao is None or not isinstance(medico_id, int):
+            return
+        data, minuto = posicao
+        self._marcar(self._ocupados, (medico_id, data), minuto, True)
+        # O lock temporário do horário foi consumido pela gravação
+        self._marcar(self._bloqueados, (medico_id, data), minuto, False)
+        self._posicao[consulta["id"]] = (medico_id, data, minuto)
+
+    def _desocupar(self, consulta_id: int):
+        posicao = self._posicao.pop(consulta_id, None)
+        if posicao is not None:
+            medico_id, data, minuto = posicao
+            self._marcar(self._ocupados, (medico_id, data), minuto, False)
+
+    @staticmethod
+    def _marcar(bitmaps: Dict[Tuple[int, str], int], chave: Tuple[int, str], minuto: int, ligado: bool):
+        atual = bitmaps.get(chave, 0)
+        novo = atual | (1 << minuto) if ligado else atual & ~(1 << minuto)
+        if novo:
+            bitmaps[chave] = novo
+        else:
+            bitmaps.pop(chave, None) # Dia sem nenhum bit ligado não ocupa memória
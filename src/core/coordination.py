@@ -0,0 +1,281 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, List, Optional, Union
+from src.config.settings import (
+    COORDENACAO, COORDENACAO_DB, COORDENACAO_POLL_MS, COORDENACAO_RETENCAO_S,
+    WORKER_ID, WS_LOCK_TTL_S
+)
+from src.core.lock_table import LockTable, prefixo_de
+from src.storage import run_io
+
+# Entrega de um frame (mensagem já serializada) aos clientes deste processo
+Entrega = Callable[[str], None]
+
+
+class LocalCoordinator:
+    """
+    [SO - COORDENAÇÃO INTRA-PROCESSO]
+    Locks temporários em uma LockTable na RAM do próprio processo. Os
+    broadcasts só precisam alcançar os clientes locais, então publicar()
+    não faz nada além do que o ConnectionManager já entrega.
+    """
+    distribuido = False
+
+    def __init__(self, ttl: float = WS_LOCK_TTL_S, worker_id: str = WORKER_ID):
+        self.worker_id = worker_id
+        self.tabela = LockTable(ttl=ttl)
+
+    @property
+    def ttl(self) -> float:
+        return self.tabela.ttl
+
+    async def iniciar(self, entregar: Entrega):
+        pass
+
+    async def fechar(self):
+        pass
+
+    async def adquirir(self, recurso: str, dono: str) -> bool:
+        return self.tabela.adquirir(recurso, dono)
+
+    async def renovar(self, recurso: str, dono: str) -> bool:
+        return self.tabela.renovar(recurso, dono)
+
+    async def liberar(self, recurso: str, dono: Optional[str] = None) -> bool:
+        return self.tabela.liberar(recurso, dono)
+
+    async def liberar_dono(self, dono: str) -> List[str]:
+        return self.tabela.liberar_dono(dono)
+
+    async def liberar_prefixo(self, prefixo: str) -> List[str]:
+        return self.tabela.liberar_prefixo(prefixo)
+
+    async def expirar(self) -> List[str]:
+        return self.tabela.expirar()
+
+    async def espera_proximo_vencimento(self) -> Optional[float]:
+        prazo = self.tabela.proximo_vencimento()
+        return None if prazo is None else max(0.0, prazo - time.monotonic())
+
+    async def publicar(self, frame: str):
+        pass
+
+    def total_locks(self) -> int:
+        return len(self.tabela)
+
+    async def contar_locks(self) -> int:
+        return len(self.tabela)
+
+
+class SqliteCoordinator:
+    """
+    [SO - MEMÓRIA COMPARTILHADA ENTRE PROCESSOS]
+    Locks e broadcasts em um banco SQLite comum a todos os workers
+    (data/coordenacao.db, modo WAL):
+    - Tabela `locks`: recurso -> dono, prazo. Índices por dono, prefixo
+      (médico) e prazo dão as mesmas operações da LockTable; BEGIN IMMEDIATE
+      torna "verificar + adquirir" atômico entre processos.
+    - Tabela `eventos`: fila append-only (seq crescente). Publicar = INSERT;
+      cada worker faz polling de `seq > último visto` e repassa aos seus
+      clientes os eventos publicados pelos outros workers (pub-sub).
+    O relógio é o de parede (time.time), comum aos processos da máquina.
+    Todas as chamadas ao banco rodam no pool de I/O, fora do event loop.
+    A conexão é (re)aberta no primeiro uso: fechar() no shutdown não impede
+    um novo lifespan no mesmo processo.
+    """
+    distribuido = True
+
+    def __init__(self, db_path: str = COORDENACAO_DB, ttl: float = WS_LOCK_TTL_S,
+                 worker_id: str = WORKER_ID, poll_ms: float = COORDENACAO_POLL_MS,
+                 retencao_s: float = COORDENACAO_RETENCAO_S):
+        self.ttl = ttl
+        self.worker_id = worker_id
+        self._poll = poll_ms / 1000
+        self._retencao = retencao_s
+        self._lock = threading.Lock()
+        self._db_path = db_path
+        self._conexao: Optional[sqlite3.Connection] = None
+        self._ultimo_seq = 0
+        self._ultima_limpeza = 0.0
+        self._assinatura: Optional[asyncio.Task] = None
+        # Última contagem de locks lida no pool de I/O (o gauge de /metrics não consulta o banco)
+        self._locks_ativos = 0
+
+    def _abrir(self):
+        # Com o lock adquirido: no primeiro uso e após fechar()
+        if self._conexao is None:
+            os.makedirs(os.path.dirname(self._db_path), exist_ok=True)
+            self._conexao = sqlite3.connect(self._db_path, check_same_thread=False, isolation_level=None, timeout=30)
+            self._conexao.execute("PRAGMA journal_mode=WAL")
+            # Locks temporários são estado volátil: não precisam de fsync por COMMIT
+            self._conexao.execute("PRAGMA synchronous=NORMAL")
+            self._conexao.executescript("""
+                CREATE TABLE IF NOT EXISTS locks (
+                    recurso TEXT PRIMARY KEY, dono TEXT NOT NULL,
+                    prefixo TEXT NOT NULL, expira_em REAL NOT NULL);
+                CREATE INDEX IF NOT EXISTS locks_dono ON locks (dono);
+                CREATE INDEX IF NOT EXISTS locks_prefixo ON locks (prefixo);
+                CREATE INDEX IF NOT EXISTS locks_expira ON locks (expira_em);
+                CREATE TABLE IF NOT EXISTS eventos (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT, origem TEXT NOT NULL,
+                    dados TEXT NOT NULL, criado_em REAL NOT NULL);
+            """)
+
+    # --- Ciclo de vida ---
+
+    async def iniciar(self, entregar: Entrega):
+        """Começa a receber (a partir de agora) os eventos dos outros workers."""
+        if self._assinatura is not None:
+            return
+        self._ultimo_seq = await run_io(self._max_seq)
+        self._assinatura = asyncio.get_running_loop().create_task(self._assinar(entregar))
+
+    async def fechar(self):
+        if self._assinatura is not None:
+            self._assinatura.cancel()
+            await asyncio.gather(self._assinatura, return_exceptions=True)
+            self._assinatura = None
+        with self._lock:
+            if self._conexao is not None:
+                self._conexao.close()
+                self._conexao = None
+
+    async def _assinar(self, entregar: Entrega):
+        """[SO - PUB-SUB POR POLLING] Lê a fila de eventos a cada COORDENACAO_POLL_MS."""
+        while True:
+            try:
+                for origem, frame in await run_io(self._novos_eventos):
+                    if origem != self.worker_id: # Os próprios já foram entregues localmente
+                        entregar(frame)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[SO - COORDENAÇÃO] Falha ao ler eventos: {e}")
+            await asyncio.sleep(self._poll)
+
+    # --- Locks ---
+
+    async def adquirir(self, recurso: str, dono: str) -> bool:
+        return await run_io(self._adquirir, recurso, dono)
+
+    async def renovar(self, recurso: str, dono: str) -> bool:
+        return await run_io(self._executar, "UPDATE locks SET expira_em = ? WHERE recurso = ? AND dono = ?",
+                            (time.time() + self.ttl, recurso, dono))
+
+    async def liberar(self, recurso: str, dono: Optional[str] = None) -> bool:
+        if dono is None:
+            return await run_io(self._executar, "DELETE FROM locks WHERE recurso = ?", (recurso,))
+        return await run_io(self._executar, "DELETE FROM locks WHERE recurso = ? AND dono = ?", (recurso, dono))
+
+    async def liberar_dono(self, dono: str) -> List[str]:
+        return await run_io(self._remover_onde, "dono = ?", (dono,))
+
+    async def liberar_prefixo(self, prefixo: str) -> List[str]:
+        return await run_io(self._remover_onde, "prefixo = ?", (prefixo,))
+
+    async def expirar(self) -> List[str]:
+        # A transação garante que cada lease vencido é liberado por um único worker
+        return await run_io(self._remover_onde, "expira_em <= ?", (time.time(),))
+
+    async def espera_proximo_vencimento(self) -> Optional[float]:
+        prazo = await run_io(self._consultar_um, "SELECT MIN(expira_em) FROM locks")
+        return None if prazo is None else max(0.0, prazo - time.time())
+
+    def total_locks(self) -> int:
+        """Contagem da última leitura (atualizada a cada polling): não toca no banco."""
+        return self._locks_ativos
+
+    async def contar_locks(self) -> int:
+        return await run_io(self._contar_locks)
+
+    # --- Eventos ---
+
+    async def publicar(self, frame: str):
+        await run_io(self._publicar, frame)
+
+    # --- Acesso ao banco (executado no pool de I/O) ---
+
+    def _adquirir(self, recurso: str, dono: str) -> bool:
+        agora = time.time()
+        with self._lock:
+            self._abrir()
+            self._conexao.execute("BEGIN IMMEDIATE")
+            try:
+                atual = self._conexao.execute(
+                    "SELECT dono, expira_em FROM locks WHERE recurso = ?", (recurso,)).fetchone()
+                livre = atual is None or atual[0] == dono or atual[1] <= agora
+                if livre:
+                    self._conexao.execute(
+                        "INSERT OR REPLACE INTO locks (recurso, dono, prefixo, expira_em) VALUES (?, ?, ?, ?)",
+                        (recurso, dono, prefixo_de(recurso), agora + self.ttl))
+            except BaseException:
+                self._conexao.execute("ROLLBACK")
+                raise
+            self._conexao.execute("COMMIT")
+            return livre
+
+    def _remover_onde(self, condicao: str, parametros: tuple) -> List[str]:
+        with self._lock:
+            self._abrir()
+            self._conexao.execute("BEGIN IMMEDIATE")
+            try:
+                recursos = [r for (r,) in self._conexao.execute(
+                    f"SELECT recurso FROM locks WHERE {condicao}", parametros)]
+                if recursos:
+                    self._conexao.execute(f"DELETE FROM locks WHERE {condicao}", parametros)
+            except BaseException:
+                self._conexao.execute("ROLLBACK")
+                raise
+            self._conexao.execute("COMMIT")
+            return recursos
+
+    def _executar(self, sql: str, parametros: tuple) -> bool:
+        with self._lock:
+            self._abrir()
+            return self._conexao.execute(sql, parametros).rowcount > 0
+
+    def _consultar_um(self, sql: str, parametros: tuple = ()):
+        with self._lock:
+            self._abrir()
+            linha = self._conexao.execute(sql, parametros).fetchone()
+        return linha[0] if linha else None
+
+    def _max_seq(self) -> int:
+        return self._consultar_um("SELECT COALESCE(MAX(seq), 0) FROM eventos")
+
+    def _publicar(self, frame: str):
+        agora = time.time()
+        with self._lock:
+            self._abrir()
+            self._conexao.execute("INSERT INTO eventos (origem, dados, criado_em) VALUES (?, ?, ?)",
+                                  (self.worker_id, frame, agora))
+            # Limpeza periódica: eventos antigos já foram lidos por todos
+            if agora - self._ultima_limpeza >= self._retencao:
+                self._ultima_limpeza = agora
+                self._conexao.execute("DELETE FROM eventos WHERE criado_em < ?", (agora - self._retencao,))
+
+    def _contar_locks(self) -> int:
+        self._locks_ativos = self._consultar_um("SELECT COUNT(*) FROM locks") or 0
+        return self._locks_ativos
+
+    def _novos_eventos(self) -> List[tuple]:
+        with self._lock:
+            self._abrir()
+            linhas = self._conexao.execute(
+                "SELECT seq, origem, dados FROM eventos WHERE seq > ? ORDER BY seq", (self._ultimo_seq,)).fetchall()
+            self._locks_ativos = self._conexao.execute("SELECT COUNT(*) FROM locks").fetchone()[0]
+        if linhas:
+            self._ultimo_seq = linhas[-1][0]
+        return [(origem, dados) for _, origem, dados in linhas]
+
+
+Coordinator = Union[LocalCoordinator, SqliteCoordinator]
+
+def criar_coordenacao(modo: str = COORDENACAO, ttl: float = WS_LOCK_TTL_S) -> Coordinator:
+    """[SO - DRIVER] Escolhe o backend de coordenação configurado em settings.COORDENACAO."""
+    if modo == "sqlite":
+        return SqliteCoordinator(ttl=ttl)
+    return LocalCoordinator(ttl=ttl)
@@ -0,0 +1,122 @@
+import gzip
+import hashlib
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Dict, Optional
+from fastapi import Request, Response
+from src.core.serialization import dumps
+
+try:
+    import brotli # Opcional: sem ele, apenas gzip
+except ImportError:
+    brotli = None
+
+# Corpos menores que isso não compensam a compressão
+COMPRIMIR_A_PARTIR_DE = 512
+
+class RespostaCacheada:
+    """Corpo JSON pré-serializado (e pré-comprimido) de UMA versão dos dados."""
+    __slots__ = ("versao", "etag", "modificado_em", "corpos")
+
+    def __init__(self, versao: Any, corpo: bytes, etag: str, modificado_em: float):
+        self.versao = versao
+        self.etag = etag
+        self.modificado_em = modificado_em
+        self.corpos: Dict[str, bytes] = {"identity": corpo}
+        if len(corpo) >= COMPRIMIR_A_PARTIR_DE:
+            self.corpos["gzip"] = gzip.compress(corpo, compresslevel=6)
+            if brotli is not None:
+                self.corpos["br"] = brotli.compress(corpo)
+
+
+class CacheRespostas:
+    """
+    [SO - CACHE DE PÁGINAS COM VERSIONAMENTO]
+    Guarda a resposta de uma listagem para a versão atual do storage.
+    - Acerto: só compara um inteiro (storage.version()) e devolve bytes prontos.
+    - Escrita no storage = nova versão = a entrada antiga deixa de valer
+      (invalidação implícita); a próxima leitura serializa e comprime de novo.
+    - Versão e registros vêm de read_versioned() (mesmo instante), então um
+      corpo nunca é associado a uma versão mais nova que ele.
+    """
+
+    def __init__(self, storage):
+        self._storage = storage
+        self._lock = threading.Lock()
+        self._atual: Optional[RespostaCacheada] = None
+        self.acertos = 0
+        self.reconstrucoes = 0
+
+    def obter(self) -> RespostaCacheada:
+        atual = self._atual
+        if atual is not None and atual.versao == self._storage.version():
+            self.acertos += 1
+            return atual
+        with self._lock: # Uma única reconstrução por versão (as demais threads esperam)
+            atual = self._atual
+            if atual is not None and atual.versao == self._storage.version():
+                self.acertos += 1
+                return atual
+            versao, rows = self._storage.read_versioned()
+            corpo = dumps(rows)
+            # ETag forte derivada do conteúdo: estável entre reinícios e entre workers
+            etag = '"' + hashlib.sha1(corpo).hexdigest()[:20] + '"'
+            if atual is not None and atual.etag == etag:
+                # Mesmo conteúdo (ex.: update sem efeito) mantém ETag e Last-Modified
+                atual.versao = versao
+                return atual
+            self._atual = RespostaCacheada(versao, corpo, etag, time.time())
+            self.reconstrucoes += 1
+            return self._atual
+
+    def stats(self) -> Dict[str, Any]:
+        atual = self._atual
+        return {
+            "acertos": self.acertos,
+            "reconstrucoes": self.reconstrucoes,
+            "versao": atual.versao if atual else None,
+            "bytes": {k: len(v) for k, v in atual.corpos.items()} if atual else {},
+        }
+
+
+def responder(request: Request, entrada: RespostaCacheada) -> Response:
+    """
+    [SO - GET CONDICIONAL]
+    304 se o cliente já tem esta versão (If-None-Match / If-Modified-Since);
+    senão devolve o corpo pronto na melhor codificação aceita.
+    """
+    cabecalhos = {
+        "ETag": entrada.etag,
+        "Last-Modified": formatdate(entrada.modificado_em, usegmt=True),
+        "Cache-Control": "no-cache", # Pode guardar, mas revalida sempre
+        "Vary": "Accept-Encoding",
+    }
+    if _nao_modificado(request, entrada):
+        return Response(status_code=304, headers=cabecalhos)
+
+    codificacao = _escolher_codificacao(request.headers.get("accept-encoding", ""), entrada)
+    if codificacao != "identity":
+        cabecalhos["Content-Encoding"] = codificacao
+    return Response(content=entrada.corpos[codificacao], media_type="application/json", headers=cabecalhos)
+
+def _nao_modificado(request: Request, entrada: RespostaCacheada) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match tem precedência sobre If-Modified-Since (RFC 9110)
+        etags = {e.strip().removeprefix("W/") for e in if_none_match.split(",")}
+        return "*" in etags or entrada.etag in etags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(entrada.modificado_em) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def _escolher_codificacao(accept_encoding: str, entrada: RespostaCacheada) -> str:
+    aceitas = {parte.split(";")[0].strip().lower() for parte in accept_encoding.split(",")}
+    for codificacao in ("br", "gzip"):
+        if codificacao in aceitas and codificacao in entrada.corpos:
+            return codificacao
+    return "identity"
@@ -0,0 +1,154 @@
+import heapq
+import itertools
+import time
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Set, Tuple
+
+class Lease:
+    """Concessão temporária de um recurso: dono + instante de expiração."""
+    __slots__ = ("recurso", "dono", "expira_em")
+
+    def __init__(self, recurso: str, dono: Hashable, expira_em: float):
+        self.recurso = recurso
+        self.dono = dono
+        self.expira_em = expira_em
+
+
+def prefixo_de(recurso: str) -> str:
+    """'<medico_id>|<data_hora>' -> '<medico_id>'."""
+    return recurso.split("|", 1)[0]
+
+
+class LockTable:
+    """
+    [SO - TABELA DE ALOCAÇÃO DE RECURSOS]
+    Tabela de locks temporários com índices reversos:
+      - recurso -> Lease (quem segura e até quando)
+      - dono    -> recursos (liberação ao desconectar em O(locks do dono))
+      - prefixo -> recursos (liberação por médico em O(locks do médico))
+    As concessões vencem sozinhas (TTL) e são expiradas por um min-heap
+    ordenado pelo prazo; entradas renovadas/liberadas ficam obsoletas no
+    heap e são descartadas quando chegam ao topo (remoção preguiçosa).
+    """
+
+    def __init__(self, ttl: float, relogio: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self._relogio = relogio
+        self._leases: Dict[str, Lease] = {}
+        self._por_dono: Dict[Hashable, Set[str]] = {}
+        self._por_prefixo: Dict[str, Set[str]] = {}
+        self._heap: List[Tuple[float, int, str]] = []
+        self._seq = itertools.count()
+
+    # --- Consulta ---
+    def __contains__(self, recurso: str) -> bool:
+        return recurso in self._leases
+
+    def __len__(self) -> int:
+        return len(self._leases)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._leases))
+
+    def dono(self, recurso: str) -> Optional[Hashable]:
+        lease = self._leases.get(recurso)
+        return lease.dono if lease else None
+
+    def lease(self, recurso: str) -> Optional[Lease]:
+        return self._leases.get(recurso)
+
+    def recursos_de(self, dono: Hashable) -> List[str]:
+        return list(self._por_dono.get(dono, ()))
+
+    def proximo_vencimento(self) -> Optional[float]:
+        """Prazo mais próximo (relógio monotônico), ou None se não há locks."""
+        self._podar_topo()
+        return self._heap[0][0] if self._heap else None
+
+    # --- Alocação ---
+    def adquirir(self, recurso: str, dono: Hashable, ttl: Optional[float] = None) -> bool:
+        """Concede o recurso se estiver livre (ou vencido); renova se já for do dono."""
+        atual = self._leases.get(recurso)
+        if atual is not None and atual.dono != dono:
+            if atual.expira_em > self._relogio():
+                return False
+            self._remover(recurso)
+        self._conceder(recurso, dono, ttl)
+        return True
+
+    def renovar(self, recurso: str, dono: Hashable, ttl: Optional[float] = None) -> bool:
+        """Estende o prazo; só o dono atual pode renovar."""
+        atual = self._leases.get(recurso)
+        if atual is None or atual.dono != dono:
+            return False
+        self._conceder(recurso, dono, ttl)
+        return True
+
+    def liberar(self, recurso: str, dono: Optional[Hashable] = None) -> bool:
+        """Libera o recurso. Com `dono`, só libera se ele for o dono atual."""
+        atual = self._leases.get(recurso)
+        if atual is None or (dono is not None and atual.dono != dono):
+            return False
+        self._remover(recurso)
+        return True
+
+    def liberar_dono(self, dono: Hashable) -> List[str]:
+        recursos = list(self._por_dono.get(dono, ()))
+        for recurso in recursos:
+            self._remover(recurso)
+        return recursos
+
+    def liberar_prefixo(self, prefixo: str) -> List[str]:
+        recursos = list(self._por_prefixo.get(prefixo, ()))
+        for recurso in recursos:
+            self._remover(recurso)
+        return recursos
+
+    def expirar(self, agora: Optional[float] = None) -> List[str]:
+        """Remove e devolve os recursos cujo prazo já passou."""
+        agora = self._relogio() if agora is None else agora
+        vencidos = []
+        while self._heap and self._heap[0][0] <= agora:
+            prazo, _, recurso = heapq.heappop(self._heap)
+            lease = self._leases.get(recurso)
+            if lease is not None and lease.expira_em == prazo:
+                self._remover(recurso)
+                vencidos.append(recurso)
+        return vencidos
+
+    def snapshot(self) -> Dict[str, Any]:
+        agora = self._relogio()
+        return {
+            r: {"dono": id(l.dono), "expira_em_s": round(max(0.0, l.expira_em - agora), 3)}
+            for r, l in self._leases.items()
+        }
+
+    # --- Internos ---
+    def _conceder(self, recurso: str, dono: Hashable, ttl: Optional[float]):
+        prazo = self._relogio() + (self.ttl if ttl is None else ttl)
+        lease = self._leases.get(recurso)
+        if lease is None:
+            self._leases[recurso] = Lease(recurso, dono, prazo)
+            self._por_dono.setdefault(dono, set()).add(recurso)
+            self._por_prefixo.setdefault(prefixo_de(recurso), set()).add(recurso)
+        else:
+            lease.expira_em = prazo
+        heapq.heappush(self._heap, (prazo, next(self._seq), recurso))
+
+    def _remover(self, recurso: str):
+        lease = self._leases.pop(recurso)
+        for indice, chave in ((self._por_dono, lease.dono), (self._por_prefixo, prefixo_de(recurso))):
+            grupo = indice.get(chave)
+            if grupo is not None:
+                grupo.discard(recurso)
+                if not grupo:
+                    del indice[chave]
+        self._podar_topo()
+
+    def _podar_topo(self):
+        # Descarta entradas obsoletas do topo para o heap não crescer sem limite
+        while self._heap:
+            prazo, _, recurso = self._heap[0]
+            lease = self._leases.get(recurso)
+            if lease is not None and lease.expira_em == prazo:
+                break
+            heapq.heappop(self._heap)
@@ -0,0 +1,223 @@
+import datetime
+import glob
+import heapq
+import json
+import os
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from src.config.settings import LOGS_DIR
+
+PREFIXO_SEGMENTO = "system_logs_"
+EXTENSAO_SEGMENTO = ".ndjson"
+
+# Chave de ordenação de um evento: (timestamp UTC, escritor, seq). O seq
+# desempata eventos do mesmo microssegundo; o escritor, os de workers diferentes.
+Chave = Tuple[Any, ...]
+
+def carimbo(instante: Optional[datetime.datetime] = None) -> str:
+    """
+    [SO - RELÓGIO] Timestamp dos eventos: UTC, largura fixa (microssegundos e
+    fuso sempre presentes). Ordem de texto == ordem cronológica, sem os saltos
+    do horário local na troca de horário de verão.
+    """
+    instante = instante or datetime.datetime.now(datetime.timezone.utc)
+    return instante.astimezone(datetime.timezone.utc).isoformat(timespec="microseconds")
+
+def normalizar(timestamp: Optional[str]) -> str:
+    """Qualquer ISO 8601 -> carimbo UTC. Sem fuso (eventos antigos, filtros) = horário local."""
+    if not timestamp or (len(timestamp) == 32 and timestamp.endswith("+00:00")):
+        return timestamp or ""
+    try:
+        return carimbo(datetime.datetime.fromisoformat(timestamp))
+    except ValueError:
+        return timestamp
+
+def horario_local(timestamp: str) -> str:
+    """Carimbo UTC -> ISO no fuso do servidor (exibição no dashboard)."""
+    try:
+        return datetime.datetime.fromisoformat(timestamp).astimezone().isoformat()
+    except ValueError:
+        return timestamp
+
+def cursor_de(evento: Dict[str, Any], escritor: str = "") -> str:
+    """Cursor opaco 'timestamp|seq[|escritor]' que aponta para logo antes deste evento."""
+    cursor = f"{normalizar(evento.get('timestamp'))}|{evento.get('seq', 0)}"
+    return f"{cursor}|{escritor}" if escritor else cursor
+
+def _chave_cursor(cursor: str) -> Chave:
+    timestamp, _, resto = cursor.partition("|")
+    if not resto:
+        return (normalizar(timestamp),) # Cursor antigo (só o timestamp): antes de todo o instante
+    seq, _, escritor = resto.partition("|")
+    try:
+        return (normalizar(timestamp), escritor, int(seq))
+    except ValueError:
+        return (normalizar(timestamp),)
+
+def nome_segmento(inicio: datetime.datetime, escritor: str = "") -> str:
+    # Início em UTC ('Z' no fim). Com vários workers, o sufixo identifica a
+    # cadeia de segmentos do processo.
+    sufixo = f".{escritor}" if escritor else ""
+    utc = inicio.astimezone(datetime.timezone.utc)
+    return f"{PREFIXO_SEGMENTO}{utc.strftime('%Y%m%dT%H%M%S%f')}Z{sufixo}{EXTENSAO_SEGMENTO}"
+
+def _partes_nome(path: str) -> Tuple[str, str]:
+    meio = os.path.basename(path)[len(PREFIXO_SEGMENTO):-len(EXTENSAO_SEGMENTO)]
+    carimbo_nome, _, escritor = meio.partition(".")
+    return carimbo_nome, escritor
+
+def inicio_segmento(path: str) -> str:
+    """Início do segmento (a partir do nome) no mesmo formato dos eventos."""
+    carimbo_nome = _partes_nome(path)[0]
+    inicio = datetime.datetime.strptime(carimbo_nome.rstrip("Z"), '%Y%m%dT%H%M%S%f')
+    if carimbo_nome.endswith("Z"):
+        inicio = inicio.replace(tzinfo=datetime.timezone.utc)
+    return carimbo(inicio) # Sem 'Z': nome antigo, em horário local
+
+def escritor_segmento(path: str) -> str:
+    """Processo que gravou o segmento ("" no modo de um único worker)."""
+    return _partes_nome(path)[1]
+
+def listar_segmentos(diretorio: str = LOGS_DIR) -> List[str]:
+    # Em ordem de início (nomes antigos em horário local convivem com os em UTC)
+    segmentos = glob.glob(os.path.join(glob.escape(diretorio), f"{PREFIXO_SEGMENTO}*{EXTENSAO_SEGMENTO}"))
+    return sorted(segmentos, key=lambda s: (inicio_segmento(s), s))
+
+def linhas_reverso(path: str, bloco: int = 64 * 1024, fim: Optional[int] = None) -> Iterator[str]:
+    """
+    [SO - LEITURA REVERSA]
+    Lê o arquivo de trás para frente em blocos (seek + read), devolvendo as
+    linhas da última para a primeira. Custo proporcional ao que é lido, não
+    ao tamanho do arquivo. `fim` limita a leitura a bytes anteriores ao offset.
+    """
+    with open(path, 'rb') as f:
+        posicao = f.seek(0, os.SEEK_END) if fim is None else fim
+        resto = b""
+        while posicao > 0:
+            tamanho = min(bloco, posicao)
+            posicao -= tamanho
+            f.seek(posicao)
+            partes = (f.read(tamanho) + resto).split(b"\n")
+            resto = partes[0] # Pode ser o fim de uma linha do bloco anterior
+            for linha in reversed(partes[1:]):
+                if linha:
+                    yield linha.decode('utf-8', errors='replace')
+        if resto:
+            yield resto.decode('utf-8', errors='replace')
+
+def _timestamp(linha: bytes) -> Optional[str]:
+    try:
+        return normalizar(json.loads(linha).get("timestamp"))
+    except ValueError:
+        return None # Linha rasgada ou parcial (segmento ativo)
+
+def offset_por_tempo(path: str, alvo: str, bloco: int = 4096, depois: bool = False) -> int:
+    """
+    [SO - BUSCA BINÁRIA EM ARQUIVO]
+    Offset da primeira linha com timestamp >= alvo (> alvo com `depois`).
+    As linhas são gravadas em ordem de chegada (timestamps crescentes), então
+    basta O(log n) seeks mais uma varredura curta. Retorna o tamanho do
+    arquivo se nenhuma linha casar.
+    """
+    def passou(ts: Optional[str]) -> bool:
+        return ts is not None and (ts > alvo if depois else ts >= alvo)
+
+    with open(path, 'rb') as f:
+        tamanho = f.seek(0, os.SEEK_END)
+        lo, hi = 0, tamanho # lo é sempre início de linha com tudo antes < alvo
+        while hi - lo > bloco:
+            meio = (lo + hi) // 2
+            f.seek(meio)
+            f.readline() # Descarta a linha parcial: alinha no próximo início
+            pos = f.tell()
+            linha = f.readline()
+            if not linha or pos >= hi:
+                hi = meio
+                continue
+            if passou(_timestamp(linha)):
+                hi = pos
+            else:
+                lo = pos + len(linha)
+
+        f.seek(lo)
+        pos = lo
+        for linha in f:
+            if passou(_timestamp(linha)):
+                return pos
+            pos += len(linha)
+        return tamanho
+
+
+class LogStore:
+    """
+    [SO - ÍNDICE TEMPORAL DE ARQUIVOS]
+    Consultas sobre os segmentos NDJSON sem carregar o histórico:
+    - O nome de cada segmento é o seu instante inicial, então o intervalo de
+      tempo de um segmento é [início, início do próximo).
+    - "Últimos N" e paginação por cursor (antes=<cursor>) leem os segmentos
+      de trás para frente e param ao completar a página. O cursor carrega
+      (timestamp, seq, escritor): eventos do mesmo instante nunca são
+      pulados nem repetidos na virada da página.
+    - Intervalos (de/ate) localizam o ponto de partida por busca binária.
+    O custo depende do tamanho da página, não de quantos meses existem.
+    Com vários workers, cada processo grava a sua cadeia de segmentos; as
+    cadeias são lidas em paralelo e intercaladas pela chave (heapq.merge).
+    Eventos ainda na fila do LogPipeline (não gravados) não aparecem aqui.
+    """
+
+    def __init__(self, diretorio: str = LOGS_DIR):
+        self.diretorio = diretorio
+
+    def consultar(self, limite: int = 50, antes: Optional[str] = None, de: Optional[str] = None,
+                  ate: Optional[str] = None, tipo: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Eventos com de <= timestamp < ate e anteriores ao cursor `antes`, do
+        mais novo ao mais antigo, até `limite`. de/ate sem fuso são horário
+        local. Retorna (eventos, cursor da próxima página).
+        """
+        tetos = [_chave_cursor(antes) if antes else None, (normalizar(ate),) if ate else None]
+        teto = min(filter(None, tetos), default=None)
+        de = normalizar(de) if de else None
+        cadeias: Dict[str, List[str]] = {}
+        for segmento in listar_segmentos(self.diretorio):
+            cadeias.setdefault(escritor_segmento(segmento), []).append(segmento)
+        fluxos = [self._reverso(segmentos, escritor, teto, de) for escritor, segmentos in cadeias.items()]
+
+        eventos: List[Dict[str, Any]] = []
+        for chave, evento in heapq.merge(*fluxos, key=lambda par: par[0], reverse=True):
+            if tipo and evento.get("tipo") != tipo:
+                continue
+            eventos.append(evento)
+            if len(eventos) >= limite:
+                return eventos, cursor_de(evento, chave[1])
+        return eventos, None
+
+    def _reverso(self, segmentos: List[str], escritor: str, teto: Optional[Chave],
+                 de: Optional[str]) -> Iterator[Tuple[Chave, Dict[str, Any]]]:
+        """(chave, evento) de uma cadeia com de <= timestamp e chave < teto, do mais novo ao mais antigo."""
+        inicios = [inicio_segmento(s) for s in segmentos]
+        for i in range(len(segmentos) - 1, -1, -1):
+            if teto is not None and inicios[i] > teto[0]:
+                continue # Segmento inteiro é posterior ao teto
+            fim_segmento = inicios[i + 1] if i + 1 < len(segmentos) else None
+            if de is not None and fim_segmento is not None and fim_segmento < de:
+                break # Este e todos os anteriores são anteriores ao piso
+
+            inicio_leitura = None
+            if teto is not None and (fim_segmento is None or teto[0] <= fim_segmento):
+                # Lê até o fim do instante do teto: o seq decide entre os empatados
+                inicio_leitura = offset_por_tempo(segmentos[i], teto[0], depois=True)
+
+            for linha in linhas_reverso(segmentos[i], fim=inicio_leitura):
+                try:
+                    evento = json.loads(linha)
+                except ValueError:
+                    continue
+                chave = (normalizar(evento.get("timestamp")), escritor, evento.get("seq", 0))
+                if teto is not None and chave >= teto:
+                    continue
+                if de is not None and chave[0] < de:
+                    return # Chegamos ao piso do intervalo
+                yield chave, evento
+
+    def ultimos(self, limite: int = 50) -> List[Dict[str, Any]]:
+        return self.consultar(limite=limite)[0]
@@ -1,46 +1,257 @@
 import datetime
-from src.storage import JsonStorage
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+from src.config.settings import (
+    LOGS_DIR, LOG_FILA_CAPACIDADE, LOG_RING_TAMANHO,
+    LOG_SEGMENTO_MAX_BYTES, LOG_SEGMENTO_MAX_IDADE_S, LOG_FSYNC, LOG_ESCRITOR
+)
+from src.core.log_store import LogStore, carimbo, listar_segmentos, nome_segmento
+from src.core.metrics import registrar_io
 
-# [SO - LAZY LOADING]
-# Variável global inicializada como None. Só aloca recursos quando usada pela primeira vez.
-_db_logs_instance = None
+_ENCERRAR = object() # Sentinela para a thread escritora
 
-def get_db_logs():
+class LogPipeline:
     """
-    Padrão Singleton para acesso ao arquivo de logs.
-    Evita abrir múltiplos descritores de arquivo desnecessariamente.
+    [SO - PRODUTOR/CONSUMIDOR COM BUFFER LIMITADO]
+    - Produtores (rotas) apenas enfileiram o evento: custo O(1), sem I/O.
+    - Um único consumidor (thread escritora) drena a fila em lotes, ecoa no
+      stdout e grava NDJSON (uma linha por evento) no segmento ativo.
+    - Segmentos rotacionam por tamanho ou idade: data/logs/system_logs_<início>.ndjson
+      (com vários workers: system_logs_<início>.<worker>.ndjson, um escritor por arquivo)
+    - Fila cheia: o evento é descartado na hora e contabilizado em
+      `descartados`. Quem loga (inclusive rotas async) nunca espera.
+    - Um ring buffer em RAM guarda os eventos recentes para o dashboard.
+    - [SO - RELÓGIO] Timestamp (UTC) e `seq` são atribuídos aqui, sob o
+      mesmo lock do enfileiramento: a ordem no arquivo é a ordem da chave
+      (timestamp, seq) usada pelo cursor de paginação.
     """
-    global _db_logs_instance
-    if _db_logs_instance is None:
+
+    def __init__(self, diretorio: str = LOGS_DIR, capacidade: int = LOG_FILA_CAPACIDADE,
+                 ring: int = LOG_RING_TAMANHO,
+                 segmento_max_bytes: int = LOG_SEGMENTO_MAX_BYTES,
+                 segmento_max_idade_s: int = LOG_SEGMENTO_MAX_IDADE_S, fsync: bool = LOG_FSYNC,
+                 escritor: str = LOG_ESCRITOR):
+        self.diretorio = diretorio
+        self.escritor = escritor
+        self._fila: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, capacidade))
+        self._segmento_max_bytes = segmento_max_bytes
+        self._segmento_max_idade = segmento_max_idade_s
+        self._fsync = fsync
+
+        # [SO - RING BUFFER] deque com maxlen descarta o mais antigo em O(1)
+        self._recentes: deque = deque(maxlen=ring)
+        self._estado_lock = threading.Lock() # Protege o ring e os contadores
+
+        self.enfileirados = 0
+        self.gravados = 0
+        self.descartados = 0
+        self._seq = 0
+
+        self._arquivo = None
+        self._segmento_path: Optional[str] = None
+        self._segmento_inicio = 0.0
+
+        os.makedirs(diretorio, exist_ok=True)
+        self._migrar_legado()
+        self._carregar_recentes()
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    # --- Produtor ---
+
+    def publicar(self, evento: Dict[str, Any]) -> bool:
+        """Enfileira um evento. Retorna False se foi descartado (fila cheia)."""
+        with self._estado_lock:
+            evento = {"timestamp": carimbo(), "seq": self._seq + 1, **evento}
+            try:
+                self._fila.put_nowait(evento) # Nunca bloqueia: seguro sob o lock
+            except queue.Full:
+                self.descartados += 1
+                return False
+            self._seq += 1
+            self.enfileirados += 1
+            self._recentes.append(evento)
+        return True
+
+    def recentes(self, limite: int = 50) -> List[Dict[str, Any]]:
+        """Últimos eventos (mais novo primeiro), direto da RAM."""
+        with self._estado_lock:
+            copia = list(self._recentes)
+        copia.reverse()
+        return copia[:limite]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enfileirados": self.enfileirados,
+            "gravados": self.gravados,
+            "descartados": self.descartados,
+            "fila": self._fila.qsize(),
+            "capacidade": self._fila.maxsize,
+            "segmento_ativo": os.path.basename(self._segmento_path) if self._segmento_path else None,
+        }
+
+    def close(self, timeout: float = 5.0):
+        """Drena a fila para o disco e encerra a thread escritora (espera no máximo `timeout` s)."""
+        if not self._thread.is_alive():
+            return # Escritora morta: não há quem drene a fila
+        prazo = time.monotonic() + timeout
+        try:
+            self._fila.put(_ENCERRAR, timeout=timeout)
+        except queue.Full:
+            print(f"[SO - LOG] Fila não drenou em {timeout:.0f} s: {self._fila.qsize()} evento(s) perdido(s)")
+            return
+        self._thread.join(max(0.0, prazo - time.monotonic()))
+
+    # --- Consumidor ---
+
+    def _run(self):
+        while True:
+            lote = [self._fila.get()] # Bloqueia até existir trabalho
+            # Drena o que já estiver na fila: um write/fsync por lote
+            while len(lote) < 1024:
+                try:
+                    lote.append(self._fila.get_nowait())
+                except queue.Empty:
+                    break
+
+            encerrar = any(item is _ENCERRAR for item in lote)
+            eventos = [item for item in lote if item is not _ENCERRAR]
+            if eventos:
+                try:
+                    self._gravar(eventos)
+                except OSError as e:
+                    print(f"!! ERRO AO GRAVAR LOG !!: {e}")
+            if encerrar:
+                if self._arquivo:
+                    self._arquivo.close()
+                return
+
+    def _gravar(self, eventos: List[Dict[str, Any]]):
+        linhas = []
+        for evento in eventos:
+            # Saída padrão (stdout) para debug imediato, fora do caminho da requisição
+            print(f"[{evento['tipo']}] {evento['mensagem']}")
+            linhas.append(json.dumps(evento, ensure_ascii=False) + "\n")
+
+        self._rotacionar_se_preciso(eventos[0]["timestamp"])
+        inicio = time.perf_counter()
+        dados = "".join(linhas)
+        self._arquivo.write(dados)
+        self._arquivo.flush()
+        if self._fsync:
+            os.fsync(self._arquivo.fileno()) # Um fsync por lote
+        registrar_io("system_logs", "write", inicio, len(dados.encode("utf-8")))
+        self.gravados += len(eventos)
+
+    def _rotacionar_se_preciso(self, primeiro: str):
+        """
+        [SO - ROTAÇÃO DE LOG] Abre um novo segmento por tamanho ou idade.
+        O nome leva o timestamp do primeiro evento do lote (carimbado antes da
+        rotação), para que o início do segmento nunca passe dos seus eventos.
+        """
+        if self._arquivo is not None:
+            cheio = self._arquivo.tell() >= self._segmento_max_bytes
+            velho = time.time() - self._segmento_inicio >= self._segmento_max_idade
+            if not (cheio or velho):
+                return
+            self._arquivo.close()
+
+        inicio = datetime.datetime.fromisoformat(primeiro)
+        self._segmento_path = os.path.join(self.diretorio, nome_segmento(inicio, self.escritor))
+        self._segmento_inicio = time.time()
+        self._arquivo = open(self._segmento_path, 'a', encoding='utf-8')
+
+    # --- Boot ---
+
+    def _carregar_recentes(self):
+        """Preenche o ring buffer com os eventos mais recentes do disco."""
+        eventos = LogStore(self.diretorio).ultimos(self._recentes.maxlen)
+        eventos.reverse()
+        self._recentes.extend(eventos)
+        # O seq continua de onde o processo anterior parou
+        self._seq = max((e.get("seq", 0) for e in eventos), default=0)
+
+    def _migrar_legado(self):
+        """
+        [SO - MIGRAÇÃO] Converte o antigo system_logs.json (array JSON + WAL)
+        em um segmento NDJSON, uma única vez (só se ainda não há segmentos).
+        """
+        legado = os.path.join(self.diretorio, "system_logs.json")
+        if not os.path.exists(legado) or listar_segmentos(self.diretorio):
+            return
+        from src.storage import JsonStorage # Import tardio: só na migração
+        # Caminho absoluto (os.path.join ignora o DATA_DIR) e só leitura: o legado não é tocado
+        storage_legado = JsonStorage(legado, somente_leitura=True)
+        eventos = sorted(storage_legado.read(), key=lambda e: e.get("timestamp", ""))
+        storage_legado.close()
+        if not eventos:
+            return
+        primeiro = datetime.datetime.fromisoformat(eventos[0]["timestamp"])
+        destino = os.path.join(self.diretorio, nome_segmento(primeiro))
         try:
-            _db_logs_instance = JsonStorage('logs/system_logs.json')
-        except Exception as e:
-            print(f"[LOG CRITICAL] Falha ao iniciar logs: {e}")
-            return None
-    return _db_logs_instance
+            # 'x': com vários workers, só o primeiro a chegar faz a conversão
+            with open(destino, 'x', encoding='utf-8') as f:
+                for evento in eventos:
+                    evento = {k: v for k, v in evento.items() if k != "id"}
+                    f.write(json.dumps(evento, ensure_ascii=False) + "\n")
+        except FileExistsError:
+            return
+        print(f"[SO - MIGRAÇÃO] {len(eventos)} eventos de system_logs.json -> {os.path.basename(destino)}")
+
+
+# [SO - LAZY LOADING]
+# Variável global inicializada como None. Só aloca recursos (thread, arquivo)
+# quando usada pela primeira vez.
+_pipeline_instance: Optional[LogPipeline] = None
+_pipeline_lock = threading.Lock()
+
+def get_log_pipeline() -> Optional[LogPipeline]:
+    """
+    Padrão Singleton para o pipeline de logs.
+    Um único escritor por processo para os segmentos em data/logs.
+    """
+    global _pipeline_instance
+    if _pipeline_instance is None:
+        with _pipeline_lock:
+            if _pipeline_instance is None:
+                try:
+                    _pipeline_instance = LogPipeline()
+                except Exception as e:
+                    print(f"[LOG CRITICAL] Falha ao iniciar logs: {e}")
+                    return None
+    return _pipeline_instance
+
+def encerrar_logs():
+    """[SO - SHUTDOWN] Descarrega os eventos pendentes para o disco."""
+    global _pipeline_instance
+    with _pipeline_lock:
+        if _pipeline_instance is not None:
+            _pipeline_instance.close()
+            _pipeline_instance = None
 
 def log_evento(tipo: str, mensagem: str, usuario: str = "SYSTEM"):
     """
     [SO - LOGGING SEQUENCIAL]
-    Realiza uma operação de escrita Append-Only (Adicionar ao final).
-    Essencial para auditoria e recuperação de falhas (Journaling).
+    Registra um evento de auditoria Append-Only (Adicionar ao final).
+    O chamador paga apenas o enfileiramento; a gravação em disco é feita
+    em lote pela thread escritora. Seguro em rotas async (não bloqueia).
     """
     try:
         evento = {
-            # Timestamp do SO
-            "timestamp": datetime.datetime.now().isoformat(),
+            # Timestamp e seq são carimbados pelo pipeline, na ordem da fila
             "tipo": tipo,
             "usuario": usuario,
             "mensagem": mensagem
         }
-        
-        # Saída padrão (stdout) para debug imediato
-        print(f"[{tipo}] {mensagem}")
-        
-        # Persistência em disco protegida por Lock (via JsonStorage)
-        storage = get_db_logs()
-        if storage:
-            storage.add(evento)
-            
+
+        pipeline = get_log_pipeline()
+        if pipeline:
+            pipeline.publicar(evento)
+
     except Exception as e:
-        print(f"!! ERRO AO GRAVAR LOG !!: {e}")
\ No newline at end of file
+        print(f"!! ERRO AO GRAVAR LOG !!: {e}")
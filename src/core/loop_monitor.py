@@ -0,0 +1,63 @@
+import asyncio
+import time
+from collections import deque
+from typing import Dict, Optional
+from src.config.settings import LOOP_LAG_INTERVALO_MS, LOOP_LAG_ALERTA_MS
+from src.core.metrics import metricas
+
+class LoopLagMonitor:
+    """
+    [SO - LATÊNCIA DE ESCALONAMENTO]
+    Uma corrotina dorme um intervalo fixo e mede quanto tempo EXTRA levou
+    para acordar. Esse atraso é o tempo em que o event loop ficou ocupado
+    (bloqueado) sem conseguir escalonar as outras tarefas.
+    """
+
+    def __init__(self, intervalo_ms: int = LOOP_LAG_INTERVALO_MS,
+                 alerta_ms: int = LOOP_LAG_ALERTA_MS, janela: int = 600):
+        self.intervalo = intervalo_ms / 1000
+        self.alerta_ms = alerta_ms
+        self._amostras = deque(maxlen=janela) # Últimas N medições (ms)
+        self._max_ms = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            inicio = time.perf_counter()
+            await asyncio.sleep(self.intervalo)
+            atraso_ms = max(0.0, (time.perf_counter() - inicio - self.intervalo) * 1000)
+            self._amostras.append(atraso_ms)
+            self._max_ms = max(self._max_ms, atraso_ms)
+            if atraso_ms > self.alerta_ms:
+                print(f"[SO - ESCALONADOR] Event loop bloqueado por {atraso_ms:.1f} ms")
+
+    def stats(self) -> Dict[str, float]:
+        amostras = sorted(self._amostras)
+        if not amostras:
+            return {"amostras": 0, "atual_ms": 0.0, "p50_ms": 0.0, "p99_ms": 0.0,
+                    "max_janela_ms": 0.0, "max_total_ms": 0.0}
+        return {
+            "amostras": len(amostras),
+            "atual_ms": round(self._amostras[-1], 3),
+            "p50_ms": round(amostras[len(amostras) // 2], 3),
+            "p99_ms": round(amostras[min(len(amostras) - 1, int(len(amostras) * 0.99))], 3),
+            "max_janela_ms": round(amostras[-1], 3),
+            "max_total_ms": round(self._max_ms, 3),
+        }
+
+loop_monitor = LoopLagMonitor()
+metricas.medidor("so_event_loop_lag_seconds", "Último atraso medido do event loop.",
+                 lambda: loop_monitor.stats()["atual_ms"] / 1000)
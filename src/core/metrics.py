@@ -0,0 +1,262 @@
+"""
+[SO - INSTRUMENTAÇÃO]
+Métricas do processo no formato texto do Prometheus (GET /metrics).
+
+Pensado para o caminho quente: registrar uma amostra é uma busca binária no
+vetor de buckets e um incremento sob um lock próprio da métrica (nada de
+I/O, nada de alocação por amostra). Valores que já existem em algum lugar
+(conexões WebSocket, locks temporários, jobs) são lidos só na coleta, por
+callbacks (Medidor).
+
+Com vários workers (SO_WORKERS) cada processo tem o seu registro: o scrape
+vê o worker que atendeu a requisição, identificado pelo rótulo `worker`
+de so_info.
+"""
+import bisect
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+from src.config.settings import WORKER_ID
+
+# Buckets padrão (segundos): de 50 µs a 10 s
+BUCKETS_SEGUNDOS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Jobs de relatório: segundos a minutos
+BUCKETS_JOBS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+Rotulos = Tuple[str, ...]
+
+
+class _Metrica:
+    tipo = ""
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Sequence[str] = ()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._lock = threading.Lock()
+
+    def linhas(self) -> Iterable[str]:
+        raise NotImplementedError
+
+
+class Contador(_Metrica):
+    """Valor que só cresce (bytes gravados, requisições...)."""
+    tipo = "counter"
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Sequence[str] = ()):
+        super().__init__(nome, ajuda, rotulos)
+        self._valores: Dict[Rotulos, float] = {}
+
+    def inc(self, *rotulos: str, valor: float = 1):
+        with self._lock:
+            self._valores[rotulos] = self._valores.get(rotulos, 0) + valor
+
+    def linhas(self) -> Iterable[str]:
+        with self._lock:
+            valores = list(self._valores.items())
+        for rotulos, valor in valores:
+            yield f"{self.nome}{_rotulos(self.rotulos, rotulos)} {_numero(valor)}"
+
+
+class Histograma(_Metrica):
+    """Distribuição de durações; os buckets são acumulados só na exportação."""
+    tipo = "histogram"
+
+    def __init__(self, nome: str, ajuda: str, rotulos: Sequence[str] = (),
+                 buckets: Sequence[float] = BUCKETS_SEGUNDOS):
+        super().__init__(nome, ajuda, rotulos)
+        self.buckets = tuple(sorted(buckets))
+        # rótulos -> [contagem por bucket (+Inf no fim), soma]
+        self._series: Dict[Rotulos, List[Any]] = {}
+
+    def observar(self, valor: float, *rotulos: str):
+        indice = bisect.bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(rotulos)
+            if serie is None:
+                serie = self._series[rotulos] = [[0] * (len(self.buckets) + 1), 0.0]
+            serie[0][indice] += 1
+            serie[1] += valor
+
+    def linhas(self) -> Iterable[str]:
+        with self._lock:
+            series = [(r, list(s[0]), s[1]) for r, s in self._series.items()]
+        for rotulos, contagens, soma in series:
+            acumulado = 0
+            for limite, contagem in zip(self.buckets + (math.inf,), contagens):
+                acumulado += contagem
+                le = "+Inf" if limite == math.inf else _numero(limite)
+                yield f"{self.nome}_bucket{_rotulos(self.rotulos + ('le',), rotulos + (le,))} {acumulado}"
+            yield f"{self.nome}_sum{_rotulos(self.rotulos, rotulos)} {_numero(soma)}"
+            yield f"{self.nome}_count{_rotulos(self.rotulos, rotulos)} {acumulado}"
+
+
+class Medidor(_Metrica):
+    """
+    Valor instantâneo lido na coleta. `coletar` devolve um número ou, com
+    rótulos, um dicionário {tupla de rótulos: número}.
+    """
+    tipo = "gauge"
+
+    def __init__(self, nome: str, ajuda: str, coletar: Callable[[], Union[float, Dict[Rotulos, float]]],
+                 rotulos: Sequence[str] = ()):
+        super().__init__(nome, ajuda, rotulos)
+        self._coletar = coletar
+
+    def linhas(self) -> Iterable[str]:
+        try:
+            valor = self._coletar()
+        except Exception as e:
+            print(f"[SO - MÉTRICAS] Falha ao coletar {self.nome}: {e}")
+            return
+        valores = valor.items() if isinstance(valor, dict) else [((), valor)]
+        for rotulos, numero in valores:
+            yield f"{self.nome}{_rotulos(self.rotulos, rotulos)} {_numero(numero)}"
+
+
+class RegistroMetricas:
+    def __init__(self):
+        self._metricas: Dict[str, _Metrica] = {}
+        self._lock = threading.Lock()
+
+    def _registrar(self, metrica: _Metrica) -> _Metrica:
+        with self._lock:
+            # Idempotente: módulos reimportados recebem a mesma métrica
+            return self._metricas.setdefault(metrica.nome, metrica)
+
+    def contador(self, nome: str, ajuda: str, rotulos: Sequence[str] = ()) -> Contador:
+        return self._registrar(Contador(nome, ajuda, rotulos))
+
+    def histograma(self, nome: str, ajuda: str, rotulos: Sequence[str] = (),
+                   buckets: Sequence[float] = BUCKETS_SEGUNDOS) -> Histograma:
+        return self._registrar(Histograma(nome, ajuda, rotulos, buckets))
+
+    def medidor(self, nome: str, ajuda: str, coletar: Callable[[], Any], rotulos: Sequence[str] = ()) -> Medidor:
+        with self._lock:
+            # Um medidor re-registrado passa a ler da fonte mais recente
+            metrica = self._metricas[nome] = Medidor(nome, ajuda, coletar, rotulos)
+        return metrica
+
+    def exportar(self) -> str:
+        """Formato de exposição em texto do Prometheus (0.0.4)."""
+        with self._lock:
+            metricas = sorted(self._metricas.values(), key=lambda m: m.nome)
+        saida = []
+        for metrica in metricas:
+            saida.append(f"# HELP {metrica.nome} {metrica.ajuda}")
+            saida.append(f"# TYPE {metrica.nome} {metrica.tipo}")
+            saida.extend(metrica.linhas())
+        return "\n".join(saida) + "\n"
+
+
+def _rotulos(nomes: Rotulos, valores: Rotulos) -> str:
+    if not nomes:
+        return ""
+    pares = (f'{n}="{_escapar(str(v))}"' for n, v in zip(nomes, valores))
+    return "{" + ",".join(pares) + "}"
+
+def _escapar(valor: str) -> str:
+    return valor.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _numero(valor: float) -> str:
+    if isinstance(valor, bool):
+        valor = int(valor)
+    if isinstance(valor, int):
+        return str(valor)
+    if math.isinf(valor):
+        return "+Inf" if valor > 0 else "-Inf"
+    return repr(float(valor))
+
+
+metricas = RegistroMetricas()
+metricas.medidor("so_info", "Identidade do processo (valor sempre 1).", lambda: {(WORKER_ID,): 1}, ("worker",))
+
+# --- Métricas do caminho quente (importadas pelos módulos instrumentados) ---
+
+lock_espera = metricas.histograma("so_storage_lock_wait_seconds",
+                                  "Tempo esperando o mutex do storage.", ("arquivo",))
+lock_posse = metricas.histograma("so_storage_lock_hold_seconds",
+                                 "Tempo com o mutex do storage adquirido (região crítica).", ("arquivo",))
+io_bytes = metricas.contador("so_storage_io_bytes_total", "Bytes lidos/gravados em arquivos.", ("arquivo", "op"))
+io_duracao = metricas.histograma("so_storage_io_seconds",
+                                 "Duração das operações de arquivo (write inclui o fsync).", ("arquivo", "op"))
+http_duracao = metricas.histograma("so_http_request_duration_seconds",
+                                   "Latência das requisições HTTP por rota.", ("metodo", "rota", "status"))
+broadcast_fanout = metricas.histograma("so_broadcast_fanout_seconds",
+                                       "Tempo para enfileirar um broadcast em todos os clientes locais.")
+broadcast_entrega = metricas.histograma("so_broadcast_delivery_seconds",
+                                        "Tempo entre enfileirar uma mensagem e enviá-la ao cliente.")
+relatorio_duracao = metricas.histograma("so_report_job_duration_seconds",
+                                        "Duração dos jobs de relatório (da fila ao fim).", ("resultado",),
+                                        buckets=BUCKETS_JOBS)
+
+def registrar_io(arquivo: str, op: str, inicio: float, tamanho: Optional[int] = None):
+    """Fecha a medição de uma operação de arquivo iniciada em `inicio` (perf_counter)."""
+    io_duracao.observar(time.perf_counter() - inicio, arquivo, op)
+    if tamanho:
+        io_bytes.inc(arquivo, op, valor=tamanho)
+
+
+class LockMedido:
+    """
+    [SO - MUTEX INSTRUMENTADO]
+    threading.Lock que mede a espera (acquire) e a posse (até o release).
+    O instante da aquisição fica no próprio objeto: só o dono do lock o escreve.
+    """
+    __slots__ = ("_lock", "_arquivo", "_adquirido_em")
+
+    def __init__(self, arquivo: str):
+        self._lock = threading.Lock()
+        self._arquivo = arquivo
+        self._adquirido_em = 0.0
+
+    def acquire(self, blocking: bool = True, timeout: float = -1) -> bool:
+        inicio = time.perf_counter()
+        ok = self._lock.acquire(blocking, timeout)
+        if ok:
+            self._adquirido_em = time.perf_counter()
+            lock_espera.observar(self._adquirido_em - inicio, self._arquivo)
+        return ok
+
+    def release(self):
+        posse = time.perf_counter() - self._adquirido_em
+        self._lock.release()
+        lock_posse.observar(posse, self._arquivo)
+
+    def locked(self) -> bool:
+        return self._lock.locked()
+
+    def __enter__(self) -> bool:
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class MetricasHTTP:
+    """
+    Middleware ASGI: latência por rota. O rótulo é o caminho declarado da rota
+    (/api/medicos/{medico_id}/slots), não a URL, para não explodir a cardinalidade.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        inicio = time.perf_counter()
+        status = [500]
+
+        async def enviar(mensagem):
+            if mensagem["type"] == "http.response.start":
+                status[0] = mensagem["status"]
+            await send(mensagem)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            caminho = getattr(scope.get("route"), "path", None) or "<sem_rota>"
+            http_duracao.observar(time.perf_counter() - inicio, scope["method"], caminho, str(status[0]))
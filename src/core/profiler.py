@@ -0,0 +1,102 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Optional
+
+# Pilhas distintas guardadas; as excedentes são somadas em uma única linha
+MAX_PILHAS = 20000
+MAX_PROFUNDIDADE = 128
+
+
+class AmostradorPilhas:
+    """
+    [SO - PROFILING POR AMOSTRAGEM]
+    Uma thread acorda a cada `intervalo` e fotografa a pilha de todas as
+    threads do processo (sys._current_frames), como o kernel faz ao
+    interromper a CPU periodicamente. Nenhum código é instrumentado: o custo
+    é proporcional à taxa de amostragem e é zero com o profiler desligado.
+
+    O resultado sai no formato "folded" (uma pilha por linha, quadros
+    separados por ';' e a contagem no fim), aceito por flamegraph.pl,
+    speedscope e similares.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._parar = threading.Event()
+        self._pilhas: Counter = Counter()
+        self.intervalo_ms = 0.0
+        self.amostras = 0
+        self.iniciado_em: Optional[float] = None
+        self.encerrado_em: Optional[float] = None
+        self.expira_em: Optional[float] = None
+
+    @property
+    def ativo(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def iniciar(self, intervalo_ms: float = 10, duracao_s: float = 60) -> bool:
+        """Começa uma nova captura (descarta a anterior). False se já houver uma em curso."""
+        with self._lock:
+            if self.ativo:
+                return False
+            self._pilhas = Counter()
+            self.amostras = 0
+            self.intervalo_ms = intervalo_ms
+            self.iniciado_em, self.encerrado_em = time.time(), None
+            # Limite de duração: um profiler esquecido ligado não degrada o servidor para sempre
+            self.expira_em = self.iniciado_em + duracao_s
+            self._parar.clear()
+            self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+            self._thread.start()
+            return True
+
+    def parar(self):
+        self._parar.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def _run(self):
+        proprio = threading.get_ident()
+        intervalo = self.intervalo_ms / 1000
+        while not self._parar.wait(intervalo) and time.time() < self.expira_em:
+            nomes = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != proprio:
+                    self._registrar(nomes.get(ident, str(ident)), frame)
+            self.amostras += 1
+        self.encerrado_em = time.time()
+
+    def _registrar(self, thread: str, frame):
+        quadros = []
+        while frame is not None and len(quadros) < MAX_PROFUNDIDADE:
+            codigo = frame.f_code
+            quadros.append(f"{os.path.basename(codigo.co_filename)}:{codigo.co_name}")
+            frame = frame.f_back
+        quadros.append(thread)
+        pilha = ";".join(reversed(quadros))
+        if pilha in self._pilhas or len(self._pilhas) < MAX_PILHAS:
+            self._pilhas[pilha] += 1
+        else:
+            self._pilhas[f"{thread};[outras pilhas]"] += 1
+
+    def folded(self) -> str:
+        pilhas = list(self._pilhas.items())
+        return "".join(f"{pilha} {contagem}\n" for pilha, contagem in sorted(pilhas))
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ativo": self.ativo,
+            "intervalo_ms": self.intervalo_ms,
+            "amostras": self.amostras,
+            "pilhas_distintas": len(self._pilhas),
+            "iniciado_em": self.iniciado_em,
+            "encerrado_em": self.encerrado_em,
+            "expira_em": self.expira_em if self.ativo else None,
+        }
+
+profiler = AmostradorPilhas()
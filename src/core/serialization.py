@@ -0,0 +1,144 @@
+"""
+[SO - SERIALIZAÇÃO]
+Um único ponto de codificação JSON para a API, os WebSockets e o storage.
+
+- orjson (opcional) quando instalado: serializa direto para bytes UTF-8,
+  várias vezes mais rápido que o json da stdlib. Sem ele, json compacto com
+  a mesma saída (sem espaços, sem escapar acentos).
+- Quadro: uma mensagem de broadcast codificada no máximo UMA vez por formato
+  (texto ou binário); os mesmos bytes/str são reutilizados por todos os
+  destinatários.
+- Subprotocolo WebSocket binário (SUBPROTOCOLO_BINARIO), opcional e
+  negociado pelo cliente no handshake (Sec-WebSocket-Protocol). Formato do
+  frame:
+      byte 0   código do tipo de mensagem (0 = genérico)
+      resto    JSON: código 0 -> o objeto inteiro
+                     código N -> lista com os valores dos campos do esquema N,
+                                 na ordem do esquema (sem chaves, sem "tipo")
+  Campos ausentes viram null e são omitidos na decodificação. Os esquemas são
+  enviados ao cliente no primeiro frame (tipo "esquema_binario"), então o
+  navegador não precisa de uma cópia da tabela.
+"""
+import json
+from typing import Any, Dict, Optional, Union
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson # Opcional: sem ele, json da stdlib
+except ImportError:
+    orjson = None
+
+SUBPROTOCOLO_BINARIO = "so.bin.v1"
+
+# (código, chave, nome, campos): mensagens do servidor ("tipo") e do cliente ("acao")
+ESQUEMAS = (
+    (1, "tipo", "bloqueio_temporario", ("recurso", "dono_id", "ttl")),
+    (2, "tipo", "desbloqueio_temporario", ("recurso", "status")),
+    (3, "tipo", "resposta_selecao", ("sucesso", "recurso", "ttl", "dados_originais")),
+    (4, "tipo", "resposta_renovacao", ("sucesso", "recurso")),
+    (5, "tipo", "novo_agendamento", ("dados", "seq")),
+    (6, "tipo", "agendamento_cancelado", ("id", "medico_id", "data_hora", "seq")),
+    (7, "tipo", "novo_medico", ("dados", "seq")),
+    (8, "tipo", "atualizacao_medico", ("dados", "seq")),
+    (9, "tipo", "recurso_removido", ("id", "seq")),
+    (32, "acao", "selecionar", ("medico_id", "data_hora", "client_id")),
+    (33, "acao", "renovar", ("medico_id", "data_hora", "client_id")),
+    (34, "acao", "cancelar_selecao", ("medico_id", "data_hora", "client_id")),
+)
+_POR_NOME = {(chave, nome): (codigo, campos) for codigo, chave, nome, campos in ESQUEMAS}
+_POR_CODIGO = {codigo: (chave, nome, campos) for codigo, chave, nome, campos in ESQUEMAS}
+
+
+def dumps(obj: Any) -> bytes:
+    """JSON compacto em bytes UTF-8."""
+    if orjson is not None:
+        # OPT_NON_STR_KEYS: chaves int viram texto, como no json da stdlib
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def dumps_texto(obj: Any) -> str:
+    return dumps(obj).decode("utf-8")
+
+def loads(dados: Union[bytes, bytearray, str]) -> Any:
+    """Inverso de dumps; erros de sintaxe levantam ValueError (json.JSONDecodeError)."""
+    if orjson is not None:
+        return orjson.loads(dados)
+    return json.loads(dados)
+
+
+class RespostaJSON(JSONResponse):
+    """JSONResponse codificada por dumps (orjson quando disponível)."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+# --- Subprotocolo binário ---
+
+def codificar_binario(mensagem: Dict[str, Any]) -> bytes:
+    for chave in ("tipo", "acao"):
+        esquema = _POR_NOME.get((chave, mensagem.get(chave)))
+        if esquema is None:
+            continue
+        codigo, campos = esquema
+        if all(c == chave or c in campos for c in mensagem):
+            valores = [mensagem.get(c) for c in campos]
+            while valores and valores[-1] is None:
+                valores.pop()
+            return bytes((codigo,)) + dumps(valores)
+        break
+    # Campo fora do esquema: vai inteiro (nada se perde)
+    return b"\x00" + dumps(mensagem)
+
+def decodificar_binario(frame: bytes) -> Dict[str, Any]:
+    if not frame:
+        raise ValueError("Frame binário vazio")
+    corpo = loads(frame[1:])
+    if frame[0] == 0:
+        if not isinstance(corpo, dict):
+            raise ValueError("Frame genérico deve conter um objeto")
+        return corpo
+    esquema = _POR_CODIGO.get(frame[0])
+    if esquema is None or not isinstance(corpo, list):
+        raise ValueError(f"Frame binário com código desconhecido: {frame[0]}")
+    chave, nome, campos = esquema
+    mensagem = {chave: nome}
+    for campo, valor in zip(campos, corpo):
+        if valor is not None:
+            mensagem[campo] = valor
+    return mensagem
+
+# Primeiro frame de uma conexão binária: a tabela de esquemas
+ANUNCIO_ESQUEMAS = {"tipo": "esquema_binario", "protocolo": SUBPROTOCOLO_BINARIO,
+                    "esquemas": [[codigo, chave, nome, list(campos)] for codigo, chave, nome, campos in ESQUEMAS]}
+
+
+class Quadro:
+    """
+    Mensagem pronta para envio. Cada formato é codificado na primeira vez em
+    que um destinatário o pede e reaproveitado por todos os outros.
+    """
+    __slots__ = ("_mensagem", "_texto", "_binario")
+
+    def __init__(self, mensagem: Optional[Dict[str, Any]] = None, texto: Optional[str] = None):
+        self._mensagem = mensagem
+        self._texto = texto
+        self._binario: Optional[bytes] = None
+
+    @property
+    def mensagem(self) -> Dict[str, Any]:
+        if self._mensagem is None:
+            self._mensagem = loads(self._texto)
+        return self._mensagem
+
+    @property
+    def texto(self) -> str:
+        if self._texto is None:
+            self._texto = dumps_texto(self._mensagem)
+        return self._texto
+
+    @property
+    def binario(self) -> bytes:
+        if self._binario is None:
+            self._binario = codificar_binario(self.mensagem)
+        return self._binario
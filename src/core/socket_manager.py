@@ -1,35 +1,215 @@
-from fastapi import WebSocket
-from typing import List, Dict
+import asyncio
+import time
+from collections import deque
+from fastapi import WebSocket, WebSocketDisconnect
+from typing import Any, Callable, Dict, List, Optional, Set
+from src.config.settings import WS_FILA_POR_CLIENTE
+from src.core.coordination import Coordinator, criar_coordenacao
+from src.core.metrics import broadcast_entrega, broadcast_fanout, metricas as registro_metricas
+from src.core.serialization import (ANUNCIO_ESQUEMAS, SUBPROTOCOLO_BINARIO, Quadro,
+                                    decodificar_binario, loads)
+
+# Código de fechamento WebSocket 1013 = "Try Again Later" (cliente lento)
+WS_CODIGO_CLIENTE_LENTO = 1013
+
+class ClientChannel:
+    """
+    [SO - BUFFER POR PROCESSO]
+    Fila de saída limitada de um cliente, drenada por uma tarefa escritora
+    própria. Um cliente lento só atrasa a si mesmo: os demais continuam
+    recebendo, e quem estoura a fila é desconectado.
+    `binario`: o cliente negociou o subprotocolo compacto (SUBPROTOCOLO_BINARIO).
+    """
+
+    def __init__(self, websocket: WebSocket, capacidade: int, binario: bool = False):
+        self.websocket = websocket
+        self.binario = binario
+        self.fila: "asyncio.Queue[tuple]" = asyncio.Queue(maxsize=capacidade)
+        self.task: Optional[asyncio.Task] = None
+
+    def enfileirar(self, quadro: Quadro) -> bool:
+        try:
+            self.fila.put_nowait((quadro, time.perf_counter()))
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def encerrar(self):
+        if self.task is not None and self.task is not asyncio.current_task():
+            self.task.cancel()
+
+
+class BroadcastMetrics:
+    """Amostras de fan-out (serializar + enfileirar) e de entrega (fila -> socket)."""
+
+    def __init__(self, janela: int = 1000):
+        self.broadcasts = 0
+        self.mensagens_enfileiradas = 0
+        self.desconexoes_lentos = 0
+        self._fanout_ms = deque(maxlen=janela)
+        self._entrega_ms = deque(maxlen=janela)
+
+    def registrar_fanout(self, ms: float, destinos: int):
+        self.broadcasts += 1
+        self.mensagens_enfileiradas += destinos
+        self._fanout_ms.append(ms)
+
+    def registrar_entrega(self, ms: float):
+        self._entrega_ms.append(ms)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "broadcasts": self.broadcasts,
+            "mensagens_enfileiradas": self.mensagens_enfileiradas,
+            "desconexoes_lentos": self.desconexoes_lentos,
+            "fanout_ms": _percentis(self._fanout_ms),
+            "entrega_ms": _percentis(self._entrega_ms),
+        }
+
+def _percentis(amostras) -> Dict[str, float]:
+    ordenadas = sorted(amostras)
+    if not ordenadas:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    def p(q: float) -> float:
+        return round(ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * q))], 3)
+    return {"p50": p(0.50), "p95": p(0.95), "p99": p(0.99), "max": round(ordenadas[-1], 3)}
+
 
 class ConnectionManager:
-    def __init__(self):
-        # Lista de processos/clientes conectados
-        self.active_connections: List[WebSocket] = []
+    def __init__(self, capacidade_fila: int = WS_FILA_POR_CLIENTE, coordenacao: Optional[Coordinator] = None):
+        # Tabela de processos/clientes conectados -> canal de saída de cada um
+        self.active_connections: Dict[WebSocket, ClientChannel] = {}
+        self.capacidade_fila = capacidade_fila
+        self.metricas = BroadcastMetrics()
+        self._tarefas: Set[asyncio.Task] = set() # Referências fortes p/ tarefas avulsas
         
         # [SO - MEMÓRIA COMPARTILHADA]
-        # Esta estrutura atua como uma tabela de alocação de recursos na RAM.
-        # Chave: Recurso (Horário) -> Valor: Processo Dono (WebSocket)
-        self.temporary_locks: Dict[str, WebSocket] = {} 
+        # Tabela de alocação de recursos: Recurso (Horário) -> Lease (Dono + prazo).
+        # Fica no backend de coordenação: RAM do processo (um worker) ou um
+        # meio comum a todos os workers, que também propaga os broadcasts.
+        self.coordenacao = coordenacao or criar_coordenacao()
+        self._expirador: Optional[asyncio.Task] = None
+        self._acordar_expirador: Optional[asyncio.Event] = None
+        # Observadores internos dos broadcasts (ex.: motor de disponibilidade)
+        self._ouvintes: List[Callable[[dict], None]] = []
 
     async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
+        # Negociação do subprotocolo: só quem pede recebe frames binários
+        binario = SUBPROTOCOLO_BINARIO in websocket.scope.get("subprotocols", [])
+        await websocket.accept(subprotocol=SUBPROTOCOLO_BINARIO if binario else None)
+        canal = ClientChannel(websocket, self.capacidade_fila, binario)
+        canal.task = asyncio.get_running_loop().create_task(self._writer(canal))
+        self.active_connections[websocket] = canal
+        if binario:
+            self._entregar(canal, Quadro(ANUNCIO_ESQUEMAS))
+        self._garantir_expirador()
+        await self.iniciar()
+
+    async def iniciar(self):
+        """Assina os broadcasts dos outros workers (idempotente; chamado no boot e no connect)."""
+        await self.coordenacao.iniciar(self._receber_remoto)
+
+    def adicionar_ouvinte(self, ouvinte: Callable[[dict], None]):
+        """Registra um callback síncrono chamado com cada mensagem difundida (local ou remota)."""
+        self._ouvintes.append(ouvinte)
+
+    @property
+    def ttl_lock(self) -> float:
+        return self.coordenacao.ttl
 
-    async def disconnect(self, websocket: WebSocket):
+    def _dono(self, websocket: WebSocket) -> str:
+        # Identidade global do dono: worker + socket (único entre processos)
+        return f"{self.coordenacao.worker_id}:{id(websocket)}"
+
+    def _garantir_expirador(self):
+        if self._expirador is None or self._expirador.done():
+            self._acordar_expirador = asyncio.Event()
+            self._expirador = asyncio.get_running_loop().create_task(self._expirar_leases())
+
+    async def _expirar_leases(self):
+        """
+        [SO - TIMER / WATCHDOG]
+        Dorme até o prazo mais próximo do heap de leases (ou até ser acordado
+        por um lock novo) e libera as seleções abandonadas que venceram.
+        Com coordenação distribuída, locks de outros workers não acordam este
+        processo: a espera é limitada a 1 s.
+        """
+        while True:
+            self._acordar_expirador.clear()
+            try:
+                espera = await self.coordenacao.espera_proximo_vencimento()
+                if self.coordenacao.distribuido:
+                    espera = min(espera if espera is not None else 1.0, 1.0)
+                try:
+                    await asyncio.wait_for(self._acordar_expirador.wait(), espera)
+                except asyncio.TimeoutError:
+                    pass
+                vencidos = await self.coordenacao.expirar()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[SO - TIMEOUT] Falha ao expirar leases: {e}")
+                await asyncio.sleep(1.0)
+                continue
+            for recurso in vencidos:
+                print(f"[SO - TIMEOUT] Lease expirado, liberando: {recurso}")
+                await self.broadcast({
+                    "tipo": "desbloqueio_temporario",
+                    "recurso": recurso,
+                    "status": "free"
+                })
+
+    async def close(self):
+        """Encerra o expirador e os escritores (shutdown do servidor)."""
+        tarefas = [c.task for c in self.active_connections.values() if c.task is not None]
+        if self._expirador is not None:
+            tarefas.append(self._expirador)
+        for tarefa in tarefas:
+            tarefa.cancel()
+        await asyncio.gather(*tarefas, return_exceptions=True)
+        self._expirador = None
+        await self.coordenacao.fechar()
+
+    async def _writer(self, canal: ClientChannel):
+        """[SO - CONSUMIDOR] Drena a fila do cliente, uma mensagem por vez."""
+        try:
+            while True:
+                quadro, enfileirado_em = await canal.fila.get()
+                if canal.binario:
+                    await canal.websocket.send_bytes(quadro.binario)
+                else:
+                    await canal.websocket.send_text(quadro.texto)
+                espera = time.perf_counter() - enfileirado_em
+                self.metricas.registrar_entrega(espera * 1000)
+                broadcast_entrega.observar(espera)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Socket morto: a limpeza roda em outra tarefa (ela cancela esta)
+            self._agendar(self.disconnect(canal.websocket))
+
+    def _agendar(self, corrotina):
+        tarefa = asyncio.get_running_loop().create_task(corrotina)
+        self._tarefas.add(tarefa)
+        tarefa.add_done_callback(self._tarefas.discard)
+
+    async def disconnect(self, websocket: WebSocket, codigo: Optional[int] = None):
         """
         [SO - GARBAGE COLLECTION / PREVENÇÃO DE DEADLOCK]
         Quando um processo (cliente) morre ou desconecta, o sistema deve
         liberar os recursos que ele segurava para evitar inanição (Starvation).
         """
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+        canal = self.active_connections.pop(websocket, None)
+        if canal is not None:
+            canal.encerrar()
+        if codigo is not None:
+            try:
+                await websocket.close(code=codigo)
+            except Exception:
+                pass
         
-        locks_to_release = []
-        # Varre a memória procurando locks órfãos deste socket
-        for resource_id, owner_socket in list(self.temporary_locks.items()):
-            if owner_socket == websocket:
-                locks_to_release.append(resource_id)
-                del self.temporary_locks[resource_id]
+        # Índice reverso dono -> recursos: custo O(locks deste socket)
+        locks_to_release = await self.coordenacao.liberar_dono(self._dono(websocket))
         
         # Avisa os outros processos que os recursos foram liberados
         for resource in locks_to_release:
@@ -45,61 +225,137 @@ class ConnectionManager:
         [SO - COMUNICAÇÃO INTER-PROCESSOS (IPC)]
         Envia uma mensagem para todos os processos conectados (Multicast).
         Usado para manter a consistência de estado visual entre clientes.
+        A mensagem é serializada UMA vez por formato (texto/binário) e o
+        mesmo Quadro é enfileirado em cada canal: o custo é O(clientes)
+        operações em memória, sem esperar a rede.
+        Os clientes dos outros workers recebem o mesmo frame via coordenação.
         """
-        for connection in list(self.active_connections):
+        quadro = Quadro(message)
+        self._notificar(message)
+        self._difundir_local(quadro)
+        await self.coordenacao.publicar(quadro.texto)
+
+    def _receber_remoto(self, frame: str):
+        quadro = Quadro(texto=frame)
+        if self._ouvintes:
+            self._notificar(quadro.mensagem)
+        self._difundir_local(quadro)
+
+    def _notificar(self, message: dict):
+        for ouvinte in self._ouvintes:
             try:
-                await connection.send_json(message)
-            except Exception:
-                await self.disconnect(connection)
+                ouvinte(message)
+            except Exception as e:
+                print(f"[SO - BROADCAST] Falha em ouvinte: {e}")
+
+    def _difundir_local(self, quadro: Quadro):
+        inicio = time.perf_counter()
+        for canal in list(self.active_connections.values()):
+            self._entregar(canal, quadro)
+        duracao = time.perf_counter() - inicio
+        self.metricas.registrar_fanout(duracao * 1000, len(self.active_connections))
+        broadcast_fanout.observar(duracao)
+
+    async def send_personal(self, websocket: WebSocket, message: dict):
+        """Mensagem para um único cliente, pela mesma fila (preserva a ordem)."""
+        canal = self.active_connections.get(websocket)
+        if canal is not None:
+            self._entregar(canal, Quadro(message))
+
+    async def receber(self, websocket: WebSocket) -> Dict[str, Any]:
+        """
+        Próxima mensagem do cliente, em texto (JSON) ou binário (subprotocolo).
+        Levanta WebSocketDisconnect no fechamento e ValueError se malformada.
+        """
+        evento = await websocket.receive()
+        if evento["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(evento.get("code", 1000))
+        if evento.get("bytes") is not None:
+            return decodificar_binario(evento["bytes"])
+        mensagem = loads(evento.get("text") or "")
+        if not isinstance(mensagem, dict):
+            raise ValueError("Mensagem deve ser um objeto JSON")
+        return mensagem
+
+    def _entregar(self, canal: ClientChannel, quadro: Quadro):
+        if not canal.enfileirar(quadro):
+            # [SO - CONSUMIDOR LENTO] Fila cheia: desconecta para proteger os demais
+            self.metricas.desconexoes_lentos += 1
+            print(f"[SO - BROADCAST] Cliente lento desconectado (fila com {canal.fila.qsize()} mensagens)")
+            self.active_connections.pop(canal.websocket, None)
+            canal.encerrar()
+            self._agendar(self.disconnect(canal.websocket, codigo=WS_CODIGO_CLIENTE_LENTO))
+
+    def stats(self) -> Dict[str, Any]:
+        profundidades = [c.fila.qsize() for c in self.active_connections.values()]
+        return {
+            **self.metricas.stats(),
+            "conexoes_ativas": len(self.active_connections),
+            "locks_ativos": self.coordenacao.total_locks(),
+            "worker": self.coordenacao.worker_id,
+            "fila_max_atual": max(profundidades, default=0),
+            "conexoes_binarias": sum(1 for c in self.active_connections.values() if c.binario),
+        }
 
     async def request_lock(self, websocket: WebSocket, resource_id: str):
         """
         [SO - SEMÁFORO LÓGICO]
         Tenta adquirir o acesso exclusivo a um recurso (horário).
-        Se já estiver na tabela temporary_locks, nega o acesso (Busy Wait evitado).
+        Se já estiver na tabela de locks, nega o acesso (Busy Wait evitado).
+        O lock é um lease: vence após o TTL se não for renovado.
         """
-        if resource_id in self.temporary_locks:
-            if self.temporary_locks[resource_id] != websocket:
-                return False # Recurso Ocupado
-        
-        # Adquire o Lock na memória
-        self.temporary_locks[resource_id] = websocket
+        # Adquire o Lock (ou renova, se já for deste socket)
+        if not await self.coordenacao.adquirir(resource_id, self._dono(websocket)):
+            return False # Recurso Ocupado
+        if self._acordar_expirador is not None:
+            self._acordar_expirador.set()
         
         # Propaga o estado de bloqueio para todos (Sincronização)
         await self.broadcast({
             "tipo": "bloqueio_temporario",
             "recurso": resource_id,
-            "dono_id": id(websocket)
+            "dono_id": id(websocket),
+            "ttl": self.ttl_lock
         })
         return True
 
-    async def release_lock(self, resource_id: str):
-        if resource_id in self.temporary_locks:
-            del self.temporary_locks[resource_id]
+    async def renew_lock(self, websocket: WebSocket, resource_id: str) -> bool:
+        """[SO - HEARTBEAT] O dono estende o prazo do lease enquanto o usuário preenche os dados."""
+        return await self.coordenacao.renovar(resource_id, self._dono(websocket))
+
+    async def release_lock(self, resource_id: str, websocket: Optional[WebSocket] = None):
+        dono = self._dono(websocket) if websocket is not None else None
+        if await self.coordenacao.liberar(resource_id, dono):
             await self.broadcast({
                 "tipo": "desbloqueio_temporario",
                 "recurso": resource_id
             })
 
-    def consume_lock(self, resource_id: str):
+    async def consume_lock(self, resource_id: str):
         """
         [SO - TRANSIÇÃO DE ESTADO]
         Remove o lock da memória (Volátil) quando o dado é persistido no disco.
         Evita inconsistência entre o estado em RAM e o estado em Disco.
         """
-        if resource_id in self.temporary_locks:
-            del self.temporary_locks[resource_id]
+        if await self.coordenacao.liberar(resource_id):
             print(f"[SO - MEMORY] Lock temporário consumido (persistido): {resource_id}")
 
-    async def force_release_resource(self, resource_prefix: str):
+    async def force_release_resource(self, resource_prefix: str, seq: Optional[int] = None):
         # [SO - INTERRUPÇÃO] Força a liberação administrativa de um recurso
-        locks_to_remove = [k for k in self.temporary_locks.keys() if k.startswith(f"{resource_prefix}|")]
-        for key in locks_to_remove:
-            del self.temporary_locks[key]
+        # Índice por prefixo (médico): sem varrer a tabela inteira
+        await self.coordenacao.liberar_prefixo(resource_prefix)
 
-        await self.broadcast({
+        mensagem = {
             "tipo": "recurso_removido",
             "id": resource_prefix
-        })
+        }
+        if seq is not None:
+            mensagem["seq"] = seq
+        await self.broadcast(mensagem)
 
-manager = ConnectionManager()
\ No newline at end of file
+manager = ConnectionManager()
+registro_metricas.medidor("so_websocket_connections", "Conexões WebSocket ativas neste processo.",
+                          lambda: len(manager.active_connections))
+# Com coordenação sqlite a contagem é global (tabela compartilhada entre workers)
+registro_metricas.medidor("so_temporary_locks", "Seleções temporárias de horário (leases) ativas.",
+                          lambda: manager.coordenacao.total_locks())
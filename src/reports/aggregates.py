@@ -0,0 +1,193 @@
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from src.core.availability import separar_data_hora
+
+# Uma célula (médico, dia) guarda 48 contadores: [0:24] agendadas por hora
+# do dia e [24:48] canceladas por hora do dia
+HORAS = 24
+
+
+class AgregadorConsultas:
+    """
+    [SO - CONTADORES INCREMENTAIS]
+    Estatísticas das consultas mantidas como contadores, em vez de percorrer
+    o dataset a cada relatório/dashboard:
+    - células (médico, dia) com contagem por hora: base para os filtros
+    - totais por médico, por dia e por hora: leitura direta, sem filtro
+    - por especialidade: soma dos médicos na leitura (poucos médicos)
+
+    Mesma sincronização do SlotEngine: o feed de mudanças é aplicado sob
+    demanda antes de cada leitura; em um reset, tudo é recontado a partir
+    dos storages.
+    Canceladas vêm do storage de cancelamentos (um registro gravado por
+    cancelamento), não das exclusões de consultas: sobrevivem a reinícios,
+    são as mesmas em todos os workers e uma exclusão desfeita (lote que
+    falhou no fsync) nunca conta como cancelamento.
+    """
+
+    def __init__(self, feed, db_medicos, db_consultas, db_cancelamentos):
+        self._feed = feed
+        self._db_medicos = db_medicos
+        self._db_consultas = db_consultas
+        self._db_cancelamentos = db_cancelamentos
+        self._lock = threading.Lock()
+        self._medicos: Dict[int, Tuple[str, str]] = {}         # id -> (nome, especialidade)
+        self._celulas: Dict[Tuple[int, str], List[int]] = {}
+        self._por_medico: Dict[int, List[int]] = {}             # [agendadas, canceladas]
+        self._por_dia: Dict[str, List[int]] = {}
+        self._por_hora: List[List[int]] = [[0, 0] for _ in range(HORAS)]
+        self._posicao: Dict[int, Tuple[int, str, int]] = {}     # consulta id -> (médico, data, hora)
+        self._epoca: Optional[str] = None
+        self._seq: Optional[int] = None
+        self.reconstrucoes = 0
+
+    # --- Leitura ---
+
+    def resumo(self, medico_id: Optional[int] = None, de: Optional[str] = None,
+               ate: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Contagens por médico, especialidade, dia e hora. de (inclusivo) /
+        ate (exclusivo) em AAAA-MM-DD. Sem filtro, só lê os totais; com
+        filtro, soma as células (médico, dia) do intervalo.
+        """
+        with self._lock:
+            self._sincronizar()
+            if medico_id is None and de is None and ate is None:
+                por_medico = {m: list(c) for m, c in self._por_medico.items()}
+                por_dia = {d: list(c) for d, c in self._por_dia.items()}
+                por_hora = [list(c) for c in self._por_hora]
+            else:
+                por_medico, por_dia = {}, {}
+                por_hora = [[0, 0] for _ in range(HORAS)]
+                for (medico, data), celula in self._celulas.items():
+                    if (medico_id is not None and medico != medico_id) or \
+                            (de and data < de) or (ate and data >= ate):
+                        continue
+                    agendadas, canceladas = sum(celula[:HORAS]), sum(celula[HORAS:])
+                    _somar(por_medico.setdefault(medico, [0, 0]), agendadas, canceladas)
+                    _somar(por_dia.setdefault(data, [0, 0]), agendadas, canceladas)
+                    for hora in range(HORAS):
+                        _somar(por_hora[hora], celula[hora], celula[HORAS + hora])
+            medicos = dict(self._medicos)
+
+        por_especialidade: Dict[str, List[int]] = {}
+        linhas_medico = []
+        for medico, (agendadas, canceladas) in por_medico.items():
+            nome, especialidade = medicos.get(medico, (f"ID {medico}", "N/A"))
+            _somar(por_especialidade.setdefault(especialidade, [0, 0]), agendadas, canceladas)
+            linhas_medico.append({"id": medico, "nome": nome, "especialidade": especialidade,
+                                  "agendadas": agendadas, "canceladas": canceladas})
+        return {
+            "total": {"agendadas": sum(c[0] for c in por_medico.values()),
+                      "canceladas": sum(c[1] for c in por_medico.values())},
+            "por_medico": sorted(linhas_medico, key=lambda l: (-l["agendadas"], l["id"])),
+            "por_especialidade": [{"especialidade": e, "agendadas": c[0], "canceladas": c[1]}
+                                  for e, c in sorted(por_especialidade.items(), key=lambda i: (-i[1][0], i[0]))],
+            "por_dia": [{"data": d, "agendadas": c[0], "canceladas": c[1]} for d, c in sorted(por_dia.items())],
+            "por_hora": [{"hora": f"{h:02d}:00", "agendadas": c[0], "canceladas": c[1]}
+                         for h, c in enumerate(por_hora) if c[0] or c[1]],
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {"celulas": len(self._celulas), "consultas": len(self._posicao),
+                "seq": self._seq, "reconstrucoes": self.reconstrucoes}
+
+    # --- Feed de mudanças ---
+
+    def _sincronizar(self):
+        if self._seq is None:
+            self._reconstruir()
+        while True:
+            lote = self._feed.desde(self._seq, epoca=self._epoca)
+            if lote["reset"]:
+                self._reconstruir()
+                continue
+            for mudanca in lote["mudancas"]:
+                self._aplicar(mudanca)
+            self._seq = lote["seq"]
+            if not lote["mais"]:
+                return
+
+    def _reconstruir(self):
+        # Seq lido ANTES dos dados: as mudanças concorrentes reaplicadas depois
+        # só movem consultas já contadas (via _posicao), nunca as contam duas vezes
+        inicio = self._feed.desde(None)
+        self._epoca, self._seq = inicio["epoca"], inicio["seq"]
+        self._posicao.clear()
+        self._celulas.clear()
+        self._por_medico.clear()
+        self._por_dia.clear()
+        self._por_hora = [[0, 0] for _ in range(HORAS)]
+        self._medicos.clear()
+        for medico in self._db_medicos.read():
+            self._definir_medico(medico)
+        # Em lotes pelo índice de data: meses arquivados são lidos bloco a bloco
+        for lote in self._db_consultas.iterar('por_data'):
+            for consulta in lote:
+                self._agendar(consulta)
+        for lote in self._db_cancelamentos.iterar('por_data'):
+            for cancelamento in lote:
+                self._contar_cancelamento(cancelamento, +1)
+        self.reconstrucoes += 1
+
+    def _aplicar(self, mudanca: Dict[str, Any]):
+        dados = mudanca.get("dados") or {}
+        if mudanca["origem"] == "medicos":
+            # Médico excluído continua nomeado nas contagens das consultas dele
+            if mudanca["op"] != "delete":
+                self._definir_medico(dados)
+        elif mudanca["origem"] == "consultas":
+            self._desagendar(mudanca["id"])
+            if mudanca["op"] != "delete":
+                self._agendar(dados)
+        elif mudanca["origem"] == "cancelamentos":
+            # Cancelamentos só são gravados; um delete é um registro desfeito
+            self._contar_cancelamento(dados, -1 if mudanca["op"] == "delete" else +1)
+
+    def _definir_medico(self, medico: Dict[str, Any]):
+        self._medicos[medico["id"]] = (medico.get("nome", f"ID {medico['id']}"), medico.get("especialidade") or "N/A")
+
+    def _agendar(self, consulta: Dict[str, Any]):
+        posicao = _posicao(consulta)
+        if posicao is not None:
+            self._posicao[consulta["id"]] = posicao
+            self._contar(posicao, 0, +1)
+
+    def _contar_cancelamento(self, cancelamento: Dict[str, Any], delta: int):
+        posicao = _posicao(cancelamento)
+        if posicao is not None:
+            self._contar(posicao, 1, delta)
+
+    def _desagendar(self, consulta_id: int):
+        posicao = self._posicao.pop(consulta_id, None)
+        if posicao is not None:
+            self._contar(posicao, 0, -1)
+
+    def _contar(self, posicao: Tuple[int, str, int], coluna: int, delta: int):
+        medico, data, hora = posicao
+        celula = self._celulas.setdefault((medico, data), [0] * (2 * HORAS))
+        celula[coluna * HORAS + hora] += delta
+        if not any(celula):
+            del self._celulas[(medico, data)] # Célula zerada não ocupa memória
+        _incrementar(self._por_medico, medico, coluna, delta)
+        _incrementar(self._por_dia, data, coluna, delta)
+        self._por_hora[hora][coluna] += delta
+
+
+def _posicao(consulta: Dict[str, Any]) -> Optional[Tuple[int, str, int]]:
+    separada = separar_data_hora(consulta.get("data_hora"))
+    medico_id = consulta.get("medico_id")
+    if separada is None or not isinstance(medico_id, int):
+        return None
+    data, minuto = separada
+    return medico_id, data, minuto // 60
+
+def _incrementar(contadores: Dict[Any, List[int]], chave: Any, coluna: int, delta: int):
+    atual = contadores.setdefault(chave, [0, 0])
+    atual[coluna] += delta
+    if not atual[0] and not atual[1]:
+        del contadores[chave]
+
+def _somar(destino: List[int], agendadas: int, canceladas: int):
+    destino[0] += agendadas
+    destino[1] += canceladas
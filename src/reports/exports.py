@@ -0,0 +1,213 @@
+"""
+[SO - STREAMING DE EXPORTAÇÕES]
+Exportações das consultas em CSV, NDJSON e num formato colunar binário.
+Todas são geradores: leem o storage em lotes (storage.iterar) e devolvem
+bytes lote a lote, então a memória usada não depende do total de linhas.
+
+Formato colunar ("SOCOL2"), inspirado no Parquet, todo em little-endian:
+    b"SOCOL2\\n"
+    u32 tamanho + JSON do esquema: {"colunas": [{"nome", "tipo"}, ...]}
+    grupos de linhas (um por lote), cada um:
+        u32 linhas (0 = fim do arquivo)
+        por coluna: u32 tamanho + bloco comprimido (zlib)
+Tipos e codificação do bloco (antes do zlib):
+    int64     -> array de int64 (nulo = -2**63)
+    int32     -> array de int32 (nulo = -2**31)
+    minutos   -> u8 modo + corpo. Modo 0: int64 com minutos desde 1970-01-01
+                 ('AAAA-MM-DDTHH:MM'). Modo 1: 'texto' com o valor original,
+                 quando algum valor do grupo não volta idêntico de minutos
+                 (segundos, fuso, formato fora do padrão...)
+    texto     -> u32 offsets (linhas + 1) + bytes UTF-8 concatenados
+    categoria -> u32 entradas + u32 tamanho + dicionário ('texto') + u16 código por linha
+SOCOL1 (anterior) é igual, mas 'minutos' não tem o byte de modo (sempre int64).
+"""
+import csv
+import io
+import struct
+import sys
+import zlib
+from array import array
+from datetime import datetime, timedelta
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+from src.config.settings import RELATORIO_LOTE
+from src.core.serialization import dumps, loads
+
+COLUNAS: List[Tuple[str, str]] = [
+    ("id", "int64"),
+    ("data_hora", "minutos"),
+    ("medico_id", "int32"),
+    ("medico", "categoria"),
+    ("paciente", "texto"),
+    ("status", "categoria"),
+]
+MAGICO = b"SOCOL2\n"
+MAGICO_V1 = b"SOCOL1\n" # Ainda lido por ler_colunar
+MINUTOS, MINUTOS_TEXTO = 0, 1
+NULO_INT64 = -2 ** 63
+NULO_INT32 = -2 ** 31
+_EPOCA = datetime(1970, 1, 1)
+
+FORMATOS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "colunar": ("application/octet-stream", "socol"),
+}
+
+def _linhas(storage, indice: str, grupo: Any, de: Optional[str], ate: Optional[str],
+            mapa_medicos: Dict[int, str], lote: int) -> Iterator[List[Dict[str, Any]]]:
+    """Lotes já no esquema de exportação (médico resolvido pelo nome)."""
+    for rows in storage.iterar(indice, grupo, de, ate, lote=lote):
+        yield [{
+            "id": r.get("id"),
+            "data_hora": r.get("data_hora"),
+            "medico_id": r.get("medico_id"),
+            "medico": mapa_medicos.get(r.get("medico_id")),
+            "paciente": r.get("paciente"),
+            "status": r.get("status"),
+        } for r in rows]
+
+def exportar(formato: str, storage, indice: str, grupo: Any, de: Optional[str], ate: Optional[str],
+             mapa_medicos: Dict[int, str], lote: int = RELATORIO_LOTE) -> Iterator[bytes]:
+    """Gerador de bytes do formato pedido (para StreamingResponse)."""
+    # Códigos de categoria são u16: um grupo de linhas não passa de 65535
+    lotes = _linhas(storage, indice, grupo, de, ate, mapa_medicos, min(lote, 65535))
+    if formato == "csv":
+        return _csv(lotes)
+    if formato == "ndjson":
+        return _ndjson(lotes)
+    if formato == "colunar":
+        return _colunar(lotes)
+    raise ValueError(f"Formato desconhecido: {formato}")
+
+def _csv(lotes: Iterable[List[Dict[str, Any]]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    escritor = csv.DictWriter(buffer, fieldnames=[nome for nome, _ in COLUNAS], lineterminator="\n")
+    escritor.writeheader()
+    for lote in lotes:
+        escritor.writerows(lote)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8") # Só o cabeçalho (nenhuma linha)
+
+def _ndjson(lotes: Iterable[List[Dict[str, Any]]]) -> Iterator[bytes]:
+    for lote in lotes:
+        # Mesmo codificador das respostas da API (orjson quando instalado)
+        yield b"".join(dumps(r) + b"\n" for r in lote)
+
+# --- Colunar ---
+
+def _colunar(lotes: Iterable[List[Dict[str, Any]]]) -> Iterator[bytes]:
+    esquema = dumps({"colunas": [{"nome": n, "tipo": t} for n, t in COLUNAS]})
+    yield MAGICO + struct.pack("<I", len(esquema)) + esquema
+    for lote in lotes:
+        partes = [struct.pack("<I", len(lote))]
+        for nome, tipo in COLUNAS:
+            bloco = zlib.compress(_codificar(tipo, [r[nome] for r in lote]), 6)
+            partes.append(struct.pack("<I", len(bloco)))
+            partes.append(bloco)
+        yield b"".join(partes)
+    yield struct.pack("<I", 0) # Fim
+
+def _le(valores: array) -> bytes:
+    if sys.byteorder == "big":
+        valores.byteswap()
+    return valores.tobytes()
+
+def _de_le(codigo: str, dados: bytes) -> array:
+    valores = array(codigo)
+    valores.frombytes(dados)
+    if sys.byteorder == "big":
+        valores.byteswap()
+    return valores
+
+def _codificar(tipo: str, valores: List[Any]) -> bytes:
+    if tipo == "int64":
+        return _le(array("q", (NULO_INT64 if v is None else int(v) for v in valores)))
+    if tipo == "int32":
+        return _le(array("i", (NULO_INT32 if v is None else int(v) for v in valores)))
+    if tipo == "minutos":
+        minutos = array("q", (_minutos(v) for v in valores))
+        if all(v is None or _de_minutos(m) == v for v, m in zip(valores, minutos)):
+            return bytes([MINUTOS]) + _le(minutos)
+        # Algum valor se perderia na conversão: o grupo guarda os textos originais
+        return bytes([MINUTOS_TEXTO]) + _codificar_texto(valores)
+    if tipo == "texto":
+        return _codificar_texto(valores)
+    if tipo == "categoria":
+        dicionario: Dict[Any, int] = {}
+        codigos = array("H", (dicionario.setdefault(v, len(dicionario)) for v in valores))
+        corpo = _codificar_texto(list(dicionario))
+        return struct.pack("<II", len(dicionario), len(corpo)) + corpo + _le(codigos)
+    raise ValueError(f"Tipo desconhecido: {tipo}")
+
+def _codificar_texto(valores: List[Optional[str]]) -> bytes:
+    # Nulo = offset repetido com o bit alto ligado no final (0x80000000)
+    offsets, blob = array("I", [0]), bytearray()
+    for v in valores:
+        if v is None:
+            offsets.append(len(blob) | 0x80000000)
+        else:
+            blob += str(v).encode("utf-8")
+            offsets.append(len(blob))
+    return _le(offsets) + bytes(blob)
+
+def _minutos(data_hora: Optional[str]) -> int:
+    try:
+        return int((datetime.fromisoformat(data_hora[:16]) - _EPOCA).total_seconds()) // 60
+    except (TypeError, ValueError):
+        return NULO_INT64
+
+def _de_minutos(minutos: int) -> Optional[str]:
+    if minutos == NULO_INT64:
+        return None
+    return (_EPOCA + timedelta(minutes=minutos)).strftime("%Y-%m-%dT%H:%M")
+
+def ler_colunar(arquivo: BinaryIO) -> Iterator[Dict[str, Any]]:
+    """Leitor de referência do formato SOCOL2/SOCOL1 (linha a linha, grupo por grupo)."""
+    magico = arquivo.read(len(MAGICO))
+    if magico not in (MAGICO, MAGICO_V1):
+        raise ValueError("Arquivo não está no formato SOCOL2")
+    (tamanho,) = struct.unpack("<I", arquivo.read(4))
+    colunas = [(c["nome"], c["tipo"]) for c in loads(arquivo.read(tamanho))["colunas"]]
+    while True:
+        (linhas,) = struct.unpack("<I", arquivo.read(4))
+        if linhas == 0:
+            return
+        dados = {}
+        for nome, tipo in colunas:
+            (tamanho,) = struct.unpack("<I", arquivo.read(4))
+            bloco = zlib.decompress(arquivo.read(tamanho))
+            if tipo == "minutos" and magico == MAGICO_V1:
+                bloco = bytes([MINUTOS]) + bloco
+            dados[nome] = _decodificar(tipo, bloco, linhas)
+        for i in range(linhas):
+            yield {nome: dados[nome][i] for nome, _ in colunas}
+
+def _decodificar(tipo: str, bloco: bytes, linhas: int) -> List[Any]:
+    if tipo == "int64":
+        return [None if v == NULO_INT64 else v for v in _de_le("q", bloco)]
+    if tipo == "minutos":
+        if bloco[0] == MINUTOS_TEXTO:
+            return _decodificar_texto(bloco[1:], linhas)
+        return [_de_minutos(v) for v in _de_le("q", bloco[1:])]
+    if tipo == "int32":
+        return [None if v == NULO_INT32 else v for v in _de_le("i", bloco)]
+    if tipo == "texto":
+        return _decodificar_texto(bloco, linhas)
+    if tipo == "categoria":
+        entradas, tamanho = struct.unpack("<II", bloco[:8])
+        dicionario = _decodificar_texto(bloco[8:8 + tamanho], entradas)
+        return [dicionario[c] for c in _de_le("H", bloco[8 + tamanho:])]
+    raise ValueError(f"Tipo desconhecido: {tipo}")
+
+def _decodificar_texto(bloco: bytes, linhas: int) -> List[Optional[str]]:
+    offsets = _de_le("I", bloco[:4 * (linhas + 1)])
+    blob = bloco[4 * (linhas + 1):]
+    valores, inicio = [], 0
+    for bruto in offsets[1:]:
+        fim = bruto & 0x7FFFFFFF
+        valores.append(None if bruto & 0x80000000 else blob[inicio:fim].decode("utf-8"))
+        inicio = fim
+    return valores
@@ -1,56 +1,305 @@
+import hashlib
+import json
 import os
+import re
+import time
+import reportlab
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 from datetime import datetime
-from src.config.settings import RELATORIOS_DIR
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from src.config.settings import RELATORIOS_DIR, RELATORIO_CACHE_MAX_BYTES, RELATORIO_CACHE_MAX_IDADE_S
+
+# Progresso do desenho: (linhas, páginas) já gravadas
+Progresso = Callable[[int, int], None]
+
+# [SO - CACHE DE BLOCOS] Páginas já desenhadas de cada mês, por conteúdo
+BLOCOS_DIR = os.path.join(RELATORIOS_DIR, ".blocos")
+# Entra no digest dos blocos: mudar o desenho invalida os blocos antigos
+LAYOUT_VERSAO = 1
+FONTES = ("Helvetica-Bold", "Helvetica")
+LINHAS_POR_PAGINA = 43
+COLUNAS = (50, 200, 400)
+# Operador de fonte em um objeto de texto: "/F1 10 Tf"
+_OPERADOR_FONTE = re.compile(r"(/\S+) [\d.]+ Tf")
 
 def gerar_relatorio_pdf(consultas: list, medicos: list) -> str:
     """
     [SO - OPERAÇÃO DE I/O BINÁRIA]
     Gera um arquivo PDF escrevendo bytes diretamente em um stream.
     """
+    mapa_medicos = {m['id']: m['nome'] for m in medicos}
+    return desenhar_relatorio([consultas], mapa_medicos)["arquivo"]
+
+def gerar_relatorio_em_processo(fila, estado, mapa_medicos: Dict[int, str], filename: str,
+                                titulo: str = "", anterior: Optional[Dict[str, Any]] = None,
+                                resumo: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    [SO - PROCESSO FILHO]
+    Ponto de entrada no pool de processos: consome lotes de consultas da fila
+    (None = fim) e publica o progresso no dicionário compartilhado `estado`.
+    """
+    estado["iniciado_em"] = datetime.now().timestamp()
+
+    def progresso(linhas: int, paginas: int):
+        estado["linhas"] = linhas
+        estado["paginas"] = paginas
+
+    return desenhar_relatorio(iter(fila.get, None), mapa_medicos, progresso, filename, titulo, anterior, resumo)
+
+def desenhar_relatorio(lotes: Iterable[List[Dict[str, Any]]], mapa_medicos: Dict[int, str],
+                       progresso: Optional[Progresso] = None, filename: Optional[str] = None,
+                       titulo: str = "", anterior: Optional[Dict[str, Any]] = None,
+                       resumo: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Desenha o relatório à medida que os lotes chegam, um mês por vez.
+    [SO - REUSO INCREMENTAL]
+    - Cada mês começa numa página nova, então suas páginas só dependem das
+      consultas daquele mês: ficam em cache por digest do conteúdo. Meses
+      passados (append-only) não são redesenhados; só o mês que mudou.
+    - Se o digest do relatório inteiro for igual ao de `anterior` (mesmo
+      filtro), o arquivo anterior é devolvido sem gravar nada.
+    `resumo` (AgregadorConsultas.resumo) vira páginas de estatísticas logo
+    depois da capa.
+    """
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"relatorio_consultas_{timestamp}.pdf"
+    filename = filename or f"relatorio_consultas_{timestamp}.pdf"
     filepath = os.path.join(RELATORIOS_DIR, filename)
+    # Grava num arquivo temporário: a listagem/download nunca vê um PDF pela metade
+    parcial = filepath + ".parcial"
 
     # [SO - BUFFER DE MEMÓRIA]
     # O canvas funciona como um buffer em memória RAM onde desenhamos o documento.
-    c = canvas.Canvas(filepath, pagesize=letter)
+    c = canvas.Canvas(parcial, pagesize=letter)
     width, height = letter
+    # Registra as fontes logo de início: os blocos em cache referenciam os nomes
+    # de recurso (/F1, /F2) que o canvas atribui a elas, e esse mapeamento entra
+    # no digest de cada bloco (ver _contexto_blocos)
+    for fonte in FONTES:
+        c.setFont(fonte, 10)
+    contexto = _contexto_blocos(c)
+
+    # O total e o sumário só são conhecidos no fim do stream: a capa é um
+    # "form" (XObject) referenciado agora e desenhado depois do último lote
+    c.doForm("capa")
+    c.showPage()
+
+    total = {"linhas": 0, "paginas": 1, "blocos": 0, "reutilizados": 0}
+    meses: List[Tuple[str, int]] = []
+    digest_total = hashlib.sha1(f"v{LAYOUT_VERSAO}".encode())
+    if resumo:
+        total["paginas"] += _desenhar_resumo(c, resumo, height)
+        digest_total.update(json.dumps(resumo, sort_keys=True).encode())
+
+    def fechar_mes(mes: str, linhas: List[Tuple[str, str, str]]):
+        paginas, digest, reutilizado = _bloco_do_mes(c, contexto, mes, linhas, height)
+        for pagina in paginas:
+            for codigo in pagina:
+                # Operadores PDF gerados por PDFTextObject.getCode(): entram como estão
+                c.addLiteral(codigo)
+            c.showPage() # Paginação (Gerenciamento de Buffer)
+        meses.append((mes, len(linhas)))
+        digest_total.update(digest.encode())
+        total["linhas"] += len(linhas)
+        total["paginas"] += len(paginas)
+        total["blocos"] += 1
+        total["reutilizados"] += int(reutilizado)
+        if progresso:
+            progresso(total["linhas"], total["paginas"])
+
+    mes_atual, linhas_mes = None, []
+    try:
+        for lote in lotes:
+            for consulta in lote:
+                mes = consulta['data_hora'][:7] # Lotes chegam em ordem de data_hora
+                if mes != mes_atual:
+                    if linhas_mes:
+                        fechar_mes(mes_atual, linhas_mes)
+                    mes_atual, linhas_mes = mes, []
+                nome_medico = mapa_medicos.get(consulta['medico_id'], f"ID {consulta['medico_id']}")
+                linhas_mes.append((consulta['data_hora'].replace("T", " "), f"Dr(a). {nome_medico}",
+                                   consulta.get('paciente') or 'N/A'))
+        if linhas_mes:
+            fechar_mes(mes_atual, linhas_mes)
+
+        digest = digest_total.hexdigest()
+        if anterior and anterior.get("digest") == digest and \
+                os.path.exists(os.path.join(RELATORIOS_DIR, anterior["arquivo"])):
+            # Mesmo conteúdo do último relatório deste filtro: nada a gravar
+            os.utime(os.path.join(RELATORIOS_DIR, anterior["arquivo"]))
+            return {**total, "arquivo": anterior["arquivo"], "digest": digest, "reutilizado": True}
+
+        c.beginForm("capa")
+        _desenhar_capa(c, titulo or f"Relatório do Sistema - {timestamp}", total["linhas"], meses, height, width)
+        c.endForm()
+
+        # [SO - FLUSH TO DISK]
+        # O método save() realiza a descarga (flush) do buffer da memória para o disco físico.
+        c.save()
+        os.replace(parcial, filepath) # Publicação atômica
+    except BaseException:
+        if os.path.exists(parcial):
+            os.remove(parcial)
+        raise
 
-    # ... (Lógica de desenho do PDF) ...
+    return {**total, "arquivo": filename, "digest": digest, "reutilizado": False}
+
+def _desenhar_capa(c, titulo: str, linhas: int, meses: List[Tuple[str, int]], height: float, width: float):
     c.setFont("Helvetica-Bold", 16)
-    c.drawString(50, height - 50, f"Relatório do Sistema - {timestamp}")
+    c.drawString(50, height - 50, titulo)
     c.setFont("Helvetica", 10)
-    c.drawString(50, height - 70, f"Total de Consultas Agendadas: {len(consultas)}")
+    c.drawString(50, height - 70, f"Total de Consultas Agendadas: {linhas}")
     c.line(50, height - 80, width - 50, height - 80)
-
     y = height - 100
-    c.setFont("Helvetica-Bold", 10)
-    c.drawString(50, y, "DATA/HORA")
-    c.drawString(200, y, "MÉDICO")
-    c.drawString(400, y, "PACIENTE")
-    
-    y -= 20
-    c.setFont("Helvetica", 10)
+    cabem = int((y - 50) / 15)
+    for i, (mes, quantidade) in enumerate(meses):
+        if i == cabem - 1 and len(meses) > cabem:
+            c.drawString(50, y, f"... e mais {len(meses) - i} mês(es)")
+            break
+        c.drawString(50, y, f"{mes}: {quantidade} consulta(s)")
+        y -= 15
 
-    mapa_medicos = {m['id']: m['nome'] for m in medicos}
+def _desenhar_resumo(c, resumo: Dict[str, Any], height: float) -> int:
+    """Tabelas de agendadas/canceladas por médico, especialidade, hora e dia; retorna as páginas."""
+    def contagens(linha: Dict[str, Any]) -> Tuple[str, str]:
+        return str(linha["agendadas"]), str(linha["canceladas"])
 
-    for consulta in consultas:
-        if y < 50:
-            c.showPage() # Paginação (Gerenciamento de Buffer)
-            y = height - 50
-        
-        data_fmt = consulta['data_hora'].replace("T", " ")
-        nome_medico = mapa_medicos.get(consulta['medico_id'], f"ID {consulta['medico_id']}")
-        
-        c.drawString(50, y, data_fmt)
-        c.drawString(200, y, f"Dr(a). {nome_medico}")
-        c.drawString(400, y, consulta.get('paciente', 'N/A'))
-        y -= 15
+    # Dias em três grupos lado a lado: (data, agendadas, canceladas) x 3 por linha
+    dias = [(l["data"], *contagens(l)) for l in resumo["por_dia"]]
+    secoes = [
+        ("Por médico", ("MÉDICO", "ESPECIALIDADE", "AGENDADAS", "CANCELADAS"), (50, 250, -470, -560),
+         [(f"Dr(a). {l['nome']}", l["especialidade"], *contagens(l)) for l in resumo["por_medico"]]),
+        ("Por especialidade", ("ESPECIALIDADE", "AGENDADAS", "CANCELADAS"), (50, -470, -560),
+         [(l["especialidade"], *contagens(l)) for l in resumo["por_especialidade"]]),
+        ("Por faixa de horário", ("HORA", "AGENDADAS", "CANCELADAS"), (50, -470, -560),
+         [(l["hora"], *contagens(l)) for l in resumo["por_hora"]]),
+        ("Por dia", ("DIA", "AGEND.", "CANC.") * 3, (50, -150, -190, 230, -330, -370, 410, -510, -550),
+         [sum(dias[i:i + 3], ()) for i in range(0, len(dias), 3)]),
+    ]
+
+    paginas, y = 1, height - 50
+    c.setFont("Helvetica-Bold", 14)
+    c.drawString(50, y, "Resumo: consultas agendadas / canceladas")
+    y -= 30
+    for titulo, cabecalho, colunas, linhas in secoes:
+        if y < 50 + 3 * 15: # Título + cabeçalho + uma linha
+            c.showPage()
+            paginas, y = paginas + 1, height - 50
+        c.setFont("Helvetica-Bold", 12)
+        c.drawString(50, y, titulo)
+        y -= 20
+        for i, linha in enumerate([cabecalho] + linhas):
+            if y < 50:
+                c.showPage()
+                paginas, y = paginas + 1, height - 50
+            c.setFont("Helvetica-Bold" if i == 0 else "Helvetica", 10)
+            for x, texto in zip(colunas, linha):
+                # x negativo = coluna numérica, alinhada à direita em -x
+                if x < 0:
+                    c.drawRightString(-x, y, texto)
+                else:
+                    c.drawString(x, y, texto)
+            y -= 15
+        y -= 10
+    c.showPage()
+    return paginas
+
+def _contexto_blocos(c) -> str:
+    """
+    Tudo de que o código PDF de um bloco depende além das linhas: versão do
+    layout e do ReportLab e os nomes de recurso (/F1, /F2...) das fontes neste
+    canvas, lidos do código de um objeto de texto (API pública). Entra no
+    digest: um bloco só é reusado onde seria idêntico.
+    """
+    nomes = []
+    for fonte in FONTES:
+        t = c.beginText()
+        t.setFont(fonte, 10)
+        nome = _OPERADOR_FONTE.search(t.getCode())
+        nomes.append(f"{fonte}={nome.group(1) if nome else '?'}")
+    return f"v{LAYOUT_VERSAO}|reportlab {reportlab.Version}|{','.join(nomes)}"
+
+def _bloco_do_mes(c, contexto: str, mes: str, linhas: List[Tuple[str, str, str]],
+                  height: float) -> Tuple[List[List[str]], str, bool]:
+    """Páginas (código de texto PDF) de um mês: do cache, ou desenhadas e guardadas."""
+    h = hashlib.sha1(f"{contexto}|{mes}".encode())
+    for linha in linhas:
+        h.update("\x1f".join(linha).encode("utf-8"))
+        h.update(b"\n")
+    digest = h.hexdigest()
+    caminho = os.path.join(BLOCOS_DIR, f"{digest}.json")
+    try:
+        with open(caminho, "r", encoding="utf-8") as f:
+            paginas = json.load(f)
+        os.utime(caminho) # Mais recente no LRU
+        return paginas, digest, True
+    except (OSError, ValueError):
+        pass
+
+    paginas = []
+    for inicio in range(0, len(linhas), LINHAS_POR_PAGINA):
+        paginas.append(_desenhar_pagina(c, mes, linhas[inicio:inicio + LINHAS_POR_PAGINA], height))
+
+    # Escrita atômica: um bloco pela metade nunca é lido
+    os.makedirs(BLOCOS_DIR, exist_ok=True)
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, "w", encoding="utf-8") as f:
+        json.dump(paginas, f)
+    os.replace(temporario, caminho)
+    return paginas, digest, False
+
+def _desenhar_pagina(c, mes: str, linhas: List[Tuple[str, str, str]], height: float) -> List[str]:
+    # Objetos de texto (um por coluna) em vez de um drawString por célula
+    t = c.beginText(50, height - 50)
+    t.setFont("Helvetica-Bold", 12)
+    t.textOut(f"Consultas de {mes}")
+    codigos = [t.getCode()]
+    for x, titulo in zip(COLUNAS, ("DATA/HORA", "MÉDICO", "PACIENTE")):
+        t = c.beginText(x, height - 78)
+        t.setFont("Helvetica-Bold", 10)
+        t.textOut(titulo)
+        codigos.append(t.getCode())
+
+    for i, x in enumerate(COLUNAS):
+        t = c.beginText(x, height - 98)
+        t.setFont("Helvetica", 10)
+        t.setLeading(15)
+        for linha in linhas:
+            t.textLine(linha[i])
+        codigos.append(t.getCode())
+    return codigos
+
+def podar_relatorios(max_bytes: int = RELATORIO_CACHE_MAX_BYTES, max_idade_s: float = RELATORIO_CACHE_MAX_IDADE_S) -> int:
+    """
+    [SO - POLÍTICA DE SUBSTITUIÇÃO (LRU)]
+    Apaga PDFs e blocos mais velhos que max_idade_s e, se data/relatorios
+    ainda passar de max_bytes, os usados há mais tempo (mtime é renovado a
+    cada reuso). Arquivos .parcial (jobs em andamento) não são tocados.
+    """
+    arquivos = []
+    for pasta in (RELATORIOS_DIR, BLOCOS_DIR):
+        if not os.path.isdir(pasta):
+            continue
+        for nome in os.listdir(pasta):
+            if nome.endswith(".pdf") or (pasta == BLOCOS_DIR and nome.endswith(".json")):
+                caminho = os.path.join(pasta, nome)
+                try:
+                    st = os.stat(caminho)
+                except OSError:
+                    continue
+                arquivos.append((st.st_mtime, st.st_size, caminho))
 
-    # [SO - FLUSH TO DISK]
-    # O método save() realiza a descarga (flush) do buffer da memória para o disco físico.
-    c.save()
-    
-    return filename
\ No newline at end of file
+    arquivos.sort() # Mais antigos primeiro
+    agora = time.time()
+    total = sum(tamanho for _, tamanho, _ in arquivos)
+    removidos = 0
+    for mtime, tamanho, caminho in arquivos:
+        if agora - mtime <= max_idade_s and total <= max_bytes:
+            break
+        try:
+            os.remove(caminho)
+            removidos += 1
+            total -= tamanho
+        except OSError:
+            pass
+    return removidos
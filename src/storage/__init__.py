@@ -1 +1,8 @@
-from .database import JsonStorage
\ No newline at end of file
+from .database import JsonStorage
+from .indexes import UniqueConstraintError
+from .sqlite_backend import SqliteStorage
+from .partitions import PartitionedStorage, ParticaoSeladaError, particao_quente
+from .changes import ChangeFeed, SqliteChangeFeed
+from .registry import get_storage, get_change_feed, close_all
+from .async_storage import AsyncStorage, get_async_storage, run_io
+from .simulation import SimulacaoCarga, simulacao
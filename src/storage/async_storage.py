@@ -0,0 +1,70 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from src.config.settings import IO_WORKERS
+from .registry import Storage, get_storage
+
+# [SO - THREAD POOL DE I/O]
+# O event loop é uma única thread: qualquer syscall bloqueante nele (open,
+# write, fsync, time.sleep) congela TODOS os clientes. As chamadas ao storage
+# são despachadas para este pool dedicado e o loop só aguarda o Future.
+_io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="storage-io")
+
+async def run_io(func: Callable, *args: Any, **kwargs: Any) -> Any:
+    """Executa uma função bloqueante no pool de I/O sem travar o event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_io_executor, functools.partial(func, *args, **kwargs))
+
+
+class AsyncStorage:
+    """
+    Fachada assíncrona sobre um storage síncrono (JsonStorage/SqliteStorage).
+    Mesma interface, mas cada método é uma corrotina executada no pool de I/O.
+    """
+
+    def __init__(self, storage: Storage):
+        self.sync = storage
+
+    async def read(self) -> List[Dict[str, Any]]:
+        return await run_io(self.sync.read)
+
+    async def add(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        return await run_io(self.sync.add, item)
+
+    async def update(self, item_id: int, updates: Dict[str, Any]) -> bool:
+        return await run_io(self.sync.update, item_id, updates)
+
+    async def delete(self, item_id: int) -> bool:
+        return await run_io(self.sync.delete, item_id)
+
+    async def get(self, item_id: int) -> Optional[Dict[str, Any]]:
+        return await run_io(self.sync.get, item_id)
+
+    async def find_by(self, indice: str, *chave: Any) -> List[Dict[str, Any]]:
+        return await run_io(self.sync.find_by, indice, *chave)
+
+    async def find_one(self, indice: str, *chave: Any) -> Optional[Dict[str, Any]]:
+        return await run_io(self.sync.find_one, indice, *chave)
+
+    async def seq_de(self, item_id: int) -> int:
+        return await run_io(self.sync.seq_de, item_id)
+
+    async def range(self, indice: str, grupo: Any = None, de: Any = None, ate: Any = None,
+                    apos: Optional[Tuple[Any, int]] = None, limite: Optional[int] = None) -> List[Dict[str, Any]]:
+        return await run_io(self.sync.range, indice, grupo, de, ate, apos, limite)
+
+
+_async_storages: Dict[str, AsyncStorage] = {}
+_async_lock = threading.Lock()
+
+def get_async_storage(filename: str) -> AsyncStorage:
+    """Fachada assíncrona (cacheada) do storage compartilhado de um arquivo."""
+    storage = get_storage(filename)
+    with _async_lock:
+        fachada = _async_storages.get(id(storage))
+        if fachada is None:
+            fachada = AsyncStorage(storage)
+            _async_storages[id(storage)] = fachada
+        return fachada
@@ -0,0 +1,150 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Dict, List, Optional, Union
+from src.config.settings import FEED_RETENCAO
+from src.core.serialization import dumps_texto, loads
+
+class ChangeFeed:
+    """
+    [SO - LOG DE MUDANÇAS (CHANGE DATA CAPTURE)]
+    Sequência global e monotônica de mudanças do armazenamento em RAM
+    (backend json). Cada add/update/delete registra, dentro da região crítica
+    do storage, {seq, origem, op, id, dados}; clientes pedem só o que veio
+    depois do último `seq` que viram.
+    - Buffer circular com as últimas FEED_RETENCAO mudanças: seqs são
+      contíguos, então localizar `since` é aritmética O(1).
+    - A `epoca` muda a cada boot do processo: um cliente com seq de outra
+      época (ou mais antigo que o buffer) recebe `reset` e recarrega tudo.
+    """
+
+    def __init__(self, retencao: int = FEED_RETENCAO):
+        self._lock = threading.Lock()
+        self._registros: deque = deque(maxlen=max(1, retencao))
+        self._ultimo_por_item: Dict[tuple, int] = {}
+        self._seq = 0
+        self.epoca = uuid.uuid4().hex[:12]
+
+    def registrar(self, origem: str, op: str, item_id: int, dados: Optional[Dict[str, Any]]) -> int:
+        with self._lock:
+            self._seq += 1
+            self._registros.append({"seq": self._seq, "origem": origem, "op": op, "id": item_id, "dados": dados})
+            self._ultimo_por_item[(origem, item_id)] = self._seq
+            return self._seq
+
+    def seq_atual(self) -> int:
+        return self._seq
+
+    def seq_de(self, origem: str, item_id: int) -> int:
+        """Seq da última mudança de um item (para carimbar o broadcast correspondente)."""
+        with self._lock:
+            return self._ultimo_por_item.get((origem, item_id), self._seq)
+
+    def desde(self, since: Optional[int], epoca: Optional[str] = None, limite: int = 1000) -> Dict[str, Any]:
+        with self._lock:
+            seq = self._seq
+            primeiro = self._registros[0]["seq"] if self._registros else seq + 1
+            if since is None or (epoca and epoca != self.epoca) or since > seq or since < primeiro - 1:
+                return _resposta(self.epoca, seq, [], reset=since is not None)
+            inicio = since - primeiro + 1
+            mudancas = [self._registros[i] for i in range(inicio, min(len(self._registros), inicio + limite))]
+        fim = mudancas[-1]["seq"] if mudancas else seq
+        return _resposta(self.epoca, fim, mudancas, mais=fim < seq)
+
+
+class SqliteChangeFeed:
+    """
+    Mesmo contrato do ChangeFeed, persistido no banco do SqliteStorage:
+    - Tabela _mudancas (seq AUTOINCREMENT) gravada NA MESMA transação da
+      mudança de dados: o log nunca diverge da tabela, mesmo entre processos.
+    - A época fica na tabela _meta e sobrevive a reinícios.
+    - Mudanças além de FEED_RETENCAO são podadas periodicamente.
+    """
+
+    def __init__(self, db_path: str, retencao: int = FEED_RETENCAO):
+        self._retencao = max(1, retencao)
+        self._lock = threading.Lock()
+        self._db_path = db_path
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conexao: Optional[sqlite3.Connection] = None
+        with self._lock:
+            self._abrir()
+        criar_tabelas(self._conexao)
+        self._conexao.execute("INSERT OR IGNORE INTO _meta (chave, valor) VALUES ('epoca', ?)", (uuid.uuid4().hex[:12],))
+        self.epoca = self._conexao.execute("SELECT valor FROM _meta WHERE chave = 'epoca'").fetchone()[0]
+
+    def _abrir(self):
+        # Com o lock adquirido: no boot e no primeiro uso após close()
+        if self._conexao is None:
+            self._conexao = sqlite3.connect(self._db_path, check_same_thread=False, isolation_level=None, timeout=30)
+            self._conexao.execute("PRAGMA journal_mode=WAL")
+
+    def registrar_em(self, conexao: sqlite3.Connection, origem: str, op: str, item_id: int,
+                     dados: Optional[Dict[str, Any]]) -> int:
+        """Chamado dentro da transação (BEGIN IMMEDIATE) do storage."""
+        seq = conexao.execute(
+            "INSERT INTO _mudancas (origem, op, item_id, dados, criado_em) VALUES (?, ?, ?, ?, ?)",
+            (origem, op, item_id, None if dados is None else dumps_texto(dados), time.time())
+        ).lastrowid
+        if seq % 1000 == 0:
+            conexao.execute("DELETE FROM _mudancas WHERE seq <= ?", (seq - self._retencao,))
+        return seq
+
+    def _consultar(self, sql: str, parametros: tuple = ()) -> List[tuple]:
+        with self._lock:
+            self._abrir()
+            return self._conexao.execute(sql, parametros).fetchall()
+
+    def seq_atual(self) -> int:
+        # sqlite_sequence guarda o último seq emitido, mesmo após a poda
+        linha = self._consultar("SELECT seq FROM sqlite_sequence WHERE name = '_mudancas'")
+        return linha[0][0] if linha else 0
+
+    def seq_de(self, origem: str, item_id: int) -> int:
+        linha = self._consultar("SELECT MAX(seq) FROM _mudancas WHERE origem = ? AND item_id = ?", (origem, item_id))
+        return linha[0][0] if linha and linha[0][0] is not None else self.seq_atual()
+
+    def desde(self, since: Optional[int], epoca: Optional[str] = None, limite: int = 1000) -> Dict[str, Any]:
+        with self._lock:
+            self._abrir()
+            # Leitura consistente: seq atual e mudanças vêm do mesmo snapshot
+            self._conexao.execute("BEGIN")
+            try:
+                linha = self._conexao.execute("SELECT seq FROM sqlite_sequence WHERE name = '_mudancas'").fetchone()
+                seq = linha[0] if linha else 0
+                primeiro = self._conexao.execute("SELECT MIN(seq) FROM _mudancas").fetchone()[0] or seq + 1
+                if since is None or (epoca and epoca != self.epoca) or since > seq or since < primeiro - 1:
+                    return _resposta(self.epoca, seq, [], reset=since is not None)
+                linhas = self._conexao.execute(
+                    "SELECT seq, origem, op, item_id, dados FROM _mudancas WHERE seq > ? ORDER BY seq LIMIT ?",
+                    (since, limite)).fetchall()
+            finally:
+                self._conexao.execute("COMMIT")
+        mudancas = [{"seq": s, "origem": o, "op": op, "id": i, "dados": loads(d) if d else None}
+                    for s, o, op, i, d in linhas]
+        fim = mudancas[-1]["seq"] if mudancas else seq
+        return _resposta(self.epoca, fim, mudancas, mais=fim < seq)
+
+    def close(self):
+        with self._lock:
+            if self._conexao is not None:
+                self._conexao.close()
+                self._conexao = None
+
+
+Feed = Union[ChangeFeed, SqliteChangeFeed]
+
+def criar_tabelas(conexao: sqlite3.Connection):
+    conexao.executescript("""
+        CREATE TABLE IF NOT EXISTS _meta (chave TEXT PRIMARY KEY, valor TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS _mudancas (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT, origem TEXT NOT NULL, op TEXT NOT NULL,
+            item_id INTEGER NOT NULL, dados TEXT, criado_em REAL NOT NULL);
+        CREATE INDEX IF NOT EXISTS _mudancas_item ON _mudancas (origem, item_id);
+    """)
+
+def _resposta(epoca: str, seq: int, mudancas: List[Dict[str, Any]], reset: bool = False, mais: bool = False) -> Dict[str, Any]:
+    return {"epoca": epoca, "seq": seq, "reset": reset, "mais": mais, "mudancas": mudancas}
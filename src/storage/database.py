@@ -1,24 +1,96 @@
+import glob
+import itertools
 import json
 import os
 import threading
 import time
-from typing import List, Dict, Any
-from src.config.settings import DATA_DIR
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Sequence, Tuple
+from src.config.settings import (
+    DATA_DIR, WAL_COMPACTACAO_REGISTROS, GROUP_COMMIT_JANELA_MS, GROUP_COMMIT_MAX_ITENS
+)
+from src.core.metrics import LockMedido, registrar_io
+from src.core.serialization import dumps, dumps_texto, loads
+from .changes import ChangeFeed
+from .group_commit import CommitTicket, GroupCommitter
+from .indexes import UniqueConstraintError, lotes_por_cursor
+from .records import TabelaColunar
+from .simulation import SimulacaoCarga, simulacao as simulacao_padrao
 
 class JsonStorage:
-    def __init__(self, filename: str):
+    """
+    Motor de armazenamento baseado em Journaling (Write-Ahead Log).
+
+    [SO - SISTEMA DE ARQUIVOS COM JOURNAL]
+    - A tabela materializada vive na RAM (dicionário id -> registro).
+    - Cada mutação (add/update/delete) vira UMA linha acrescentada ao final
+      do arquivo de log (<arquivo>.json.wal). Nunca reescrevemos o arquivo todo.
+    - Periodicamente o log é "selado" e compactado em background: a tabela vira
+      um novo snapshot (<arquivo>.json) gravado via arquivo temporário + rename
+      atômico. Um crash no meio da escrita nunca trunca o dataset.
+    - Escritas concorrentes são agrupadas (group commit): um write + um fsync
+      por lote; cada chamador só retorna após o seu registro estar no disco.
+    - No boot: snapshot + segmentos selados + cauda do log (replay).
+    - Índices secundários (HashIndex/SortedIndex) são mantidos em RAM junto
+      com a tabela; índices únicos são verificados dentro da região crítica.
+    """
+
+    def __init__(self, filename: str, compactar_a_cada: int = WAL_COMPACTACAO_REGISTROS,
+                 indices: Sequence = (), simulacao: Optional[SimulacaoCarga] = None,
+                 feed: Optional[ChangeFeed] = None, colunas: Sequence = (),
+                 validar: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 somente_leitura: bool = False):
         """
         Inicializa o gerenciador de arquivo com um LOCK específico.
+        `feed` (opcional) recebe cada mudança para a sincronização incremental.
+        `colunas` (schema.colunas_para) define o layout compacto da tabela em RAM.
+        `validar` (opcional) é chamada dentro da região crítica com cada versão
+        de registro que uma escrita toca (nova, antiga ou removida) e recusa a
+        escrita levantando uma exceção.
+        `somente_leitura` só reconstrói a tabela (migração, inspeção): nenhum
+        arquivo é criado ou truncado, não há committer e escritas são recusadas.
         """
         self.filepath = os.path.join(DATA_DIR, filename)
-        
+        self.origem = os.path.splitext(os.path.basename(filename))[0]
+        self._feed = feed
+        self._validar = validar
+        self.wal_path = self.filepath + '.wal'
+        self.meta_path = self.filepath + '.meta'
+        self._compactar_a_cada = max(1, compactar_a_cada)
+        self._simulacao = simulacao or simulacao_padrao
+
         # [SO - CONCORRÊNCIA] Primitiva de Sincronização (Mutex)
         # Este objeto Lock garante a Exclusão Mútua. Apenas uma thread pode
-        # possuir este lock por vez.
-        self._lock = threading.Lock()
-        
+        # possuir este lock por vez. (LockMedido: mede espera e posse em /metrics)
+        self._lock = LockMedido(os.path.basename(self.filepath))
+
+        # [SO - MEMÓRIA PRINCIPAL] Tabela materializada (id -> registro), em
+        # layout colunar: os dicts só são montados na saída (get/read/range).
+        self._rows = TabelaColunar(colunas)
+        # [SO - COPY-ON-WRITE] Visão imutável publicada para os leitores.
+        # Escritores apenas a invalidam; leitores nunca esperam pelo lock
+        # enquanto houver uma visão válida.
+        # A visão carrega o LSN em que foi tirada: (lsn, cópia congelada da tabela)
+        self._snapshot: Optional[Tuple[int, TabelaColunar]] = None
+        self._indices = {indice.nome: indice for indice in indices}
+        self._next_id = 1
+        self._lsn = 0             # Log Sequence Number do último registro aplicado
+        self._wal_registros = 0   # Registros no segmento ativo
+        self._compactando = False
+        self._somente_leitura = somente_leitura
+        self._wal = None
+        self._committer: Optional[GroupCommitter] = None
+        self._fechando = False
+
+        if somente_leitura:
+            self._recover()
+            return
+
         # Garante que o arquivo existe (Syscall de criação)
         self._ensure_file_exists()
+        self._recover()
+        with self._lock:
+            self._abrir_log()
+            self._maybe_compact()
 
     def _ensure_file_exists(self):
         """
@@ -31,98 +103,559 @@ class JsonStorage:
             os.makedirs(directory, exist_ok=True) # Syscall: mkdir
 
         if not os.path.exists(self.filepath):
-            with open(self.filepath, 'w') as f: # Syscall: open/write
-                json.dump([], f)
+            _atomic_write_json(self.filepath, [])
 
-    def read(self) -> List[Dict[str, Any]]:
+    # --- Recuperação (Replay) ---
+
+    def _recover(self):
         """
-        Lê os dados do arquivo.
-        [SO - PROBLEMA LEITORES/ESCRITORES]
-        Protegemos até a leitura para evitar ler um arquivo que está sendo
-        escrito pela metade (Dirty Read).
+        [SO - RECUPERAÇÃO DE FALHAS]
+        Reconstrói a tabela: snapshot + segmentos selados + log ativo.
+        As operações são idempotentes, então reaplicar um segmento que já
+        estava no snapshot (crash durante a compactação) é seguro.
+        """
+        try:
+            inicio = time.perf_counter()
+            with open(self.filepath, 'rb') as f:
+                snapshot = loads(f.read())
+                registrar_io(os.path.basename(self.filepath), "read", inicio, os.fstat(f.fileno()).st_size)
+        except (json.JSONDecodeError, FileNotFoundError):
+            snapshot = []
+        ids = [item["id"] for item in snapshot if isinstance(item.get("id"), int)]
+        self._next_id = max(ids, default=0) + 1
+        for item in snapshot:
+            if item.get("id") in self._rows:
+                # [LEGADO] Versões antigas geravam IDs repetidos (len + 1 após deleções)
+                item = {k: v for k, v in item.items() if k != "id"}
+            self._put(item)
+
+        try:
+            with open(self.meta_path, 'rb') as f:
+                self._lsn = loads(f.read()).get("lsn", 0)
+        except (json.JSONDecodeError, FileNotFoundError):
+            pass
+
+        for segmento in self._sealed_segments():
+            self._replay(segmento, truncar_cauda=False)
+        self._wal_registros = self._replay(self.wal_path, truncar_cauda=not self._somente_leitura)
+
+    def _sealed_segments(self) -> List[str]:
+        # O sufixo é o LSN com zeros à esquerda: ordem alfabética == ordem temporal
+        return sorted(glob.glob(glob.escape(self.wal_path) + '.*'))
+
+    def _replay(self, path: str, truncar_cauda: bool) -> int:
+        """Aplica os registros de um segmento e retorna quantos foram lidos."""
+        if not os.path.exists(path):
+            return 0
+        aplicados = 0
+        offset_valido = 0
+        inicio = time.perf_counter()
+        with open(path, 'rb') as f:
+            for linha in f:
+                try:
+                    registro = loads(linha)
+                except ValueError:
+                    # [SO - ESCRITA PARCIAL] Linha rasgada por um crash no meio do write.
+                    print(f"[SO - WAL] Registro corrompido ignorado em {path} (offset {offset_valido})")
+                    break
+                self._apply(registro)
+                aplicados += 1
+                offset_valido += len(linha)
+        registrar_io(os.path.basename(self.wal_path), "read", inicio, offset_valido)
+
+        if truncar_cauda and offset_valido < os.path.getsize(path):
+            # Descarta a cauda rasgada para que novos appends não fiquem "colados" nela
+            with open(path, 'r+b') as f:
+                f.truncate(offset_valido)
+        return aplicados
+
+    def _apply(self, registro: Dict[str, Any]):
+        op = registro.get("op")
+        if op == "add":
+            self._put(registro["item"])
+        elif op == "update":
+            atual = self._rows.get(registro["id"])
+            if atual is not None:
+                self._set_row(registro["id"], {**atual, **registro["updates"]})
+        elif op == "delete":
+            self._drop_row(registro["id"])
+        elif op == "descartar":
+            self._drop_rows(registro["ids"])
+        self._lsn = max(self._lsn, registro.get("lsn", 0))
+
+    def _put(self, item: Dict[str, Any]):
+        item_id = item.get("id")
+        if item_id is None:
+            item_id = self._next_id
+            item = {**item, "id": item_id}
+        self._set_row(item_id, item)
+        if isinstance(item_id, int) and item_id >= self._next_id:
+            self._next_id = item_id + 1
+
+    def _set_row(self, item_id: int, row: Dict[str, Any]):
+        """Insere/substitui um registro mantendo os índices coerentes."""
+        antigo = self._rows.get(item_id)
+        # Os índices recebem a forma canônica: textos repetidos vêm do pool da coluna
+        row = self._rows.put(item_id, row)
+        for indice in self._indices.values():
+            if antigo is not None:
+                indice.remove(item_id, antigo)
+            indice.add(item_id, row)
+
+    def _drop_row(self, item_id: int):
+        antigo = self._rows.pop(item_id)
+        if antigo is not None:
+            for indice in self._indices.values():
+                indice.remove(item_id, antigo)
+
+    def _drop_rows(self, ids: Iterable[int]) -> List[Tuple[int, Dict[str, Any]]]:
+        """Remoção em lote: os índices são ajustados uma vez para o lote inteiro."""
+        removidos = []
+        for item_id in ids:
+            antigo = self._rows.pop(item_id)
+            if antigo is not None:
+                removidos.append((item_id, antigo))
+        for indice in self._indices.values():
+            indice.remove_lote(removidos)
+        return removidos
+
+    def _check_unique(self, item_id: Optional[int], row: Dict[str, Any]):
+        """
+        [SO - EXCLUSÃO MÚTUA NO DADO]
+        Deve ser chamado com o lock adquirido: a verificação e a escrita formam
+        uma única operação atômica (sem a corrida do "lê, confere, grava").
+        """
+        for indice in self._indices.values():
+            if getattr(indice, 'unique', False) and indice.conflito(item_id, row):
+                raise UniqueConstraintError(indice.nome, indice.chave(row))
+
+    # --- Journaling ---
+
+    def _abrir_log(self):
+        """
+        [SO - DESCRITOR DE ARQUIVO] O log fica aberto em modo append.
+        Só a thread do GroupCommitter escreve nele (escritor único).
+        Chamado com o lock adquirido: no boot e na primeira escrita após close().
+        """
+        self._wal = open(self.wal_path, 'a', encoding='utf-8')
+        self._committer = GroupCommitter(
+            self._persistir_lote, GROUP_COMMIT_JANELA_MS, GROUP_COMMIT_MAX_ITENS,
+            nome=f"wal-{os.path.basename(self.filepath)}", ao_falhar=self._desfazer_lote
+        )
+
+    def _garantir_log(self):
+        # Com o lock adquirido e ANTES de mexer na tabela: uma escrita recusada não deixa rastro
+        if self._somente_leitura:
+            raise RuntimeError(f"{self.filepath} aberto somente para leitura")
+        if self._fechando:
+            raise RuntimeError(f"{self.filepath} em encerramento")
+        if self._committer is None:
+            self._abrir_log()
+
+    def _append_wal(self, registro: Dict[str, Any], desfazer: List[Tuple[int, Optional[Dict[str, Any]]]],
+                    publicado: bool = True) -> CommitTicket:
         """
-        with self._lock: # Adquire o Mutex
+        Numera o registro e o entrega ao GroupCommitter. Deve ser chamado com o
+        lock adquirido, o que garante que a ordem no log é a ordem do LSN.
+        `desfazer` traz (id, versão anterior ou None) de cada registro que a
+        mutação vai tocar, para o caso de o lote não chegar ao disco.
+        O chamador aguarda o ticket (fsync) DEPOIS de liberar o lock.
+        """
+        self._garantir_log()
+        lsn = self._lsn + 1
+        registro["lsn"] = lsn
+        ticket = self._committer.submit(_Registro(dumps_texto(registro) + "\n", lsn, desfazer, publicado))
+        self._lsn = lsn
+        self._wal_registros += 1
+        return ticket
+
+    def _persistir_lote(self, lote: List[Any]):
+        """
+        [SO - I/O APPEND + FSYNC EM LOTE]
+        Executado apenas pela thread do GroupCommitter. Grava as linhas do lote
+        com um único write e força a descarga com um único fsync. Um marcador
+        _Selo no meio do lote fecha o segmento atual exatamente naquele ponto.
+        """
+        registros: List[_Registro] = []
+        for item in lote:
+            if isinstance(item, _Selo):
+                self._descarregar(registros)
+                registros = []
+                item.aplicado = True
+                self._selar(item)
+            else:
+                registros.append(item)
+        self._descarregar(registros)
+
+    def _descarregar(self, registros: List["_Registro"]):
+        if not registros:
+            return
+        inicio = time.perf_counter()
+        dados = "".join(r.linha for r in registros)
+        tamanho = os.fstat(self._wal.fileno()).st_size
+        try:
+            self._wal.write(dados)
+            self._wal.flush()
+            os.fsync(self._wal.fileno()) # Syscall: fsync (durabilidade)
+        except OSError:
+            # Nada do lote fica no log: o replay nunca vê metade dele
             try:
-                if not os.path.exists(self.filepath):
-                    return []
-                with open(self.filepath, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except (json.JSONDecodeError, FileNotFoundError):
-                return [] 
-            # O Lock é liberado automaticamente aqui
+                self._wal.truncate(tamanho)
+                self._wal.seek(0, os.SEEK_END)
+            except OSError:
+                pass
+            raise
+        for registro in registros:
+            registro.persistido = True
+        registrar_io(os.path.basename(self.wal_path), "write", inicio, len(dados.encode("utf-8")))
+
+    def _desfazer_lote(self, lote: List[Any], erro: BaseException):
+        """
+        [SO - ROLLBACK] Chamado pelo committer quando um lote não chega ao disco.
+        As mutações já estavam na RAM (aplicadas antes do fsync): são desfeitas
+        na ordem inversa, junto com tudo o que ainda estava na fila (construído
+        por cima delas). Quem consome o feed recebe o estado restaurado.
+        """
+        with self._lock:
+            itens = list(lote) + self._committer.cancelar_pendentes(erro)
+            if any(isinstance(i, _Selo) and not i.aplicado for i in itens):
+                self._compactando = False # O selo não chegou a fechar o segmento
+            perdidos = [i for i in itens if isinstance(i, _Registro) and not i.persistido]
+            if not perdidos:
+                return
+            publicados = {item_id: self._rows.get(item_id)
+                          for r in perdidos if r.publicado for item_id, _ in r.desfazer}
+            for registro in reversed(perdidos):
+                for item_id, antigo in reversed(registro.desfazer):
+                    if antigo is None:
+                        self._drop_row(item_id)
+                    else:
+                        self._set_row(item_id, antigo)
+            self._lsn = perdidos[0].lsn - 1
+            self._wal_registros = max(0, self._wal_registros - len(perdidos))
+            for item_id, desfeito in publicados.items():
+                restaurado = self._rows.get(item_id)
+                if restaurado is None:
+                    if desfeito is not None:
+                        self._registrar_mudanca("delete", item_id, desfeito)
+                elif desfeito is None:
+                    self._registrar_mudanca("add", item_id, restaurado)
+                else:
+                    self._registrar_mudanca("update", item_id, restaurado)
+            self._invalidar_visao()
+        print(f"[SO - WAL] {len(perdidos)} mutação(ões) desfeita(s) em {self.filepath}: {erro}")
+
+    def _selar(self, selo: "_Selo"):
+        selado = f"{self.wal_path}.{selo.lsn:012d}"
+        self._wal.close()
+        try:
+            os.replace(self.wal_path, selado) # Syscall: rename (atômico)
+        except OSError as e:
+            # Sem selo não há compactação; o log segue crescendo no mesmo arquivo
+            print(f"[SO - WAL] Falha ao selar {self.wal_path}: {e}")
+            with self._lock:
+                self._compactando = False
+            return
+        finally:
+            self._wal = open(self.wal_path, 'a', encoding='utf-8')
+        threading.Thread(
+            target=self._compact, args=(selo.snapshot, selo.lsn, selado),
+            name=f"compactador-{os.path.basename(self.filepath)}", daemon=True
+        ).start()
+
+    def _maybe_compact(self):
+        """
+        [SO - COMPACTAÇÃO EM BACKGROUND]
+        Pede ao committer que sele o segmento ativo; em seguida uma thread grava
+        o novo snapshot. Deve ser chamado com o lock adquirido, APÓS aplicar a mutação na tabela
+        (o snapshot precisa cobrir tudo o que está no segmento selado).
+        """
+        if self._compactando or self._wal_registros < self._compactar_a_cada:
+            return
+
+        # Cópia congelada da tabela (vetores copiados em bloco) como snapshot.
+        # O selo entra na fila do committer logo após o último registro coberto.
+        self._committer.submit(_Selo(self._lsn, self._rows.congelar()))
+        self._wal_registros = 0
+        self._compactando = True
+
+    def _compact(self, snapshot: List[Dict[str, Any]], lsn: int, selado: str):
+        try:
+            _atomic_write_rows(self.filepath, snapshot)
+            _atomic_write_json(self.meta_path, {"lsn": lsn})
+            # Só agora os segmentos cobertos pelo snapshot podem sumir
+            for segmento in self._sealed_segments():
+                if segmento <= selado:
+                    os.remove(segmento)
+            print(f"[SO - WAL] Compactação concluída: {self.filepath} (LSN {lsn})")
+        except OSError as e:
+            print(f"[SO - WAL] Falha na compactação de {self.filepath}: {e}")
+        finally:
+            with self._lock:
+                self._compactando = False
+
+    # --- Interface pública ---
+
+    def _visao(self) -> Tuple[int, TabelaColunar]:
+        """
+        [SO - PROBLEMA LEITORES/ESCRITORES]
+        Retorna a visão imutável atual. A leitura da referência é atômica, então
+        o leitor vê o estado anterior OU posterior a uma escrita, nunca o meio.
+        Só reconstrói a visão (com o Mutex) na primeira leitura após uma escrita.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock: # Adquire o Mutex
+                if self._snapshot is None:
+                    self._snapshot = (self._lsn, self._rows.congelar())
+                snapshot = self._snapshot
+        return snapshot
+
+    def _invalidar_visao(self):
+        # Chamado pelo escritor, com o lock adquirido, após mutar a tabela
+        self._snapshot = None
+
+    def read(self) -> List[Dict[str, Any]]:
+        """
+        Lê os dados da tabela em memória (sem I/O de disco).
+        Os dicts são montados a partir da visão congelada, fora do lock.
+        """
+        return list(self._visao()[1])
+
+    def version(self) -> int:
+        """Versão dos dados (LSN): muda a cada escrita, persiste entre reinícios."""
+        return self._lsn
+
+    def read_versioned(self) -> Tuple[int, List[Dict[str, Any]]]:
+        """(versão, registros) do MESMO instante: base para caches por versão."""
+        lsn, rows = self._visao()
+        return lsn, list(rows)
 
     def add(self, item: Dict[str, Any]) -> Dict[str, Any]:
         """
-        Adiciona um item ao arquivo JSON.
+        Adiciona um item à tabela e registra a operação no log.
         [SO - REGIÃO CRÍTICA]
         Todo este bloco é atômico do ponto de vista das threads.
         """
         with self._lock: # [SO] Entra na Região Crítica (Acquire Lock)
-            print(f"[SO - LOCK] Thread {threading.get_ident()} adquiriu o lock para {self.filepath}")
-            
-            # 1. Ler estado atual (I/O)
-            try:
-                with open(self.filepath, 'r', encoding='utf-8') as f:
-                    current_data = json.load(f)
-            except (FileNotFoundError, json.JSONDecodeError):
-                current_data = []
-            
-            # [SO - SIMULAÇÃO DE CARGA]
+            if self._simulacao.ativo: # Rastro didático: só no modo de simulação (um print por escrita custa caro)
+                print(f"[SO - LOCK] Thread {threading.get_ident()} adquiriu o lock para {self.filepath}")
+
+            # [SO - SIMULAÇÃO DE CARGA] (opcional, ver settings.SIMULACAO_CARGA)
             # Simula um processamento pesado para provar que o Lock funciona.
             # Se outra thread tentar entrar aqui agora, ela ficará bloqueada (BLOCKED).
-            time.sleep(2) 
-            
-            # 2. Modificar dados na Memória (Heap)
+            self._simulacao.aplicar("add")
+
+            # 1. Modificar dados na Memória (Heap)
+            item = dict(item)
             if "id" not in item:
-                item["id"] = len(current_data) + 1
-            current_data.append(item)
-            
-            # 3. Escrever no disco (Persistência)
-            # [SO - I/O WRITE] A escrita física ocorre aqui.
-            with open(self.filepath, 'w', encoding='utf-8') as f:
-                json.dump(current_data, f, indent=4, ensure_ascii=False)
-                
-            print(f"[SO - LOCK] Thread {threading.get_ident()} liberou o lock.")
-            return item # [SO] Sai da Região Crítica (Release Lock)
+                item["id"] = self._next_id
+            self._validar_escrita(item)
+            self._check_unique(item["id"], item)
+
+            # 2. Journaling: o registro entra na fila do log na ordem do LSN
+            ticket = self._append_wal({"op": "add", "item": item}, [(item["id"], self._rows.get(item["id"]))])
+            self._put(item)
+            self._registrar_mudanca("add", item["id"], item)
+            self._invalidar_visao()
+            self._maybe_compact()
+
+            if self._simulacao.ativo:
+                print(f"[SO - LOCK] Thread {threading.get_ident()} liberou o lock.")
+            # [SO] Sai da Região Crítica (Release Lock)
+
+        # 3. [SO - I/O WRITE] Aguarda o fsync do lote (group commit) fora do lock,
+        # permitindo que outras threads entrem e dividam o mesmo fsync.
+        ticket.wait()
+        return item
 
     def update(self, item_id: int, updates: Dict[str, Any]) -> bool:
         """Atualiza um item existente de forma segura."""
         with self._lock: # [SO] Exclusão Mútua
-            try:
-                with open(self.filepath, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-            except FileNotFoundError:
+            atual = self._rows.get(item_id)
+            if atual is None:
                 return False
-            
-            found = False
-            for i, item in enumerate(data):
-                if item.get("id") == item_id:
-                    data[i].update(updates)
-                    found = True
-                    break
-            
-            if found:
-                with open(self.filepath, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, indent=4, ensure_ascii=False)
-            
-            return found
+
+            novo = {**atual, **updates}
+            self._validar_escrita(atual, novo)
+            self._check_unique(item_id, novo)
+            ticket = self._append_wal({"op": "update", "id": item_id, "updates": updates}, [(item_id, atual)])
+            # Copy-on-write: o registro antigo continua válido para quem já o leu
+            self._set_row(item_id, novo)
+            self._registrar_mudanca("update", item_id, novo)
+            self._invalidar_visao()
+            self._maybe_compact()
+        ticket.wait()
+        return True
 
     def delete(self, item_id: int) -> bool:
         """Remove um item pelo ID de forma segura (Thread-Safe)."""
         with self._lock: # [SO] Exclusão Mútua
-            try:
-                with open(self.filepath, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-            except (FileNotFoundError, json.JSONDecodeError):
+            atual = self._rows.get(item_id)
+            if atual is None:
                 return False
 
-            original_len = len(data)
-            data = [item for item in data if item.get("id") != item_id]
-            
-            if len(data) < original_len:
-                time.sleep(0.5) 
-                with open(self.filepath, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, indent=4, ensure_ascii=False)
-                return True
-            
-            return False
\ No newline at end of file
+            self._validar_escrita(atual)
+            self._simulacao.aplicar("delete")
+            ticket = self._append_wal({"op": "delete", "id": item_id}, [(item_id, atual)])
+            self._drop_row(item_id)
+            self._registrar_mudanca("delete", item_id, atual)
+            self._invalidar_visao()
+            self._maybe_compact()
+        ticket.wait()
+        return True
+
+    def descartar(self, ids: Iterable[int]) -> int:
+        """
+        Remove registros SEM publicá-los no feed de mudanças: usado quando o
+        dado muda de lugar (arquivamento), não quando deixa de existir.
+        O lote inteiro vira UM registro no log. Retorna quantos existiam.
+        """
+        with self._lock:
+            self._garantir_log()
+            removidos = self._drop_rows(ids)
+            if not removidos:
+                return 0
+            ticket = self._append_wal({"op": "descartar", "ids": [item_id for item_id, _ in removidos]},
+                                      removidos, publicado=False)
+            # Peso no log = linhas removidas: um arquivamento grande logo
+            # vira snapshot menor, em vez de ser reaplicado a cada boot
+            self._wal_registros += len(removidos) - 1
+            self._invalidar_visao()
+            self._maybe_compact()
+        ticket.wait()
+        return len(removidos)
+
+    def reservar_ids(self, proximo: int):
+        """Novos IDs começam em `proximo` ou depois (IDs já usados fora desta tabela)."""
+        with self._lock:
+            self._next_id = max(self._next_id, proximo)
+
+    def _validar_escrita(self, *rows: Dict[str, Any]):
+        # Dentro do lock: a regra e a escrita formam uma única operação atômica
+        if self._validar is not None:
+            for row in rows:
+                self._validar(row)
+
+    def _registrar_mudanca(self, op: str, item_id: int, dados: Dict[str, Any]):
+        # Dentro do lock: a ordem do feed é a mesma ordem do WAL
+        if self._feed is not None:
+            self._feed.registrar(self.origem, op, item_id, dados)
+
+    def seq_de(self, item_id: int) -> int:
+        """Seq (no feed de mudanças) da última alteração deste item."""
+        return self._feed.seq_de(self.origem, item_id) if self._feed is not None else 0
+
+    # --- Consultas por índice ---
+
+    def get(self, item_id: int) -> Optional[Dict[str, Any]]:
+        """Busca direta pela chave primária, O(1)."""
+        with self._lock: # As colunas de uma linha mudam juntas só dentro do lock
+            return self._rows.get(item_id)
+
+    def find_by(self, indice: str, *chave: Any) -> List[Dict[str, Any]]:
+        """Registros cuja chave no HashIndex `indice` é `chave`, O(1)."""
+        with self._lock:
+            return self._materializar(self._indices[indice].get(tuple(chave)))
+
+    def find_one(self, indice: str, *chave: Any) -> Optional[Dict[str, Any]]:
+        encontrados = self.find_by(indice, *chave)
+        return encontrados[0] if encontrados else None
+
+    def range(self, indice: str, grupo: Any = None, de: Any = None, ate: Any = None,
+              apos: Optional[Tuple[Any, int]] = None, limite: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Registros do SortedIndex `indice` com de <= valor < ate, em ordem.
+        `apos`/`limite` paginam por cursor (valor, id) sem varrer o início.
+        Custo O(log n + k), onde k é o tamanho do resultado.
+        """
+        with self._lock:
+            return self._materializar(self._indices[indice].range(grupo, de, ate, apos, limite))
+
+    def iterar(self, indice: str, grupo: Any = None, de: Any = None, ate: Any = None,
+               lote: int = 500) -> Iterator[List[Dict[str, Any]]]:
+        """[SO - LEITURA EM BLOCOS] Lotes do range, paginados por cursor (ver lotes_por_cursor)."""
+        return lotes_por_cursor(lambda apos, limite: self.range(indice, grupo, de, ate, apos=apos, limite=limite),
+                                self._indices[indice].campo, lote)
+
+    def _materializar(self, ids: Iterable[int]) -> List[Dict[str, Any]]:
+        rows = (self._rows.get(i) for i in ids)
+        return [row for row in rows if row is not None]
+
+    def close(self):
+        """
+        Descarrega os lotes pendentes e fecha o log (shutdown limpo).
+        A instância continua válida: a próxima escrita reabre o log.
+        """
+        with self._lock:
+            committer = self._committer
+            if committer is None or self._fechando:
+                return
+            self._fechando = True
+        try:
+            # Fora do lock: um lote que falhe na drenagem precisa dele para ser desfeito
+            committer.close()
+        finally:
+            with self._lock:
+                self._wal.close()
+                self._wal, self._committer = None, None
+                self._fechando = False
+
+
+class _Registro:
+    """Mutação na fila do committer: a linha do log e como desfazê-la na RAM."""
+    __slots__ = ("linha", "lsn", "desfazer", "publicado", "persistido")
+
+    def __init__(self, linha: str, lsn: int, desfazer: List[Tuple[int, Optional[Dict[str, Any]]]],
+                 publicado: bool):
+        self.linha = linha
+        self.lsn = lsn
+        self.desfazer = desfazer
+        self.publicado = publicado # Passou pelo feed de mudanças
+        self.persistido = False
+
+
+class _Selo:
+    """Marcador na fila do committer: fecha o segmento ativo no LSN indicado."""
+    __slots__ = ("lsn", "snapshot", "aplicado")
+
+    def __init__(self, lsn: int, snapshot: TabelaColunar):
+        self.lsn = lsn
+        self.snapshot = snapshot
+        self.aplicado = False
+
+
+def _atomic_write_json(path: str, data: Any):
+    _atomic_write(path, (dumps(data),))
+
+def _atomic_write_rows(path: str, rows: Iterable[Dict[str, Any]], lote: int = 5000):
+    """Lista JSON gravada em blocos: o snapshot inteiro nunca existe como dicts na memória."""
+    def blocos() -> Iterator[bytes]:
+        yield b"["
+        separador = b""
+        iterador = iter(rows)
+        while True:
+            bloco = list(itertools.islice(iterador, lote))
+            if not bloco:
+                break
+            yield separador + dumps(bloco)[1:-1]
+            separador = b","
+        yield b"]"
+    _atomic_write(path, blocos())
+
+def _atomic_write(path: str, partes: Iterable[bytes]):
+    """
+    [SO - ESCRITA ATÔMICA]
+    Grava em um arquivo temporário, força o fsync e troca via rename.
+    Leitores (ou um crash) veem o arquivo antigo inteiro ou o novo inteiro.
+    """
+    tmp_path = path + '.tmp'
+    inicio = time.perf_counter()
+    with open(tmp_path, 'wb') as f:
+        # JSON compacto: o snapshot é lido por máquina (replay), não por pessoas
+        for parte in partes:
+            f.write(parte)
+        f.flush()
+        os.fsync(f.fileno())
+        registrar_io(os.path.basename(path), "write", inicio, os.fstat(f.fileno()).st_size)
+    os.replace(tmp_path, path) # Syscall: rename
@@ -0,0 +1,114 @@
+import threading
+import time
+from typing import Any, Callable, List, Optional
+
+class CommitTicket:
+    """
+    Recibo de uma mutação enfileirada. wait() bloqueia até o lote que a
+    contém estar no disco (após o fsync) e propaga falhas de I/O.
+    """
+    __slots__ = ("_evento", "erro")
+
+    def __init__(self):
+        self._evento = threading.Event()
+        self.erro: Optional[BaseException] = None
+
+    def _concluir(self, erro: Optional[BaseException] = None):
+        self.erro = erro
+        self._evento.set()
+
+    def wait(self):
+        self._evento.wait()
+        if self.erro is not None:
+            raise self.erro
+
+    def concluido(self, timeout: Optional[float] = None) -> bool:
+        """Espera até `timeout`; True se o lote já terminou (com ou sem erro)."""
+        return self._evento.wait(timeout)
+
+
+class GroupCommitter:
+    """
+    [SO - GROUP COMMIT]
+    Thread dedicada que junta as mutações que chegam dentro de uma janela de
+    tempo (ou até N itens) e as persiste com UM write e UM fsync.
+    Sob rajada, N agendamentos pagam o custo de um único fsync; cada chamador
+    ainda recebe a confirmação de durabilidade do seu próprio registro.
+    Se um lote falha, `ao_falhar(lote, erro)` é chamada (na thread do
+    committer) antes de os chamadores receberem o erro.
+    """
+
+    def __init__(self, persistir_lote: Callable[[List[Any]], None], janela_ms: float,
+                 max_itens: int, nome: str = "group-commit",
+                 ao_falhar: Optional[Callable[[List[Any], BaseException], None]] = None):
+        self._persistir_lote = persistir_lote
+        self._ao_falhar = ao_falhar
+        self._janela = janela_ms / 1000
+        self._max_itens = max(1, max_itens)
+        self._cond = threading.Condition()
+        self._fila: List[Any] = []
+        self._tickets: List[CommitTicket] = []
+        self._encerrando = False
+        self._thread = threading.Thread(target=self._run, name=nome, daemon=True)
+        self._thread.start()
+
+    def submit(self, item: Any) -> CommitTicket:
+        """Enfileira um item. Itens são persistidos na ordem de submissão."""
+        ticket = CommitTicket()
+        with self._cond:
+            if self._encerrando:
+                raise RuntimeError("GroupCommitter encerrado")
+            self._fila.append(item)
+            self._tickets.append(ticket)
+            self._cond.notify()
+        return ticket
+
+    def cancelar_pendentes(self, erro: BaseException) -> List[Any]:
+        """Retira da fila tudo o que ainda não foi persistido; os chamadores recebem `erro`."""
+        with self._cond:
+            itens, self._fila = self._fila, []
+            tickets, self._tickets = self._tickets, []
+        for ticket in tickets:
+            ticket._concluir(erro)
+        return itens
+
+    def close(self):
+        """Persiste o que estiver pendente e encerra a thread."""
+        with self._cond:
+            self._encerrando = True
+            self._cond.notify()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._fila and not self._encerrando:
+                    self._cond.wait()
+                if not self._fila:
+                    return # Encerrando e sem pendências
+
+                # [SO - JANELA DE AGRUPAMENTO] Espera mais chegadas até o prazo ou o limite
+                prazo = time.monotonic() + self._janela
+                while len(self._fila) < self._max_itens and not self._encerrando:
+                    restante = prazo - time.monotonic()
+                    if restante <= 0:
+                        break
+                    self._cond.wait(restante)
+
+                lote, self._fila = self._fila[:self._max_itens], self._fila[self._max_itens:]
+                tickets, self._tickets = self._tickets[:len(lote)], self._tickets[len(lote):]
+
+            # I/O fora da Condition: novos itens continuam entrando no próximo lote
+            erro = None
+            try:
+                self._persistir_lote(lote)
+            except BaseException as e:
+                print(f"[SO - GROUP COMMIT] Falha ao persistir lote de {len(lote)}: {e}")
+                erro = e
+                if self._ao_falhar is not None:
+                    try:
+                        self._ao_falhar(lote, e)
+                    except Exception as falha:
+                        print(f"[SO - GROUP COMMIT] Falha ao desfazer lote: {falha}")
+            for ticket in tickets:
+                ticket._concluir(erro)
@@ -0,0 +1,157 @@
+from bisect import bisect_left, bisect_right, insort
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Sequence, Set, Tuple, Union
+
+class UniqueConstraintError(Exception):
+    """Violação de um índice único (ex.: dois agendamentos no mesmo horário)."""
+
+    def __init__(self, indice: str, chave: Any):
+        super().__init__(f"Chave duplicada no índice '{indice}': {chave}")
+        self.indice = indice
+        self.chave = chave
+
+
+class HashIndex:
+    """
+    [SO - TABELA HASH]
+    Mapeia uma tupla de campos para o(s) ID(s) que a possuem.
+    Consulta em O(1). Com unique=True, o storage recusa a segunda ocorrência.
+    Chave com um único ID guarda o próprio int (o caso comum, e o único em
+    índices únicos); o set só aparece a partir do segundo ID, economizando
+    ~200 bytes por registro.
+    """
+
+    def __init__(self, nome: str, campos: Sequence[str], unique: bool = False):
+        self.nome = nome
+        self.campos = tuple(campos)
+        self.unique = unique
+        self._mapa: Dict[Hashable, Union[int, Set[int]]] = {}
+
+    def chave(self, row: Dict[str, Any]) -> Hashable:
+        return tuple(row.get(c) for c in self.campos)
+
+    def add(self, item_id: int, row: Dict[str, Any]):
+        chave = self.chave(row)
+        atual = self._mapa.get(chave)
+        if atual is None or atual == item_id:
+            self._mapa[chave] = item_id
+        elif isinstance(atual, set):
+            atual.add(item_id)
+        else:
+            self._mapa[chave] = {atual, item_id}
+
+    def remove(self, item_id: int, row: Dict[str, Any]):
+        chave = self.chave(row)
+        atual = self._mapa.get(chave)
+        if atual is None:
+            return
+        if isinstance(atual, set):
+            atual.discard(item_id)
+            if len(atual) == 1:
+                self._mapa[chave] = atual.pop()
+        elif atual == item_id:
+            del self._mapa[chave]
+
+    def remove_lote(self, itens: Iterable[Tuple[int, Dict[str, Any]]]):
+        for item_id, row in itens:
+            self.remove(item_id, row)
+
+    def conflito(self, item_id: Optional[int], row: Dict[str, Any]) -> bool:
+        """True se outro registro (id diferente) já ocupa a chave deste."""
+        return any(i != item_id for i in self.get(self.chave(row)))
+
+    def get(self, chave: Hashable) -> List[int]:
+        ids = self._mapa.get(chave)
+        if ids is None:
+            return []
+        return sorted(ids) if isinstance(ids, set) else [ids]
+
+
+class SortedIndex:
+    """
+    [SO - ÁRVORE DE BUSCA (VIA BISSECÇÃO)]
+    Mantém, por grupo, uma lista ordenada de (valor, id). Intervalos são
+    localizados por busca binária em O(log n) e percorridos em ordem.
+    Sem campo de grupo, existe um único grupo global.
+    """
+
+    def __init__(self, nome: str, campo: str, grupo: Optional[str] = None):
+        self.nome = nome
+        self.campo = campo
+        self.grupo = grupo
+        self._grupos: Dict[Hashable, List[Tuple[Any, int]]] = {}
+
+    def _grupo_de(self, row: Dict[str, Any]) -> Hashable:
+        return row.get(self.grupo) if self.grupo else None
+
+    def add(self, item_id: int, row: Dict[str, Any]):
+        valor = row.get(self.campo)
+        if valor is None:
+            return # Registro sem o campo não participa do índice
+        insort(self._grupos.setdefault(self._grupo_de(row), []), (valor, item_id))
+
+    def remove(self, item_id: int, row: Dict[str, Any]):
+        valor = row.get(self.campo)
+        lista = self._grupos.get(self._grupo_de(row))
+        if valor is None or lista is None:
+            return
+        pos = bisect_left(lista, (valor, item_id))
+        if pos < len(lista) and lista[pos] == (valor, item_id):
+            del lista[pos]
+        if not lista:
+            del self._grupos[self._grupo_de(row)]
+
+    def remove_lote(self, itens: Iterable[Tuple[int, Dict[str, Any]]]):
+        """Remove vários (id, registro) com UMA passada por grupo, em vez de um del O(n) por item."""
+        por_grupo: Dict[Hashable, Set[Tuple[Any, int]]] = {}
+        for item_id, row in itens:
+            valor = row.get(self.campo)
+            if valor is not None:
+                por_grupo.setdefault(self._grupo_de(row), set()).add((valor, item_id))
+        for grupo, pares in por_grupo.items():
+            lista = self._grupos.get(grupo)
+            if lista is None:
+                continue
+            # Posições por busca binária; a lista nova é montada com fatias (cópia em C)
+            restantes, inicio = [], 0
+            for par in sorted(pares):
+                pos = bisect_left(lista, par, inicio)
+                if pos < len(lista) and lista[pos] == par:
+                    restantes.extend(lista[inicio:pos])
+                    inicio = pos + 1
+            restantes.extend(lista[inicio:])
+            lista[:] = restantes
+            if not lista:
+                del self._grupos[grupo]
+
+    def range(self, grupo: Hashable = None, de: Any = None, ate: Any = None,
+              apos: Optional[Tuple[Any, int]] = None, limite: Optional[int] = None) -> Iterable[int]:
+        """
+        IDs com de <= valor < ate (limites opcionais), em ordem crescente.
+        `apos` = (valor, id) do último item já entregue (paginação por cursor):
+        a página seguinte começa logo depois dele, também por busca binária.
+        """
+        lista = self._grupos.get(grupo, [])
+        inicio = 0 if de is None else bisect_left(lista, (de,))
+        if apos is not None:
+            inicio = max(inicio, bisect_right(lista, tuple(apos)))
+        fim = len(lista) if ate is None else bisect_left(lista, (ate,))
+        if limite is not None:
+            fim = min(fim, inicio + limite)
+        return [item_id for _, item_id in lista[inicio:fim]]
+
+
+def lotes_por_cursor(pagina: Callable[[Optional[Tuple[Any, int]], int], List[Dict[str, Any]]], campo: str,
+                     lote: int, apos: Optional[Tuple[Any, int]] = None) -> Iterator[List[Dict[str, Any]]]:
+    """
+    [SO - LEITURA EM BLOCOS] Percorre um range em lotes de `lote` registros
+    (keyset sobre (valor, id)): `pagina(apos, limite)` é o range(..., apos,
+    limite) do storage. Nenhum lote segura o lock por muito tempo e o
+    resultado completo nunca fica inteiro em memória.
+    """
+    while True:
+        rows = pagina(apos, lote)
+        if rows:
+            yield rows
+        if len(rows) < lote:
+            return
+        apos = (rows[-1][campo], rows[-1]["id"])
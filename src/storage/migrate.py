@@ -0,0 +1,62 @@
+import os
+import sqlite3
+import sys
+from typing import Dict, Sequence
+from src.config.settings import DATA_DIR, SQLITE_PATH
+from .database import JsonStorage
+from .partitions import PartitionedStorage
+from .schema import indices_para, particoes_para
+from .sqlite_backend import SqliteStorage
+
+# Arquivos de dados conhecidos pelo sistema
+ARQUIVOS = ['consultas/medicos.json', 'consultas/consultas.json', 'consultas/cancelamentos.json']
+
+def _ja_migrado(db_path: str, filename: str) -> bool:
+    with sqlite3.connect(db_path) as conexao:
+        conexao.execute("CREATE TABLE IF NOT EXISTS _migracoes (arquivo TEXT PRIMARY KEY)")
+        return conexao.execute("SELECT 1 FROM _migracoes WHERE arquivo = ?", (filename,)).fetchone() is not None
+
+def _marcar_migrado(db_path: str, filename: str):
+    with sqlite3.connect(db_path) as conexao:
+        conexao.execute("INSERT OR IGNORE INTO _migracoes (arquivo) VALUES (?)", (filename,))
+
+def migrar_arquivo(filename: str, destino: SqliteStorage, db_path: str = SQLITE_PATH) -> int:
+    """
+    [SO - MIGRAÇÃO ONE-SHOT]
+    Copia um arquivo JSON (snapshot + WAL) para a tabela SQLite equivalente.
+    Executa uma única vez por arquivo: a marca fica na tabela _migracoes.
+    """
+    if _ja_migrado(db_path, filename):
+        return 0
+    importadas = 0
+    if os.path.exists(os.path.join(DATA_DIR, filename)) and destino.is_empty():
+        importadas = destino.import_rows(_ler_json(filename))
+        print(f"[SO - MIGRAÇÃO] {filename}: {importadas} registros -> {destino.tabela}")
+    _marcar_migrado(db_path, filename)
+    return importadas
+
+def _ler_json(filename: str) -> list:
+    """Todos os registros do arquivo, inclusive os meses já arquivados em partições."""
+    particoes = particoes_para(filename)
+    if particoes is None:
+        # Sem committer nem compactação: a origem é só lida
+        return JsonStorage(filename, somente_leitura=True).read()
+    # Somente leitura: a migração não arquiva nem reescreve partições
+    origem = PartitionedStorage(filename, *particoes, indices=indices_para(filename), somente_leitura=True)
+    try:
+        return origem.read()
+    finally:
+        origem.close()
+
+def migrar_json_para_sqlite(arquivos: Sequence[str] = ARQUIVOS, db_path: str = SQLITE_PATH) -> Dict[str, int]:
+    resultado = {}
+    for filename in arquivos:
+        destino = SqliteStorage(filename, indices=indices_para(filename), db_path=db_path)
+        resultado[filename] = migrar_arquivo(filename, destino, db_path)
+    return resultado
+
+if __name__ == "__main__":
+    # Uso: python -m src.storage.migrate [caminho/do/banco.db]
+    destino_db = sys.argv[1] if len(sys.argv) > 1 else SQLITE_PATH
+    for arquivo, total in migrar_json_para_sqlite(db_path=destino_db).items():
+        print(f"{arquivo}: {total} registros migrados")
@@ -0,0 +1,553 @@
+"""
+[SO - PARTICIONAMENTO POR MÊS + ARMAZENAMENTO EM CAMADAS (TIERING)]
+Camada quente: um JsonStorage (tabela em RAM + WAL) com o mês atual e os
+futuros, os únicos que ainda recebem escritas. Agendamento, disponibilidade
+e a listagem completa só tocam esta camada, por maior que seja o histórico.
+
+Camada fria: cada mês passado é selado em um arquivo imutável
+(data/consultas/arquivo/<origem>.<AAAA-MM>.<geração>.part), lido via mmap e
+descomprimido bloco a bloco só quando uma leitura passa por ele:
+    b"SOPART1\\n"
+    blocos: zlib(JSON da lista de registros), ordenados por (data, id)
+            dentro de cada grupo (médico); um bloco nunca mistura grupos
+    índice: JSON {"mes", "campo", "grupo", "linhas", "blocos": [[grupo,
+            primeiro, último, id_min, id_max, linhas, offset, tamanho], ...],
+            "ids": [[id, nº do bloco], ...] em ordem de id}
+    u64 offset do índice + b"SOPART1\\n"
+Os blocos seguem a ordem de data, então as faixas de id se sobrepõem: é o
+mapa "ids" que leva um get(id) direto ao único bloco que o contém.
+(Partições gravadas antes do mapa caem na varredura por faixa de id.)
+Um arquivo nunca é reescrito no lugar: uma nova geração é gravada ao lado
+(tmp + fsync + rename) e o catálogo passa a apontar para ela.
+"""
+import glob
+import heapq
+import itertools
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from array import array
+from bisect import bisect_left
+from datetime import date
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from src.config.settings import ARQUIVO_LINHAS_POR_BLOCO, DATA_DIR
+from src.core.metrics import registrar_io
+from src.core.serialization import dumps, loads
+from .changes import ChangeFeed
+from .database import JsonStorage, _atomic_write, _atomic_write_json
+from .indexes import lotes_por_cursor
+
+MAGICO = b"SOPART1\n"
+_RODAPE = struct.Struct("<Q")
+_MES = re.compile(r"\d{4}-(0[1-9]|1[0-2])-")
+VAZIO = object()
+
+
+class ParticaoSeladaError(Exception):
+    """Escrita em um mês já arquivado (partições seladas são somente leitura)."""
+
+    def __init__(self, mes: str):
+        super().__init__(f"Mês {mes} já arquivado: registros somente leitura")
+        self.mes = mes
+
+
+def mes_de(valor: Any) -> Optional[str]:
+    """'2025-01-06T08:30' -> '2025-01'; None se não for uma data reconhecível."""
+    if isinstance(valor, str) and _MES.match(valor):
+        return valor[:7]
+    return None
+
+def mes_atual() -> str:
+    return date.today().strftime("%Y-%m")
+
+def _proximo_mes(mes: str) -> str:
+    ano, numero = int(mes[:4]), int(mes[5:7])
+    return f"{ano + numero // 12:04d}-{numero % 12 + 1:02d}"
+
+def _sobrepoe(mes: str, de: Optional[str], ate: Optional[str]) -> bool:
+    """O mês [mes, próximo) cruza o intervalo [de, ate)? (comparação de texto ISO)"""
+    return (ate is None or mes < ate) and (de is None or _proximo_mes(mes) > de)
+
+
+def gravar_particao(caminho: str, mes: str, rows: Sequence[Dict[str, Any]], campo: str, grupo: str,
+                    por_bloco: int = ARQUIVO_LINHAS_POR_BLOCO):
+    """Grava um mês selado (formato no topo do módulo) via escrita atômica."""
+    grupos: Dict[Any, List[Dict[str, Any]]] = {}
+    for row in rows:
+        grupos.setdefault(row.get(grupo), []).append(row)
+
+    def partes() -> Iterator[bytes]:
+        yield MAGICO
+        offset = len(MAGICO)
+        blocos, ids = [], []
+        for valor, linhas in grupos.items():
+            linhas.sort(key=lambda r: (r[campo], r["id"]))
+            for i in range(0, len(linhas), por_bloco):
+                bloco = linhas[i:i + por_bloco]
+                dados = zlib.compress(dumps(bloco), 6)
+                ids_bloco = [r["id"] for r in bloco]
+                ids.extend((item_id, len(blocos)) for item_id in ids_bloco)
+                blocos.append([valor, bloco[0][campo], bloco[-1][campo], min(ids_bloco), max(ids_bloco),
+                               len(bloco), offset, len(dados)])
+                offset += len(dados)
+                yield dados
+        indice = dumps({"mes": mes, "campo": campo, "grupo": grupo, "linhas": len(rows), "blocos": blocos,
+                        "ids": sorted(ids)})
+        yield indice + _RODAPE.pack(offset) + MAGICO
+
+    _atomic_write(caminho, partes())
+
+
+class ParticaoFria:
+    """
+    Um mês selado. O arquivo só é aberto (mmap) na primeira leitura e, dele,
+    só o índice é decodificado; cada bloco é descomprimido quando uma leitura
+    passa por ele e descartado em seguida (as páginas ficam no cache do SO).
+    """
+
+    def __init__(self, caminho: str, mes: str, geracao: int, linhas: int, id_max: int, rotulo: str):
+        self.caminho = caminho
+        self.mes = mes
+        self.geracao = geracao
+        self.linhas = linhas
+        self.id_max = id_max
+        self._rotulo = rotulo # Nome nas métricas de I/O (um só para todos os meses)
+        self._lock = threading.Lock()
+        self._mapa: Optional[mmap.mmap] = None
+        self._blocos: Optional[List[list]] = None
+        # Mapa id -> bloco do índice, em vetores paralelos (ordenados por id)
+        self._ids: Optional[array] = None
+        self._ids_bloco: Optional[array] = None
+        self._campo = ""
+        self._grupo = ""
+
+    @property
+    def aberta(self) -> bool:
+        return self._blocos is not None
+
+    def _abrir(self) -> List[list]:
+        if self._blocos is None:
+            with self._lock:
+                if self._blocos is None:
+                    with open(self.caminho, 'rb') as f:
+                        mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    fim = len(mapa) - len(MAGICO)
+                    if mapa[:len(MAGICO)] != MAGICO or mapa[fim:] != MAGICO:
+                        raise ValueError(f"Partição corrompida: {self.caminho}")
+                    (inicio,) = _RODAPE.unpack(mapa[fim - _RODAPE.size:fim])
+                    indice = loads(mapa[inicio:fim - _RODAPE.size])
+                    self._campo, self._grupo = indice["campo"], indice["grupo"]
+                    if "ids" in indice:
+                        self._ids = array("q", (par[0] for par in indice["ids"]))
+                        self._ids_bloco = array("I", (par[1] for par in indice["ids"]))
+                    self._mapa = mapa
+                    self._blocos = indice["blocos"]
+        return self._blocos
+
+    def _ler_bloco(self, meta: list) -> List[Dict[str, Any]]:
+        offset, tamanho = meta[6], meta[7]
+        inicio = time.perf_counter()
+        rows = loads(zlib.decompress(self._mapa[offset:offset + tamanho]))
+        registrar_io(self._rotulo, "read", inicio, tamanho)
+        return rows
+
+    def percorrer(self, campo_grupo: Optional[str] = None, valor: Any = None, de: Optional[str] = None,
+                  ate: Optional[str] = None, apos: Optional[Tuple[Any, int]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Registros com de <= data < ate (e depois de `apos`), em ordem de
+        (data, id). Com `campo_grupo`, só os que têm esse campo == `valor`:
+        pelo grupo da partição, blocos de outros grupos nem são lidos.
+        """
+        blocos = self._abrir()
+        campo = self._campo
+        apos = tuple(apos) if apos is not None else None
+        por_bloco = campo_grupo is not None and campo_grupo == self._grupo
+        fluxos: Dict[Any, List[list]] = {}
+        for meta in blocos:
+            if por_bloco and meta[0] != valor:
+                continue
+            if (de is not None and meta[2] < de) or (ate is not None and meta[1] >= ate) or \
+                    (apos is not None and meta[2] < apos[0]):
+                continue
+            fluxos.setdefault(meta[0], []).append(meta)
+
+        def linhas(metas: List[list]) -> Iterator[Dict[str, Any]]:
+            for meta in metas:
+                for row in self._ler_bloco(meta):
+                    data = row[campo]
+                    if (de is not None and data < de) or (ate is not None and data >= ate):
+                        continue
+                    if apos is not None and (data, row["id"]) <= apos:
+                        continue
+                    if campo_grupo is not None and not por_bloco and row.get(campo_grupo) != valor:
+                        continue
+                    yield row
+
+        if len(fluxos) == 1:
+            yield from linhas(next(iter(fluxos.values())))
+        else:
+            # Cada grupo já está em ordem: intercalação k-way, um bloco por grupo na memória
+            yield from heapq.merge(*(linhas(m) for m in fluxos.values()), key=lambda r: (r[campo], r["id"]))
+
+    def todas(self) -> Iterator[Dict[str, Any]]:
+        for meta in self._abrir():
+            yield from self._ler_bloco(meta)
+
+    def get(self, item_id: int) -> Optional[Dict[str, Any]]:
+        blocos = self._abrir()
+        if self._ids is not None:
+            # Busca binária no mapa: no máximo um bloco descomprimido, nenhum se o id não está aqui
+            pos = bisect_left(self._ids, item_id)
+            if pos == len(self._ids) or self._ids[pos] != item_id:
+                return None
+            return next((row for row in self._ler_bloco(blocos[self._ids_bloco[pos]]) if row["id"] == item_id), None)
+        for meta in blocos:
+            if meta[3] <= item_id <= meta[4]:
+                for row in self._ler_bloco(meta):
+                    if row["id"] == item_id:
+                        return row
+        return None
+
+    def buscar(self, criterios: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Registros com todos os campos iguais aos `criterios`, em ordem de id."""
+        blocos = self._abrir()
+        grupo, data = criterios.get(self._grupo, VAZIO), criterios.get(self._campo)
+        encontrados = []
+        for meta in blocos:
+            if grupo is not VAZIO and meta[0] != grupo:
+                continue
+            if data is not None and not meta[1] <= data <= meta[2]:
+                continue
+            encontrados.extend(r for r in self._ler_bloco(meta)
+                               if all(r.get(c) == v for c, v in criterios.items()))
+        return sorted(encontrados, key=lambda r: r["id"])
+
+    def bytes(self) -> int:
+        try:
+            return os.path.getsize(self.caminho)
+        except OSError:
+            return 0
+
+    def fechar(self):
+        with self._lock:
+            if self._mapa is not None:
+                self._mapa.close()
+            self._mapa, self._blocos = None, None
+            self._ids = self._ids_bloco = None
+
+
+class PartitionedStorage:
+    """
+    Mesma interface do JsonStorage (read/add/update/delete/get/find_by/
+    range/iterar...), com as consultas particionadas por mês (ver módulo).
+    - Escritas vão para a camada quente; um mês < `limite` está selado e
+      qualquer escrita que o toque levanta ParticaoSeladaError (a regra roda
+      dentro da região crítica do JsonStorage, via `validar`).
+    - range/iterar atravessam as duas camadas em ordem: partições frias do
+      intervalo (encadeadas, meses são disjuntos) intercaladas com a quente.
+    - find_by pelo índice único (médico, data) vai direto à partição do mês.
+    - Na virada do mês, a primeira escrita dispara o arquivamento em
+      background (também roda na abertura e em POST /admin/arquivo/selar).
+      Com `arquivar=False` (SO_ARQUIVO=0) nada é arquivado automaticamente,
+      mas as partições já seladas continuam lidas e protegidas.
+    - `somente_leitura` (migração): lê catálogo, partições e camada quente
+      sem arquivar, sem apagar arquivos e sem escrever no WAL.
+    """
+
+    def __init__(self, filename: str, campo: str, grupo: str, indices: Sequence = (),
+                 colunas: Sequence = (), feed: Optional[ChangeFeed] = None,
+                 por_bloco: int = ARQUIVO_LINHAS_POR_BLOCO, arquivar: bool = True,
+                 somente_leitura: bool = False):
+        self._campo = campo
+        self._grupo = grupo
+        self._por_bloco = max(1, por_bloco)
+        self._indices = {indice.nome: indice for indice in indices}
+        # Índice ordenado global pelo campo de data: é por ele que os meses são varridos
+        self._indice_global = next((i.nome for i in indices if getattr(i, "campo", None) == campo
+                                    and getattr(i, "grupo", VAZIO) is None), None)
+        if self._indice_global is None:
+            raise ValueError(f"Particionamento de {filename} exige um SortedIndex global em '{campo}'")
+
+        self.origem = os.path.splitext(os.path.basename(filename))[0]
+        self._catalogo_path = caminho_catalogo(filename)
+        self._diretorio = os.path.dirname(self._catalogo_path)
+        self._rotulo_io = f"{self.origem}.arquivo"
+        self._arquivar_auto = arquivar and not somente_leitura
+        self._somente_leitura = somente_leitura
+        if not somente_leitura:
+            os.makedirs(self._diretorio, exist_ok=True)
+
+        # [SO - COPY-ON-WRITE] mês -> partição; o arquivamento troca o dict inteiro,
+        # então um leitor usa sempre um catálogo coerente sem pegar lock.
+        self._particoes: Dict[str, ParticaoFria] = {}
+        self._limite = "" # Meses < limite estão selados
+        self._arquivando = threading.Lock() # Um arquivamento por vez
+        self._carregar_catalogo()
+
+        self.quente = JsonStorage(filename, indices=indices, colunas=colunas, feed=feed, validar=self._validar,
+                                  somente_leitura=somente_leitura)
+        self.filepath = self.quente.filepath
+        # Os IDs arquivados continuam ocupados: a tabela quente nunca os reaproveita
+        self.quente.reservar_ids(max((p.id_max for p in self._particoes.values()), default=0) + 1)
+        if self._arquivar_auto:
+            self.arquivar()
+
+    # --- Catálogo ---
+
+    def _carregar_catalogo(self):
+        try:
+            with open(self._catalogo_path, 'rb') as f:
+                catalogo = loads(f.read())
+        except (ValueError, FileNotFoundError):
+            catalogo = {}
+        self._limite = catalogo.get("limite", "")
+        for mes, info in catalogo.get("particoes", {}).items():
+            self._particoes[mes] = ParticaoFria(os.path.join(self._diretorio, info["arquivo"]), mes,
+                                                info["geracao"], info["linhas"], info["id_max"], self._rotulo_io)
+        if self._somente_leitura:
+            return
+        # Gerações substituídas ou gravações interrompidas por um crash
+        referenciados = {p.caminho for p in self._particoes.values()}
+        for caminho in glob.glob(os.path.join(glob.escape(self._diretorio), f"{glob.escape(self.origem)}.*.part*")):
+            if caminho not in referenciados:
+                _remover(caminho)
+
+    def _salvar_catalogo(self):
+        _atomic_write_json(self._catalogo_path, {
+            "limite": self._limite,
+            "particoes": {mes: {"arquivo": os.path.basename(p.caminho), "geracao": p.geracao,
+                                "linhas": p.linhas, "id_max": p.id_max}
+                          for mes, p in sorted(self._particoes.items())},
+        })
+
+    # --- Arquivamento ---
+
+    def _validar(self, row: Dict[str, Any]):
+        # Chamado pelo JsonStorage com o lock dele adquirido
+        mes = mes_de(row.get(self._campo))
+        if mes is not None and mes < self._limite:
+            raise ParticaoSeladaError(mes)
+
+    def arquivar(self) -> Dict[str, int]:
+        """
+        [SO - TIERING] Sela os meses anteriores ao atual. Retorna {mês: registros}.
+        1. O limite sobe primeiro: escritas nesses meses passam a ser recusadas.
+        2. Cada mês é lido da camada quente (em lotes), fundido com a partição
+           que já existir (arquivamento interrompido) e gravado numa nova geração.
+        3. O catálogo publica a partição; só então as linhas saem da camada
+           quente (sem passar pelo feed: é mudança de lugar, não cancelamento).
+        Um crash em qualquer ponto é corrigido pela próxima execução.
+        """
+        if self._somente_leitura:
+            raise RuntimeError(f"{self.origem} aberto somente para leitura")
+        with self._arquivando:
+            limite = max(self._limite, mes_atual())
+            if limite != self._limite:
+                self._limite = limite
+                self._salvar_catalogo()
+
+            selados: Dict[str, int] = {}
+            # O primeiro lote passa pelo lock da camada quente: nenhuma escrita
+            # validada com o limite antigo fica pela metade depois dele
+            lotes = self.quente.iterar(self._indice_global, None, None, limite, lote=5000)
+            linhas = (row for lote in lotes for row in lote)
+            for mes, rows in itertools.groupby(linhas, key=lambda r: mes_de(r.get(self._campo))):
+                if mes is not None:
+                    rows = list(rows)
+                    self._selar(mes, rows)
+                    selados[mes] = len(rows)
+            if selados:
+                print(f"[SO - ARQUIVO] {self.origem}: {sum(selados.values())} registro(s) arquivado(s) "
+                      f"em {len(selados)} partição(ões) ({', '.join(selados)})")
+            return selados
+
+    def _selar(self, mes: str, rows: List[Dict[str, Any]]):
+        anterior = self._particoes.get(mes)
+        todas = rows
+        if anterior is not None:
+            # A camada quente prevalece: é a versão mais recente de cada registro
+            por_id = {row["id"]: row for row in anterior.todas()}
+            por_id.update((row["id"], row) for row in rows)
+            todas = list(por_id.values())
+        geracao = anterior.geracao + 1 if anterior is not None else 1
+        caminho = os.path.join(self._diretorio, f"{self.origem}.{mes}.{geracao}.part")
+        gravar_particao(caminho, mes, todas, self._campo, self._grupo, self._por_bloco)
+
+        particao = ParticaoFria(caminho, mes, geracao, len(todas), max(r["id"] for r in todas), self._rotulo_io)
+        self._particoes = {**self._particoes, mes: particao}
+        self._salvar_catalogo()
+        for inicio in range(0, len(rows), 5000):
+            # Em lotes: bookings concorrentes não esperam o mês inteiro sair da RAM
+            self.quente.descartar(row["id"] for row in rows[inicio:inicio + 5000])
+        if anterior is not None:
+            # Leitores em andamento mantêm o mmap antigo (o SO libera ao fim)
+            _remover(anterior.caminho)
+
+    def _talvez_arquivar(self):
+        if self._arquivar_auto and mes_atual() > self._limite and not self._arquivando.locked():
+            threading.Thread(target=self._arquivar_em_background, daemon=True,
+                             name=f"arquivador-{self.origem}").start()
+
+    def _arquivar_em_background(self):
+        try:
+            self.arquivar()
+        except (OSError, ValueError) as e:
+            print(f"[SO - ARQUIVO] Falha ao arquivar {self.origem}: {e}")
+
+    @property
+    def limite(self) -> str:
+        """Primeiro mês não selado ('AAAA-MM'); '' se nada foi arquivado ainda."""
+        return self._limite
+
+    def stats(self) -> Dict[str, Any]:
+        particoes = self._particoes
+        return {
+            "limite": self._limite,
+            "arquivadas": sum(p.linhas for p in particoes.values()),
+            "particoes": [{"mes": mes, "linhas": p.linhas, "bytes": p.bytes(), "geracao": p.geracao,
+                           "aberta": p.aberta} for mes, p in sorted(particoes.items())],
+        }
+
+    # --- Leitura ---
+
+    def _percorrer(self, indice: str, grupo: Any, de: Optional[str], ate: Optional[str],
+                   apos: Optional[Tuple[Any, int]], lote: int) -> Iterator[Dict[str, Any]]:
+        """Registros do range nas duas camadas, em ordem de (data, id), lidos sob demanda."""
+        definicao = self._indices[indice]
+        if getattr(definicao, "campo", None) != self._campo:
+            # Índice por outro campo: só existe na camada quente
+            yield from self._quentes(indice, grupo, de, ate, apos, lote, {})
+            return
+        particoes = self._particoes
+        inicio = apos[0] if apos is not None and (de is None or apos[0] > de) else de
+        campo_grupo = getattr(definicao, "grupo", None)
+        frias = itertools.chain.from_iterable(
+            particoes[mes].percorrer(campo_grupo, grupo, de, ate, apos)
+            for mes in sorted(particoes) if _sobrepoe(mes, inicio, ate)
+        )
+        quentes = self._quentes(indice, grupo, de, ate, apos, lote, particoes)
+        campo = self._campo
+        yield from heapq.merge(frias, quentes, key=lambda r: (r[campo], r["id"]))
+
+    def _quentes(self, indice: str, grupo: Any, de: Optional[str], ate: Optional[str],
+                 apos: Optional[Tuple[Any, int]], lote: int, particoes: Dict[str, ParticaoFria]) -> Iterator[Dict[str, Any]]:
+        # Linhas de um mês já publicado na camada fria estão só de passagem: são ignoradas
+        lotes = lotes_por_cursor(lambda apos, limite: self.quente.range(indice, grupo, de, ate, apos=apos, limite=limite),
+                                 self._indices[indice].campo, lote, apos)
+        for rows in lotes:
+            for row in rows:
+                if mes_de(row.get(self._campo)) not in particoes:
+                    yield row
+
+    def range(self, indice: str, grupo: Any = None, de: Any = None, ate: Any = None,
+              apos: Optional[Tuple[Any, int]] = None, limite: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Mesmo contrato do JsonStorage.range, atravessando as partições seladas."""
+        rows = self._percorrer(indice, grupo, de, ate, apos, lote=limite or 500)
+        return list(itertools.islice(rows, limite))
+
+    def iterar(self, indice: str, grupo: Any = None, de: Any = None, ate: Any = None,
+               lote: int = 500) -> Iterator[List[Dict[str, Any]]]:
+        """[SO - LEITURA EM BLOCOS] Lotes do range; partições frias descomprimidas bloco a bloco."""
+        rows = self._percorrer(indice, grupo, de, ate, None, lote)
+        while True:
+            bloco = list(itertools.islice(rows, lote))
+            if bloco:
+                yield bloco
+            if len(bloco) < lote:
+                return
+
+    def read(self) -> List[Dict[str, Any]]:
+        """Todo o histórico (partições seladas + camada quente). Prefira iterar()."""
+        return self.read_versioned()[1]
+
+    def read_versioned(self) -> Tuple[int, List[Dict[str, Any]]]:
+        particoes = self._particoes
+        versao, quentes = self.quente.read_versioned()
+        rows = [row for mes in sorted(particoes) for row in particoes[mes].todas()]
+        rows.extend(row for row in quentes if mes_de(row.get(self._campo)) not in particoes)
+        return versao, rows
+
+    def version(self) -> int:
+        # Arquivar também muda a camada quente (descartar), então a versão avança
+        return self.quente.version()
+
+    def get(self, item_id: int) -> Optional[Dict[str, Any]]:
+        row = self.quente.get(item_id)
+        if row is None:
+            row = self._get_frio(item_id)[1]
+        return row
+
+    def _get_frio(self, item_id: int) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        if not isinstance(item_id, int):
+            return None, None
+        for mes, particao in sorted(self._particoes.items(), reverse=True):
+            if item_id <= particao.id_max:
+                row = particao.get(item_id)
+                if row is not None:
+                    return mes, row
+        return None, None
+
+    def find_by(self, indice: str, *chave: Any) -> List[Dict[str, Any]]:
+        campos = getattr(self._indices[indice], "campos", ())
+        if self._campo in campos:
+            particao = self._particoes.get(mes_de(chave[campos.index(self._campo)]))
+            if particao is not None:
+                return particao.buscar(dict(zip(campos, chave)))
+        return self.quente.find_by(indice, *chave)
+
+    def find_one(self, indice: str, *chave: Any) -> Optional[Dict[str, Any]]:
+        encontrados = self.find_by(indice, *chave)
+        return encontrados[0] if encontrados else None
+
+    def seq_de(self, item_id: int) -> int:
+        return self.quente.seq_de(item_id)
+
+    # --- Escrita (sempre na camada quente) ---
+
+    def add(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        self._talvez_arquivar()
+        return self.quente.add(item)
+
+    def update(self, item_id: int, updates: Dict[str, Any]) -> bool:
+        self._talvez_arquivar()
+        if self.quente.update(item_id, updates):
+            return True
+        self._recusar_se_arquivado(item_id)
+        return False
+
+    def delete(self, item_id: int) -> bool:
+        self._talvez_arquivar()
+        if self.quente.delete(item_id):
+            return True
+        self._recusar_se_arquivado(item_id)
+        return False
+
+    def _recusar_se_arquivado(self, item_id: int):
+        mes = self._get_frio(item_id)[0]
+        if mes is not None:
+            raise ParticaoSeladaError(mes)
+
+    def close(self):
+        self.quente.close()
+        for particao in self._particoes.values():
+            particao.fechar()
+
+
+def caminho_catalogo(filename: str) -> str:
+    """Catálogo das partições de um arquivo de dados (existe depois do primeiro arquivamento)."""
+    origem = os.path.splitext(os.path.basename(filename))[0]
+    return os.path.join(os.path.dirname(os.path.join(DATA_DIR, filename)), "arquivo", f"{origem}.catalogo.json")
+
+def particao_quente(storage):
+    """A camada quente de um storage particionado (ou o próprio storage)."""
+    return storage.quente if isinstance(storage, PartitionedStorage) else storage
+
+def _remover(caminho: str):
+    try:
+        os.remove(caminho)
+    except OSError:
+        pass # Windows: ainda mapeado por um leitor; o próximo boot remove
@@ -0,0 +1,345 @@
+import datetime
+from abc import ABC, abstractmethod
+from array import array
+from functools import lru_cache
+from itertools import compress
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence
+
+# Marca de campo ausente (diferente de None, que é um valor válido)
+VAZIO = object()
+
+# Um id pode ficar até esta distância além do fim das colunas; ids mais
+# distantes (ou não inteiros) vão para o dicionário de avulsos
+SALTO_MAXIMO = 65536
+
+_EPOCA = datetime.datetime(1970, 1, 1)
+_FORMATO_INSTANTE = "%Y-%m-%dT%H:%M"
+
+
+class _Coluna(ABC):
+    """Um campo do registro guardado em um vetor indexado pela posição (= id)."""
+
+    def __init__(self, nome: str):
+        self.nome = nome
+
+    @abstractmethod
+    def gravar(self, pos: int, valor: Any) -> bool:
+        """Grava o valor; False se ele não cabe na coluna (vai para os extras)."""
+
+    @abstractmethod
+    def ler(self, pos: int) -> Any:
+        ...
+
+    @abstractmethod
+    def ler_todos(self, ocupado: bytearray) -> Iterable[Any]:
+        """Valores das posições ocupadas, em ordem (leitura em bloco para a iteração)."""
+
+    @abstractmethod
+    def apagar(self, pos: int):
+        ...
+
+    @abstractmethod
+    def estender(self, n: int):
+        ...
+
+    @abstractmethod
+    def copia(self) -> "_Coluna":
+        ...
+
+
+class ColunaInteiro(_Coluna):
+    """Inteiros em um array da stdlib (4 bytes por linha com tipo 'i')."""
+
+    def __init__(self, nome: str, tipo: str = "i"):
+        super().__init__(nome)
+        self.dados = array(tipo)
+        bits = self.dados.itemsize * 8
+        self._vazio = -(1 << (bits - 1))        # Menor valor do tipo = ausente
+        self._maximo = (1 << (bits - 1)) - 1
+
+    def gravar(self, pos: int, valor: Any) -> bool:
+        # bool é subclasse de int: fica nos extras para voltar como True/False
+        if type(valor) is not int or not self._vazio < valor <= self._maximo:
+            return False
+        self.dados[pos] = valor
+        return True
+
+    def ler(self, pos: int) -> Any:
+        valor = self.dados[pos]
+        return VAZIO if valor == self._vazio else valor
+
+    def ler_todos(self, ocupado: bytearray) -> Iterable[Any]:
+        vazio = self._vazio
+        return (VAZIO if valor == vazio else valor for valor in compress(self.dados, ocupado))
+
+    def apagar(self, pos: int):
+        self.dados[pos] = self._vazio
+
+    def estender(self, n: int):
+        self.dados.extend(array(self.dados.typecode, [self._vazio]) * n)
+
+    def copia(self) -> "ColunaInteiro":
+        nova = type(self).__new__(type(self))
+        nova.__dict__.update(self.__dict__)
+        nova.dados = self.dados[:]
+        return nova
+
+
+class ColunaInstante(ColunaInteiro):
+    """
+    Datas "AAAA-MM-DDTHH:MM" guardadas como minutos desde 1970 (int32): o
+    texto é refeito a partir dos minutos na leitura (nenhum texto guardado
+    por linha). Só valores fora do formato canônico ficam nos extras, intactos.
+    """
+
+    def __init__(self, nome: str):
+        super().__init__(nome, "i")
+
+    def gravar(self, pos: int, valor: Any) -> bool:
+        if type(valor) is not str:
+            return False
+        minutos = _para_minutos(valor)
+        if minutos is None or not self._vazio < minutos <= self._maximo:
+            return False
+        self.dados[pos] = minutos
+        return True
+
+    def ler(self, pos: int) -> Any:
+        minutos = self.dados[pos]
+        return VAZIO if minutos == self._vazio else _de_minutos(minutos)
+
+    def ler_todos(self, ocupado: bytearray) -> Iterable[Any]:
+        vazio = self._vazio
+        return (VAZIO if minutos == vazio else _de_minutos(minutos) for minutos in compress(self.dados, ocupado))
+
+
+class ColunaCategoria(_Coluna):
+    """Textos repetidos (status, especialidade): código de 2 bytes + tabela de valores."""
+
+    def __init__(self, nome: str):
+        super().__init__(nome)
+        self.codigos = array("H")
+        self.valores: List[Optional[str]] = [None] # Código 0 = ausente
+        self._codigo: Dict[str, int] = {}
+
+    def gravar(self, pos: int, valor: Any) -> bool:
+        if type(valor) is not str:
+            return False
+        codigo = self._codigo.get(valor)
+        if codigo is None:
+            if len(self.valores) > 0xFFFF:
+                return False
+            codigo = self._codigo[valor] = len(self.valores)
+            self.valores.append(valor)
+        self.codigos[pos] = codigo
+        return True
+
+    def ler(self, pos: int) -> Any:
+        codigo = self.codigos[pos]
+        return self.valores[codigo] if codigo else VAZIO
+
+    def ler_todos(self, ocupado: bytearray) -> Iterable[Any]:
+        valores = [VAZIO] + self.valores[1:]
+        return map(valores.__getitem__, compress(self.codigos, ocupado))
+
+    def apagar(self, pos: int):
+        self.codigos[pos] = 0
+
+    def estender(self, n: int):
+        self.codigos.extend(array("H", bytes(2 * n)))
+
+    def copia(self) -> "ColunaCategoria":
+        nova = ColunaCategoria.__new__(ColunaCategoria)
+        nova.__dict__.update(self.__dict__) # Tabela de valores compartilhada (só cresce)
+        nova.codigos = self.codigos[:]
+        return nova
+
+
+class ColunaObjeto(_Coluna):
+    """Qualquer valor (textos únicos, listas, dicts): uma referência por linha."""
+
+    def __init__(self, nome: str):
+        super().__init__(nome)
+        self.dados: List[Any] = []
+
+    def gravar(self, pos: int, valor: Any) -> bool:
+        self.dados[pos] = valor
+        return True
+
+    def ler(self, pos: int) -> Any:
+        return self.dados[pos]
+
+    def ler_todos(self, ocupado: bytearray) -> Iterable[Any]:
+        return compress(self.dados, ocupado)
+
+    def apagar(self, pos: int):
+        self.dados[pos] = VAZIO
+
+    def estender(self, n: int):
+        self.dados.extend([VAZIO] * n)
+
+    def copia(self) -> "ColunaObjeto":
+        nova = ColunaObjeto(self.nome)
+        nova.dados = self.dados[:]
+        return nova
+
+
+class TabelaColunar:
+    """
+    [SO - LAYOUT DE MEMÓRIA COLUNAR]
+    Tabela em RAM do JsonStorage. Em vez de um dict por registro (chaves
+    repetidas em cada linha, um objeto int/str por campo), cada campo do
+    esquema é um vetor e o id é a posição nele:
+    - inteiros e datas em array (4 bytes por linha)
+    - textos repetidos por código (2 bytes) + tabela de valores
+    - demais valores: uma referência por linha
+    Campos fora do esquema (ou valores que não cabem na coluna) ficam em um
+    dict de extras da linha; ids não inteiros ou muito esparsos ficam inteiros
+    em `avulsos`. Nada se perde: ler(gravar(x)) == x.
+
+    A conversão para dict só acontece na saída (get, iteração). O chamador
+    garante a exclusão mútua; `congelar()` tira uma cópia imutável para
+    leitores sem lock (vetores copiados em bloco, pools compartilhados).
+    """
+
+    def __init__(self, colunas: Sequence[_Coluna] = ()):
+        self._colunas = list(colunas)
+        self._nomes = frozenset(c.nome for c in self._colunas)
+        self._montar = _montador([c.nome for c in self._colunas])
+        self._ocupado = bytearray()
+        self._extras: Dict[int, Dict[str, Any]] = {}
+        self._avulsos: Dict[Any, Dict[str, Any]] = {}
+        self._total = 0
+
+    def __len__(self) -> int:
+        return self._total + len(self._avulsos)
+
+    def __contains__(self, item_id: Any) -> bool:
+        return item_id in self._avulsos or (self._posicao(item_id) and self._ocupado[item_id] == 1)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        """Registros como dicts, em ordem de id (avulsos no fim). Decodifica coluna a coluna."""
+        ocupado, extras, montar = self._ocupado, self._extras, self._montar
+        colunas = [coluna.ler_todos(ocupado) for coluna in self._colunas]
+        for valores in zip(compress(range(len(ocupado)), ocupado), *colunas):
+            row = montar(*valores)
+            if VAZIO in valores:
+                row = {campo: valor for campo, valor in row.items() if valor is not VAZIO}
+            if extras:
+                extra = extras.get(valores[0])
+                if extra:
+                    row.update(extra)
+                    row["id"] = row.pop("id") # id sempre por último, como em _linha
+            yield row
+        yield from self._avulsos.values()
+
+    def get(self, item_id: Any) -> Optional[Dict[str, Any]]:
+        avulso = self._avulsos.get(item_id) if self._avulsos else None
+        if avulso is not None:
+            return avulso
+        if self._posicao(item_id) and self._ocupado[item_id]:
+            return self._linha(item_id)
+        return None
+
+    def put(self, item_id: Any, row: Dict[str, Any]) -> Dict[str, Any]:
+        """Insere/substitui um registro e devolve a forma canônica dele (o que get() devolverá)."""
+        if item_id in self._avulsos or type(item_id) is not int \
+                or not 0 <= item_id < len(self._ocupado) + SALTO_MAXIMO:
+            self._avulsos[item_id] = row
+            return row
+        if item_id >= len(self._ocupado):
+            # Crescimento geométrico (como o list do CPython): append amortizado O(1)
+            self._estender(max(item_id + 1, len(self._ocupado) + len(self._ocupado) // 8 + 64))
+
+        extras = {}
+        for coluna in self._colunas:
+            valor = row.get(coluna.nome, VAZIO)
+            if valor is VAZIO or not coluna.gravar(item_id, valor):
+                coluna.apagar(item_id)
+                if valor is not VAZIO:
+                    extras[coluna.nome] = valor
+        for campo, valor in row.items():
+            if campo != "id" and campo not in self._nomes:
+                extras[campo] = valor
+        if extras:
+            self._extras[item_id] = extras
+        else:
+            self._extras.pop(item_id, None)
+        if not self._ocupado[item_id]:
+            self._ocupado[item_id] = 1
+            self._total += 1
+        return self._linha(item_id)
+
+    def pop(self, item_id: Any) -> Optional[Dict[str, Any]]:
+        if item_id in self._avulsos:
+            return self._avulsos.pop(item_id)
+        antigo = self.get(item_id)
+        if antigo is not None:
+            self._ocupado[item_id] = 0
+            self._total -= 1
+            self._extras.pop(item_id, None)
+            for coluna in self._colunas:
+                coluna.apagar(item_id) # Solta as referências (textos únicos)
+        return antigo
+
+    def congelar(self) -> "TabelaColunar":
+        """Cópia que não muda mais: leitores a percorrem sem segurar o lock."""
+        copia = TabelaColunar.__new__(TabelaColunar)
+        copia._colunas = [c.copia() for c in self._colunas]
+        copia._nomes = self._nomes
+        copia._montar = self._montar
+        copia._ocupado = self._ocupado[:]
+        copia._extras = dict(self._extras)  # Os dicts de extras nunca são alterados, só trocados
+        copia._avulsos = dict(self._avulsos)
+        copia._total = self._total
+        return copia
+
+    def _posicao(self, item_id: Any) -> bool:
+        return type(item_id) is int and 0 <= item_id < len(self._ocupado)
+
+    def _estender(self, tamanho: int):
+        n = tamanho - len(self._ocupado)
+        self._ocupado.extend(bytes(n))
+        for coluna in self._colunas:
+            coluna.estender(n)
+
+    def _linha(self, pos: int) -> Dict[str, Any]:
+        row = {}
+        for coluna in self._colunas:
+            valor = coluna.ler(pos)
+            if valor is not VAZIO:
+                row[coluna.nome] = valor
+        extras = self._extras.get(pos)
+        if extras:
+            row.update(extras)
+        row["id"] = pos
+        return row
+
+
+def _montador(nomes: Sequence[str]):
+    """Função que monta o dict de uma linha a partir de (id, valores das colunas); id por último."""
+    nomes = tuple(nomes)
+
+    def montar(pos: int, *valores: Any) -> Dict[str, Any]:
+        row = dict(zip(nomes, valores))
+        row["id"] = pos
+        return row
+    return montar
+
+def _para_minutos(texto: str) -> Optional[int]:
+    # Só o formato canônico: o texto precisa voltar idêntico na leitura
+    if len(texto) != 16 or texto[10] != "T":
+        return None
+    try:
+        instante = datetime.datetime.strptime(texto, _FORMATO_INSTANTE)
+    except ValueError:
+        return None
+    if instante.strftime(_FORMATO_INSTANTE) != texto:
+        return None
+    return int((instante - _EPOCA).total_seconds()) // 60
+
+@lru_cache(maxsize=4096)
+def _de_minutos(minutos: int) -> str:
+    # Inverso de _para_minutos; o cache limitado cobre os horários mais lidos
+    instante = _EPOCA + datetime.timedelta(minutes=minutos)
+    return instante.strftime(_FORMATO_INSTANTE)
@@ -0,0 +1,86 @@
+import os
+import threading
+from typing import Dict, Optional, Union
+from src.config.settings import ARQUIVO_ATIVO, STORAGE_BACKEND, SQLITE_PATH
+from .changes import ChangeFeed, Feed, SqliteChangeFeed
+from .database import JsonStorage
+from .migrate import migrar_arquivo
+from .partitions import PartitionedStorage, caminho_catalogo
+from .schema import colunas_para, indices_para, particoes_para
+from .sqlite_backend import SqliteStorage
+
+Storage = Union[JsonStorage, PartitionedStorage, SqliteStorage]
+
+# [SO - TABELA DE ARQUIVOS ABERTOS]
+# Assim como o kernel mantém uma única entrada (inode em memória) por arquivo,
+# o processo mantém UMA instância de storage por arquivo de dados:
+# uma tabela em RAM, um lock de escrita e um descritor do log (WAL).
+_storages: Dict[str, Storage] = {}
+_registry_lock = threading.Lock()
+_feed: Optional[Feed] = None
+
+def _chave(filename: str) -> str:
+    # Normaliza 'consultas/x.json', 'consultas\\x.json' e './consultas/x.json'
+    return os.path.normcase(os.path.normpath(filename))
+
+def _abrir(filename: str) -> Storage:
+    """[SO - DRIVER] Escolhe o backend configurado em settings.STORAGE_BACKEND."""
+    if STORAGE_BACKEND == "sqlite":
+        storage = SqliteStorage(filename, indices=indices_para(filename), feed=_feed_atual())
+        migrar_arquivo(filename, storage)
+        return storage
+    particoes = particoes_para(filename)
+    # Com partições já seladas, SO_ARQUIVO=0 só suspende o arquivamento: abrir a
+    # camada quente sozinha esconderia os meses arquivados (e os IDs e horários
+    # ocupados por eles)
+    if particoes is not None and (ARQUIVO_ATIVO or os.path.exists(caminho_catalogo(filename))):
+        # Meses passados em partições seladas; só o atual e os futuros em RAM
+        campo, grupo = particoes
+        return PartitionedStorage(filename, campo, grupo, indices=indices_para(filename),
+                                  colunas=colunas_para(filename), feed=_feed_atual(), arquivar=ARQUIVO_ATIVO)
+    return JsonStorage(filename, indices=indices_para(filename), colunas=colunas_para(filename),
+                       feed=_feed_atual())
+
+def _feed_atual() -> Feed:
+    # Chamado com _registry_lock adquirido
+    global _feed
+    if _feed is None:
+        _feed = SqliteChangeFeed(SQLITE_PATH) if STORAGE_BACKEND == "sqlite" else ChangeFeed()
+    return _feed
+
+def get_change_feed() -> Feed:
+    """[SO - CHANGE DATA CAPTURE] Feed de mudanças compartilhado por todos os storages."""
+    with _registry_lock:
+        return _feed_atual()
+
+def get_storage(filename: str) -> Storage:
+    """
+    [SO - CONNECTION MANAGER]
+    Entrega a instância compartilhada do storage de um arquivo, abrindo-a
+    (replay do log) apenas no primeiro acesso.
+    """
+    chave = _chave(filename)
+    storage = _storages.get(chave)
+    if storage is not None:
+        return storage
+
+    with _registry_lock:
+        # Double-checked locking: outra thread pode ter aberto enquanto esperávamos
+        storage = _storages.get(chave)
+        if storage is None:
+            storage = _abrir(filename)
+            _storages[chave] = storage
+        return storage
+
+def close_all():
+    """
+    [SO - SHUTDOWN] Descarrega e fecha todos os storages abertos.
+    As instâncias continuam na tabela: módulos que as guardaram (api, admin)
+    seguem válidos e o próximo uso reabre log/conexões (novo lifespan).
+    """
+    with _registry_lock:
+        for storage in _storages.values():
+            storage.close()
+        # O feed em RAM continua válido (mesma época); o do SQLite fecha a conexão
+        if isinstance(_feed, SqliteChangeFeed):
+            _feed.close()
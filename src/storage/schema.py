@@ -0,0 +1,55 @@
+from typing import Optional, Tuple
+from .indexes import HashIndex, SortedIndex
+from .records import ColunaCategoria, ColunaInstante, ColunaInteiro, ColunaObjeto
+
+# [SO - ESQUEMA / METADADOS]
+# Índices secundários de cada arquivo de dados. O registry os entrega ao
+# storage na abertura; eles são reconstruídos em RAM durante o replay.
+def indices_para(filename: str) -> list:
+    if filename.endswith('consultas.json'):
+        return [
+            # Um horário por médico: garantido dentro do caminho de escrita
+            HashIndex('medico_data_hora', ('medico_id', 'data_hora'), unique=True),
+            # Agenda de um médico em ordem cronológica (intervalos por data)
+            SortedIndex('por_medico', 'data_hora', grupo='medico_id'),
+            # Linha do tempo global (consultas de um dia / de um período)
+            SortedIndex('por_data', 'data_hora'),
+        ]
+    if filename.endswith('cancelamentos.json'):
+        # Um registro por cancelamento: a base das contagens de canceladas
+        return [SortedIndex('por_data', 'data_hora')]
+    return []
+
+# Layout em RAM de cada arquivo (ver TabelaColunar). A ordem das colunas é a
+# ordem dos campos nos dicts devolvidos. Campos fora da lista continuam
+# funcionando, só que sem a compactação.
+def colunas_para(filename: str) -> list:
+    if filename.endswith('consultas.json'):
+        return [
+            ColunaObjeto('paciente'),
+            ColunaInteiro('medico_id'),
+            ColunaInstante('data_hora'),
+            ColunaCategoria('status'),
+        ]
+    if filename.endswith('cancelamentos.json'):
+        return [
+            ColunaInteiro('consulta_id'),
+            ColunaInteiro('medico_id'),
+            ColunaInstante('data_hora'),
+            ColunaObjeto('cancelada_em'),
+        ]
+    if filename.endswith('medicos.json'):
+        return [
+            ColunaObjeto('nome'),
+            ColunaCategoria('especialidade'),
+            ColunaObjeto('ativo'),
+            ColunaObjeto('disponibilidade'),
+        ]
+    return []
+
+# Particionamento mensal (ver PartitionedStorage): (campo de data, campo que
+# agrupa os blocos das partições seladas). None = arquivo não particionado.
+def particoes_para(filename: str) -> Optional[Tuple[str, str]]:
+    if filename.endswith('consultas.json'):
+        return ('data_hora', 'medico_id')
+    return None
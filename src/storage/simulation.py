@@ -0,0 +1,49 @@
+import random
+import time
+from typing import Callable, Dict, Optional
+from src.config.settings import (
+    SIMULACAO_CARGA, SIMULACAO_LATENCIA_ADD_S, SIMULACAO_LATENCIA_DELETE_S, SIMULACAO_JITTER_S
+)
+
+class SimulacaoCarga:
+    """
+    [SO - SIMULAÇÃO DE CARGA]
+    Injeta um "processamento pesado" artificial dentro da região crítica do
+    storage para provar que o Lock funciona: enquanto uma thread dorme com o
+    Mutex, as outras ficam bloqueadas (BLOCKED). Desligada por padrão.
+    A função de espera e o gerador aleatório são injetáveis (testes/benchmarks).
+    """
+
+    def __init__(self, ativo: bool, latencias: Dict[str, float], jitter: float = 0.0,
+                 sleep: Callable[[float], None] = time.sleep,
+                 aleatorio: Callable[[], float] = random.random):
+        self.ativo = ativo
+        self.latencias = dict(latencias)
+        self.jitter = jitter
+        self._sleep = sleep
+        self._aleatorio = aleatorio
+
+    def aplicar(self, operacao: str):
+        """Dorme a latência configurada para a operação (se o modo estiver ligado)."""
+        if not self.ativo:
+            return
+        atraso = self.latencias.get(operacao, 0.0) + self.jitter * self._aleatorio()
+        if atraso > 0:
+            self._sleep(atraso)
+
+    def configurar(self, ativo: Optional[bool] = None, latencias: Optional[Dict[str, float]] = None,
+                   jitter: Optional[float] = None):
+        if ativo is not None:
+            self.ativo = ativo
+        if latencias is not None:
+            self.latencias.update(latencias)
+        if jitter is not None:
+            self.jitter = jitter
+
+
+# Instância global usada pelos storages (perfil vindo de settings.py)
+simulacao = SimulacaoCarga(
+    ativo=SIMULACAO_CARGA,
+    latencias={"add": SIMULACAO_LATENCIA_ADD_S, "delete": SIMULACAO_LATENCIA_DELETE_S},
+    jitter=SIMULACAO_JITTER_S,
+)
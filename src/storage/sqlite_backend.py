@@ -0,0 +1,374 @@
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from src.config.settings import SQLITE_PATH, SQLITE_POOL_SIZE, GROUP_COMMIT_JANELA_MS, GROUP_COMMIT_MAX_ITENS
+from src.core.metrics import LockMedido, registrar_io
+from src.core.serialization import dumps_texto, loads
+from .changes import SqliteChangeFeed
+from .group_commit import CommitTicket
+from .indexes import SortedIndex, UniqueConstraintError, lotes_por_cursor
+from .simulation import SimulacaoCarga, simulacao as simulacao_padrao
+
+class SqliteStorage:
+    """
+    Backend alternativo com a mesma interface do JsonStorage
+    (read/add/update/delete/get/find_by/find_one/range).
+
+    [SO - BANCO EMBARCADO]
+    - Um único arquivo (data/sistema.db) em modo WAL: leitores não bloqueiam
+      o escritor e o escritor não bloqueia os leitores.
+    - Cada arquivo .json lógico vira uma tabela (id, dados JSON).
+    - Os índices do schema viram índices de expressão do SQLite; o índice único
+      (medico_id, data_hora) é garantido pelo próprio motor.
+    - Pool pequeno de conexões para leitura + uma conexão dedicada ao escritor.
+    - Group commit: escritas concorrentes dividem uma transação e um fsync
+      (ver _transacao), como o GroupCommitter do JsonStorage.
+    """
+
+    def __init__(self, filename: str, indices: Sequence = (), db_path: str = SQLITE_PATH,
+                 pool_size: int = SQLITE_POOL_SIZE, simulacao: Optional[SimulacaoCarga] = None,
+                 feed: Optional[SqliteChangeFeed] = None, janela_ms: float = GROUP_COMMIT_JANELA_MS,
+                 max_itens: int = GROUP_COMMIT_MAX_ITENS):
+        self.filepath = db_path
+        self.tabela = _nome_tabela(filename)
+        self._pool_size = max(1, pool_size)
+        self._feed = feed
+        self._indices = {indice.nome: indice for indice in indices}
+        self._simulacao = simulacao or simulacao_padrao
+
+        # [SO - CONCORRÊNCIA] Um único escritor por tabela no processo.
+        # Entre processos, o próprio SQLite serializa (BEGIN IMMEDIATE).
+        self._lock = LockMedido(self.tabela)
+        self._writer: Optional[sqlite3.Connection] = None
+        # [SO - GROUP COMMIT] Transação aberta que as próximas escritas ainda podem usar
+        self._janela = janela_ms / 1000
+        self._max_itens = max(1, max_itens)
+        self._lote: Optional[CommitTicket] = None
+        self._itens_no_lote = 0
+
+        # [SO - POOL DE RECURSOS] Conexões reutilizáveis para leitura
+        self._pool: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        self._no_pool = 0 # Conexões de leitura abertas (livres ou emprestadas)
+        with self._lock:
+            self._abrir_conexoes()
+
+        self._criar_tabela()
+        self._sql = self._preparar_sql()
+
+    # --- DDL ---
+
+    def _criar_tabela(self):
+        t = self.tabela
+        with self._lock:
+            self._writer.execute(
+                f'CREATE TABLE IF NOT EXISTS "{t}" (id INTEGER PRIMARY KEY AUTOINCREMENT, dados TEXT NOT NULL)'
+            )
+            # [SO - VERSIONAMENTO] Contador por tabela, incrementado em toda escrita
+            self._writer.execute("CREATE TABLE IF NOT EXISTS _versoes (tabela TEXT PRIMARY KEY, versao INTEGER NOT NULL)")
+            self._writer.execute("INSERT OR IGNORE INTO _versoes (tabela, versao) VALUES (?, 0)", (t,))
+            for indice in self._indices.values():
+                colunas = ", ".join(_expr(c) for c in _colunas_indice(indice))
+                unico = "UNIQUE " if getattr(indice, "unique", False) else ""
+                self._writer.execute(
+                    f'CREATE {unico}INDEX IF NOT EXISTS "{t}__{indice.nome}" ON "{t}" ({colunas})'
+                )
+
+    def _preparar_sql(self) -> Dict[str, str]:
+        """
+        [SO - PREPARED STATEMENTS]
+        Todo SQL é texto constante com parâmetros '?': o sqlite3 mantém as
+        instruções compiladas em cache por conexão e só as reexecuta.
+        """
+        t = self.tabela
+        return {
+            "read": f'SELECT id, dados FROM "{t}" ORDER BY id',
+            "get": f'SELECT id, dados FROM "{t}" WHERE id = ?',
+            "insert": f'INSERT INTO "{t}" (dados) VALUES (?)',
+            "insert_id": f'INSERT INTO "{t}" (id, dados) VALUES (?, ?)',
+            "update": f'UPDATE "{t}" SET dados = ? WHERE id = ?',
+            "delete": f'DELETE FROM "{t}" WHERE id = ?',
+            "count": f'SELECT COUNT(*) FROM "{t}"',
+            "versao": 'SELECT versao FROM _versoes WHERE tabela = ?',
+            "incrementar_versao": 'UPDATE _versoes SET versao = versao + 1 WHERE tabela = ?',
+        }
+
+    # --- Conexões ---
+
+    def _abrir_conexoes(self):
+        # Com o lock adquirido: no boot e no primeiro uso após close()
+        if self._writer is None:
+            self._writer = _conectar(self.filepath)
+            while self._no_pool < self._pool_size:
+                self._pool.put(_conectar(self.filepath))
+                self._no_pool += 1
+
+    @contextmanager
+    def _leitor(self) -> Iterator[sqlite3.Connection]:
+        if self._writer is None:
+            with self._lock:
+                self._abrir_conexoes()
+        conexao = self._pool.get() # Bloqueia se todas estiverem em uso
+        try:
+            yield conexao
+        finally:
+            self._pool.put(conexao)
+
+    @contextmanager
+    def _transacao(self) -> Iterator[sqlite3.Connection]:
+        """
+        [SO - REGIÃO CRÍTICA + TRANSAÇÃO EM GRUPO]
+        A primeira escrita abre o lote: BEGIN IMMEDIATE reserva o direito de
+        escrita no arquivo, inclusive contra outros processos. As escritas que
+        chegam durante a janela (GROUP_COMMIT_JANELA_MS, ou até
+        GROUP_COMMIT_MAX_ITENS) entram na mesma transação, cada uma em um
+        SAVEPOINT: uma violação de unicidade desfaz só a própria escrita.
+        Um único COMMIT (um fsync no WAL) confirma o lote inteiro, e cada
+        chamador só retorna depois dele, como no JsonStorage.
+        """
+        erro: Optional[BaseException] = None
+        with self._lock:
+            self._abrir_conexoes()
+            lote, lider = self._lote, self._lote is None
+            if lider:
+                self._writer.execute("BEGIN IMMEDIATE")
+                lote = self._lote = CommitTicket()
+                self._itens_no_lote = 0
+            self._writer.execute("SAVEPOINT escrita")
+            try:
+                yield self._writer
+            except BaseException as e:
+                self._writer.execute("ROLLBACK TO escrita")
+                erro = e
+            self._writer.execute("RELEASE escrita")
+            self._itens_no_lote += 1
+            if self._itens_no_lote >= self._max_itens:
+                self._confirmar_lote()
+        if lider and not lote.concluido(self._janela):
+            # Fim da janela: quem abriu o lote o confirma (o lock fica livre durante a espera)
+            with self._lock:
+                if self._lote is lote:
+                    self._confirmar_lote()
+        if erro is not None:
+            raise erro # A própria escrita já foi desfeita no SAVEPOINT
+        lote.wait()
+
+    def _confirmar_lote(self):
+        # Com o lock adquirido
+        lote, self._lote = self._lote, None
+        inicio = time.perf_counter()
+        try:
+            self._writer.execute("COMMIT")
+        except BaseException as e:
+            print(f"[SO - GROUP COMMIT] Falha no COMMIT de {self._itens_no_lote} escrita(s) em {self.tabela}: {e}")
+            if self._writer.in_transaction:
+                self._writer.execute("ROLLBACK")
+            lote._concluir(e)
+            return
+        # O SQLite não expõe os bytes por transação: só a duração do COMMIT
+        registrar_io(os.path.basename(self.filepath), "commit", inicio)
+        lote._concluir()
+
+    # --- Interface pública ---
+
+    def read(self) -> List[Dict[str, Any]]:
+        with self._leitor() as conexao:
+            return [_row(i, d) for i, d in conexao.execute(self._sql["read"])]
+
+    def version(self) -> int:
+        with self._leitor() as conexao:
+            return conexao.execute(self._sql["versao"], (self.tabela,)).fetchone()[0]
+
+    def read_versioned(self) -> Tuple[int, List[Dict[str, Any]]]:
+        """(versão, registros) lidos na mesma transação (snapshot do WAL)."""
+        with self._leitor() as conexao:
+            conexao.execute("BEGIN")
+            try:
+                versao = conexao.execute(self._sql["versao"], (self.tabela,)).fetchone()[0]
+                rows = [_row(i, d) for i, d in conexao.execute(self._sql["read"])]
+            finally:
+                conexao.execute("COMMIT")
+        return versao, rows
+
+    def get(self, item_id: int) -> Optional[Dict[str, Any]]:
+        with self._leitor() as conexao:
+            linha = conexao.execute(self._sql["get"], (item_id,)).fetchone()
+        return _row(*linha) if linha else None
+
+    def add(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        item = dict(item)
+        item_id = item.pop("id", None)
+        dados = dumps_texto(item)
+        with self._transacao() as conexao:
+            if self._simulacao.ativo: # Mesmo rastro didático do JsonStorage
+                print(f"[SO - LOCK] Thread {threading.get_ident()} adquiriu o lock para {self.tabela}")
+            # [SO - SIMULAÇÃO DE CARGA] Mesmo perfil didático do JsonStorage
+            self._simulacao.aplicar("add")
+            try:
+                if item_id is None:
+                    item_id = conexao.execute(self._sql["insert"], (dados,)).lastrowid
+                else:
+                    conexao.execute(self._sql["insert_id"], (item_id, dados))
+            except sqlite3.IntegrityError as e:
+                raise self._traduzir(e, item) from e
+            self._registrar_mudanca(conexao, "add", item_id, {**item, "id": item_id})
+            if self._simulacao.ativo:
+                print(f"[SO - LOCK] Thread {threading.get_ident()} liberou o lock.")
+        item["id"] = item_id
+        return item
+
+    def update(self, item_id: int, updates: Dict[str, Any]) -> bool:
+        with self._transacao() as conexao:
+            linha = conexao.execute(self._sql["get"], (item_id,)).fetchone()
+            if linha is None:
+                return False
+            novo = {**loads(linha[1]), **updates}
+            novo.pop("id", None)
+            try:
+                conexao.execute(self._sql["update"], (dumps_texto(novo), item_id))
+            except sqlite3.IntegrityError as e:
+                raise self._traduzir(e, novo) from e
+            self._registrar_mudanca(conexao, "update", item_id, {**novo, "id": item_id})
+            return True
+
+    def delete(self, item_id: int) -> bool:
+        with self._transacao() as conexao:
+            self._simulacao.aplicar("delete")
+            linha = conexao.execute(self._sql["get"], (item_id,)).fetchone()
+            if linha is None:
+                return False
+            conexao.execute(self._sql["delete"], (item_id,))
+            self._registrar_mudanca(conexao, "delete", item_id, _row(*linha))
+            return True
+
+    def _registrar_mudanca(self, conexao: sqlite3.Connection, op: str, item_id: int, dados: Dict[str, Any]):
+        # Mesma transação da mudança: versão e feed nunca divergem da tabela
+        conexao.execute(self._sql["incrementar_versao"], (self.tabela,))
+        if self._feed is not None:
+            self._feed.registrar_em(conexao, self.tabela, op, item_id, dados)
+
+    def seq_de(self, item_id: int) -> int:
+        """Seq (no feed de mudanças) da última alteração deste item."""
+        return self._feed.seq_de(self.tabela, item_id) if self._feed is not None else 0
+
+    def find_by(self, indice: str, *chave: Any) -> List[Dict[str, Any]]:
+        idx = self._indices[indice]
+        condicoes = " AND ".join(f"{_expr(c)} = ?" for c in idx.campos)
+        sql = f'SELECT id, dados FROM "{self.tabela}" WHERE {condicoes} ORDER BY id'
+        with self._leitor() as conexao:
+            return [_row(i, d) for i, d in conexao.execute(sql, chave)]
+
+    def find_one(self, indice: str, *chave: Any) -> Optional[Dict[str, Any]]:
+        encontrados = self.find_by(indice, *chave)
+        return encontrados[0] if encontrados else None
+
+    def range(self, indice: str, grupo: Any = None, de: Any = None, ate: Any = None,
+              apos: Optional[Tuple[Any, int]] = None, limite: Optional[int] = None) -> List[Dict[str, Any]]:
+        idx = self._indices[indice]
+        campo = _expr(idx.campo)
+        condicoes, parametros = [f"{campo} IS NOT NULL"], []
+        if idx.grupo:
+            condicoes.append(f"{_expr(idx.grupo)} = ?")
+            parametros.append(grupo)
+        if de is not None:
+            condicoes.append(f"{campo} >= ?")
+            parametros.append(de)
+        if ate is not None:
+            condicoes.append(f"{campo} < ?")
+            parametros.append(ate)
+        if apos is not None:
+            # Keyset pagination: continua depois de (valor, id), usando o índice
+            condicoes.append(f"({campo}, id) > (?, ?)")
+            parametros.extend([apos[0], apos[1]])
+        sql = (f'SELECT id, dados FROM "{self.tabela}" WHERE {" AND ".join(condicoes)} '
+               f'ORDER BY {campo}, id')
+        if limite is not None:
+            sql += " LIMIT ?"
+            parametros.append(limite)
+        with self._leitor() as conexao:
+            return [_row(i, d) for i, d in conexao.execute(sql, parametros)]
+
+    def iterar(self, indice: str, grupo: Any = None, de: Any = None, ate: Any = None,
+               lote: int = 500) -> Iterator[List[Dict[str, Any]]]:
+        """[SO - LEITURA EM BLOCOS] Lotes do range, paginados por cursor (ver lotes_por_cursor)."""
+        return lotes_por_cursor(lambda apos, limite: self.range(indice, grupo, de, ate, apos=apos, limite=limite),
+                                self._indices[indice].campo, lote)
+
+    # --- Migração ---
+
+    def is_empty(self) -> bool:
+        with self._leitor() as conexao:
+            return conexao.execute(self._sql["count"]).fetchone()[0] == 0
+
+    def import_rows(self, rows: Sequence[Dict[str, Any]]) -> int:
+        """
+        Carga em lote preservando os IDs originais (uma única transação).
+        Linhas que violam restrições (ex.: duplicatas legadas) são descartadas.
+        """
+        importadas = 0
+        with self._transacao() as conexao:
+            for row in rows:
+                dados = {k: v for k, v in row.items() if k != "id"}
+                try:
+                    conexao.execute(self._sql["insert_id"], (row.get("id"), dumps_texto(dados)))
+                    importadas += 1
+                except sqlite3.IntegrityError as e:
+                    print(f"[SO - MIGRAÇÃO] Registro {row.get('id')} ignorado em {self.tabela}: {e}")
+            conexao.execute(self._sql["incrementar_versao"], (self.tabela,))
+        return importadas
+
+    def close(self):
+        """Fecha as conexões livres; a instância reabre as que faltarem no próximo uso."""
+        with self._lock:
+            if self._writer is None:
+                return
+            if self._lote is not None:
+                self._confirmar_lote() # Lote aberto: confirmado antes de fechar
+            self._writer.close()
+            self._writer = None
+            while not self._pool.empty():
+                self._pool.get_nowait().close()
+                self._no_pool -= 1
+
+    def _traduzir(self, erro: sqlite3.IntegrityError, row: Dict[str, Any]) -> Exception:
+        # Índices de expressão aparecem pelo nome: "UNIQUE constraint failed: index 'consultas__x'".
+        # Outras violações (ex.: id repetido, "consultas.id") seguem como IntegrityError.
+        violado = _INDICE_VIOLADO.search(str(erro))
+        if violado is not None:
+            for indice in self._indices.values():
+                if violado.group(1) == f"{self.tabela}__{indice.nome}" and getattr(indice, "unique", False):
+                    return UniqueConstraintError(indice.nome, indice.chave(row))
+        return erro
+
+
+_INDICE_VIOLADO = re.compile(r"index '([^']+)'")
+
+def _conectar(db_path: str) -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    # isolation_level=None: controlamos BEGIN/COMMIT explicitamente
+    conexao = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None,
+                              timeout=30, cached_statements=256)
+    conexao.execute("PRAGMA journal_mode=WAL")   # Leitores concorrentes ao escritor
+    conexao.execute("PRAGMA synchronous=FULL")   # fsync a cada COMMIT (durabilidade)
+    return conexao
+
+def _nome_tabela(filename: str) -> str:
+    base = os.path.splitext(os.path.basename(filename))[0]
+    return re.sub(r"\W", "_", base)
+
+def _expr(campo: str) -> str:
+    return f"json_extract(dados, '$.{campo}')"
+
+def _colunas_indice(indice) -> List[str]:
+    if isinstance(indice, SortedIndex):
+        return ([indice.grupo] if indice.grupo else []) + [indice.campo]
+    return list(indice.campos)
+
+def _row(item_id: int, dados: str) -> Dict[str, Any]:
+    row = loads(dados)
+    row["id"] = item_id
+    return row
@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# Os módulos de src leem SO_DATA_DIR na importação: os testes nunca tocam o data/ real
+os.environ["SO_DATA_DIR"] = tempfile.mkdtemp(prefix="so_testes_")
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+os.chdir(RAIZ) # main.py resolve templates/ a partir do diretório atual
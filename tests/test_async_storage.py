@@ -0,0 +1,64 @@
+import asyncio
+import threading
+import time
+
+from src.core.loop_monitor import LoopLagMonitor
+from src.storage import get_async_storage, get_storage, run_io
+
+
+def test_run_io_nao_bloqueia_o_event_loop():
+    async def cenario():
+        ticks = 0
+
+        async def relogio():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        def bloqueante():
+            time.sleep(0.3) # Ex.: mutex do storage + fsync
+            return threading.current_thread().name
+
+        tarefa = asyncio.ensure_future(relogio())
+        nome = await run_io(bloqueante)
+        tarefa.cancel()
+        return nome, ticks
+
+    nome, ticks = asyncio.run(cenario())
+    assert nome.startswith("storage-io")
+    assert ticks >= 10
+
+
+def test_fachada_compartilha_o_storage_do_registry(tmp_path):
+    arquivo = str(tmp_path / "avisos.json")
+    fachada = get_async_storage(arquivo)
+    assert get_async_storage(arquivo) is fachada
+    assert fachada.sync is get_storage(arquivo)
+
+    async def cenario():
+        aviso = await fachada.add({"texto": "plantão"})
+        assert await fachada.update(aviso["id"], {"texto": "feriado"})
+        return aviso, await fachada.get(aviso["id"]), await fachada.read()
+
+    aviso, lido, todos = asyncio.run(cenario())
+    assert lido == {"texto": "feriado", "id": aviso["id"]}
+    assert todos == [lido] == get_storage(arquivo).read()
+
+
+def test_monitor_mede_o_loop_bloqueado():
+    monitor = LoopLagMonitor(intervalo_ms=10, alerta_ms=1000)
+    assert monitor.stats()["amostras"] == 0
+
+    async def cenario():
+        monitor.start()
+        await asyncio.sleep(0.05)
+        time.sleep(0.2) # Syscall bloqueante direto no loop
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+
+    asyncio.run(cenario())
+    stats = monitor.stats()
+    assert stats["amostras"] >= 2
+    assert stats["max_total_ms"] >= 150
+    assert stats["p50_ms"] <= stats["p99_ms"] <= stats["max_janela_ms"]
@@ -0,0 +1,66 @@
+import asyncio
+import json
+
+from src.core.socket_manager import WS_CODIGO_CLIENTE_LENTO, ConnectionManager
+
+
+class _Socket:
+    """WebSocket falso: `travado` nunca conclui um envio (cliente lento)."""
+
+    def __init__(self, travado: bool = False):
+        self.scope = {"subprotocols": []}
+        self.recebidas = []
+        self.codigo = None
+        self._travado = travado
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, frame: str):
+        if self._travado:
+            await asyncio.Event().wait()
+        self.recebidas.append(json.loads(frame))
+
+    async def close(self, code: int = 1000):
+        self.codigo = code
+
+
+def test_cliente_lento_nao_atrasa_os_demais():
+    async def cenario():
+        manager = ConnectionManager(capacidade_fila=2)
+        rapido, lento = _Socket(), _Socket(travado=True)
+        await manager.connect(rapido)
+        await manager.connect(lento)
+        for n in range(6):
+            await manager.broadcast({"tipo": "teste", "n": n})
+            await asyncio.sleep(0) # Escritores drenam as filas
+        await asyncio.sleep(0.05)
+        return manager, rapido, lento
+
+    manager, rapido, lento = asyncio.run(cenario())
+    assert [m["n"] for m in rapido.recebidas] == list(range(6))
+
+    # 1 mensagem presa no send + 2 na fila: a quarta estoura e o cliente cai
+    assert lento.codigo == WS_CODIGO_CLIENTE_LENTO
+    assert list(manager.active_connections) == [rapido]
+    stats = manager.stats()
+    assert stats["desconexoes_lentos"] == 1
+    assert stats["broadcasts"] == 6
+    assert stats["mensagens_enfileiradas"] == 6 + 3
+
+
+def test_mensagem_pessoal_segue_a_ordem_da_fila():
+    async def cenario():
+        manager = ConnectionManager(capacidade_fila=8)
+        socket, outro = _Socket(), _Socket()
+        await manager.connect(socket)
+        await manager.connect(outro)
+        await manager.broadcast({"tipo": "a"})
+        await manager.send_personal(socket, {"tipo": "b"})
+        await manager.broadcast({"tipo": "c"})
+        await asyncio.sleep(0.05)
+        return socket, outro
+
+    socket, outro = asyncio.run(cenario())
+    assert [m["tipo"] for m in socket.recebidas] == ["a", "b", "c"]
+    assert [m["tipo"] for m in outro.recebidas] == ["a", "c"]
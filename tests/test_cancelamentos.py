@@ -0,0 +1,20 @@
+from fastapi.testclient import TestClient
+
+import main
+from src.core import admin
+
+
+def test_canceladas_persistem_entre_reinicios():
+    consulta = {"paciente_nome": "Paciente", "medico_id": 2, "data_hora": "2031-03-04T09:00"}
+    with TestClient(main.app) as cliente:
+        antes = cliente.get("/admin/stats", params={"medico_id": "2"}).json()["total"]
+        assert cliente.post("/api/agendar", json=consulta).status_code == 200
+        resposta = cliente.post("/api/cancelar", json={"medico_id": 2, "data_hora": "2031-03-04T09:00"})
+        assert resposta.status_code == 200, resposta.text
+        depois = cliente.get("/admin/stats", params={"medico_id": "2"}).json()["total"]
+        assert depois == {"agendadas": antes["agendadas"], "canceladas": antes["canceladas"] + 1}
+
+    # Recontagem a partir dos storages (como num processo novo): o cancelamento continua lá
+    admin.agregador._seq = None
+    with TestClient(main.app) as cliente:
+        assert cliente.get("/admin/stats", params={"medico_id": "2"}).json()["total"] == depois
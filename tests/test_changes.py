@@ -0,0 +1,63 @@
+from src.storage import ChangeFeed, JsonStorage, SqliteChangeFeed, SqliteStorage
+
+
+def test_feed_em_ram_segue_a_ordem_das_escritas(tmp_path):
+    feed = ChangeFeed(retencao=3)
+    storage = JsonStorage(str(tmp_path / "medicos.json"), feed=feed)
+    medico = storage.add({"nome": "Dra. Ana"})
+    storage.update(medico["id"], {"nome": "Dra. Ana Lima"})
+    storage.delete(medico["id"])
+
+    resposta = feed.desde(0)
+    assert resposta["epoca"] == feed.epoca and resposta["seq"] == 3
+    assert not resposta["reset"] and not resposta["mais"]
+    assert [(m["seq"], m["origem"], m["op"], m["id"]) for m in resposta["mudancas"]] == [
+        (1, "medicos", "add", medico["id"]),
+        (2, "medicos", "update", medico["id"]),
+        (3, "medicos", "delete", medico["id"]),
+    ]
+    assert resposta["mudancas"][1]["dados"] == {"nome": "Dra. Ana Lima", "id": medico["id"]}
+    assert storage.seq_de(medico["id"]) == 3
+
+    # Paginação: `mais` avisa que o cliente deve pedir de novo a partir de `seq`
+    pagina = feed.desde(1, limite=1)
+    assert (pagina["seq"], pagina["mais"]) == (2, True)
+    assert feed.desde(3)["mudancas"] == []
+
+
+def test_feed_em_ram_pede_reset_fora_da_janela(tmp_path):
+    feed = ChangeFeed(retencao=2)
+    storage = JsonStorage(str(tmp_path / "medicos.json"), feed=feed)
+    medico = storage.add({"nome": "Dr. Caio"})
+    for n in range(3):
+        storage.update(medico["id"], {"sala": n})
+
+    assert feed.desde(1)["reset"]                      # A mudança 2 já saiu do buffer circular
+    assert [m["seq"] for m in feed.desde(2)["mudancas"]] == [3, 4]
+    assert feed.desde(3, epoca="outra")["reset"]       # Outro boot do processo
+    assert feed.desde(9)["reset"]                      # Seq que nunca existiu
+    assert not feed.desde(None)["reset"]               # Primeira carga
+    assert ChangeFeed().epoca != feed.epoca
+
+
+def test_feed_sqlite_na_mesma_transacao_e_entre_workers(tmp_path):
+    db_path = str(tmp_path / "sistema.db")
+    feed = SqliteChangeFeed(db_path)
+    storage = SqliteStorage('consultas/medicos.json', db_path=db_path, feed=feed)
+    medico = storage.add({"nome": "Dra. Lia"})
+    storage.update(medico["id"], {"ativo": False})
+
+    # Outro worker (outra conexão) vê as mesmas mudanças e a mesma época
+    outro = SqliteChangeFeed(db_path)
+    assert outro.epoca == feed.epoca
+    resposta = outro.desde(0)
+    assert [(m["seq"], m["op"], m["dados"]) for m in resposta["mudancas"]] == [
+        (1, "add", {"nome": "Dra. Lia", "id": medico["id"]}),
+        (2, "update", {"nome": "Dra. Lia", "ativo": False, "id": medico["id"]}),
+    ]
+    assert outro.seq_de("medicos", medico["id"]) == 2
+    assert outro.desde(2, epoca=feed.epoca) == {"epoca": feed.epoca, "seq": 2, "reset": False,
+                                                "mais": False, "mudancas": []}
+    assert outro.desde(1, epoca="outra")["reset"]
+    feed.close()
+    outro.close()
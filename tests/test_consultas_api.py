@@ -0,0 +1,73 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.core.api import api_router, db_consultas
+
+MEDICO = 901 # Agenda própria: não se mistura com a de outros testes
+
+
+@pytest.fixture(scope="module")
+def cliente():
+    app = FastAPI()
+    app.include_router(api_router)
+    return TestClient(app)
+
+
+@pytest.fixture(scope="module")
+def agenda():
+    ids = {}
+    # Fora de ordem: a resposta vem na ordem de data_hora, não na de inserção
+    for dia, hora, status in [(5, 9, "confirmada"), (3, 9, None), (3, 14, "confirmada"), (4, 8, None),
+                              (6, 9, None), (3, 11, "confirmada"), (7, 10, None)]:
+        data_hora = f"2032-05-{dia:02d}T{hora:02d}:00"
+        consulta = {"paciente": f"P{dia}{hora}", "medico_id": MEDICO, "data_hora": data_hora}
+        if status:
+            consulta["status"] = status
+        ids[data_hora] = db_consultas.add(consulta)["id"]
+    return ids
+
+
+def _paginar(cliente, **params):
+    paginas, cursor = [], None
+    while True:
+        resposta = cliente.get("/api/consultas", params={**params, **({"cursor": cursor} if cursor else {})})
+        assert resposta.status_code == 200, resposta.text
+        paginas.append(resposta.json())
+        cursor = resposta.headers.get("x-proximo-cursor")
+        if cursor is None:
+            return paginas
+
+
+def test_paginacao_por_cursor_em_ordem_de_data(cliente, agenda):
+    paginas = _paginar(cliente, medico_id=MEDICO, limite=3)
+    assert [len(p) for p in paginas] == [3, 3, 1]
+    vistos = [row["data_hora"] for pagina in paginas for row in pagina]
+    assert vistos == sorted(agenda)
+    assert [row["id"] for pagina in paginas for row in pagina] == [agenda[d] for d in sorted(agenda)]
+
+
+def test_cursor_estavel_com_escritas_entre_paginas(cliente, agenda):
+    primeira = cliente.get("/api/consultas", params={"medico_id": MEDICO, "limite": 2})
+    cursor = primeira.headers["x-proximo-cursor"]
+    # Uma consulta nova ANTES do cursor não desloca as páginas seguintes
+    nova = db_consultas.add({"paciente": "Nova", "medico_id": MEDICO, "data_hora": "2032-05-01T08:00"})
+    try:
+        resto = _paginar(cliente, medico_id=MEDICO, limite=2, cursor=cursor)
+        vistos = [row["data_hora"] for row in primeira.json()] + [row["data_hora"] for p in resto for row in p]
+        assert vistos == sorted(agenda)
+    finally:
+        db_consultas.delete(nova["id"])
+
+
+def test_filtros_intervalo_status_e_projecao(cliente, agenda):
+    dia = cliente.get("/api/consultas", params={"de": "2032-05-03", "ate": "2032-05-04"}).json()
+    assert [row["data_hora"] for row in dia] == ["2032-05-03T09:00", "2032-05-03T11:00", "2032-05-03T14:00"]
+
+    paginas = _paginar(cliente, medico_id=MEDICO, status="confirmada", limite=2, campos="id,data_hora")
+    confirmadas = [row for pagina in paginas for row in pagina]
+    assert confirmadas == [{"id": agenda[d], "data_hora": d}
+                           for d in ("2032-05-03T11:00", "2032-05-03T14:00", "2032-05-05T09:00")]
+
+    assert cliente.get("/api/consultas", params={"medico_id": MEDICO, "cursor": "x"}).status_code == 400
+    assert cliente.get("/api/consultas", params={"medico_id": MEDICO, "limite": 0}).status_code == 422
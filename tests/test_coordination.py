@@ -0,0 +1,81 @@
+import asyncio
+import time
+
+from src.core.coordination import LocalCoordinator, SqliteCoordinator
+
+
+def test_lease_local_expira_e_libera_o_recurso():
+    async def cenario():
+        coordenacao = LocalCoordinator(ttl=0.05, worker_id="w1")
+        assert await coordenacao.adquirir("1|2030-01-01T09:00", "w1:a")
+        assert not await coordenacao.adquirir("1|2030-01-01T09:00", "w1:b")
+        assert await coordenacao.expirar() == []
+        assert 0 < await coordenacao.espera_proximo_vencimento() <= 0.05
+        await asyncio.sleep(0.08)
+        assert await coordenacao.expirar() == ["1|2030-01-01T09:00"]
+        assert await coordenacao.espera_proximo_vencimento() is None
+        assert await coordenacao.adquirir("1|2030-01-01T09:00", "w1:b")
+        return coordenacao.total_locks()
+
+    assert asyncio.run(cenario()) == 1
+
+
+def test_locks_sqlite_compartilhados_entre_workers(tmp_path):
+    db_path = str(tmp_path / "coordenacao.db")
+
+    async def cenario():
+        w1 = SqliteCoordinator(db_path, ttl=0.2, worker_id="w1")
+        w2 = SqliteCoordinator(db_path, ttl=0.2, worker_id="w2")
+        try:
+            assert await w1.adquirir("1|2030-01-01T09:00", "w1:a")
+            assert await w1.adquirir("1|2030-01-01T10:00", "w1:a")
+            assert await w2.adquirir("2|2030-01-01T09:00", "w2:b")
+            # Verificar + adquirir é atômico entre processos; o dono pode renovar
+            assert not await w2.adquirir("1|2030-01-01T09:00", "w2:b")
+            assert await w1.adquirir("1|2030-01-01T09:00", "w1:a")
+            assert not await w2.renovar("1|2030-01-01T09:00", "w2:b")
+            assert await w2.contar_locks() == 3 and w2.total_locks() == 3
+
+            assert sorted(await w2.liberar_prefixo("2")) == ["2|2030-01-01T09:00"]
+            assert sorted(await w2.liberar_dono("w1:a")) == ["1|2030-01-01T09:00", "1|2030-01-01T10:00"]
+            assert await w1.contar_locks() == 0
+
+            # Lease vencido: liberado por UM único worker e livre para o próximo dono
+            assert await w1.adquirir("1|2030-01-01T11:00", "w1:a")
+            await asyncio.sleep(0.25)
+            vencidos = await w1.expirar() + await w2.expirar()
+            assert vencidos == ["1|2030-01-01T11:00"]
+            assert await w2.adquirir("1|2030-01-01T11:00", "w2:b")
+
+            # fechar() no shutdown: o próximo uso reabre a conexão
+            await w1.fechar()
+            assert not await w1.adquirir("1|2030-01-01T11:00", "w1:a")
+        finally:
+            await w1.fechar()
+            await w2.fechar()
+
+    asyncio.run(cenario())
+
+
+def test_pub_sub_entre_workers(tmp_path):
+    db_path = str(tmp_path / "coordenacao.db")
+
+    async def cenario():
+        recebidos = {"w1": [], "w2": []}
+        w1 = SqliteCoordinator(db_path, worker_id="w1", poll_ms=10)
+        w2 = SqliteCoordinator(db_path, worker_id="w2", poll_ms=10)
+        await w1.publicar('{"tipo": "antes"}') # Anterior à assinatura: não é reentregue
+        await w1.iniciar(recebidos["w1"].append)
+        await w2.iniciar(recebidos["w2"].append)
+        await w1.iniciar(recebidos["w1"].append) # Idempotente
+        await w1.publicar('{"tipo": "de_w1"}')
+        await w2.publicar('{"tipo": "de_w2"}')
+        limite = time.monotonic() + 5
+        while time.monotonic() < limite and not (recebidos["w1"] and recebidos["w2"]):
+            await asyncio.sleep(0.01)
+        await w1.fechar()
+        await w2.fechar()
+        return recebidos
+
+    # Cada worker só repassa o que os OUTROS publicaram
+    assert asyncio.run(cenario()) == {"w1": ['{"tipo": "de_w2"}'], "w2": ['{"tipo": "de_w1"}']}
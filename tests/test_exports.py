@@ -0,0 +1,26 @@
+import io
+import json
+
+from src.core import serialization
+from src.reports.exports import COLUNAS, _colunar, _ndjson, ler_colunar
+
+
+def _linha(id, data_hora):
+    return {**{nome: None for nome, _ in COLUNAS}, "id": id, "data_hora": data_hora}
+
+
+def test_colunar_preserva_data_hora_fora_do_padrao():
+    lotes = [
+        [_linha(1, "2031-01-01T09:00"), _linha(2, None)],
+        # Segundos e fuso não cabem em minutos: o grupo vai como texto
+        [_linha(3, "2031-01-01T09:00:30"), _linha(4, "2031-01-01T10:00-03:00"), _linha(5, "amanhã")],
+    ]
+    arquivo = io.BytesIO(b"".join(_colunar(lotes)))
+    assert list(ler_colunar(arquivo)) == [linha for lote in lotes for linha in lote]
+
+
+def test_ndjson_usa_o_codificador_compartilhado():
+    lotes = [[_linha(1, "2031-01-01T09:00"), {**_linha(2, None), "paciente": "José"}], []]
+    corpo = b"".join(_ndjson(lotes))
+    assert corpo == b"".join(serialization.dumps(r) + b"\n" for lote in lotes for r in lote)
+    assert [json.loads(l) for l in corpo.decode("utf-8").splitlines()] == [r for lote in lotes for r in lote]
@@ -0,0 +1,72 @@
+import threading
+
+import pytest
+
+from src.storage import ChangeFeed, JsonStorage, database
+from src.storage.schema import colunas_para, indices_para
+
+ARQUIVO = 'consultas/group_commit.json'
+
+
+def _abrir(feed=None):
+    return JsonStorage(ARQUIVO, indices=indices_para('consultas.json'), colunas=colunas_para('consultas.json'),
+                       feed=feed)
+
+
+@pytest.fixture
+def storage():
+    storage = _abrir(ChangeFeed())
+    for row in storage.read():
+        storage.delete(row["id"])
+    yield storage
+    storage.close()
+
+
+def test_close_e_reabre_na_proxima_escrita(storage):
+    storage.close()
+    storage.close() # Idempotente
+    consulta = storage.add({"medico_id": 1, "data_hora": "2031-02-03T09:00"})
+    storage.close()
+    reaberto = _abrir()
+    assert reaberto.get(consulta["id"]) == consulta
+    reaberto.close()
+
+
+def test_lote_que_falha_e_desfeito_na_ram(storage, monkeypatch):
+    consulta = storage.add({"medico_id": 1, "data_hora": "2031-02-03T09:00", "paciente": "A"})
+    versao = storage.version()
+
+    def fsync_falha(fd):
+        raise OSError(5, "falha simulada de I/O")
+    monkeypatch.setattr(database.os, "fsync", fsync_falha)
+
+    with pytest.raises(OSError):
+        storage.update(consulta["id"], {"paciente": "B"})
+    erros = []
+
+    def agendar(hora):
+        try:
+            storage.add({"medico_id": 2, "data_hora": f"2031-02-03T{hora}:00"})
+        except OSError as e:
+            erros.append(e)
+    threads = [threading.Thread(target=agendar, args=(10 + i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    monkeypatch.undo()
+
+    # Nada do que falhou ficou na RAM, nos índices ou no LSN
+    assert len(erros) == 4
+    assert storage.version() == versao
+    assert storage.get(consulta["id"])["paciente"] == "A"
+    assert storage.read() == [storage.get(consulta["id"])]
+    assert storage.find_by('medico_data_hora', 2, "2031-02-03T10:00") == []
+
+    # O log continua íntegro: a próxima escrita persiste e sobrevive ao replay
+    nova = storage.add({"medico_id": 2, "data_hora": "2031-02-03T10:00"})
+    storage.close()
+    reaberto = _abrir()
+    assert sorted(r["id"] for r in reaberto.read()) == [consulta["id"], nova["id"]]
+    assert reaberto.version() == versao + 1
+    reaberto.close()
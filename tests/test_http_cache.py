@@ -0,0 +1,80 @@
+import gzip
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from src.core import http_cache
+from src.core.http_cache import CacheRespostas, responder
+from src.storage import JsonStorage
+
+
+@pytest.fixture
+def cenario(tmp_path):
+    storage = JsonStorage(str(tmp_path / "medicos.json"))
+    for n in range(30): # Corpo acima de COMPRIMIR_A_PARTIR_DE
+        storage.add({"nome": f"Dr. Médico {n}", "especialidade": "Clínica Geral"})
+    cache = CacheRespostas(storage)
+    app = FastAPI()
+
+    @app.get("/medicos")
+    def listar(request: Request):
+        return responder(request, cache.obter())
+
+    return storage, cache, TestClient(app)
+
+
+def test_etag_e_304_ate_a_proxima_escrita(cenario):
+    storage, cache, cliente = cenario
+    resposta = cliente.get("/medicos")
+    assert resposta.status_code == 200
+    assert len(resposta.json()) == 30
+    etag = resposta.headers["etag"]
+    assert resposta.headers["cache-control"] == "no-cache"
+
+    revalidacao = cliente.get("/medicos", headers={"If-None-Match": etag})
+    assert revalidacao.status_code == 304 and revalidacao.content == b""
+    assert revalidacao.headers["etag"] == etag
+    assert cliente.get("/medicos", headers={"If-None-Match": f'"outra", W/{etag}'}).status_code == 304
+    ultima = resposta.headers["last-modified"]
+    assert cliente.get("/medicos", headers={"If-Modified-Since": ultima}).status_code == 304
+    assert cache.stats()["reconstrucoes"] == 1 and cache.stats()["acertos"] >= 3
+
+    # Update sem efeito: nova versão, mesmo conteúdo, mesmo ETag
+    storage.update(1, {"nome": "Dr. Médico 0"})
+    assert cliente.get("/medicos", headers={"If-None-Match": etag}).status_code == 304
+
+    storage.update(1, {"nome": "Dra. Nova"})
+    nova = cliente.get("/medicos", headers={"If-None-Match": etag})
+    assert nova.status_code == 200 and nova.headers["etag"] != etag
+    assert nova.json()[0]["nome"] == "Dra. Nova"
+    assert cache.stats()["versao"] == storage.version()
+
+
+def test_negociacao_de_codificacao(cenario):
+    storage, cache, cliente = cenario
+    entrada = cache.obter()
+    comprimida = cliente.get("/medicos", headers={"Accept-Encoding": "deflate, gzip;q=0.8"})
+    assert comprimida.headers["content-encoding"] == "gzip"
+    assert comprimida.headers["vary"] == "Accept-Encoding"
+    assert gzip.decompress(entrada.corpos["gzip"]) == entrada.corpos["identity"]
+    assert len(comprimida.json()) == 30
+
+    crua = cliente.get("/medicos", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in crua.headers
+    assert crua.content == entrada.corpos["identity"]
+
+    # Corpo pequeno não é comprimido
+    for item in storage.read()[1:]:
+        storage.delete(item["id"])
+    pequena = cliente.get("/medicos", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in pequena.headers
+    assert set(cache.obter().corpos) == {"identity"}
+
+
+def test_brotli_tem_preferencia_quando_instalado(cenario):
+    pytest.importorskip("brotli")
+    _, cache, cliente = cenario
+    resposta = cliente.get("/medicos", headers={"Accept-Encoding": "gzip, br"})
+    assert resposta.headers["content-encoding"] == "br"
+    assert http_cache.brotli.decompress(cache.obter().corpos["br"]) == cache.obter().corpos["identity"]
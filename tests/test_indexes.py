@@ -0,0 +1,60 @@
+import pytest
+
+from src.storage import JsonStorage, UniqueConstraintError
+from src.storage.indexes import HashIndex, SortedIndex
+from src.storage.schema import indices_para
+
+
+def test_sorted_index_intervalos_por_grupo():
+    indice = SortedIndex('por_medico', 'data_hora', grupo='medico_id')
+    horarios = ["2030-01-03T10:00", "2030-01-01T09:00", "2030-01-02T09:00", "2030-01-02T09:00"]
+    for item_id, data_hora in enumerate(horarios, start=1):
+        indice.add(item_id, {"medico_id": 1, "data_hora": data_hora})
+    indice.add(5, {"medico_id": 2, "data_hora": "2030-01-02T11:00"})
+    indice.add(6, {"medico_id": 1}) # Sem o campo: fora do índice
+
+    assert list(indice.range(1)) == [2, 3, 4, 1]
+    # de inclusivo, ate exclusivo
+    assert list(indice.range(1, de="2030-01-02", ate="2030-01-03")) == [3, 4]
+    assert list(indice.range(1, de="2030-01-02T09:00")) == [3, 4, 1]
+    assert list(indice.range(1, ate="2030-01-02T09:00")) == [2]
+    assert list(indice.range(2)) == [5]
+    assert list(indice.range(3)) == []
+
+    indice.remove(3, {"medico_id": 1, "data_hora": "2030-01-02T09:00"})
+    assert list(indice.range(1, de="2030-01-02", ate="2030-01-03")) == [4]
+
+
+def test_hash_index_conflito_ignora_o_proprio_registro():
+    indice = HashIndex('medico_data_hora', ('medico_id', 'data_hora'), unique=True)
+    row = {"medico_id": 1, "data_hora": "2030-01-01T09:00"}
+    indice.add(1, row)
+    assert indice.get((1, "2030-01-01T09:00")) == [1]
+    assert not indice.conflito(1, row)
+    assert indice.conflito(None, row)
+    assert indice.conflito(2, dict(row))
+    indice.remove(1, row)
+    assert indice.get((1, "2030-01-01T09:00")) == []
+    assert not indice.conflito(None, row)
+
+
+def test_indice_unico_no_caminho_de_escrita(tmp_path):
+    arquivo = str(tmp_path / "consultas.json")
+    storage = JsonStorage(arquivo, indices=indices_para('consultas.json'))
+    primeira = storage.add({"medico_id": 1, "data_hora": "2030-01-01T09:00", "paciente": "Ana"})
+    segunda = storage.add({"medico_id": 2, "data_hora": "2030-01-01T09:00", "paciente": "Bia"})
+
+    with pytest.raises(UniqueConstraintError) as erro:
+        storage.add({"medico_id": 1, "data_hora": "2030-01-01T09:00", "paciente": "Carla"})
+    assert erro.value.indice == 'medico_data_hora'
+    with pytest.raises(UniqueConstraintError):
+        storage.update(segunda["id"], {"medico_id": 1})
+    assert len(storage.read()) == 2
+
+    # Remarcar libera o horário antigo; o replay reconstrói os índices
+    assert storage.update(primeira["id"], {"data_hora": "2030-01-01T10:00"})
+    assert storage.update(segunda["id"], {"medico_id": 1})
+    reaberto = JsonStorage(arquivo, indices=indices_para('consultas.json'))
+    assert [r["paciente"] for r in reaberto.range('por_medico', 1)] == ["Bia", "Ana"]
+    assert reaberto.find_one('medico_data_hora', 1, "2030-01-01T09:00")["id"] == segunda["id"]
+    assert [r["id"] for r in reaberto.range('por_data', de="2030-01-01T09:30")] == [primeira["id"]]
@@ -0,0 +1,41 @@
+import time
+
+from fastapi.testclient import TestClient
+
+import main
+from src.storage import get_storage
+
+
+def test_dois_lifespans_seguidos_no_mesmo_processo():
+    # O shutdown fecha os storages; as referências guardadas por api/admin
+    # continuam válidas e reabrem o log na primeira escrita do lifespan seguinte
+    db_consultas = get_storage('consultas/consultas.json')
+    for hora in ("09:00", "10:00"):
+        with TestClient(main.app) as cliente:
+            versao = db_consultas.version()
+            resposta = cliente.post("/api/agendar", json={
+                "paciente_nome": "Paciente", "medico_id": 1, "data_hora": f"2031-01-06T{hora}"})
+            assert resposta.status_code == 200, resposta.text
+            assert db_consultas.version() == versao + 1
+
+    horarios = [c["data_hora"] for c in db_consultas.find_by('medico_data_hora', 1, "2031-01-06T10:00")]
+    assert horarios == ["2031-01-06T10:00"]
+
+
+def test_relatorios_depois_de_um_shutdown():
+    # O shutdown encerra o pool de processos e o semáforo do loop anterior:
+    # o lifespan seguinte precisa gerar relatórios normalmente
+    for hora in ("11:00", "12:00"):
+        with TestClient(main.app) as cliente:
+            resposta = cliente.post("/api/agendar", json={
+                "paciente_nome": "Paciente", "medico_id": 1, "data_hora": f"2031-01-07T{hora}"})
+            assert resposta.status_code == 200, resposta.text
+            resposta = cliente.post("/admin/relatorios/gerar", data={"medico_id": "1"}, follow_redirects=False)
+            assert resposta.status_code == 303
+            job_id = resposta.headers["location"].split("job=")[1]
+
+            prazo = time.monotonic() + 60
+            while (job := cliente.get(f"/admin/relatorios/jobs/{job_id}").json())["status"] in ("na_fila", "executando"):
+                assert time.monotonic() < prazo, job
+                time.sleep(0.05)
+            assert job["status"] == "concluido", job
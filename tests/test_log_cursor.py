@@ -0,0 +1,64 @@
+import datetime
+import json
+
+from src.core.log_store import LogStore, carimbo, nome_segmento
+from src.core.logger import LogPipeline
+
+
+def _paginar(store, limite):
+    vistos, cursor = [], None
+    while True:
+        eventos, cursor = store.consultar(limite=limite, antes=cursor)
+        vistos.extend(e["mensagem"] for e in eventos)
+        if cursor is None:
+            return vistos
+
+
+def test_cursor_nao_pula_nem_repete_eventos_do_mesmo_instante(tmp_path):
+    """Vários eventos com o mesmo timestamp na virada da página: o seq desempata."""
+    instante = datetime.datetime(2030, 1, 1, 12, 0, tzinfo=datetime.timezone.utc)
+    with open(tmp_path / nome_segmento(instante), "w", encoding="utf-8") as f:
+        for seq in range(1, 8):
+            f.write(json.dumps({"timestamp": carimbo(instante), "seq": seq, "tipo": "T",
+                                "usuario": "SYSTEM", "mensagem": f"e{seq}"}) + "\n")
+
+    vistos = _paginar(LogStore(str(tmp_path)), limite=2)
+    assert vistos == [f"e{seq}" for seq in range(7, 0, -1)]
+
+
+def test_pipeline_carimba_utc_e_seq_em_ordem(tmp_path):
+    pipeline = LogPipeline(diretorio=str(tmp_path), fsync=False)
+    for i in range(50):
+        pipeline.publicar({"tipo": "T", "usuario": "SYSTEM", "mensagem": f"m{i}"})
+    pipeline.close()
+
+    with open(pipeline._segmento_path, encoding="utf-8") as f:
+        eventos = [json.loads(linha) for linha in f]
+    assert [e["seq"] for e in eventos] == list(range(1, 51))
+    assert all(e["timestamp"].endswith("+00:00") for e in eventos)
+    assert _paginar(LogStore(str(tmp_path)), limite=3) == [f"m{i}" for i in range(49, -1, -1)]
+
+    # Segmento antigo: nome e timestamps em horário local, sem fuso nem seq
+    with open(tmp_path / "system_logs_20200101T120000000000.ndjson", "w", encoding="utf-8") as f:
+        f.write(json.dumps({"timestamp": "2020-01-01T12:00:00", "tipo": "T",
+                            "usuario": "SYSTEM", "mensagem": "legado"}) + "\n")
+
+    # Reinício: o seq continua e a paginação cruza para o segmento antigo
+    reaberto = LogPipeline(diretorio=str(tmp_path), fsync=False)
+    reaberto.publicar({"tipo": "T", "usuario": "SYSTEM", "mensagem": "novo"})
+    reaberto.close()
+    assert reaberto.recentes(1)[0]["seq"] == 51
+    vistos = _paginar(LogStore(str(tmp_path)), limite=7)
+    assert vistos[:2] == ["novo", "m49"] and vistos[-1] == "legado" and len(vistos) == 52
+
+
+def test_migra_o_legado_do_proprio_diretorio_sem_altera_lo(tmp_path):
+    legado = tmp_path / "system_logs.json"
+    legado.write_text(json.dumps([{"id": 1, "timestamp": "2020-01-01T12:00:00", "tipo": "T",
+                                   "usuario": "SYSTEM", "mensagem": "antigo"}]), encoding="utf-8")
+
+    pipeline = LogPipeline(diretorio=str(tmp_path), fsync=False)
+    pipeline.close()
+    assert _paginar(LogStore(str(tmp_path)), limite=5) == ["antigo"]
+    # Lido somente para leitura: nem WAL nem .meta ao lado do arquivo antigo
+    assert sorted(p.name for p in tmp_path.iterdir() if p.name.startswith("system_logs.json")) == ["system_logs.json"]
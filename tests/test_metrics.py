@@ -0,0 +1,67 @@
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+import main
+from src.core.metrics import LockMedido, RegistroMetricas, metricas
+
+
+def test_formato_de_exposicao():
+    registro = RegistroMetricas()
+    requisicoes = registro.contador("teste_requisicoes_total", "Requisições.", ("rota",))
+    duracao = registro.histograma("teste_duracao_seconds", "Duração.", buckets=(1.0, 0.1))
+    registro.medidor("teste_fila", "Itens na fila.", lambda: {("a\"b",): 3}, ("nome",))
+    registro.medidor("teste_quebrado", "Coleta que falha.", lambda: 1 / 0)
+
+    requisicoes.inc("/api")
+    requisicoes.inc("/api", valor=2)
+    # Registro idempotente: o mesmo nome devolve a mesma métrica
+    assert registro.contador("teste_requisicoes_total", "Requisições.", ("rota",)) is requisicoes
+    for valor in (0.05, 0.1, 0.5, 5):
+        duracao.observar(valor)
+
+    linhas = registro.exportar().splitlines()
+    assert linhas[:5] == [
+        "# HELP teste_duracao_seconds Duração.",
+        "# TYPE teste_duracao_seconds histogram",
+        'teste_duracao_seconds_bucket{le="0.1"} 2', # Buckets acumulados, le inclusivo
+        'teste_duracao_seconds_bucket{le="1.0"} 3',
+        'teste_duracao_seconds_bucket{le="+Inf"} 4',
+    ]
+    assert "teste_duracao_seconds_sum 5.65" in linhas
+    assert "teste_duracao_seconds_count 4" in linhas
+    assert 'teste_fila{nome="a\\"b"} 3' in linhas
+    assert "# TYPE teste_quebrado gauge" in linhas
+    assert not any(l.startswith("teste_quebrado ") for l in linhas)
+    assert 'teste_requisicoes_total{rota="/api"} 3' in linhas
+
+
+def test_lock_medido_mede_espera_e_posse():
+    lock = LockMedido("teste_lock.json")
+    with lock:
+        outro = threading.Thread(target=lambda: lock.acquire() and lock.release())
+        outro.start()
+        time.sleep(0.02)
+        assert lock.locked()
+    outro.join()
+
+    linhas = metricas.exportar().splitlines()
+    assert 'so_storage_lock_wait_seconds_count{arquivo="teste_lock.json"} 2' in linhas
+    assert 'so_storage_lock_hold_seconds_count{arquivo="teste_lock.json"} 2' in linhas
+    # A segunda aquisição esperou a primeira posse terminar
+    espera = next(l for l in linhas if l.startswith('so_storage_lock_wait_seconds_sum{arquivo="teste_lock.json"}'))
+    assert float(espera.split()[-1]) >= 0.015
+
+
+def test_endpoint_metrics():
+    with TestClient(main.app) as cliente:
+        assert cliente.get("/api/medicos").status_code == 200
+        resposta = cliente.get("/metrics")
+    assert resposta.status_code == 200
+    assert resposta.headers["content-type"].startswith("text/plain; version=0.0.4")
+    texto = resposta.text
+    assert "# TYPE so_http_request_duration_seconds histogram" in texto
+    # Rótulo pela rota declarada, não pela URL
+    assert 'so_http_request_duration_seconds_count{metodo="GET",rota="/api/medicos",status="200"}' in texto
+    assert "so_info{worker=" in texto
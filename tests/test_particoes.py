@@ -0,0 +1,155 @@
+import glob
+import os
+import uuid
+
+import pytest
+
+from src.storage import PartitionedStorage, ParticaoSeladaError, partitions, registry
+from src.storage.migrate import _ler_json
+from src.storage.schema import colunas_para, indices_para
+
+
+@pytest.fixture
+def arquivo(monkeypatch):
+    # Antes da virada: janeiro/2020 é o mês atual, nada está selado
+    monkeypatch.setattr(partitions, "mes_atual", lambda: "2020-01")
+    os.makedirs(os.path.join(partitions.DATA_DIR, "particoes"), exist_ok=True)
+    return f"particoes/{uuid.uuid4().hex[:8]}.consultas.json"
+
+
+def _abrir(filename, **opcoes):
+    return PartitionedStorage(filename, "data_hora", "medico_id", indices=indices_para(filename),
+                              colunas=colunas_para(filename), por_bloco=2, **opcoes)
+
+
+def _povoar(storage):
+    """Ids na ordem de (data, id). Dias agendados de trás para frente e dois
+    médicos intercalados: as faixas de id dos blocos se sobrepõem."""
+    pares = []
+    for dia in range(5, 0, -1):
+        for medico in (1, 2):
+            consulta = storage.add({"medico_id": medico, "data_hora": f"2020-01-{dia:02d}T09:00"})
+            pares.append((consulta["data_hora"], consulta["id"]))
+    ids = [item_id for _, item_id in sorted(pares)]
+    ids.append(storage.add({"medico_id": 1, "data_hora": "2020-02-03T09:00"})["id"])
+    return ids
+
+
+def test_selar_recusa_escritas_no_mes_arquivado(arquivo, monkeypatch):
+    storage = _abrir(arquivo)
+    ids = _povoar(storage)
+    monkeypatch.setattr(partitions, "mes_atual", lambda: "2020-02")
+    assert storage.arquivar() == {"2020-01": 10}
+
+    assert storage.get(ids[3])["data_hora"] == "2020-01-02T09:00"
+    with pytest.raises(ParticaoSeladaError):
+        storage.add({"medico_id": 1, "data_hora": "2020-01-20T09:00"})
+    with pytest.raises(ParticaoSeladaError):
+        storage.delete(ids[0])
+    with pytest.raises(ParticaoSeladaError):
+        storage.update(ids[0], {"paciente": "Outro"})
+    assert storage.delete(ids[-1]) # Mês quente continua livre
+    storage.close()
+
+
+def test_get_frio_descomprime_um_bloco(arquivo, monkeypatch):
+    storage = _abrir(arquivo)
+    ids = _povoar(storage)
+    monkeypatch.setattr(partitions, "mes_atual", lambda: "2020-02")
+    storage.arquivar()
+
+    particao = storage._particoes["2020-01"]
+    lidos = []
+    ler_bloco = particao._ler_bloco
+    monkeypatch.setattr(particao, "_ler_bloco", lambda meta: lidos.append(meta) or ler_bloco(meta))
+    for item_id in ids[:10]:
+        lidos.clear()
+        assert storage.get(item_id)["id"] == item_id
+        assert len(lidos) == 1
+    lidos.clear()
+    assert particao.get(10 ** 6) is None and not lidos # Id ausente: nenhum bloco lido
+    storage.close()
+
+
+def test_range_com_cursor_atravessa_as_camadas(arquivo, monkeypatch):
+    storage = _abrir(arquivo)
+    ids = _povoar(storage)
+    monkeypatch.setattr(partitions, "mes_atual", lambda: "2020-02")
+    storage.arquivar()
+
+    vistos, apos = [], None
+    while True:
+        pagina = storage.range("por_data", apos=apos, limite=3)
+        vistos.extend(r["id"] for r in pagina)
+        if len(pagina) < 3:
+            break
+        apos = (pagina[-1]["data_hora"], pagina[-1]["id"])
+    assert vistos == ids
+    por_medico = [r["id"] for lote in storage.iterar("por_medico", 1, lote=2) for r in lote]
+    assert por_medico == ids[0:10:2] + [ids[-1]]
+    storage.close()
+
+
+def test_selar_retoma_depois_de_um_crash(arquivo, monkeypatch):
+    storage = _abrir(arquivo)
+    ids = _povoar(storage)
+    monkeypatch.setattr(partitions, "mes_atual", lambda: "2020-02")
+
+    # Crash depois de publicar a partição, antes de tirar as linhas da camada quente
+    def falhar(_ids):
+        raise OSError("crash simulado")
+    monkeypatch.setattr(storage.quente, "descartar", falhar)
+    with pytest.raises(OSError):
+        storage.arquivar()
+    monkeypatch.undo()
+    monkeypatch.setattr(partitions, "mes_atual", lambda: "2020-02")
+    storage.close()
+
+    reaberto = _abrir(arquivo) # A abertura termina o arquivamento
+    assert sorted(r["id"] for r in reaberto.read()) == sorted(ids)
+    assert reaberto.quente.find_by("medico_data_hora", 1, "2020-01-01T09:00") == []
+    assert reaberto.stats()["particoes"][0]["geracao"] == 2
+    # Só a geração publicada fica no disco
+    assert len(glob.glob(os.path.join(reaberto._diretorio, f"{reaberto.origem}.2020-01.*.part"))) == 1
+    reaberto.close()
+
+
+def test_ids_arquivados_nao_sao_reaproveitados(arquivo, monkeypatch):
+    storage = _abrir(arquivo)
+    ids = _povoar(storage)
+    storage.delete(ids[-1]) # Camada quente vazia depois do arquivamento
+    monkeypatch.setattr(partitions, "mes_atual", lambda: "2020-02")
+    storage.arquivar()
+    storage.close()
+    os.remove(storage.quente.wal_path) # Nem o WAL lembra do maior id
+
+    reaberto = _abrir(arquivo)
+    novo = reaberto.add({"medico_id": 1, "data_hora": "2020-02-10T09:00"})
+    assert novo["id"] > max(ids[:10])
+    reaberto.close()
+
+
+def test_sem_arquivamento_automatico_o_historico_continua_visivel(arquivo, monkeypatch):
+    storage = _abrir(arquivo)
+    ids = _povoar(storage)
+    monkeypatch.setattr(partitions, "mes_atual", lambda: "2020-02")
+    storage.arquivar()
+    storage.close()
+
+    monkeypatch.setattr(partitions, "mes_atual", lambda: "2020-03") # Fevereiro já poderia ser selado
+    reaberto = _abrir(arquivo, arquivar=False)
+    assert reaberto.stats()["limite"] == "2020-02"
+    assert sorted(r["id"] for r in reaberto.read()) == sorted(ids)
+    with pytest.raises(ParticaoSeladaError): # O índice único ainda vê o mês arquivado
+        reaberto.add({"medico_id": 1, "data_hora": "2020-01-01T09:00"})
+    reaberto.close()
+
+    # SO_ARQUIVO=0 com um catálogo no disco: o registry continua particionando
+    monkeypatch.setattr(registry, "ARQUIVO_ATIVO", False)
+    aberto = registry._abrir(arquivo)
+    assert isinstance(aberto, PartitionedStorage) and list(aberto._particoes) == ["2020-01"]
+    aberto.close()
+
+    # A migração lê tudo sem selar fevereiro
+    assert sorted(r["id"] for r in _ler_json(arquivo)) == sorted(ids)
+    assert list(_abrir(arquivo, somente_leitura=True)._particoes) == ["2020-01"]
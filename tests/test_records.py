@@ -0,0 +1,76 @@
+from src.storage import JsonStorage
+from src.storage.records import SALTO_MAXIMO, TabelaColunar
+from src.storage.schema import colunas_para
+
+LINHAS = [
+    {"paciente": "Ana", "medico_id": 1, "data_hora": "2030-01-07T08:30", "status": "confirmada"},
+    {"medico_id": 2, "data_hora": "2030-01-07T09:00"},                        # Campos ausentes
+    {"paciente": None, "medico_id": True, "data_hora": "2030-01-07 09:30"},    # Não cabem na coluna
+    {"medico_id": 2 ** 40, "data_hora": "2030-13-01T00:00", "status": 3},
+    {"paciente": {"nome": "Bia"}, "medico_id": 1, "data_hora": "2030-01-07T08:30", "sala": "B2"},
+]
+
+
+def _tabela():
+    return TabelaColunar(colunas_para('consultas.json'))
+
+
+def test_ida_e_volta_preserva_cada_valor():
+    tabela = _tabela()
+    esperado = {}
+    for item_id, row in enumerate(LINHAS, start=1):
+        row = {**row, "id": item_id}
+        assert tabela.put(item_id, row) == row
+        esperado[item_id] = row
+    # Ids não inteiros ou muito além do fim ficam avulsos, intactos
+    for item_id in ("legado-7", SALTO_MAXIMO * 4):
+        row = {"medico_id": 3, "data_hora": "2030-01-08T10:00", "id": item_id}
+        assert tabela.put(item_id, row) == row
+        esperado[item_id] = row
+
+    assert len(tabela) == len(esperado)
+    for item_id, row in esperado.items():
+        assert item_id in tabela
+        assert tabela.get(item_id) == row
+        assert type(tabela.get(item_id)["medico_id"]) is type(row["medico_id"])
+    assert list(tabela) == list(esperado.values())
+    assert all(list(row)[-1] == "id" for row in tabela)
+    assert 99 not in tabela and tabela.get(99) is None
+
+
+def test_substituir_apagar_e_congelar():
+    tabela = _tabela()
+    for item_id, row in enumerate(LINHAS[:3], start=1):
+        tabela.put(item_id, {**row, "id": item_id})
+    congelada = tabela.congelar()
+
+    # Substituir remove extras antigos; apagar libera a posição
+    assert tabela.put(3, {"medico_id": 4, "data_hora": "2030-01-09T11:00", "id": 3}) == \
+        {"medico_id": 4, "data_hora": "2030-01-09T11:00", "id": 3}
+    assert tabela.pop(1) == {**LINHAS[0], "id": 1}
+    assert tabela.pop(1) is None
+    assert [row["id"] for row in tabela] == [2, 3]
+
+    # A visão congelada continua no instante da cópia
+    assert list(congelada) == [{**row, "id": i} for i, row in enumerate(LINHAS[:3], start=1)]
+    assert congelada.get(3)["data_hora"] == "2030-01-07 09:30"
+
+
+def test_storage_colunar_equivale_ao_de_dicts(tmp_path):
+    arquivos = {}
+    for nome, colunas in (("colunar", colunas_para('consultas.json')), ("dicts", ())):
+        arquivo = str(tmp_path / nome / "consultas.json")
+        storage = JsonStorage(arquivo, colunas=colunas, compactar_a_cada=3)
+        for row in LINHAS:
+            storage.add(row)
+        storage.update(2, {"status": "cancelada", "obs": [1, 2]})
+        storage.delete(4)
+        storage.close()
+        arquivos[nome] = (arquivo, colunas, storage.read())
+
+    assert arquivos["colunar"][2] == arquivos["dicts"][2]
+    # Replay (snapshot + WAL) reconstrói exatamente os mesmos registros
+    arquivo, colunas, lidos = arquivos["colunar"]
+    reaberto = JsonStorage(arquivo, colunas=colunas)
+    assert reaberto.read() == lidos
+    reaberto.close()
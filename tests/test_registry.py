@@ -0,0 +1,41 @@
+import os
+import threading
+
+from src.storage import get_storage
+
+
+def test_uma_instancia_por_arquivo(tmp_path):
+    arquivo = str(tmp_path / "notas" / "avisos.json")
+    storage = get_storage(arquivo)
+    assert get_storage(os.path.join(str(tmp_path), "notas", ".", "avisos.json")) is storage
+    assert get_storage(str(tmp_path / "notas" / "outros.json")) is not storage
+
+    # Primeiro acesso concorrente: o double-checked locking abre o arquivo uma vez só
+    novo = str(tmp_path / "notas" / "concorrente.json")
+    vistos = []
+    threads = [threading.Thread(target=lambda: vistos.append(get_storage(novo))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(vistos) == 8 and all(visto is vistos[0] for visto in vistos)
+
+
+def test_leitores_nao_esperam_pelo_escritor(tmp_path):
+    storage = get_storage(str(tmp_path / "avisos.json"))
+    aviso = storage.add({"texto": "plantão"})
+    antes = storage.read()
+
+    # Com uma visão publicada, a leitura não disputa o mutex de escrita
+    lidos = []
+    with storage._lock:
+        leitor = threading.Thread(target=lambda: lidos.append(storage.read()))
+        leitor.start()
+        leitor.join(timeout=5)
+        assert not leitor.is_alive()
+    assert lidos == [[aviso]]
+
+    # Copy-on-write: quem já leu continua com a versão anterior
+    storage.update(aviso["id"], {"texto": "feriado"})
+    assert antes == [{"texto": "plantão", "id": aviso["id"]}]
+    assert storage.read() == [{"texto": "feriado", "id": aviso["id"]}]
@@ -0,0 +1,59 @@
+import time
+
+from fastapi.testclient import TestClient
+
+import main
+from src.concurrent.worker import CONCLUIDO, EXECUTANDO, ERRO, FilaRelatorios, JobRelatorio, RegistroJobs
+from src.config.settings import RELATORIO_JOBS_DB
+from src.storage import get_storage
+
+
+def _gerar(cliente, medico_id: int) -> dict:
+    resposta = cliente.post("/admin/relatorios/gerar", data={"medico_id": str(medico_id)}, follow_redirects=False)
+    assert resposta.status_code == 303
+    job_id = resposta.headers["location"].split("job=")[1]
+    prazo = time.monotonic() + 60
+    while (job := cliente.get(f"/admin/relatorios/jobs/{job_id}").json())["status"] in ("na_fila", "executando"):
+        assert time.monotonic() < prazo, job
+        time.sleep(0.05)
+    return job
+
+
+def test_job_e_cache_visiveis_para_outro_worker():
+    get_storage('consultas/consultas.json').add(
+        {"paciente": "Paciente", "medico_id": 2, "data_hora": "2031-02-03T09:00"})
+    with TestClient(main.app) as cliente:
+        job = _gerar(cliente, 2)
+    assert job["status"] == CONCLUIDO, job
+
+    # Outro processo (ou o mesmo após reinício): nada em RAM, só o banco comum
+    outro = FilaRelatorios(registro=RegistroJobs(RELATORIO_JOBS_DB))
+    assert outro.obter(job["id"])["arquivo"] == job["arquivo"]
+    assert job["id"] in [j["id"] for j in outro.listar()]
+
+    with TestClient(main.app) as cliente:
+        repetido = _gerar(cliente, 2)
+    assert repetido["status"] == CONCLUIDO and repetido["reutilizado"], repetido
+    assert repetido["arquivo"] == job["arquivo"]
+
+
+def test_progresso_e_interrupcao(tmp_path):
+    registro = RegistroJobs(str(tmp_path / "jobs.db"), historico=2)
+    job = JobRelatorio("teste")
+    job.status, job.enviadas = EXECUTANDO, 500
+    registro.salvar(job)
+    assert registro.obter(job.id)["enviadas"] == 500
+
+    # O dono morreu sem concluir: o próximo boot marca o job como erro
+    assert registro.interromper() == 1
+    assert registro.obter(job.id)["status"] == ERRO
+    assert registro.interromper() == 0
+
+    # Só os `historico` jobs finalizados mais recentes ficam na tabela
+    for _ in range(3):
+        finalizado = JobRelatorio("teste")
+        finalizado.status = CONCLUIDO
+        registro.salvar(finalizado)
+    assert len(registro.listar(10)) == 2
+    registro.fechar()
+    assert registro.listar(10)[0]["id"] == finalizado.id # Reaberto no uso seguinte
@@ -0,0 +1,92 @@
+import asyncio
+import json
+
+import pytest
+
+from src.core import serialization
+from src.core.serialization import (ANUNCIO_ESQUEMAS, ESQUEMAS, SUBPROTOCOLO_BINARIO, Quadro,
+                                    codificar_binario, decodificar_binario, dumps, loads)
+from src.core.socket_manager import ConnectionManager
+
+
+@pytest.mark.parametrize("mensagem", [
+    {"tipo": "bloqueio_temporario", "recurso": "1|2030-01-07T08:30", "dono_id": 140, "ttl": 60},
+    {"tipo": "desbloqueio_temporario", "recurso": "1|2030-01-07T08:30"},
+    {"tipo": "resposta_selecao", "sucesso": False, "recurso": "1|2030-01-07T08:30"},
+    {"tipo": "novo_agendamento", "dados": {"id": 9, "paciente": "Ana Lúcia", "medico_id": 1}, "seq": 12},
+    {"tipo": "recurso_removido", "seq": 3}, # Campo do meio ausente
+    {"acao": "selecionar", "medico_id": 1, "data_hora": "2030-01-07T08:30", "client_id": "c1"},
+])
+def test_ida_e_volta_pelos_esquemas(mensagem):
+    frame = codificar_binario(mensagem)
+    assert frame[0] != 0
+    assert decodificar_binario(frame) == mensagem
+
+
+def test_fora_do_esquema_vai_inteiro():
+    # Campo extra ou tipo desconhecido: código 0 com o objeto completo
+    for mensagem in ({"tipo": "bloqueio_temporario", "recurso": "1|x", "extra": 1}, {"tipo": "outro", "a": [1, 2]}):
+        frame = codificar_binario(mensagem)
+        assert frame[0] == 0 and decodificar_binario(frame) == mensagem
+
+    for invalido in (b"", bytes((99,)) + b"[]", b"\x01{}", b"\x00[1]"):
+        with pytest.raises(ValueError):
+            decodificar_binario(invalido)
+
+    evento = {"tipo": "bloqueio_temporario", "recurso": "12|2030-01-07T08:30", "dono_id": 140737488355328, "ttl": 60}
+    assert len(codificar_binario(evento)) < len(dumps(evento)) / 2
+    assert {codigo for codigo, *_ in ESQUEMAS} == {e[0] for e in ANUNCIO_ESQUEMAS["esquemas"]}
+
+
+def test_fallback_da_stdlib_tem_a_mesma_saida(monkeypatch):
+    objeto = {"nome": "José", "itens": [1, 2.5, None, True], 3: "chave int"}
+    rapido = dumps(objeto)
+    monkeypatch.setattr(serialization, "orjson", None)
+    assert dumps(objeto) == rapido == json.dumps(objeto, ensure_ascii=False, separators=(",", ":")).encode()
+    assert loads(rapido) == {"nome": "José", "itens": [1, 2.5, None, True], "3": "chave int"}
+    with pytest.raises(ValueError):
+        loads(b'{"rasgado": ')
+
+
+def test_quadro_codifica_uma_vez_por_formato():
+    quadro = Quadro({"tipo": "desbloqueio_temporario", "recurso": "1|x", "status": "free"})
+    assert quadro.texto is quadro.texto
+    assert quadro.binario is quadro.binario
+    remoto = Quadro(texto=quadro.texto) # Frame vindo de outro worker
+    assert remoto.binario == quadro.binario and remoto.mensagem == quadro.mensagem
+
+
+class _Socket:
+    def __init__(self, subprotocolos=()):
+        self.scope = {"subprotocols": list(subprotocolos)}
+        self.subprotocolo = None
+        self.frames = []
+
+    async def accept(self, subprotocol=None):
+        self.subprotocolo = subprotocol
+
+    async def send_text(self, frame):
+        self.frames.append(frame)
+
+    async def send_bytes(self, frame):
+        self.frames.append(frame)
+
+
+def test_subprotocolo_negociado_no_handshake():
+    async def cenario():
+        manager = ConnectionManager()
+        texto, binario, outro_binario = _Socket(), _Socket([SUBPROTOCOLO_BINARIO]), _Socket([SUBPROTOCOLO_BINARIO])
+        for socket in (texto, binario, outro_binario):
+            await manager.connect(socket)
+        await manager.broadcast({"tipo": "recurso_removido", "id": 4, "seq": 7})
+        await asyncio.sleep(0.05)
+        await manager.close()
+        return texto, binario, outro_binario
+
+    texto, binario, outro_binario = asyncio.run(cenario())
+    assert texto.subprotocolo is None and binario.subprotocolo == SUBPROTOCOLO_BINARIO
+    assert [loads(f) for f in texto.frames] == [{"tipo": "recurso_removido", "id": 4, "seq": 7}]
+    # Primeiro frame binário: a tabela de esquemas; depois, os mesmos bytes para todos
+    assert decodificar_binario(binario.frames[0]) == ANUNCIO_ESQUEMAS
+    assert decodificar_binario(binario.frames[1]) == {"tipo": "recurso_removido", "id": 4, "seq": 7}
+    assert binario.frames[1] is outro_binario.frames[1]
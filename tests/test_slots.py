@@ -0,0 +1,92 @@
+import datetime
+
+from src.core.availability import SlotEngine, separar_data_hora
+from src.storage import ChangeFeed, JsonStorage
+
+SEGUNDA = datetime.date(2030, 1, 7)
+
+
+def _motor(tmp_path, retencao=1000):
+    feed = ChangeFeed(retencao=retencao)
+    medicos = JsonStorage(str(tmp_path / "medicos.json"), feed=feed)
+    consultas = JsonStorage(str(tmp_path / "consultas.json"), feed=feed)
+    medico = medicos.add({"nome": "Dra. Ana", "disponibilidade": {"Seg": ["08:00", "08:30", "09:00"], "Ter": ["14:00"]}})
+    return SlotEngine(feed, medicos, consultas), medicos, consultas, medico["id"]
+
+
+def _dia(motor, medico_id, data=SEGUNDA):
+    return motor.slots(medico_id, data, data + datetime.timedelta(days=1))[0]
+
+
+def test_livres_sao_agenda_menos_ocupados_e_bloqueados(tmp_path):
+    motor, _, consultas, medico_id = _motor(tmp_path)
+    consulta = consultas.add({"medico_id": medico_id, "data_hora": "2030-01-07T08:30"})
+    motor.observar({"tipo": "bloqueio_temporario", "recurso": f"{medico_id}|2030-01-07T09:00"})
+    assert _dia(motor, medico_id) == {"data": "2030-01-07", "livres": ["08:00"],
+                                      "ocupados": ["08:30"], "bloqueados": ["09:00"]}
+
+    # Semana inteira: só segunda e terça têm agenda
+    semana = motor.slots(medico_id, SEGUNDA, SEGUNDA + datetime.timedelta(days=7))
+    assert [len(d["livres"]) for d in semana] == [1, 1, 0, 0, 0, 0, 0]
+
+    # Deltas: cancelamento libera o bit, desbloqueio também
+    consultas.delete(consulta["id"])
+    motor.observar({"tipo": "desbloqueio_temporario", "recurso": f"{medico_id}|2030-01-07T09:00"})
+    assert _dia(motor, medico_id)["livres"] == ["08:00", "08:30", "09:00"]
+    assert motor.reconstrucoes == 1
+
+
+def test_deltas_de_medicos_e_remarcacoes(tmp_path):
+    motor, medicos, consultas, medico_id = _motor(tmp_path)
+    consulta = consultas.add({"medico_id": medico_id, "data_hora": "2030-01-07T08:00"})
+    assert _dia(motor, medico_id)["ocupados"] == ["08:00"]
+
+    # Remarcação move o bit; agenda nova substitui a máscara do dia da semana
+    consultas.update(consulta["id"], {"data_hora": "2030-01-07T09:00"})
+    medicos.update(medico_id, {"disponibilidade": {"Seg": ["09:00", "10:00"]}})
+    assert _dia(motor, medico_id) == {"data": "2030-01-07", "livres": ["10:00"],
+                                      "ocupados": ["09:00"], "bloqueados": []}
+
+    # Lock de outro dia/médico e remoção administrativa do médico
+    motor.observar({"tipo": "bloqueio_temporario", "recurso": f"{medico_id}|2030-01-07T10:00"})
+    motor.observar({"tipo": "recurso_removido", "id": str(medico_id)})
+    medicos.delete(medico_id)
+    assert motor.medicos() == []
+    assert motor.slots(medico_id, SEGUNDA, SEGUNDA + datetime.timedelta(days=1)) is None
+
+
+def test_reset_do_feed_reconstroi_a_partir_dos_storages(tmp_path):
+    motor, _, consultas, medico_id = _motor(tmp_path, retencao=2)
+    assert _dia(motor, medico_id)["livres"] == ["08:00", "08:30", "09:00"]
+    for hora in ("08:00", "08:30", "09:00"): # Mais mudanças que a janela do feed
+        consultas.add({"medico_id": medico_id, "data_hora": f"2030-01-07T{hora}"})
+    assert _dia(motor, medico_id)["ocupados"] == ["08:00", "08:30", "09:00"]
+    assert motor.reconstrucoes == 2
+
+
+def test_separar_data_hora():
+    assert separar_data_hora("2030-01-07T08:30") == ("2030-01-07", 510)
+    assert separar_data_hora("2030-01-07T24:00") is None
+    assert separar_data_hora("2030-01-07") is None
+
+
+def test_janela_nao_entra_em_meses_selados():
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from src.core import api
+
+    app = FastAPI()
+    app.include_router(api.api_router)
+    medico = api.db_medicos.add({"nome": "Dr. Selado", "disponibilidade": {"Seg": ["08:00"]}})
+    limite = datetime.date.fromisoformat(f"{api.db_consultas.limite}-01")
+    with TestClient(app) as cliente:
+        # Meses selados não têm bitmaps: nada de "livres" falsos no passado arquivado
+        passado = cliente.get(f"/api/medicos/{medico['id']}/slots",
+                              params={"from": "2000-01-03", "to": "2000-01-10"}).json()
+        assert passado["dias"] == [] and passado["de"] == passado["ate"] == "2000-01-10"
+
+        virada = cliente.get(f"/api/medicos/{medico['id']}/slots",
+                             params={"from": (limite - datetime.timedelta(days=3)).isoformat(),
+                                     "to": (limite + datetime.timedelta(days=4)).isoformat()}).json()
+        assert virada["de"] == limite.isoformat()
+        assert [d["data"] for d in virada["dias"]][0] == limite.isoformat() and len(virada["dias"]) == 4
@@ -0,0 +1,84 @@
+import json
+import threading
+
+import pytest
+
+from src.storage import SqliteStorage, UniqueConstraintError
+from src.storage.migrate import migrar_arquivo
+from src.storage.schema import indices_para
+
+
+def test_mesma_interface_do_json_storage(tmp_path):
+    db_path = str(tmp_path / "sistema.db")
+    storage = SqliteStorage('consultas/consultas.json', indices=indices_para('consultas.json'), db_path=db_path)
+    tarde = storage.add({"medico_id": 1, "data_hora": "2030-01-01T14:00", "paciente": "Ana"})
+    manha = storage.add({"medico_id": 1, "data_hora": "2030-01-01T09:00", "paciente": "Bia"})
+    assert storage.get(tarde["id"]) == tarde
+
+    # O índice único vira UNIQUE INDEX no SQLite e volta como UniqueConstraintError
+    with pytest.raises(UniqueConstraintError) as erro:
+        storage.add({"medico_id": 1, "data_hora": "2030-01-01T09:00", "paciente": "Carla"})
+    assert erro.value.indice == 'medico_data_hora'
+    with pytest.raises(UniqueConstraintError):
+        storage.update(tarde["id"], {"data_hora": "2030-01-01T09:00"})
+
+    assert [r["id"] for r in storage.range('por_medico', 1)] == [manha["id"], tarde["id"]]
+    assert [r["id"] for r in storage.range('por_data', de="2030-01-01T10:00")] == [tarde["id"]]
+    assert storage.find_one('medico_data_hora', 1, "2030-01-01T14:00")["paciente"] == "Ana"
+
+    assert storage.update(tarde["id"], {"paciente": "Dora"})
+    assert storage.delete(manha["id"])
+    assert not storage.update(manha["id"], {"paciente": "Eva"})
+
+    # Outra instância (outro worker) enxerga o mesmo banco
+    outro = SqliteStorage('consultas/consultas.json', indices=indices_para('consultas.json'), db_path=db_path)
+    assert outro.read() == [{"medico_id": 1, "data_hora": "2030-01-01T14:00", "paciente": "Dora", "id": tarde["id"]}]
+
+
+def test_escritas_concorrentes_dividem_o_commit(tmp_path):
+    storage = SqliteStorage('consultas/consultas.json', indices=indices_para('consultas.json'),
+                            db_path=str(tmp_path / "sistema.db"), janela_ms=100, max_itens=64)
+    storage.add({"medico_id": 1, "data_hora": "2030-01-01T08:00"}) # Abre as conexões
+    commits = []
+    storage._writer.set_trace_callback(lambda sql: commits.append(sql) if sql == "COMMIT" else None)
+
+    barreira, erros = threading.Barrier(8), []
+    def agendar(i):
+        barreira.wait()
+        # O horário 08:00 já existe: só a escrita i=0 falha, as demais são confirmadas
+        hora = "08:00" if i == 0 else f"{8 + i:02d}:30"
+        try:
+            storage.add({"medico_id": 1, "data_hora": f"2030-01-01T{hora}"})
+        except UniqueConstraintError as e:
+            erros.append(e)
+    threads = [threading.Thread(target=agendar, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(erros) == 1 and len(storage.read()) == 8
+    assert len(commits) < 7 # Um fsync por lote, não por agendamento
+    storage.close()
+
+
+def test_migracao_json_uma_unica_vez(tmp_path):
+    # Snapshot + cauda do WAL, como o JsonStorage deixa no disco
+    arquivo = str(tmp_path / "medicos.json")
+    with open(arquivo, 'w', encoding='utf-8') as f:
+        json.dump([{"id": 3, "nome": "Dr. Caio"}, {"id": 7, "nome": "Dra. Lia"}], f)
+    with open(arquivo + '.wal', 'w', encoding='utf-8') as f:
+        f.write(json.dumps({"op": "update", "id": 3, "updates": {"ativo": False}, "lsn": 1}) + "\n")
+        f.write(json.dumps({"op": "add", "item": {"id": 8, "nome": "Dr. Rui"}, "lsn": 2}) + "\n")
+
+    db_path = str(tmp_path / "sistema.db")
+    destino = SqliteStorage(arquivo, db_path=db_path)
+    assert migrar_arquivo(arquivo, destino, db_path) == 3
+    # Os IDs originais são preservados
+    assert destino.read() == [
+        {"id": 3, "nome": "Dr. Caio", "ativo": False},
+        {"id": 7, "nome": "Dra. Lia"},
+        {"id": 8, "nome": "Dr. Rui"},
+    ]
+    assert migrar_arquivo(arquivo, destino, db_path) == 0
+    assert len(destino.read()) == 3
@@ -0,0 +1,56 @@
+import glob
+import json
+import time
+
+from src.storage.database import JsonStorage
+
+
+def _esperar_compactacao(storage, lsn, prazo=10.0):
+    limite = time.monotonic() + prazo
+    while time.monotonic() < limite:
+        try:
+            with open(storage.meta_path, encoding='utf-8') as f:
+                if json.load(f).get("lsn", 0) >= lsn and not glob.glob(glob.escape(storage.wal_path) + '.*'):
+                    return
+        except (OSError, ValueError):
+            pass
+        time.sleep(0.05)
+    raise AssertionError(f"compactação de {storage.filepath} não terminou")
+
+
+def test_replay_descarta_cauda_rasgada(tmp_path):
+    arquivo = str(tmp_path / "consultas.json")
+    storage = JsonStorage(arquivo, compactar_a_cada=100)
+    consulta = storage.add({"medico_id": 1, "paciente": "Ana"})
+    storage.update(consulta["id"], {"paciente": "Bia"})
+
+    # Crash no meio do write: a última linha do log ficou pela metade
+    with open(storage.wal_path, 'ab') as f:
+        f.write(b'{"op": "add", "item": {"medico_id": 2, "pac')
+
+    reaberto = JsonStorage(arquivo, compactar_a_cada=100)
+    assert reaberto.read() == [{"medico_id": 1, "paciente": "Bia", "id": consulta["id"]}]
+    with open(storage.wal_path, 'rb') as f:
+        linhas = f.read().splitlines(keepends=True)
+    assert len(linhas) == 2 and linhas[-1].endswith(b"\n")
+
+    # O próximo append não fica "colado" na cauda descartada
+    reaberto.update(consulta["id"], {"paciente": "Carla"})
+    assert JsonStorage(arquivo, compactar_a_cada=100).read()[0]["paciente"] == "Carla"
+
+
+def test_compactacao_grava_snapshot_e_remove_segmentos(tmp_path):
+    arquivo = str(tmp_path / "consultas.json")
+    storage = JsonStorage(arquivo, compactar_a_cada=2)
+    consulta = storage.add({"medico_id": 1, "paciente": "Ana"})
+    storage.update(consulta["id"], {"paciente": "Bia"})
+    _esperar_compactacao(storage, 2)
+
+    with open(storage.filepath, encoding='utf-8') as f:
+        assert json.load(f) == [{"medico_id": 1, "paciente": "Bia", "id": consulta["id"]}]
+
+    # Depois do selo o log recomeça; o replay aplica só o que veio depois do snapshot
+    storage.update(consulta["id"], {"paciente": "Carla"})
+    reaberto = JsonStorage(arquivo, compactar_a_cada=2)
+    assert reaberto.read() == [{"medico_id": 1, "paciente": "Carla", "id": consulta["id"]}]
+    assert reaberto.add({"medico_id": 2})["id"] == consulta["id"] + 1